@@ -408,6 +408,7 @@ def clear_scodoc_cache():
     r.flushall()
     # Also clear local caches:
     sco_preferences.clear_base_preferences()
+    sco_cache.clear_local_caches()
 
 
 # --------- Logging
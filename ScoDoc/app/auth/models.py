@@ -17,6 +17,8 @@ from flask_login import UserMixin, AnonymousUserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 import jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 from app import db, login
 
@@ -24,6 +26,7 @@ from app.scodoc.sco_exceptions import ScoValueError
 from app.scodoc.sco_permissions import Permission
 from app.scodoc.sco_roles_default import SCO_ROLES_DEFAULTS
 import app.scodoc.sco_utils as scu
+from app.scodoc import sco_cache
 from app.scodoc import sco_etud  # a deplacer dans scu
 
 VALID_LOGIN_EXP = re.compile(r"^[a-zA-Z0-9@\\\-_\.]+$")
@@ -194,6 +197,7 @@ class User(UserMixin, db.Model):
         # Roles: roles_string is "Ens_RT, Secr_RT, ..."
         if "roles_string" in data:
             self.user_roles = []
+            self.invalidate_permissions()
             for r_d in data["roles_string"].split(","):
                 if r_d:
                     role, dept = UserRole.role_dept_from_string(r_d)
@@ -234,16 +238,51 @@ class User(UserMixin, db.Model):
             return False
         if dept is False:
             dept = g.scodoc_dept
-        # les role liés à ce département, et les roles avec dept=None (super-admin)
-        roles_in_dept = (
-            UserRole.query.filter_by(user_id=self.id)
-            .filter((UserRole.dept == dept) | (UserRole.dept == None))
-            .all()
+        return self.get_permissions(dept) & perm == perm
+
+    def get_permissions(self, dept) -> int:
+        """Bitmask of the permissions of this user in `dept`:
+        roles in this dept, and roles with dept=None (super-admin).
+        """
+        permissions = self._get_permissions_by_dept()
+        return permissions.get(dept, 0) | permissions.get(None, 0)
+
+    def _get_permissions_by_dept(self) -> dict:
+        """{ dept : bitmask } of the permissions given by the user's roles.
+        Computed once, then cached in this object, in this process
+        and in the shared cache (UserPermissionsCache).
+        """
+        generation = sco_cache.UserPermissionsCache.get_generation()
+        cached = getattr(self, "_permissions_by_dept", None)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        # Rôles en cours de modification (pas encore enregistrés): pas de cache partagé
+        session = db.session()
+        modified = self.id is None or any(
+            isinstance(obj, UserRole)
+            for obj in list(session.new) + list(session.deleted)
         )
-        for user_role in roles_in_dept:
-            if user_role.role.has_permission(perm):
-                return True
-        return False
+        permissions = None
+        if not modified:
+            permissions = sco_cache.UserPermissionsCache.get(self.id)
+        if permissions is None:
+            permissions = {}
+            for user_role in self.user_roles:
+                permissions[user_role.dept] = permissions.get(user_role.dept, 0) | (
+                    user_role.role.permissions or 0
+                )
+            if not modified:
+                sco_cache.UserPermissionsCache.set(self.id, permissions)
+        self._permissions_by_dept = (
+            sco_cache.UserPermissionsCache.get_generation(),
+            permissions,
+        )
+        return permissions
+
+    def invalidate_permissions(self):
+        "Forget cached permissions (called when roles are changed)"
+        self._permissions_by_dept = None
+        invalidate_permissions_cache()
 
     # Role management
     def add_role(self, role, dept):
@@ -251,6 +290,7 @@ class User(UserMixin, db.Model):
         :param role: Role to add.
         """
         self.user_roles.append(UserRole(user=self, role=role, dept=dept))
+        self.invalidate_permissions()
 
     def add_roles(self, roles, dept):
         """Add roles to this user.
@@ -262,6 +302,7 @@ class User(UserMixin, db.Model):
     def set_roles(self, roles, dept):
         "set roles in the given dept"
         self.user_roles = [UserRole(user=self, role=r, dept=dept) for r in roles]
+        self.invalidate_permissions()
 
     def get_roles(self):
         "iterator on my roles"
@@ -371,12 +412,15 @@ class Role(db.Model):
 
     def add_permission(self, perm):
         self.permissions |= perm
+        invalidate_permissions_cache()
 
     def remove_permission(self, perm):
         self.permissions = self.permissions & ~perm
+        invalidate_permissions_cache()
 
     def reset_permissions(self):
         self.permissions = 0
+        invalidate_permissions_cache()
 
     def has_permission(self, perm):
         return self.permissions & perm == perm
@@ -442,6 +486,21 @@ class UserRole(db.Model):
         return (role, dept)
 
 
+def invalidate_permissions_cache():
+    """Invalidate cached permissions of all users.
+    Done immediately, and again after the next commit, so that permissions
+    computed by other processes before the commit are not kept.
+    """
+    sco_cache.UserPermissionsCache.invalidate_all()
+    db.session().info["user_permissions_modified"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_permissions_after_commit(session):
+    if session.info.pop("user_permissions_modified", False):
+        sco_cache.UserPermissionsCache.invalidate_all()
+
+
 def get_super_admin():
     """L'utilisateur admin (ou le premier, s'il y en a plusieurs).
     Utilisé par les tests unitaires et le script de migration.
@@ -155,35 +155,52 @@ def interprete_tag_latex(tag):
 
 
 # ----------------------------------------------------------------------------------------
-def get_code_latex_avis_etudiant(
-    donnees_etudiant, un_avis_latex, annotationPE, footer_latex, prefs
-):
-    """
-    Renvoie le code latex permettant de générer l'avis d'un étudiant en utilisant ses
-    donnees_etudiant contenu dans le dictionnaire de synthèse du jury PE et en suivant un
-    fichier modele donné
-
-    result: chaine unicode
+class AvisLatexTemplate:
+    """Modèle d'avis LaTeX (corps + footer) analysé une seule fois pour tous
+    les étudiants: recherche des tags et interprétation des tags numériques.
     """
-    if not donnees_etudiant or not un_avis_latex:  # Cas d'un template vide
-        return annotationPE if annotationPE else ""
 
-    # Le template latex (corps + footer)
-    code = un_avis_latex + "\n\n" + footer_latex
+    def __init__(self, un_avis_latex, footer_latex):
+        self.un_avis_latex = un_avis_latex
+        # Le template latex (corps + footer)
+        self.code = un_avis_latex + "\n\n" + footer_latex
+        # Recherche des tags dans le fichier
+        self.tags_latex = get_tags_latex(self.code)
+        if DEBUG:
+            log("Les tags" + str(self.tags_latex))
+        self.tags_numeriques = {
+            tag_latex: interprete_tag_latex(tag_latex)
+            for tag_latex in self.tags_latex
+            if ":" in tag_latex
+        }
 
-    # Recherche des tags dans le fichier
-    tags_latex = get_tags_latex(code)
-    if DEBUG:
-        log("Les tags" + str(tags_latex))
+    def render(self, donnees_etudiant, annotationPE, prefs):
+        """Code latex de l'avis d'un étudiant (voir get_code_latex_avis_etudiant)
+
+        result: chaine unicode
+        """
+        if not donnees_etudiant or not self.un_avis_latex:  # Cas d'un template vide
+            return annotationPE if annotationPE else ""
+        code = self.code
+        valeurs = {}  # tag_latex : valeur
+        # Interprète et remplace chaque tags latex par les données numériques de l'étudiant (y compris les
+        # tags "macros" tels que parcourstimeline
+        for tag_latex in self.tags_latex:
+            if tag_latex not in valeurs:
+                valeurs[tag_latex] = self._valeur_tag(
+                    tag_latex, donnees_etudiant, annotationPE, prefs
+                )
+            # Substitution
+            code = code.replace("**" + tag_latex + "**", valeurs[tag_latex])
+        return code
 
-    # Interprète et remplace chaque tags latex par les données numériques de l'étudiant (y compris les
-    # tags "macros" tels que parcourstimeline
-    for tag_latex in tags_latex:
+    def _valeur_tag(self, tag_latex, donnees_etudiant, annotationPE, prefs):
+        "Valeur d'un tag latex pour un étudiant"
         # les tags numériques
         valeur = DONNEE_MANQUANTE
 
-        if ":" in tag_latex:
-            (aggregat, groupe, tag_scodoc, champ) = interprete_tag_latex(tag_latex)
+        if tag_latex in self.tags_numeriques:
+            (aggregat, groupe, tag_scodoc, champ) = self.tags_numeriques[tag_latex]
             valeur = str_from_syntheseJury(
                 donnees_etudiant, aggregat, groupe, tag_scodoc, champ
             )
@@ -208,14 +225,39 @@ def get_code_latex_avis_etudiant(
                 valeur = donnees_etudiant[tag_latex]
             elif tag_latex in prefs:  # les champs **NomResponsablePE**, ...
                 valeur = pe_tools.escape_for_latex(prefs[tag_latex])
+        return valeur
 
-        # Vérification des pb d'encodage (debug)
-        # assert isinstance(tag_latex, unicode)
-        # assert isinstance(valeur, unicode)
 
-        # Substitution
-        code = code.replace("**" + tag_latex + "**", valeur)
-    return code
+# ----------------------------------------------------------------------------------------
+def get_code_latex_avis_etudiant(
+    donnees_etudiant, un_avis_latex, annotationPE, footer_latex, prefs
+):
+    """
+    Renvoie le code latex permettant de générer l'avis d'un étudiant en utilisant ses
+    donnees_etudiant contenu dans le dictionnaire de synthèse du jury PE et en suivant un
+    fichier modele donné
+    (pour plusieurs étudiants, utiliser AvisLatexTemplate)
+
+    result: chaine unicode
+    """
+    return AvisLatexTemplate(un_avis_latex, footer_latex).render(
+        donnees_etudiant, annotationPE, prefs
+    )
+
+
+# ----------------------------------------------------------------------------------------
+def get_annotations_PE(etudids, tag_annotation_pe) -> dict:
+    """Annotations PE (voir get_annotation_PE) de ces étudiants, lues en une
+    seule requête: { etudid : annotation }
+    """
+    if not tag_annotation_pe:
+        return {etudid: "" for etudid in etudids}
+    cnx = ndb.GetDBConnexion()
+    annotations = sco_etud.etud_annotations_list_many(cnx, etudids)
+    return {
+        etudid: _annotation_PE(annotations[etudid], tag_annotation_pe)
+        for etudid in etudids
+    }
 
 
 # ----------------------------------------------------------------------------------------
@@ -231,6 +273,13 @@ def get_annotation_PE(etudid, tag_annotation_pe):
         annotations = sco_etud.etud_annotations_list(
             cnx, args={"etudid": etudid}
         )  # Les annotations de l'étudiant
+        return _annotation_PE(annotations, tag_annotation_pe)
+    return ""  # pas d'annotations
+
+
+def _annotation_PE(annotations, tag_annotation_pe):
+    """L'annotation PE (la plus récente) parmi ces annotations, ou "" """
+    if tag_annotation_pe:
         annotationsPE = []
 
         exp = re.compile(r"^" + tag_annotation_pe)
@@ -383,9 +432,19 @@ def get_bilanParTag(donnees_etudiant, groupe="groupe"):
 
 # ----------------------------------------------------------------------------------------
 def get_avis_poursuite_par_etudiant(
-    jury, etudid, template_latex, tag_annotation_pe, footer_latex, prefs
+    jury,
+    etudid,
+    template_latex,
+    tag_annotation_pe,
+    footer_latex,
+    prefs,
+    avis_template=None,
+    annotations=None,
 ):
     """Renvoie un nom de fichier et le contenu de l'avis latex d'un étudiant dont l'etudid est fourni.
+    Pour traiter plusieurs étudiants, indiquer le modèle déjà analysé
+    (avis_template, AvisLatexTemplate) et les annotations PE lues en une fois
+    (annotations, voir get_annotations_PE).
     result: [ chaine unicode, chaine unicode ]
     """
     if pe_tools.PE_DEBUG:
@@ -407,14 +466,17 @@ def get_avis_poursuite_par_etudiant(
     )
 
     # les annnotations
-    annotationPE = get_annotation_PE(etudid, tag_annotation_pe=tag_annotation_pe)
+    if annotations is not None:
+        annotationPE = annotations[etudid]
+    else:
+        annotationPE = get_annotation_PE(etudid, tag_annotation_pe=tag_annotation_pe)
     if pe_tools.PE_DEBUG:
         pe_tools.pe_print(annotationPE, type(annotationPE))
 
     # le LaTeX
-    avis = get_code_latex_avis_etudiant(
-        jury.syntheseJury[etudid], template_latex, annotationPE, footer_latex, prefs
-    )
+    if avis_template is None:
+        avis_template = AvisLatexTemplate(template_latex, footer_latex)
+    avis = avis_template.render(jury.syntheseJury[etudid], annotationPE, prefs)
     # if pe_tools.PE_DEBUG: pe_tools.pe_print(avis, type(avis))
     contenu_latex += avis + "\n"
 
@@ -444,8 +506,10 @@ def get_templates_from_distrib(template="avis"):
 
 
 # ----------------------------------------------------------------------------------------
-def table_syntheseAnnotationPE(syntheseJury, tag_annotation_pe):
-    """Génère un fichier excel synthétisant les annotations PE telles qu'inscrites dans les fiches de chaque étudiant"""
+def table_syntheseAnnotationPE(syntheseJury, tag_annotation_pe, annotations=None):
+    """Génère un fichier excel synthétisant les annotations PE telles qu'inscrites dans les fiches de chaque étudiant
+    annotations: annotations PE déjà lues (voir get_annotations_PE)
+    """
     sT = SeqGenTable()  # le fichier excel à générer
 
     # Les etudids des étudiants à afficher, triés par ordre alphabétiques de nom+prénom
@@ -502,7 +566,12 @@ def table_syntheseAnnotationPE(syntheseJury, tag_annotation_pe):
             n += 1
 
         # L'annotation PE
-        annotationPE = get_annotation_PE(etudid, tag_annotation_pe=tag_annotation_pe)
+        if annotations is not None:
+            annotationPE = annotations[etudid]
+        else:
+            annotationPE = get_annotation_PE(
+                etudid, tag_annotation_pe=tag_annotation_pe
+            )
         row["Annotation PE"] = annotationPE if annotationPE else ""
         rows.append(row)
 
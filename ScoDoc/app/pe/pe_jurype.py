@@ -156,6 +156,9 @@ class JuryPE(object):
         self.semTagDict = (
             {}
         )  # Les semestres taggués à la base des calculs de moyenne par tag
+        self.semTagRegistry = (
+            {}
+        )  # Tous les semestres taggués créés (y compris ceux des UE capitalisées)
         self.setTagDict = (
             {}
         )  # dictionnaire récapitulant les semTag impliqués dans le jury de la forme { 'formsemestre_id' : object Semestre_tag
@@ -166,7 +169,7 @@ class JuryPE(object):
 
         # Un zip où ranger les fichiers générés:
         self.NOM_EXPORT_ZIP = "Jury_PE_%s" % self.diplome
-        self.zipdata = io.BytesIO()
+        self.zipdata = pe_tools.ZipStream()  # envoyé au fur et à mesure
         self.zipfile = ZipFile(self.zipdata, "w")
 
         #
@@ -205,12 +208,26 @@ class JuryPE(object):
     def get_zipped_data(self):
         """returns file-like data with a zip of all generated (CSV) files.
         Reset file cursor at the beginning !
+        (seulement si le zip n'a pas déjà été envoyé: voir iter_zipped_data)
         """
         if self.zipfile:
             self.zipfile.close()
             self.zipfile = None
-        self.zipdata.seek(0)
-        return self.zipdata
+        return io.BytesIO(self.zipdata.pop())
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def iter_zipped_data(self, add_files=None):
+        """Générateur envoyant le zip au fur et à mesure de sa construction:
+        d'abord les fichiers déjà ajoutés, puis ceux ajoutés par add_files
+        (générateur appelant add_file_to_zip), et enfin la fin du zip.
+        """
+        yield self.zipdata.pop()
+        if add_files is not None:
+            for _ in add_files:
+                yield self.zipdata.pop()
+        self.zipfile.close()
+        self.zipfile = None
+        yield self.zipdata.pop()
 
     # **************************************************************************************************************** #
     # Lancement des différentes actions permettant le calcul du jury PE
@@ -594,11 +611,9 @@ class JuryPE(object):
         """
         # Semestre taggué avec classement dans le groupe
         if fid not in self.semTagDict:
-            nt = self.get_cache_notes_d_un_semestre(fid)
-
-            # Création du semestres
-            self.semTagDict[fid] = pe_semestretag.SemestreTag(
-                nt, nt.sem
+            # Création du semestre (ou reprise de celui d'une UE capitalisée)
+            self.semTagDict[fid] = pe_semestretag.get_semtag(
+                fid, self.semTagRegistry
             )  # Création du pesemestre associé
             self.semTagDict[fid].comp_data_semtag()
             lesEtudids = self.semTagDict[fid].get_etudids()
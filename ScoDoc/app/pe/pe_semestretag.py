@@ -56,6 +56,8 @@ class SemestreTag(pe_tagtable.TableTag):
     Attributs supplémentaires :
     - inscrlist/identdict: étudiants inscrits hors démissionnaires ou défaillants
     - _tagdict : Dictionnaire résumant les tags et les modules du semestre auxquels ils sont liés
+    - registry : registre des SemestreTag (partagé par le jury), pour ne créer
+      qu'un seul SemestreTag par semestre (voir get_semtag)
 
 
     Attributs hérités de TableTag :
@@ -73,9 +75,13 @@ class SemestreTag(pe_tagtable.TableTag):
     # -----------------------------------------------------------------------------
     # Fonctions d'initialisation
     # -----------------------------------------------------------------------------
-    def __init__(self, notetable, sem):  # Initialisation sur la base d'une notetable
+    def __init__(
+        self, notetable, sem, registry=None
+    ):  # Initialisation sur la base d'une notetable
         """Instantiation d'un objet SemestreTag à partir d'un tableau de note
-        et des informations sur le semestre pour le dater
+        et des informations sur le semestre pour le dater.
+        registry: { formsemestre_id : SemestreTag } partagé par les semestres
+        d'un même jury (les semestres des UE capitalisées y sont cherchés)
         """
         pe_tagtable.TableTag.__init__(
             self,
@@ -94,13 +100,16 @@ class SemestreTag(pe_tagtable.TableTag):
 
         # Les attributs spécifiques
         self.nt = notetable
+        self.registry = {} if registry is None else registry
+        self.registry.setdefault(self.nt.formsemestre_id, self)
 
         # Les attributs hérités : la liste des étudiants
         self.inscrlist = [etud for etud in self.nt.inscrlist if etud["etat"] == "I"]
+        etudids = set(self.get_etudids())
         self.identdict = {
             etudid: ident
             for (etudid, ident) in self.nt.identdict.items()
-            if etudid in self.get_etudids()
+            if etudid in etudids
         }  # Liste des étudiants non démissionnaires et non défaillants
 
         # Les modules pris en compte dans le calcul des moyennes par tag => ceux des UE standards
@@ -113,6 +122,37 @@ class SemestreTag(pe_tagtable.TableTag):
         self.somme_coeffs = sum(
             [modimpl["module"]["coefficient"] for modimpl in self.modimpls]
         )
+        # Accès direct aux modimpls et résultats déjà calculés (notes et
+        # coeffs par module et étudiant, moyennes d'UE), réutilisés par tous les tags
+        self._modimpls_by_id = {
+            modimpl["moduleimpl_id"]: modimpl for modimpl in self.nt._modimpls
+        }
+        self._notes_coeffs = {}  # { (modimpl_id, etudid, profondeur) : (note, coeff) }
+        self._moys_ue = {}  # { (etudid, modimpl_id) : moy_ue }
+
+    # -----------------------------------------------------------------------------
+    def get_semtag(self, formsemestre_id):
+        """Le SemestreTag d'un autre semestre, pris dans le registre"""
+        return get_semtag(formsemestre_id, self.registry)
+
+    # -----------------------------------------------------------------------------
+    def get_moduleimpl(self, modimpl_id):
+        """Le modimpl du semestre dont l'id est modimpl_id (voir get_moduleimpl)"""
+        modimpl = self._modimpls_by_id.get(modimpl_id)
+        if modimpl is None and SemestreTag.DEBUG:
+            log(
+                "SemestreTag.get_moduleimpl( %s ) : le modimpl recherche n'existe pas"
+                % (modimpl_id)
+            )
+        return modimpl
+
+    # -----------------------------------------------------------------------------
+    def get_moy_ue(self, etudid, modimpl_id):
+        """Moyenne de l'UE du module (voir get_moy_ue_from_nt), calculée une fois"""
+        key = (etudid, modimpl_id)
+        if key not in self._moys_ue:
+            self._moys_ue[key] = get_moy_ue_from_nt(self.nt, etudid, modimpl_id)
+        return self._moys_ue[key]
 
     # -----------------------------------------------------------------------------
     def comp_data_semtag(self):
@@ -226,10 +266,20 @@ class SemestreTag(pe_tagtable.TableTag):
         1) soit des données du semestre en normalisant le coefficient par rapport à la somme des coefficients des modules du semestre,
         2) soit des données des UE précédemment capitalisées, en recherchant un module de même CODE que le modimpl_id proposé,
         le coefficient normalisé l'étant alors par rapport au total des coefficients du semestre auquel appartient l'ue capitalisée
+        Le résultat est mémorisé (un même module sert à plusieurs tags).
         """
+        key = (modimpl_id, etudid, profondeur)
+        if key not in self._notes_coeffs:
+            self._notes_coeffs[key] = self._comp_noteEtCoeff_modimpl(
+                modimpl_id, etudid, profondeur
+            )
+        return self._notes_coeffs[key]
+
+    def _comp_noteEtCoeff_modimpl(self, modimpl_id, etudid, profondeur):
+        """Calcule la note et le coeff (voir get_noteEtCoeff_modimpl)"""
         (note, coeff_norm) = (None, None)
 
-        modimpl = get_moduleimpl(self.nt, modimpl_id)  # Le module considéré
+        modimpl = self.get_moduleimpl(modimpl_id)  # Le module considéré
         if modimpl == None or profondeur < 0:
             return (None, None)
 
@@ -251,9 +301,7 @@ class SemestreTag(pe_tagtable.TableTag):
 
         # Si le module fait partie d'une UE capitalisée
         elif len(ue_capitalisees) > 0:
-            moy_ue_actuelle = get_moy_ue_from_nt(
-                self.nt, etudid, modimpl_id
-            )  # la moyenne actuelle
+            moy_ue_actuelle = self.get_moy_ue(etudid, modimpl_id)  # la moyenne actuelle
             # A quel semestre correspond l'ue capitalisée et quelles sont ses notes ?
             # fid_prec = [ ue['formsemestre_id'] for ue in ue_capitalisees if ue['ue_id'] == modimpl['module']['ue_id'] ][0]
             # semestre_id = modimpl['module']['semestre_id']
@@ -265,10 +313,9 @@ class SemestreTag(pe_tagtable.TableTag):
             if len(fids_prec) > 0:
                 # => le formsemestre_id du semestre dont vient la capitalisation
                 fid_prec = fids_prec[0]
-                # Lecture des notes de ce semestre
-                nt_prec = sco_cache.NotesTableCache.get(
-                    fid_prec
-                )  # le tableau de note du semestre considéré
+                # Lecture des notes de ce semestre, via le semtag associé (registre)
+                semtag_prec = self.get_semtag(fid_prec)
+                nt_prec = semtag_prec.nt  # le tableau de note du semestre considéré
 
                 # Y-a-t-il un module équivalent c'est à dire correspondant au même code (le module_id n'étant pas significatif en cas de changement de PPN)
                 modimpl_prec = [
@@ -278,7 +325,7 @@ class SemestreTag(pe_tagtable.TableTag):
                 ]
                 if len(modimpl_prec) > 0:  # si une correspondance est trouvée
                     modprec_id = modimpl_prec[0]["moduleimpl_id"]
-                    moy_ue_capitalisee = get_moy_ue_from_nt(nt_prec, etudid, modprec_id)
+                    moy_ue_capitalisee = semtag_prec.get_moy_ue(etudid, modprec_id)
                     if (
                         moy_ue_capitalisee is None
                     ) or moy_ue_actuelle >= moy_ue_capitalisee:  # on prend la meilleure ue
@@ -290,7 +337,6 @@ class SemestreTag(pe_tagtable.TableTag):
                             coeff / self.somme_coeffs if self.somme_coeffs != 0 else 0
                         )  # le coeff normalisé
                     else:
-                        semtag_prec = SemestreTag(nt_prec, nt_prec.sem)
                         (note, coeff_norm) = semtag_prec.get_noteEtCoeff_modimpl(
                             modprec_id, etudid, profondeur=profondeur - 1
                         )  # lecture de la note via le semtag associé au modimpl capitalisé
@@ -445,6 +491,18 @@ class SemestreTag(pe_tagtable.TableTag):
 # Fonctions diverses
 # ************************************************************************
 
+# *********************************************
+def get_semtag(formsemestre_id, registry):
+    """Renvoie le SemestreTag du semestre, créé une seule fois par registre
+    (dictionnaire { formsemestre_id : SemestreTag } propre à un jury)
+    """
+    semtag = registry.get(formsemestre_id)
+    if semtag is None:
+        nt = sco_cache.NotesTableCache.get(formsemestre_id)
+        semtag = SemestreTag(nt, nt.sem, registry=registry)
+    return semtag
+
+
 # *********************************************
 def comp_coeff_pond(coeffs, ponderations):
     """
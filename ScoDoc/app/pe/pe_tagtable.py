@@ -206,9 +206,7 @@ class TableTag(object):
         if tag not in self.resultats:
             return stats
 
-        notes = [
-            self.get_moy_from_resultats(tag, etudid) for etudid in self.resultats[tag]
-        ]  # les notes du tag
+        notes = [note for (note, _) in self.resultats[tag].values()]  # les notes du tag
         notes_valides = [
             note for note in notes if isinstance(note, float) and note != None
         ]
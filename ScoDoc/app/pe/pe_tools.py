@@ -163,6 +163,29 @@ def list_directory_filenames(path):
     return R
 
 
+class ZipStream:
+    """Destination (non seekable) d'un zip en cours de construction:
+    les données écrites par zipfile.ZipFile sont récupérées au fur et
+    à mesure par pop(), pour être envoyées au client.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        "Données écrites depuis le dernier appel"
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
 def add_local_file_to_zip(zipfile, ziproot, pathname, path_in_zip):
     """Read pathname server file and add content to zip under path_in_zip"""
     rooted_path_in_zip = os.path.join(ziproot, path_in_zip)
@@ -35,8 +35,12 @@
 
 """
 
-from flask import send_file, request
+import traceback
 
+import flask
+from flask import request
+
+from app import log
 import app.scodoc.sco_utils as scu
 from app.scodoc import sco_formsemestre
 from app.scodoc import html_sco_header
@@ -131,39 +135,69 @@ def pe_view_sem_recap(
         formsemestre_id, champ="pe_tag_annotation_avis_latex"
     )
 
+    # Les annotations PE de tous les étudiants, lues en une fois
+    annotations = pe_avislatex.get_annotations_PE(etudids, tag_annotation_pe)
+
     # Ajout des annotations PE dans un fichier excel
-    sT = pe_avislatex.table_syntheseAnnotationPE(jury.syntheseJury, tag_annotation_pe)
+    sT = pe_avislatex.table_syntheseAnnotationPE(
+        jury.syntheseJury, tag_annotation_pe, annotations=annotations
+    )
     if sT:
         jury.add_file_to_zip(
             jury.NOM_EXPORT_ZIP + "_annotationsPE" + scu.XLSX_SUFFIX, sT.excel()
         )
 
-    latex_pages = {}  # Dictionnaire de la forme nom_fichier => contenu_latex
-    for etudid in etudids:
-        [nom_fichier, contenu_latex] = pe_avislatex.get_avis_poursuite_par_etudiant(
+    # Le modèle d'avis, analysé une seule fois
+    avis_template = pe_avislatex.AvisLatexTemplate(template_latex, footer_latex)
+    # Les avis sont générés avant l'envoi de la réponse:
+    # en cas d'erreur, l'utilisateur a un message et non un zip tronqué.
+    avis = [
+        pe_avislatex.get_avis_poursuite_par_etudiant(
             jury,
             etudid,
             template_latex,
             tag_annotation_pe,
             footer_latex,
             prefs,
+            avis_template=avis_template,
+            annotations=annotations,
         )
-        jury.add_file_to_zip("avis/" + nom_fichier + ".tex", contenu_latex)
-        latex_pages[nom_fichier] = contenu_latex  # Sauvegarde dans un dico
-
-    # Nouvelle version : 1 fichier par étudiant avec 1 fichier appelant créée ci-dessous
-    doc_latex = "\n% -----\n".join(
-        ["\\include{" + nom + "}" for nom in sorted(latex_pages.keys())]
-    )
-    jury.add_file_to_zip("avis/avis_poursuite.tex", doc_latex)
-
-    # Ajoute image, LaTeX class file(s) and modeles
-    pe_tools.add_pe_stuff_to_zip(jury.zipfile, jury.NOM_EXPORT_ZIP)
-    data = jury.get_zipped_data()
+        for etudid in etudids
+    ]
 
-    return send_file(
-        data,
+    def add_avis_to_zip():
+        """Ajoute les avis au zip, un par un (le zip est envoyé au fur et à mesure).
+        Une erreur pendant l'envoi est signalée par un fichier ERREUR.txt,
+        le zip restant complet (lisible).
+        """
+        try:
+            for nom_fichier, contenu_latex in avis:
+                jury.add_file_to_zip("avis/" + nom_fichier + ".tex", contenu_latex)
+                yield
+
+            # Nouvelle version : 1 fichier par étudiant avec 1 fichier appelant créée ci-dessous
+            doc_latex = "\n% -----\n".join(
+                ["\\include{" + nom + "}" for nom in sorted({nom for nom, _ in avis})]
+            )
+            jury.add_file_to_zip("avis/avis_poursuite.tex", doc_latex)
+
+            # Ajoute image, LaTeX class file(s) and modeles
+            pe_tools.add_pe_stuff_to_zip(jury.zipfile, jury.NOM_EXPORT_ZIP)
+        except Exception as exc:
+            log("pe_view_sem_recap: error while building zip")
+            log(traceback.format_exc())
+            jury.add_file_to_zip(
+                "ERREUR.txt",
+                "Erreur lors de la génération des documents: ce zip est incomplet.\n"
+                + str(exc),
+            )
+        yield
+
+    response = flask.Response(
+        flask.stream_with_context(jury.iter_zipped_data(add_avis_to_zip())),
         mimetype="application/zip",
-        download_name=scu.sanitize_filename(jury.NOM_EXPORT_ZIP + ".zip"),
-        as_attachment=True,
     )
+    response.headers["Content-Disposition"] = 'attachment; filename="%s"' % (
+        scu.sanitize_filename(jury.NOM_EXPORT_ZIP + ".zip")
+    )
+    return response
@@ -33,7 +33,7 @@ import re
 
 from flask import g, url_for
 
-from . import listhistogram
+from app.scodoc import sco_stats
 
 
 def horizontal_bargraph(value, mark):
@@ -53,7 +53,7 @@ def histogram_notes(notes):
     "HTML code drawing histogram"
     if not notes:
         return ""
-    _, H = listhistogram.ListHistogram(notes, 21, minmax=(0, 20))
+    _, H = sco_stats.NotesStats(notes).histogram(21, minmax=(0, 20))
     D = ['<ul id="vhist-q-graph"><li class="vhist-qtr" id="vhist-q1"><ul>']
     left = 5
     colwidth = 16  # must match #q-graph li.bar width in stylesheet
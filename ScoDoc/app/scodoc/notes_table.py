@@ -49,7 +49,6 @@ from app.scodoc.sco_codes_parcours import (
     UE_is_fondamentale,
     UE_is_professionnelle,
 )
-from app.scodoc.sco_parcours_dut import formsemestre_get_etud_capitalisation
 from app.scodoc import sco_codes_parcours
 from app.scodoc import sco_compute_moy
 from app.scodoc import sco_cache
@@ -64,6 +63,7 @@ from app.scodoc import sco_groups
 from app.scodoc import sco_moduleimpl
 from app.scodoc import sco_parcours_dut
 from app.scodoc import sco_preferences
+from app.scodoc import sco_stats
 from app.scodoc import sco_etud
 
 
@@ -310,9 +310,10 @@ class NotesTable(object):
         T.sort(key=row_key)
         self.T = T
 
-        if len(valid_moy):
-            self.moy_min = min(valid_moy)
-            self.moy_max = max(valid_moy)
+        moy_stats = sco_stats.NotesStats(valid_moy)
+        if moy_stats.n:
+            self.moy_min = moy_stats.min
+            self.moy_max = moy_stats.max
         else:
             self.moy_min = self.moy_max = "NA"
 
@@ -474,33 +475,23 @@ class NotesTable(object):
         """
         if moduleimpl_id in self.moduleimpl_stats:
             return self.moduleimpl_stats[moduleimpl_id]
-        nb_notes = 0
-        sum_notes = 0.0
-        nb_missing = 0
         moys = self._modmoys[moduleimpl_id]
-        vals = []
-        for etudid in self.get_etudids():
+        stats = sco_stats.NotesStats(
+            moys.get(etudid, None)  # None si non inscrit
+            for etudid in self.get_etudids()
             # saute les demissionnaires et les défaillants:
-            if self.inscrdict[etudid]["etat"] != "I":
-                continue
-            val = moys.get(etudid, None)  # None si non inscrit
-            try:
-                vals.append(float(val))
-            except:
-                nb_missing = nb_missing + 1
-        sum_notes = sum(vals)
-        nb_notes = len(vals)
-        if nb_notes > 0:
-            moy = sum_notes / nb_notes
-            max_note, min_note = max(vals), min(vals)
+            if self.inscrdict[etudid]["etat"] == "I"
+        )
+        if stats.n > 0:
+            moy, min_note, max_note = stats.mean, stats.min, stats.max
         else:
             moy, min_note, max_note = "NA", "-", "-"
         s = {
             "moy": moy,
             "max": max_note,
             "min": min_note,
-            "nb_notes": nb_notes,
-            "nb_missing": nb_missing,
+            "nb_notes": stats.n,
+            "nb_missing": stats.nb_total - stats.n,
             "nb_valid_evals": len(self._valid_evals_per_mod[moduleimpl_id]),
         }
         self.moduleimpl_stats[moduleimpl_id] = s
@@ -513,14 +504,10 @@ class NotesTable(object):
         Les moyennes d'UE ne tiennent pas compte des capitalisations.
         """
         ues = self.get_ues()
-        sum_moy = 0  # la somme des moyennes générales valides
-        nb_moy = 0  # le nombre de moyennes générales valides
-        for ue in ues:
-            ue["_notes"] = []  # liste tmp des valeurs de notes valides dans l'ue
         nb_dem = 0  # nb d'étudiants démissionnaires dans le semestre
         nb_def = 0  # nb d'étudiants défaillants dans le semestre
-        T = self.get_table_moyennes_triees()
-        for t in T:
+        T = []  # lignes des étudiants inscrits
+        for t in self.get_table_moyennes_triees():
             etudid = t[-1]
             # saute les demissionnaires et les défaillants:
             if self.inscrdict[etudid]["etat"] != "I":
@@ -529,36 +516,24 @@ class NotesTable(object):
                 if self.inscrdict[etudid]["etat"] == DEF:
                     nb_def += 1
                 continue
-            try:
-                sum_moy += float(t[0])
-                nb_moy += 1
-            except:
-                pass
-            i = 0
-            for ue in ues:
-                i += 1
-                try:
-                    ue["_notes"].append(float(t[i]))
-                except:
-                    pass
+            T.append(t)
         self.nb_demissions = nb_dem
         self.nb_defaillants = nb_def
-        if nb_moy > 0:
-            self.moy_moy = sum_moy / nb_moy
+        moy_stats = sco_stats.NotesStats(t[0] for t in T)
+        if moy_stats.n > 0:
+            self.moy_moy = moy_stats.mean
         else:
             self.moy_moy = "-"
 
-        i = 0
-        for ue in ues:
-            i += 1
-            ue["nb_moy"] = len(ue["_notes"])
-            if ue["nb_moy"] > 0:
-                ue["moy"] = sum(ue["_notes"]) / ue["nb_moy"]
-                ue["max"] = max(ue["_notes"])
-                ue["min"] = min(ue["_notes"])
+        for i, ue in enumerate(ues, start=1):
+            ue_stats = sco_stats.NotesStats(t[i] for t in T)
+            ue["nb_moy"] = ue_stats.n
+            if ue_stats.n > 0:
+                ue["moy"] = ue_stats.mean
+                ue["max"] = ue_stats.max
+                ue["min"] = ue_stats.min
             else:
                 ue["moy"], ue["max"], ue["min"] = "", "", ""
-            del ue["_notes"]
 
     def get_etud_mod_moy(self, moduleimpl_id, etudid):
         """moyenne d'un etudiant dans un module (ou NI si non inscrit)"""
@@ -1141,9 +1116,11 @@ class NotesTable(object):
         """
         self.ue_capitalisees = scu.DictDefault(defaultvalue=[])
         cnx = None
+        capitalisations = sco_parcours_dut.formsemestre_get_capitalisations(
+            self.sem, self.get_etudids()
+        )
         for etudid in self.get_etudids():
-            capital = formsemestre_get_etud_capitalisation(self.sem, etudid)
-            for ue_cap in capital:
+            for ue_cap in capitalisations.get(etudid, []):
                 # Si la moyenne d'UE n'avait pas été stockée (anciennes versions de ScoDoc)
                 # il faut la calculer ici et l'enregistrer
                 if ue_cap["moy_ue"] is None:
@@ -1209,7 +1186,7 @@ class NotesTable(object):
 
         ue_cap = resultat de formsemestre_get_etud_capitalisation
         { 'ue_id' (dans le semestre source),
-          'ue_code', 'moy', 'event_date','formsemestre_id' }
+          'ue_code', 'moy', 'event_date','formsemestre_id', 'sum_coefs_ue' }
         """
         # log("get_etud_ue_cap_coef\nformsemestre_id='%s'\netudid='%s'\nue=%s\nue_cap=%s\n" % (self.formsemestre_id, etudid, ue, ue_cap))
         # 1- Coefficient explicitement déclaré dans le semestre courant pour cette UE ?
@@ -1228,9 +1205,12 @@ class NotesTable(object):
         coef = None
         if ue_cap["formsemestre_id"]:
             # Somme des coefs dans l'UE du semestre d'origine (nouveau: 23/01/2016)
-            coef = comp_etud_sum_coef_modules_ue(
-                ue_cap["formsemestre_id"], etudid, ue_cap["ue_id"]
-            )
+            if "sum_coefs_ue" in ue_cap:  # déjà calculée avec les capitalisations
+                coef = ue_cap["sum_coefs_ue"]
+            else:
+                coef = comp_etud_sum_coef_modules_ue(
+                    ue_cap["formsemestre_id"], etudid, ue_cap["ue_id"]
+                )
         if coef != None:
             return coef
         else:
@@ -1299,6 +1279,31 @@ class NotesTable(object):
         )
         return len(cursor.fetchall()) > 0
 
+    def get_etudids_with_notes_attente(self) -> set:
+        """Ensemble des étudiants ayant au moins une note en attente dans ce semestre
+        (comme etud_has_notes_attente, en une seule requête).
+        """
+        return {
+            x[0]
+            for x in ndb.SimpleQuery(
+                """SELECT DISTINCT n.etudid
+            FROM notes_notes n, notes_evaluation e, notes_moduleimpl m,
+            notes_moduleimpl_inscription i
+            WHERE n.value = %(code_attente)s
+            and n.evaluation_id = e.id
+            and e.moduleimpl_id = m.id
+            and m.formsemestre_id = %(formsemestre_id)s
+            and e.coefficient != 0
+            and m.id = i.moduleimpl_id
+            and i.etudid = n.etudid
+            """,
+                {
+                    "formsemestre_id": self.formsemestre_id,
+                    "code_attente": scu.NOTES_ATTENTE,
+                },
+            )
+        }
+
     def get_evaluations_etats(self):  # evaluation_list_in_sem
         """[ {...evaluation et son etat...} ]"""
         if self._evaluations_etats is None:
@@ -140,6 +140,114 @@ def DBInsertDict(
     return oid
 
 
+# nombre de lignes par requête INSERT/UPDATE multi-lignes
+BULK_PAGE_SIZE = 500
+
+
+def _group_rows_by_columns(vals_list) -> dict:
+    """Regroupe les dicts ayant les mêmes colonnes:
+    { (col, ...) : [ (index dans vals_list, vals), ... ] }
+    """
+    groups = {}
+    for i, vals in enumerate(vals_list):
+        groups.setdefault(tuple(vals.keys()), []).append((i, vals))
+    return groups
+
+
+def DBInsertDicts(
+    cnx,
+    table,
+    vals_list,
+    commit=False,
+    convert_empty_to_nulls=1,
+    return_id=True,
+    ignore_conflicts=False,
+    conflict_fields=None,
+    update_fields=None,
+) -> list:
+    """Insère en masse les dicts de vals_list dans la table,
+    avec des requêtes INSERT multi-lignes (... RETURNING id).
+
+    Si conflict_fields est donné, fait un "upsert": les lignes en conflit
+    sur ces colonnes sont mises à jour (colonnes update_fields, par défaut
+    toutes les autres colonnes insérées).
+
+    Return: liste des ids créés (ou mis à jour), dans l'ordre de vals_list.
+    Avec ignore_conflicts, les lignes ignorées n'ont pas d'id (None).
+    """
+    oids = [None] * len(vals_list)
+    if not vals_list:
+        return oids
+    if convert_empty_to_nulls:
+        for vals in vals_list:
+            for col in vals.keys():
+                if vals[col] == "":
+                    vals[col] = None
+    cursor = cnx.cursor(cursor_factory=ScoDocCursor)
+    req = None
+    try:
+        for cols, rows in _group_rows_by_columns(vals_list).items():
+            if cols:
+                fmt = "(" + ",".join(["%%(%s)s" % col for col in cols]) + ")"
+                req = "insert into %s (%s) values %%s" % (table, ",".join(cols))
+            else:
+                fmt = "(DEFAULT)"
+                req = "insert into %s (id) values %%s" % table
+            if conflict_fields:
+                updated = [
+                    col
+                    for col in (update_fields or cols)
+                    if col not in conflict_fields
+                ]
+                if updated:
+                    action = "UPDATE SET " + ", ".join(
+                        ["%s=EXCLUDED.%s" % (col, col) for col in updated]
+                    )
+                else:
+                    action = "NOTHING"
+                req += " ON CONFLICT (%s) DO %s" % (",".join(conflict_fields), action)
+            elif ignore_conflicts:
+                req += " ON CONFLICT DO NOTHING"
+            if not return_id:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    req,
+                    [vals for _, vals in rows],
+                    template=fmt,
+                    page_size=BULK_PAGE_SIZE,
+                )
+                continue
+            if ignore_conflicts and not conflict_fields:
+                # les lignes ignorées ne sont pas renvoyées: insertion ligne à ligne
+                for i, vals in rows:
+                    cursor.execute(
+                        req.replace("%s", fmt, 1) + " RETURNING id", vals
+                    )
+                    r = cursor.fetchone()
+                    oids[i] = r[0] if r else None
+                continue
+            # (postgresql renvoie les lignes dans l'ordre du VALUES)
+            res = psycopg2.extras.execute_values(
+                cursor,
+                req + " RETURNING id",
+                [vals for _, vals in rows],
+                template=fmt,
+                page_size=BULK_PAGE_SIZE,
+                fetch=True,
+            )
+            for (i, _), r in zip(rows, res):
+                oids[i] = r[0]
+    except:
+        log("DBInsertDicts: EXCEPTION !")
+        log("DBInsertDicts: table=%s, req=%s" % (str(table), str(req)))
+        log("DBInsertDicts: commit (exception)")
+        cnx.commit()  # get rid of this transaction
+        raise  # and re-raise exception
+    if commit:
+        cnx.commit()
+    return oids
+
+
 _SQL_REMOVE_BAD_CHARS = str.maketrans("", "", '%*()+=&|[]"`')
 
 
@@ -273,6 +381,36 @@ def DBUpdateArgs(cnx, table, vals, where=None, commit=False, convert_empty_to_nu
         cnx.commit()
 
 
+def DBUpdateDicts(cnx, table, vals_list, commit=False, convert_empty_to_nulls=1):
+    """Met à jour en masse les lignes de la table: chaque dict de vals_list
+    contient l'id de la ligne et les colonnes à modifier.
+    """
+    if not vals_list:
+        return
+    if convert_empty_to_nulls:
+        for vals in vals_list:
+            for col in vals.keys():
+                if vals[col] == "":
+                    vals[col] = None
+    cursor = cnx.cursor(cursor_factory=ScoDocCursor)
+    req = None
+    try:
+        for cols, rows in _group_rows_by_columns(vals_list).items():
+            s = ", ".join(["%s=%%(%s)s" % (x, x) for x in cols if x != "id"])
+            if not s:
+                continue
+            req = "update " + table + " set " + s + " where id=%(id)s"
+            psycopg2.extras.execute_batch(
+                cursor, req, [vals for _, vals in rows], page_size=BULK_PAGE_SIZE
+            )
+    except:
+        cnx.commit()  # get rid of this transaction
+        log('Exception in DBUpdateDicts:\n\treq="%s"\n' % req)
+        raise  # and re-raise exception
+    if commit:
+        cnx.commit()
+
+
 def DBDelete(cnx, table, oid, commit=False):
     cursor = cnx.cursor(cursor_factory=ScoDocCursor)
     try:
@@ -327,8 +465,8 @@ class EditableTable(object):
         self.sql_default_values = None
         self.insert_ignore_conflicts = insert_ignore_conflicts
 
-    def create(self, cnx, args) -> int:
-        "create object in table"
+    def _create_vals(self, args) -> dict:
+        "valeurs à insérer pour créer l'objet décrit par args"
         vals = dictfilter(args, self.dbfields, self.filter_nulls)
         if self.id_name in vals:
             del vals[self.id_name]
@@ -344,17 +482,56 @@ class EditableTable(object):
         for title in vals:
             if title in self.input_formators:
                 vals[title] = self.input_formators[title](vals[title])
+        return vals
+
+    def create(self, cnx, args, commit=True) -> int:
+        "create object in table"
+        vals = self._create_vals(args)
         # insert
         new_id = DBInsertDict(
             cnx,
             self.table_name,
             vals,
-            commit=True,
+            commit=commit,
             return_id=(self.id_name is not None),
             ignore_conflicts=self.insert_ignore_conflicts,
         )
         return new_id
 
+    def create_many(self, cnx, args_list, commit=True, return_id=True) -> list:
+        """create objects in table (requêtes multi-lignes)
+        Return: liste des ids créés, dans l'ordre de args_list
+        (None pour les lignes ignorées si insert_ignore_conflicts).
+        Si return_id est faux, les ids ne sont pas demandés (ce qui évite
+        l'insertion ligne à ligne avec insert_ignore_conflicts).
+        """
+        return DBInsertDicts(
+            cnx,
+            self.table_name,
+            [self._create_vals(args) for args in args_list],
+            commit=commit,
+            return_id=return_id and (self.id_name is not None),
+            ignore_conflicts=self.insert_ignore_conflicts,
+        )
+
+    def upsert_many(
+        self, cnx, args_list, conflict_fields, update_fields=None, commit=True
+    ) -> list:
+        """create objects in table, or update existing ones
+        (conflit sur les colonnes conflict_fields, qui doivent former
+        une contrainte d'unicité).
+        Return: liste des ids créés ou modifiés, dans l'ordre de args_list.
+        """
+        return DBInsertDicts(
+            cnx,
+            self.table_name,
+            [self._create_vals(args) for args in args_list],
+            commit=commit,
+            return_id=(self.id_name is not None),
+            conflict_fields=conflict_fields,
+            update_fields=update_fields,
+        )
+
     def delete(self, cnx, oid, commit=True):
         "delete tuple"
         DBDelete(cnx, self.table_name, oid, commit=commit)
@@ -413,8 +590,8 @@ class EditableTable(object):
                     raise
             r[k] = v
 
-    def edit(self, cnx, args, html_quote=None):
-        """Change fields"""
+    def _edit_vals(self, args, html_quote=None) -> dict:
+        "valeurs à modifier (avec l'id de l'objet)"
         # assert self.id_name in args
         oid = args[self.id_name]
         vals = dictfilter(args, self.dbfields, self.filter_nulls)
@@ -430,6 +607,11 @@ class EditableTable(object):
                 except:
                     log("exception while converting %s=%s" % (title, vals[title]))
                     raise
+        return vals
+
+    def edit(self, cnx, args, html_quote=None):
+        """Change fields"""
+        vals = self._edit_vals(args, html_quote=html_quote)
         DBUpdateArgs(
             cnx,
             self.table_name,
@@ -438,6 +620,15 @@ class EditableTable(object):
             commit=True,
         )
 
+    def edit_many(self, cnx, args_list, html_quote=None, commit=True):
+        """Change fields of several objects (chaque dict contient l'id)"""
+        DBUpdateDicts(
+            cnx,
+            self.table_name,
+            [self._edit_vals(args, html_quote=html_quote) for args in args_list],
+            commit=commit,
+        )
+
 
 def dictfilter(d, fields, filter_nulls=True):
     """returns a copy of d with only keys listed in "fields" and non null values"""
@@ -1050,6 +1050,60 @@ def get_abs_count(etudid, sem):
     return r
 
 
+def get_abs_counts(etudids, sem) -> dict:
+    """Les comptes d'absences de ces étudiants dans ce semestre:
+    { etudid : (nb abs non justifiées, nb abs justifiées) }
+    Comme get_abs_count, mais les comptes absents du cache sont calculés
+    pour tous les étudiants en deux requêtes.
+    """
+    date_debut = sem["date_debut_iso"]
+    date_fin = sem["date_fin_iso"]
+    keys = {
+        etudid: str(etudid) + "_" + date_debut + "_" + date_fin for etudid in etudids
+    }
+    cached = sco_cache.AbsSemEtudCache.get_many(keys.values())
+    counts = {etudid: cached[key] for (etudid, key) in keys.items() if key in cached}
+    missing = [etudid for etudid in etudids if etudid not in counts]
+    if not missing:
+        return counts
+    args = {"etudids": missing, "debut": date_debut, "fin": date_fin}
+    nb_abs = {
+        etudid: n
+        for (etudid, n) in ndb.SimpleQuery(
+            """SELECT etudid, COUNT(*) FROM (
+            SELECT DISTINCT A.ETUDID, A.JOUR, A.MATIN
+            FROM ABSENCES A
+            WHERE A.ETUDID = ANY(%(etudids)s)
+            AND A.ESTABS
+            AND A.JOUR BETWEEN %(debut)s AND %(fin)s
+            ) AS tmp GROUP BY etudid
+            """,
+            args,
+        ).fetchall()
+    }
+    nb_abs_just = {
+        etudid: n
+        for (etudid, n) in ndb.SimpleQuery(
+            """SELECT etudid, COUNT(*) FROM (
+            SELECT DISTINCT A.ETUDID, A.JOUR, A.MATIN
+            FROM ABSENCES A, ABSENCES B
+            WHERE A.ETUDID = ANY(%(etudids)s)
+            AND A.ETUDID = B.ETUDID
+            AND A.JOUR = B.JOUR AND A.MATIN = B.MATIN
+            AND A.JOUR BETWEEN %(debut)s AND %(fin)s
+            AND A.ESTABS AND (A.ESTJUST OR B.ESTJUST)
+            ) AS tmp GROUP BY etudid
+            """,
+            args,
+        ).fetchall()
+    }
+    for etudid in missing:
+        r = (nb_abs.get(etudid, 0), nb_abs_just.get(etudid, 0))
+        counts[etudid] = r
+        sco_cache.AbsSemEtudCache.set(keys[etudid], r)
+    return counts
+
+
 def invalidate_abs_count(etudid, sem):
     """Invalidate (clear) cached counts"""
     date_debut = sem["date_debut_iso"]
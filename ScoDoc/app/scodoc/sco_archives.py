@@ -47,8 +47,13 @@
  qui est une description (humaine, format libre) de l'archive.
 
 """
+import contextlib
 import datetime
+import fcntl
 import glob
+import gzip
+import hashlib
+import json
 import mimetypes
 import os
 import re
@@ -69,6 +74,7 @@ from app.scodoc.sco_exceptions import (
 )
 from app.scodoc import html_sco_header
 from app.scodoc import sco_bulletins_pdf
+from app.scodoc import sco_cache
 from app.scodoc import sco_excel
 from app.scodoc import sco_formsemestre
 from app.scodoc import sco_groups
@@ -78,11 +84,50 @@ from app.scodoc import sco_pvjury
 from app.scodoc import sco_pvpdf
 
 
+# Stockage des fichiers archivés:
+#  - format historique: fichiers dans le répertoire de l'archive
+#  - magasin de contenus (si Config.SCODOC_ARCHIVES_CONTENT_STORE):
+#    le contenu de chaque fichier est stocké (compressé) une seule fois dans
+#       <archivedir>/_blobs/<xx>/<sha256>[.gz]
+#    et le répertoire de l'archive contient un manifeste _manifest.json
+#       { filename : { "sha256" : hash, "size" : taille, "encoding" : "gzip"|"identity" } }
+#    Les deux formats coexistent: la lecture consulte d'abord le manifeste, puis
+#    les fichiers ordinaires (migration transparente, voir migrate_archive).
+MANIFEST_FILENAME = "_manifest.json"
+BLOBS_DIRNAME = "_blobs"
+BLOB_COMPRESSION_LEVEL = 6
+BLOB_CHUNK_SIZE = 64 * 1024
+# les blobs récents ne sont jamais supprimés par gc_blobs: un blob est écrit
+# avant le manifeste qui le référence (voir store)
+BLOB_GC_GRACE_PERIOD = 24 * 3600  # secondes
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Verrou exclusif (inter-processus) associé au fichier path"""
+    with open(path + ".lock", "a") as lockfile:
+        fcntl.flock(lockfile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+
+def _write_file_atomic(fname, data: bytes):
+    """Write data in fname: readers never see a partially written file"""
+    tmpname = "%s.%d.tmp" % (fname, os.getpid())
+    with open(tmpname, "wb") as f:
+        f.write(data)
+    os.replace(tmpname, fname)
+
+
 class BaseArchiver(object):
     def __init__(self, archive_type=""):
         self.archive_type = archive_type
         self.initialized = False
         self.root = None
+        self.blobs_dir = None
+        self.use_content_store = Config.SCODOC_ARCHIVES_CONTENT_STORE
 
     def initialize(self):
         if self.initialized:
@@ -92,18 +137,12 @@ class BaseArchiver(object):
             dirs.append(self.archive_type)
 
         self.root = os.path.join(*dirs)
+        # blobs partagés par tous les types d'archives:
+        self.blobs_dir = os.path.join(Config.SCODOC_VAR_DIR, "archives", BLOBS_DIRNAME)
         log("initialized archiver, path=" + self.root)
-        path = dirs[0]
-        for dir in dirs[1:]:
-            path = os.path.join(path, dir)
-            try:
-                scu.GSL.acquire()
-                if not os.path.isdir(path):
-                    log("creating directory %s" % path)
-                    os.mkdir(path)
-            finally:
-                scu.GSL.release()
-                self.initialized = True
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self.initialized = True
 
     def get_obj_dir(self, oid):
         """
@@ -112,18 +151,10 @@ class BaseArchiver(object):
         """
         self.initialize()
         dept = Departement.query.filter_by(acronym=g.scodoc_dept).first()
-        dept_dir = os.path.join(self.root, str(dept.id))
-        try:
-            scu.GSL.acquire()
-            if not os.path.isdir(dept_dir):
-                log("creating directory %s" % dept_dir)
-                os.mkdir(dept_dir)
-            obj_dir = os.path.join(dept_dir, str(oid))
-            if not os.path.isdir(obj_dir):
-                log("creating directory %s" % obj_dir)
-                os.mkdir(obj_dir)
-        finally:
-            scu.GSL.release()
+        obj_dir = os.path.join(self.root, str(dept.id), str(oid))
+        if not os.path.isdir(obj_dir):
+            log("creating directory %s" % obj_dir)
+            os.makedirs(obj_dir, exist_ok=True)
         return obj_dir
 
     def list_oids(self):
@@ -152,13 +183,11 @@ class BaseArchiver(object):
         return dirs
 
     def delete_archive(self, archive_id):
-        """Delete (forever) this archive"""
+        """Delete (forever) this archive
+        (les blobs qui ne sont plus référencés sont supprimés par gc_blobs)
+        """
         self.initialize()
-        try:
-            scu.GSL.acquire()
-            shutil.rmtree(archive_id, ignore_errors=True)
-        finally:
-            scu.GSL.release()
+        shutil.rmtree(archive_id, ignore_errors=True)
 
     def get_archive_date(self, archive_id):
         """Returns date (as a DateTime object) of an archive"""
@@ -168,13 +197,9 @@ class BaseArchiver(object):
     def list_archive(self, archive_id: str) -> str:
         """Return list of filenames (without path) in archive"""
         self.initialize()
-        try:
-            scu.GSL.acquire()
-            files = os.listdir(archive_id)
-        finally:
-            scu.GSL.release()
-        files.sort()
-        return [f for f in files if f and f[0] != "_"]
+        files = set(os.listdir(archive_id))
+        files.update(self._read_manifest(archive_id))
+        return sorted([f for f in files if f and f[0] != "_"])
 
     def get_archive_name(self, archive_id):
         """name identifying archive, to be used in web URLs"""
@@ -215,11 +240,7 @@ class BaseArchiver(object):
             + "-".join(["%02d" % x for x in time.localtime()[:6]])
         )
         log("creating archive: %s" % archive_id)
-        try:
-            scu.GSL.acquire()
-            os.mkdir(archive_id)  # if exists, raises an OSError
-        finally:
-            scu.GSL.release()
+        os.mkdir(archive_id)  # if exists, raises an OSError
         self.store(archive_id, "_description.txt", description.encode("utf-8"))
         return archive_id
 
@@ -231,36 +252,156 @@ class BaseArchiver(object):
         self.initialize()
         filename = scu.sanitize_filename(filename)
         log("storing %s (%d bytes) in %s" % (filename, len(data), archive_id))
-        try:
-            scu.GSL.acquire()
-            fname = os.path.join(archive_id, filename)
-            with open(fname, "wb") as f:
-                f.write(data)
-        finally:
-            scu.GSL.release()
+        fname = os.path.join(archive_id, filename)
+        if self.use_content_store and filename[0] != "_":
+            entry = self._store_blob(data)
+            with _file_lock(os.path.join(archive_id, MANIFEST_FILENAME)):
+                manifest = self._read_manifest(archive_id)
+                manifest[filename] = entry
+                self._write_manifest(archive_id, manifest)
+                if os.path.exists(fname):  # remplace l'ancienne version
+                    os.unlink(fname)
+        else:
+            _write_file_atomic(fname, data)
         return filename
 
-    def get(self, archive_id: str, filename: str):
-        """Retreive data"""
+    def open_file(self, archive_id: str, filename: str):
+        """Open archived file for (binary) reading.
+        Returns: file-like object, to be closed by the caller.
+        """
         self.initialize()
         if not scu.is_valid_filename(filename):
             log('Archiver.get: invalid filename "%s"' % filename)
             raise ValueError("invalid filename")
+        entry = self._read_manifest(archive_id).get(filename)
+        if entry:
+            blob_path = self._blob_path(entry["sha256"], entry["encoding"])
+            log("reading archive file %s (%s)" % (filename, blob_path))
+            if entry["encoding"] == "gzip":
+                return gzip.open(blob_path, "rb")
+            return open(blob_path, "rb")
         fname = os.path.join(archive_id, filename)
         log("reading archive file %s" % fname)
-        with open(fname, "rb") as f:
+        return open(fname, "rb")
+
+    def get(self, archive_id: str, filename: str):
+        """Retreive data"""
+        with self.open_file(archive_id, filename) as f:
             data = f.read()
         return data
 
     def get_archived_file(self, oid, archive_name, filename):
         """Recupere donnees du fichier indiqué et envoie au client"""
         archive_id = self.get_id_from_name(oid, archive_name)
-        data = self.get(archive_id, filename)
+        f = self.open_file(archive_id, filename)
         mime = mimetypes.guess_type(filename)[0]
         if mime is None:
             mime = "application/octet-stream"
 
-        return scu.send_file(data, filename, mime=mime)
+        def generate():
+            with f:
+                while True:
+                    chunk = f.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        response = flask.Response(generate(), mimetype=mime)
+        response.headers["Content-Disposition"] = 'attachment; filename="%s"' % (
+            scu.make_filename(filename)
+        )
+        return response
+
+    # ----- Magasin de contenus
+    def _blob_path(self, sha256: str, encoding: str) -> str:
+        "path of the blob"
+        suffix = ".gz" if encoding == "gzip" else ""
+        return os.path.join(self.blobs_dir, sha256[:2], sha256 + suffix)
+
+    def _store_blob(self, data: bytes) -> dict:
+        """Store data in the blob store (if not already present).
+        Returns manifest entry.
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        compressed = gzip.compress(data, compresslevel=BLOB_COMPRESSION_LEVEL, mtime=0)
+        if len(compressed) < len(data):
+            encoding = "gzip"
+        else:  # déjà compressé (images...)
+            encoding = "identity"
+            compressed = data
+        blob_path = self._blob_path(sha256, encoding)
+        try:
+            # va être référencé: rajeunit le blob pour le protéger du gc
+            os.utime(blob_path)
+            log("blob %s already stored" % sha256)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # contenu déterminé par le nom: pas besoin de verrou
+            _write_file_atomic(blob_path, compressed)
+        return {"sha256": sha256, "size": len(data), "encoding": encoding}
+
+    def _read_manifest(self, archive_id: str) -> dict:
+        "manifest of archive, or {} if no blob stored"
+        try:
+            with open(os.path.join(archive_id, MANIFEST_FILENAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, archive_id: str, manifest: dict):
+        _write_file_atomic(
+            os.path.join(archive_id, MANIFEST_FILENAME),
+            json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+        )
+
+    def migrate_archive(self, archive_id: str) -> int:
+        """Move plain files of this archive to the content store.
+        Returns number of migrated files.
+        """
+        self.initialize()
+        nb_files = 0
+        with _file_lock(os.path.join(archive_id, MANIFEST_FILENAME)):
+            manifest = self._read_manifest(archive_id)
+            filenames = [f for f in os.listdir(archive_id) if f[0] != "_"]
+            for filename in filenames:
+                fname = os.path.join(archive_id, filename)
+                with open(fname, "rb") as f:
+                    manifest[filename] = self._store_blob(f.read())
+                nb_files += 1
+            if nb_files:
+                self._write_manifest(archive_id, manifest)
+                for filename in filenames:
+                    os.unlink(os.path.join(archive_id, filename))
+        return nb_files
+
+    def gc_blobs(self, grace_period=BLOB_GC_GRACE_PERIOD) -> int:
+        """Delete blobs not referenced by any archive manifest (all departments).
+        Blobs modified less than grace_period seconds ago are kept: they may
+        be about to be referenced by a manifest being written.
+        Returns number of deleted blobs.
+        """
+        self.initialize()
+        archives_dir = os.path.join(Config.SCODOC_VAR_DIR, "archives")
+        referenced = set()
+        for dirpath, _, filenames in os.walk(archives_dir):
+            if MANIFEST_FILENAME in filenames:
+                for entry in self._read_manifest(dirpath).values():
+                    referenced.add(
+                        self._blob_path(entry["sha256"], entry["encoding"])
+                    )
+        nb_deleted = 0
+        t_limit = time.time() - grace_period
+        for blob_path in glob.glob(os.path.join(self.blobs_dir, "*", "*")):
+            if blob_path in referenced or blob_path.endswith(".tmp"):
+                continue
+            try:
+                if os.path.getmtime(blob_path) >= t_limit:
+                    continue  # trop récent
+                os.unlink(blob_path)
+            except FileNotFoundError:
+                continue
+            nb_deleted += 1
+        return nb_deleted
 
 
 class SemsArchiver(BaseArchiver):
@@ -274,6 +415,212 @@ PVArchive = SemsArchiver()
 # ----------------------------------------------------------------------------
 
 
+class SemArchiveBuilder:
+    """Construction des documents d'une archive de semestre.
+
+    Les données communes à tous les documents (NotesTable, décisions de jury
+    de tous les inscrits) sont calculées une seule fois (méthode compute),
+    puis chaque document est généré à partir de ces données.
+    Les générateurs ReportLab n'étant pas ré-entrants et la connexion à la base
+    étant liée à la requête, les documents sont générés séquentiellement,
+    mais l'écriture de chaque fichier dans l'archive se fait en tâche de fond
+    pendant la génération du suivant.
+
+    Après build(), self.timings donne pour chaque document:
+        (nom du fichier, durée de génération en secondes, taille en octets)
+    """
+
+    def __init__(
+        self,
+        formsemestre_id,
+        archive_id,
+        etudids,
+        groups_filename="",
+        date="",
+        date_jury="",
+        signature=None,  # pour lettres indiv
+        date_commission=None,
+        numeroArrete=None,
+        VDICode=None,
+        showTitle=False,
+        pv_title=None,
+        with_paragraph_nom=False,
+        anonymous=False,
+        bulVersion="long",
+    ):
+        self.formsemestre_id = formsemestre_id
+        self.archive_id = archive_id
+        self.etudids = etudids
+        self.groups_filename = groups_filename
+        self.date = date
+        self.date_jury = date_jury
+        self.signature = signature
+        self.date_commission = date_commission
+        self.numeroArrete = numeroArrete
+        self.VDICode = VDICode
+        self.showTitle = showTitle
+        self.pv_title = pv_title
+        self.with_paragraph_nom = with_paragraph_nom
+        self.anonymous = anonymous
+        self.bulVersion = bulVersion
+        # données partagées, calculées par compute()
+        self.nt = None
+        self.dpv = None  # décisions de tous les inscrits
+        self.dpv_groups = None  # décisions des étudiants des groupes sélectionnés
+        self.timings = []
+
+    def compute(self):
+        """Calcule les données partagées par tous les documents"""
+        from app.scodoc import sco_bulletins
+
+        t0 = time.time()
+        self.nt = sco_cache.NotesTableCache.get(self.formsemestre_id)
+        # une seule évaluation des décisions, pour les bulletins et les PV:
+        self.dpv = sco_pvjury.dict_pvjury(self.formsemestre_id, with_prev=True)
+        sco_bulletins.get_sem_bulletins_snapshot(
+            self.formsemestre_id, prefetch=True, dpv=self.dpv
+        )
+        self.dpv_groups = sco_pvjury.restrict_dict_pvjury(self.dpv, self.etudids)
+        self.timings.append(("(données)", time.time() - t0, 0))
+
+    def artifacts(self):
+        """Liste des documents à générer: [ (filename, fonction de génération) ]
+        Chaque fonction renvoie les données (bytes) ou None si document vide.
+        """
+        return [
+            ("Tableau_moyennes" + scu.XLSX_SUFFIX, self._make_recap_xls),
+            ("Tableau_moyennes.html", self._make_recap_html),
+            ("Bulletins.xml", self._make_bulletins_xml),
+            ("Decisions_Jury" + scu.XLSX_SUFFIX, self._make_decisions_xls),
+            ("Bulletins.pdf", self._make_bulletins_pdf),
+            (
+                "CourriersDecisions%s.pdf" % self.groups_filename,
+                self._make_lettres_individuelles,
+            ),
+            ("PV_Jury%s.pdf" % self.groups_filename, self._make_pvjury_pdf),
+        ]
+
+    def build(self, archiver):
+        """Génère tous les documents et les enregistre dans l'archive.
+        Returns: list of timings
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if self.nt is None:
+            self.compute()
+        flask_app = flask.current_app._get_current_object()
+
+        def store(filename, data):
+            with flask_app.app_context():
+                archiver.store(self.archive_id, filename, data)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            writes = []
+            for filename, make_data in self.artifacts():
+                t0 = time.time()
+                data = make_data()
+                self.timings.append(
+                    (filename, time.time() - t0, len(data) if data else 0)
+                )
+                if data:
+                    writes.append(executor.submit(store, filename, data))
+            for w in writes:
+                w.result()  # propagate exceptions
+        log(
+            "archive %s: %s"
+            % (
+                self.archive_id,
+                ", ".join(
+                    "%s %.3gs (%d bytes)" % (filename, duration, size)
+                    for (filename, duration, size) in self.timings
+                ),
+            )
+        )
+        return self.timings
+
+    def _make_recap_xls(self):
+        "Tableau recap notes en XLS (pour tous les etudiants, n'utilise pas les groupes)"
+        from app.scodoc.sco_recapcomplet import make_formsemestre_recapcomplet
+
+        data, _, _ = make_formsemestre_recapcomplet(self.formsemestre_id, format="xls")
+        return data
+
+    def _make_recap_html(self):
+        "Tableau recap notes en HTML (pour tous les etudiants, n'utilise pas les groupes)"
+        from app.scodoc.sco_recapcomplet import make_formsemestre_recapcomplet
+
+        data, _, _ = make_formsemestre_recapcomplet(
+            self.formsemestre_id, format="html", disable_etudlink=True
+        )
+        if not data:
+            return None
+        data = "\n".join(
+            [
+                html_sco_header.sco_header(
+                    page_title="Moyennes archivées le %s" % self.date,
+                    head_message="Moyennes archivées le %s" % self.date,
+                    no_side_bar=True,
+                ),
+                '<h2 class="fontorange">Valeurs archivées le %s</h2>' % self.date,
+                '<style type="text/css">table.notes_recapcomplet tr {  color: rgb(185,70,0); }</style>',
+                data,
+                html_sco_header.sco_footer(),
+            ]
+        )
+        return data.encode(scu.SCO_ENCODING)
+
+    def _make_bulletins_xml(self):
+        "Bulletins en XML (pour tous les etudiants, n'utilise pas les groupes)"
+        from app.scodoc.sco_recapcomplet import make_formsemestre_recapcomplet
+
+        data, _, _ = make_formsemestre_recapcomplet(
+            self.formsemestre_id, format="xml", xml_with_decisions=True
+        )
+        if not data:
+            return None
+        return data.encode(scu.SCO_ENCODING)
+
+    def _make_decisions_xls(self):
+        "Decisions de jury, en XLS"
+        return sco_pvjury.formsemestre_pvjury(
+            self.formsemestre_id, format="xls", publish=False, dpv=self.dpv
+        )
+
+    def _make_bulletins_pdf(self):
+        "Classeur bulletins (PDF)"
+        data, _ = sco_bulletins_pdf.get_formsemestre_bulletins_pdf(
+            self.formsemestre_id, version=self.bulVersion
+        )
+        return data
+
+    def _make_lettres_individuelles(self):
+        "Lettres individuelles (PDF)"
+        if not self.dpv_groups:
+            return None
+        return sco_pvpdf.pdf_lettres_individuelles(
+            self.formsemestre_id,
+            etudids=self.etudids,
+            date_jury=self.date_jury,
+            date_commission=self.date_commission,
+            signature=self.signature,
+            dpv=self.dpv_groups,
+        )
+
+    def _make_pvjury_pdf(self):
+        "PV de jury (PDF)"
+        return sco_pvpdf.pvjury_pdf(
+            self.dpv_groups,
+            date_commission=self.date_commission,
+            date_jury=self.date_jury,
+            numeroArrete=self.numeroArrete,
+            VDICode=self.VDICode,
+            showTitle=self.showTitle,
+            pv_title=self.pv_title,
+            with_paragraph_nom=self.with_paragraph_nom,
+            anonymous=self.anonymous,
+        )
+
+
 def do_formsemestre_archive(
     formsemestre_id,
     group_ids=[],  # si indiqué, ne prend que ces groupes
@@ -292,10 +639,8 @@ def do_formsemestre_archive(
     """Make and store new archive for this formsemestre.
     Store:
     - tableau recap (xls), pv jury (xls et pdf), bulletins (xml et pdf), lettres individuelles (pdf)
+    Returns: timings, list of (filename, duration, size)
     """
-    from app.scodoc.sco_recapcomplet import make_formsemestre_recapcomplet
-
-    sem = sco_formsemestre.get_formsemestre(formsemestre_id)
     sem_archive_id = formsemestre_id
     archive_id = PVArchive.create_obj_archive(sem_archive_id, description)
     date = PVArchive.get_archive_date(archive_id).strftime("%d/%m/%Y à %H:%M")
@@ -309,73 +654,24 @@ def do_formsemestre_archive(
     groups_filename = "-" + groups_infos.groups_filename
     etudids = [m["etudid"] for m in groups_infos.members]
 
-    # Tableau recap notes en XLS (pour tous les etudiants, n'utilise pas les groupes)
-    data, _, _ = make_formsemestre_recapcomplet(formsemestre_id, format="xls")
-    if data:
-        PVArchive.store(archive_id, "Tableau_moyennes" + scu.XLSX_SUFFIX, data)
-    # Tableau recap notes en HTML (pour tous les etudiants, n'utilise pas les groupes)
-    data, _, _ = make_formsemestre_recapcomplet(
-        formsemestre_id, format="html", disable_etudlink=True
-    )
-    if data:
-        data = "\n".join(
-            [
-                html_sco_header.sco_header(
-                    page_title="Moyennes archivées le %s" % date,
-                    head_message="Moyennes archivées le %s" % date,
-                    no_side_bar=True,
-                ),
-                '<h2 class="fontorange">Valeurs archivées le %s</h2>' % date,
-                '<style type="text/css">table.notes_recapcomplet tr {  color: rgb(185,70,0); }</style>',
-                data,
-                html_sco_header.sco_footer(),
-            ]
-        )
-        data = data.encode(scu.SCO_ENCODING)
-        PVArchive.store(archive_id, "Tableau_moyennes.html", data)
-
-    # Bulletins en XML (pour tous les etudiants, n'utilise pas les groupes)
-    data, _, _ = make_formsemestre_recapcomplet(
-        formsemestre_id, format="xml", xml_with_decisions=True
-    )
-    if data:
-        data = data.encode(scu.SCO_ENCODING)
-        PVArchive.store(archive_id, "Bulletins.xml", data)
-    # Decisions de jury, en XLS
-    data = sco_pvjury.formsemestre_pvjury(formsemestre_id, format="xls", publish=False)
-    if data:
-        PVArchive.store(archive_id, "Decisions_Jury" + scu.XLSX_SUFFIX, data)
-    # Classeur bulletins (PDF)
-    data, _ = sco_bulletins_pdf.get_formsemestre_bulletins_pdf(
-        formsemestre_id, version=bulVersion
-    )
-    if data:
-        PVArchive.store(archive_id, "Bulletins.pdf", data)
-    # Lettres individuelles (PDF):
-    data = sco_pvpdf.pdf_lettres_individuelles(
+    builder = SemArchiveBuilder(
         formsemestre_id,
-        etudids=etudids,
+        archive_id,
+        etudids,
+        groups_filename=groups_filename,
+        date=date,
         date_jury=date_jury,
-        date_commission=date_commission,
         signature=signature,
-    )
-    if data:
-        PVArchive.store(archive_id, "CourriersDecisions%s.pdf" % groups_filename, data)
-    # PV de jury (PDF):
-    dpv = sco_pvjury.dict_pvjury(formsemestre_id, etudids=etudids, with_prev=True)
-    data = sco_pvpdf.pvjury_pdf(
-        dpv,
         date_commission=date_commission,
-        date_jury=date_jury,
         numeroArrete=numeroArrete,
         VDICode=VDICode,
         showTitle=showTitle,
         pv_title=pv_title,
         with_paragraph_nom=with_paragraph_nom,
         anonymous=anonymous,
+        bulVersion=bulVersion,
     )
-    if data:
-        PVArchive.store(archive_id, "PV_Jury%s.pdf" % groups_filename, data)
+    return builder.build(PVArchive)
 
 
 def formsemestre_archive(formsemestre_id, group_ids=[]):
@@ -29,6 +29,7 @@
 
 """
 from app.models import formsemestre
+import collections
 import time
 import pprint
 import email
@@ -80,10 +81,8 @@ from app.scodoc import sco_bulletins_legacy
 from app.scodoc import sco_bulletins_ucac  # format expérimental UCAC Cameroun
 
 
-def make_context_dict(sem, etud):
-    """Construit dictionnaire avec valeurs pour substitution des textes
-    (preferences bul_pdf_*)
-    """
+def make_sem_context_dict(sem):
+    """Partie commune à tous les étudiants du dictionnaire de make_context_dict"""
     C = sem.copy()
     C["responsable"] = " ,".join(
         [
@@ -99,6 +98,17 @@ def make_context_dict(sem, etud):
     else:
         annee = annee_debut
     C["anneesem"] = annee
+    return C
+
+
+def make_context_dict(sem, etud, sem_context=None):
+    """Construit dictionnaire avec valeurs pour substitution des textes
+    (preferences bul_pdf_*)
+    sem_context: résultat de make_sem_context_dict(sem), calculé si non fourni.
+    """
+    if sem_context is None:
+        sem_context = make_sem_context_dict(sem)
+    C = sem_context.copy()
     C.update(etud)
     # copie preferences
     # XXX devrait acceder directement à un dict de preferences, à revoir
@@ -121,6 +131,127 @@ def make_context_dict(sem, etud):
     return C
 
 
+class SemBulletinsSnapshot:
+    """Données d'un semestre communes aux bulletins de tous ses étudiants,
+    chargées une seule fois et partagées par tous les formats de bulletins
+    (HTML, PDF, XML, JSON, envoi par mail, archives).
+
+    Ne pas construire directement: utiliser get_sem_bulletins_snapshot().
+    L'instance est liée à la NotesTable du semestre: elle est reconstruite
+    dès que celle-ci est invalidée.
+    """
+
+    def __init__(self, formsemestre_id, nt):
+        self.formsemestre_id = formsemestre_id
+        self.nt = nt
+        self.sem = nt.sem
+        cnx = ndb.GetDBConnexion()
+        # Formation et parcours
+        self.formation = sco_formations.formation_list(
+            args={"formation_id": self.sem["formation_id"]}
+        )[0]
+        self.parcours = sco_codes_parcours.get_parcours_from_code(
+            self.formation["type_parcours"]
+        )
+        # Groupes:
+        self.partitions = sco_groups.get_partitions_list(
+            formsemestre_id, with_default=False
+        )
+        self.partitions_etud_groups = {}  # { partition_id : { etudid : group } }
+        for partition in self.partitions:
+            pid = partition["partition_id"]
+            self.partitions_etud_groups[pid] = sco_groups.get_etud_groups_in_partition(
+                pid
+            )
+        # Appréciations et événements (inscription, démission...) de tous les étudiants
+        self.appreciations = collections.defaultdict(list)  # { etudid : [ app ] }
+        for app in sco_etud.appreciations_list(
+            cnx, args={"formsemestre_id": formsemestre_id}
+        ):
+            self.appreciations[app["etudid"]].append(app)
+        self.events = collections.defaultdict(list)  # { etudid : [ event ] }
+        for event in sco_etud.scolar_events_list(
+            cnx, args={"formsemestre_id": formsemestre_id}
+        ):
+            self.events[event["etudid"]].append(event)
+        self.sem_context = make_sem_context_dict(self.sem)
+        # calculés à la demande (ou pour tous par prefetch):
+        self.etuds = {}  # { etudid : etud (infos "filled") }
+        self.abs_counts = {}  # { etudid : (nbabs, nbabsjust) }
+        self.dpv = None  # décisions de jury de tous les étudiants
+        self.etud_dpvs = {}  # { etudid : dpv }
+
+    def prefetch(self, dpv=None):
+        """Charge les données individuelles de tous les étudiants
+        (pour générer les bulletins de tout le semestre)
+        dpv: décisions de jury de tous les inscrits, si l'appelant les a déjà
+        (résultat de dict_pvjury(formsemestre_id), avec ou sans with_prev).
+        """
+        etudids = self.nt.get_etudids()
+        missing = [etudid for etudid in etudids if etudid not in self.abs_counts]
+        self.abs_counts.update(sco_abs.get_abs_counts(missing, self.sem))
+        if self.dpv is None:
+            if dpv is None:
+                dpv = sco_pvjury.dict_pvjury(self.formsemestre_id)
+            self.dpv = dpv
+
+    def get_etud(self, etudid) -> dict:
+        """Infos sur l'étudiant (comme get_etud_info(filled=True)).
+        Attention: le dict est partagé, le copier avant de le modifier.
+        """
+        if etudid not in self.etuds:
+            self.etuds[etudid] = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+        return self.etuds[etudid]
+
+    def get_abs_count(self, etudid):
+        "(nb abs, nb abs justifiées) de l'étudiant dans ce semestre"
+        if etudid not in self.abs_counts:
+            self.abs_counts[etudid] = sco_abs.get_abs_count(etudid, self.sem)
+        return self.abs_counts[etudid]
+
+    def get_appreciations(self, etudid) -> list:
+        "appréciations sur l'étudiant dans ce semestre"
+        return self.appreciations.get(etudid, [])
+
+    def get_events(self, etudid) -> list:
+        "événements (inscription, démission...) de l'étudiant dans ce semestre"
+        return self.events.get(etudid, [])
+
+    def get_dpv(self, etudid):
+        "décision de jury, comme dict_pvjury(formsemestre_id, etudids=[etudid])"
+        if etudid not in self.etud_dpvs:
+            if self.dpv is None:
+                dpv = sco_pvjury.dict_pvjury(self.formsemestre_id, etudids=[etudid])
+            elif etudid in self.dpv["decisions_dict"]:
+                d = self.dpv["decisions_dict"][etudid]
+                dpv = self.dpv.copy()
+                dpv["decisions"] = [d]
+                dpv["decisions_dict"] = {etudid: d}
+            else:
+                dpv = {}
+            self.etud_dpvs[etudid] = dpv
+        return self.etud_dpvs[etudid]
+
+
+def get_sem_bulletins_snapshot(formsemestre_id, prefetch=False, dpv=None):
+    """Données communes aux bulletins du semestre, conservées pendant la requête
+    tant que la NotesTable du semestre est valide.
+    Si prefetch, charge les données de tous les étudiants (pour générer
+    tous les bulletins du semestre), en utilisant les décisions de jury dpv
+    si elles sont données (évite d'appeler à nouveau dict_pvjury).
+    """
+    nt = sco_cache.NotesTableCache.get(formsemestre_id)
+    if not hasattr(g, "bulletins_snapshots"):
+        g.bulletins_snapshots = {}
+    snapshot = g.bulletins_snapshots.get(formsemestre_id)
+    if snapshot is None or snapshot.nt is not nt:  # absent ou périmé
+        snapshot = SemBulletinsSnapshot(formsemestre_id, nt)
+        g.bulletins_snapshots[formsemestre_id] = snapshot
+    if prefetch:
+        snapshot.prefetch(dpv=dpv)
+    return snapshot
+
+
 def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
     """Collecte informations pour bulletin de notes
     Retourne un dictionnaire (avec valeur par défaut chaine vide).
@@ -135,7 +266,8 @@ def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
         raise ValueError("invalid version code !")
 
     prefs = sco_preferences.SemPreferences(formsemestre_id)
-    nt = sco_cache.NotesTableCache.get(formsemestre_id)  # > toutes notes
+    snapshot = get_sem_bulletins_snapshot(formsemestre_id)
+    nt = snapshot.nt  # > toutes notes
     if not nt.get_etud_etat(etudid):
         raise ScoValueError("Etudiant non inscrit à ce semestre")
     I = scu.DictDefault(defaultvalue="")
@@ -145,14 +277,10 @@ def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
     I["server_name"] = request.url_root
 
     # Formation et parcours
-    I["formation"] = sco_formations.formation_list(
-        args={"formation_id": I["sem"]["formation_id"]}
-    )[0]
-    I["parcours"] = sco_codes_parcours.get_parcours_from_code(
-        I["formation"]["type_parcours"]
-    )
+    I["formation"] = snapshot.formation
+    I["parcours"] = snapshot.parcours
     # Infos sur l'etudiant
-    I["etud"] = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+    I["etud"] = snapshot.get_etud(etudid).copy()
     I["descr_situation"] = I["etud"]["inscriptionstr"]
     if I["etud"]["inscription_formsemestre_id"]:
         I[
@@ -165,13 +293,10 @@ def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
     else:
         I["descr_situation_html"] = I["descr_situation"]
     # Groupes:
-    partitions = sco_groups.get_partitions_list(formsemestre_id, with_default=False)
-    partitions_etud_groups = {}  # { partition_id : { etudid : group } }
-    for partition in partitions:
-        pid = partition["partition_id"]
-        partitions_etud_groups[pid] = sco_groups.get_etud_groups_in_partition(pid)
+    partitions = snapshot.partitions
+    partitions_etud_groups = snapshot.partitions_etud_groups
     # --- Absences
-    I["nbabs"], I["nbabsjust"] = sco_abs.get_abs_count(etudid, nt.sem)
+    I["nbabs"], I["nbabsjust"] = snapshot.get_abs_count(etudid)
 
     # --- Decision Jury
     infos, dpv = etud_descr_situation_semestre(
@@ -182,6 +307,7 @@ def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
         show_decisions=prefs["bul_show_decision"],
         show_uevalid=prefs["bul_show_uevalid"],
         show_mention=prefs["bul_show_mention"],
+        snapshot=snapshot,
     )
 
     if dpv:
@@ -206,10 +332,7 @@ def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
         I["filigranne"] = prefs["bul_temporary_txt"]
 
     # --- Appreciations
-    cnx = ndb.GetDBConnexion()
-    apprecs = sco_etud.appreciations_list(
-        cnx, args={"etudid": etudid, "formsemestre_id": formsemestre_id}
-    )
+    apprecs = snapshot.get_appreciations(etudid)
     I["appreciations_list"] = apprecs
     I["appreciations_txt"] = [x["date"] + ": " + x["comment"] for x in apprecs]
     I["appreciations"] = I[
@@ -381,7 +504,7 @@ def formsemestre_bulletinetud_dict(formsemestre_id, etudid, version="long"):
         I["matieres_modules"].update(_sort_mod_by_matiere(modules, nt, etudid))
 
     #
-    C = make_context_dict(I["sem"], I["etud"])
+    C = make_context_dict(I["sem"], I["etud"], sem_context=snapshot.sem_context)
     C.update(I)
     #
     # log( 'C = \n%s\n' % pprint.pformat(C) ) # tres pratique pour voir toutes les infos dispo
@@ -629,6 +752,7 @@ def etud_descr_situation_semestre(
     show_uevalid=True,
     show_date_inscr=True,
     show_mention=False,
+    snapshot=None,
 ):
     """Dict décrivant la situation de l'étudiant dans ce semestre.
     Si format == 'html', peut inclure du balisage html (actuellement inutilisé)
@@ -646,6 +770,8 @@ def etud_descr_situation_semestre(
     decisions_ue        : noms (acronymes) des UE validées, séparées par des virgules.
     descr_decisions_ue  : ' UE acquises: UE1, UE2', ou vide si pas de dec. ou si pas show_uevalid
     descr_mention : 'Mention Bien', ou vide si pas de mention ou si pas show_mention
+
+    snapshot: SemBulletinsSnapshot du semestre (évite de recharger événements et décisions)
     """
     cnx = ndb.GetDBConnexion()
     infos = scu.DictDefault(defaultvalue="")
@@ -653,9 +779,12 @@ def etud_descr_situation_semestre(
     # --- Situation et décisions jury
 
     # demission/inscription ?
-    events = sco_etud.scolar_events_list(
-        cnx, args={"etudid": etudid, "formsemestre_id": formsemestre_id}
-    )
+    if snapshot:
+        events = snapshot.get_events(etudid)
+    else:
+        events = sco_etud.scolar_events_list(
+            cnx, args={"etudid": etudid, "formsemestre_id": formsemestre_id}
+        )
     date_inscr = None
     date_dem = None
     date_def = None
@@ -718,7 +847,10 @@ def etud_descr_situation_semestre(
         infos["descr_decision_jury"] = "Défaillant%s" % ne
         infos["situation"] += " " + infos["descr_defaillance"]
 
-    dpv = sco_pvjury.dict_pvjury(formsemestre_id, etudids=[etudid])
+    if snapshot:
+        dpv = snapshot.get_dpv(etudid)
+    else:
+        dpv = sco_pvjury.dict_pvjury(formsemestre_id, etudids=[etudid])
 
     if not show_decisions:
         return infos, dpv
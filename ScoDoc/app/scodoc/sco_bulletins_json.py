@@ -111,7 +111,11 @@ def formsemestre_bulletinetud_published_dict(
     d.update(**el)
 
     # Infos sur l'etudiant
-    etudinfo = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+    if published:  # données communes aux bulletins du semestre
+        snapshot = sco_bulletins.get_sem_bulletins_snapshot(formsemestre_id)
+        etudinfo = snapshot.get_etud(etudid)
+    else:
+        etudinfo = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
 
     d["etudiant"] = dict(
         etudid=etudid,
@@ -130,13 +134,10 @@ def formsemestre_bulletinetud_published_dict(
         return d  # stop !
 
     # Groupes:
-    partitions = sco_groups.get_partitions_list(formsemestre_id, with_default=False)
-    partitions_etud_groups = {}  # { partition_id : { etudid : group } }
-    for partition in partitions:
-        pid = partition["partition_id"]
-        partitions_etud_groups[pid] = sco_groups.get_etud_groups_in_partition(pid)
+    partitions = snapshot.partitions
+    partitions_etud_groups = snapshot.partitions_etud_groups
 
-    nt = sco_cache.NotesTableCache.get(formsemestre_id)  # > toutes notes
+    nt = snapshot.nt  # > toutes notes
     ues = nt.get_ues()
     modimpls = nt.get_modimpls()
     nbetuds = len(nt.rangs)
@@ -321,7 +322,7 @@ def formsemestre_bulletinetud_published_dict(
 
     # --- Absences
     if sco_preferences.get_preference("bul_show_abs", formsemestre_id):
-        nbabs, nbabsjust = sco_abs.get_abs_count(etudid, sem)
+        nbabs, nbabsjust = snapshot.get_abs_count(etudid)
         d["absences"] = dict(nbabs=nbabs, nbabsjust=nbabsjust)
 
     # --- Decision Jury
@@ -336,6 +337,7 @@ def formsemestre_bulletinetud_published_dict(
             show_uevalid=sco_preferences.get_preference(
                 "bul_show_uevalid", formsemestre_id
             ),
+            snapshot=snapshot,
         )
         d["situation"] = scu.quote_xml_attr(infos["situation"])
         if dpv:
@@ -380,10 +382,7 @@ def formsemestre_bulletinetud_published_dict(
             d["decision"] = dict(code="", etat="DEM")
 
     # --- Appreciations
-    cnx = ndb.GetDBConnexion()
-    apprecs = sco_etud.appreciations_list(
-        cnx, args={"etudid": etudid, "formsemestre_id": formsemestre_id}
-    )
+    apprecs = snapshot.get_appreciations(etudid)
     d["appreciation"] = []
     for app in apprecs:
         d["appreciation"].append(
@@ -110,6 +110,20 @@ def pdfassemblebulletins(
     return data
 
 
+_LOGO_SRC_RE = re.compile(r"<(\s*)logo(.*?)src\s*=\s*(.*?)>")
+_LOGO_RE = re.compile(r'<\s*logo(.*?)name\s*=\s*"(\w*?)"(.*?)/?>')
+# nota: le match sur \w*? donne le nom du logo et interdit les .. et autres
+# tentatives d'acceder à d'autres fichiers !
+
+
+def _logo_img(m) -> str:
+    "balise <img> pour le logo <logo name=...>"
+    filename = sco_pdf.find_image_filename(("logo_" + m.group(2),))
+    if not filename:  # logo inexistant: erreur signalée par makeParas
+        filename = os.path.join(scu.SCODOC_LOGOS_DIR, "logo_" + m.group(2) + ".jpg")
+    return '<img%ssrc="%s"%s/>' % (m.group(1), filename, m.group(3))
+
+
 def process_field(field, cdict, style, suppress_empty_pars=False, format="pdf"):
     """Process a field given in preferences, returns
     - if format = 'pdf': a list of Platypus objects
@@ -140,25 +154,10 @@ def process_field(field, cdict, style, suppress_empty_pars=False, format="pdf"):
         text = re.sub(r"<\s*para(\s*)(.*?)>", r"<p>", text)
         return text
     # --- PDF format:
-    # handle logos:
-    image_dir = scu.SCODOC_LOGOS_DIR + "/logos_" + g.scodoc_dept + "/"
-    if not os.path.exists(image_dir):
-        image_dir = scu.SCODOC_LOGOS_DIR + "/"  # use global logos
-        if not os.path.exists(image_dir):
-            log(f"Warning: missing global logo directory ({image_dir})")
-            image_dir = None
-
-    text = re.sub(
-        r"<(\s*)logo(.*?)src\s*=\s*(.*?)>", r"<\1logo\2\3>", text
-    )  # remove forbidden src attribute
-    if image_dir is not None:
-        text = re.sub(
-            r'<\s*logo(.*?)name\s*=\s*"(\w*?)"(.*?)/?>',
-            r'<img\1src="%s/logo_\2.jpg"\3/>' % image_dir,
-            text,
-        )
-        # nota: le match sur \w*? donne le nom du logo et interdit les .. et autres
-        # tentatives d'acceder à d'autres fichiers !
+    # handle logos (in dept specific dir, then in global dir, cached by sco_pdf):
+    if "logo" in text:
+        text = _LOGO_SRC_RE.sub(r"<\1logo\2\3>", text)  # remove forbidden src
+        text = _LOGO_RE.sub(_logo_img, text)
 
     # log('field: %s' % (text))
     return sco_pdf.makeParas(text, style, suppress_empty=suppress_empty_pars)
@@ -175,6 +174,8 @@ def get_formsemestre_bulletins_pdf(formsemestre_id, version="selectedevals"):
     sem = sco_formsemestre.get_formsemestre(formsemestre_id)
     # Make each bulletin
     nt = sco_cache.NotesTableCache.get(formsemestre_id)  # > get_etudids, get_sexnom
+    # charge les données de tous les bulletins:
+    sco_bulletins.get_sem_bulletins_snapshot(formsemestre_id, prefetch=True)
     bookmarks = {}
     filigrannes = {}
     i = 1
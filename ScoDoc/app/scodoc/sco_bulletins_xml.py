@@ -108,7 +108,11 @@ def make_xml_formsemestre_bulletinetud(
         is_appending = False
         doc = x
     # Infos sur l'etudiant
-    etudinfo = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+    if published:  # données communes aux bulletins du semestre
+        snapshot = sco_bulletins.get_sem_bulletins_snapshot(formsemestre_id)
+        etudinfo = snapshot.get_etud(etudid)
+    else:
+        etudinfo = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
     doc.append(
         Element(
             "etudiant",
@@ -130,13 +134,10 @@ def make_xml_formsemestre_bulletinetud(
         return doc  # stop !
 
     # Groupes:
-    partitions = sco_groups.get_partitions_list(formsemestre_id, with_default=False)
-    partitions_etud_groups = {}  # { partition_id : { etudid : group } }
-    for partition in partitions:
-        pid = partition["partition_id"]
-        partitions_etud_groups[pid] = sco_groups.get_etud_groups_in_partition(pid)
+    partitions = snapshot.partitions
+    partitions_etud_groups = snapshot.partitions_etud_groups
 
-    nt = sco_cache.NotesTableCache.get(formsemestre_id)  # > toutes notes
+    nt = snapshot.nt  # > toutes notes
     ues = nt.get_ues()
     modimpls = nt.get_modimpls()
     nbetuds = len(nt.rangs)
@@ -339,7 +340,7 @@ def make_xml_formsemestre_bulletinetud(
 
     # --- Absences
     if sco_preferences.get_preference("bul_show_abs", formsemestre_id):
-        nbabs, nbabsjust = sco_abs.get_abs_count(etudid, sem)
+        nbabs, nbabsjust = snapshot.get_abs_count(etudid)
         doc.append(Element("absences", nbabs=str(nbabs), nbabsjust=str(nbabsjust)))
     # --- Decision Jury
     if (
@@ -353,6 +354,7 @@ def make_xml_formsemestre_bulletinetud(
             show_uevalid=sco_preferences.get_preference(
                 "bul_show_uevalid", formsemestre_id
             ),
+            snapshot=snapshot,
         )
         x_situation = Element("situation")
         x_situation.text = scu.quote_xml_attr(infos["situation"])
@@ -406,10 +408,7 @@ def make_xml_formsemestre_bulletinetud(
         else:
             doc.append(Element("decision", code="", etat="DEM"))
     # --- Appreciations
-    cnx = ndb.GetDBConnexion()
-    apprecs = sco_etud.appreciations_list(
-        cnx, args={"etudid": etudid, "formsemestre_id": formsemestre_id}
-    )
+    apprecs = snapshot.get_appreciations(etudid)
     for appr in apprecs:
         x_appr = Element(
             "appreciation",
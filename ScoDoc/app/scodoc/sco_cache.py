@@ -44,6 +44,8 @@
 # Nouvelles fonctions:
 #  sco_cache.NotesTableCache.delete(formsemestre_id)
 #  sco_cache.NotesTableCache.delete_many(formsemestre_id_list)
+#  (les NotesTable sont aussi gardées dans chaque processus, voir
+#   Config.SCODOC_NT_LOCAL_CACHE_MB)
 #
 # Bulletins PDF:
 #  sco_cache.SemBulletinsPDFCache.get(formsemestre_id, version)
@@ -52,20 +54,270 @@
 
 # Evaluations:
 #  sco_cache.EvaluationCache.get(evaluation_id), set(evaluation_id, value), delete(evaluation_id),
+#  sco_cache.EvaluationEtatCache.get(evaluation_id) (effacé avec EvaluationCache)
+#
+# Invalidation des semestres (et départements):
+#  les clés des caches liés aux semestres incluent des jetons de génération
+#  (voir SemCacheGeneration): invalider = changer un jeton, sans effacer les clés.
+#
+# Permissions des utilisateurs (non liées à un département):
+#  sco_cache.UserPermissionsCache.get(user_id), set(user_id, value)
+#  sco_cache.UserPermissionsCache.invalidate_all()
+#
+# Résumé des nouvelles (page d'accueil du département):
+#  sco_cache.NewsSummaryCache.get(n), set(n, value), invalidate() (voir sco_news.add)
+#
+# Inscrits aux étapes Apogée (réponses du portail, voir sco_portal_apogee):
+#  sco_cache.ApoInscritsEtapeCache.get_many(keys), set(key, etuds)
+#
+# Emplois du temps (calendriers ics analysés, voir sco_edt_cal.load_ics):
+#  sco_cache.ICSCache.get(ics_url), set(ics_url, value)
+#
+# Statistiques (hits, misses, tailles, latences) par cache et département:
+#  sco_cache.CacheStats.get_stats(dept=None), CacheStats.reset()
+#  (commande flask cache-stats, et /ScoDoc/cache_stats)
 #
 
+import collections
+import os
 import time
 import traceback
 
+import flask
 from flask import g
 
+from config import Config
+
 from app.scodoc import notesdb as ndb
-from app.scodoc import sco_utils as scu
 from app import log
 
 CACHE = None  # set in app.__init__.py
 
 
+class CacheStats:
+    """Statistiques d'utilisation des caches, par classe de cache et département:
+    hits, misses, sets, invalidations, taille des valeurs sérialisées,
+    histogrammes des temps de get/set.
+    Chaque processus accumule ses compteurs en mémoire et les ajoute
+    périodiquement (toutes les FLUSH_INTERVAL secondes) aux compteurs partagés,
+    stockés dans REDIS (hash STATS_KEY).
+    """
+
+    STATS_KEY = "SCODOC_CACHE_STATS"
+    FLUSH_INTERVAL = 10  # secondes
+    # bornes des histogrammes (la dernière classe est "au delà")
+    LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+    SIZE_BUCKETS_KB = (1, 10, 100, 1000, 10000)
+    COUNTERS = ("hits", "misses", "sets", "invalidations")
+    _pending = {}  # { (dept, cache_name) : { counter : value } }
+    _last_flush = time.time()
+    _last_size = None  # taille de la dernière valeur (dé)sérialisée
+    _hooked_backend = None
+
+    @classmethod
+    def _hook_backend(cls):
+        """Intercepte la sérialisation du backend (flask_caching RedisCache)
+        pour connaitre la taille des valeurs lues et écrites sans les
+        sérialiser une seconde fois.
+        """
+        backend = getattr(CACHE, "cache", None)
+        if backend is None or backend is cls._hooked_backend:
+            return
+        cls._hooked_backend = backend
+        dump_object = getattr(backend, "dump_object", None)
+        load_object = getattr(backend, "load_object", None)
+        if dump_object is None or load_object is None:
+            return
+
+        def dump_object_with_size(value):
+            data = dump_object(value)
+            cls._last_size = len(data)
+            return data
+
+        def load_object_with_size(data):
+            if data is not None:
+                cls._last_size = len(data)
+            return load_object(data)
+
+        backend.dump_object = dump_object_with_size
+        backend.load_object = load_object_with_size
+
+    @classmethod
+    def start(cls):
+        "à appeler avant une opération get/set sur le cache"
+        cls._hook_backend()
+        cls._last_size = None
+        return time.time()
+
+    @classmethod
+    def record(cls, cache_cls, event: str, t0=None, count=1):
+        """Enregistre un évènement (hits, misses, sets, invalidations)
+        Si t0 est donné (valeur renvoyée par start()), enregistre aussi
+        le temps écoulé et la taille de la valeur.
+        """
+        if flask.has_app_context():
+            dept = g.get("scodoc_dept") or ""
+        else:
+            dept = ""
+        counters = cls._pending.setdefault((dept, cache_cls.prefix), {})
+        counters[event] = counters.get(event, 0) + count
+        if t0 is not None:
+            op = "set" if event == "sets" else "get"
+            dt_ms = (time.time() - t0) * 1000.0
+            counters[op + "_time_ms"] = counters.get(op + "_time_ms", 0.0) + dt_ms
+            name = f"{op}_ms_{cls._bucket(dt_ms, cls.LATENCY_BUCKETS_MS)}"
+            counters[name] = counters.get(name, 0) + 1
+            if cls._last_size is not None:
+                size = cls._last_size
+                counters[op + "_bytes"] = counters.get(op + "_bytes", 0) + size
+                name = f"{op}_kb_{cls._bucket(size / 1024.0, cls.SIZE_BUCKETS_KB)}"
+                counters[name] = counters.get(name, 0) + 1
+        if time.time() - cls._last_flush > cls.FLUSH_INTERVAL:
+            cls.flush()
+
+    @staticmethod
+    def _bucket(value, bounds) -> str:
+        for bound in bounds:
+            if value <= bound:
+                return f"le_{bound}"
+        return "inf"
+
+    @classmethod
+    def _redis_client(cls):
+        return getattr(getattr(CACHE, "cache", None), "_write_client", None)
+
+    @classmethod
+    def flush(cls):
+        "Ajoute les compteurs de ce processus aux compteurs partagés"
+        cls._last_flush = time.time()
+        pending, cls._pending = cls._pending, {}
+        client = cls._redis_client()
+        if not pending or client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for (dept, cache_name), counters in pending.items():
+                for counter, value in counters.items():
+                    field = f"{dept}|{cache_name}|{counter}"
+                    if isinstance(value, float):
+                        pipe.hincrbyfloat(cls.STATS_KEY, field, value)
+                    else:
+                        pipe.hincrby(cls.STATS_KEY, field, value)
+            pipe.execute()
+        except:
+            log("XXX CACHE Warning: error in CacheStats.flush")
+            log(traceback.format_exc())
+
+    @classmethod
+    def reset(cls):
+        "Remet à zéro tous les compteurs"
+        cls._pending = {}
+        client = cls._redis_client()
+        if client is not None:
+            client.delete(cls.STATS_KEY)
+
+    @classmethod
+    def get_stats(cls, dept=None) -> dict:
+        """Statistiques (de tous les processus):
+        { dept : { cache_name : { counter : value, ..., "hit_rate": float } } }
+        (dept "" pour les caches indépendants des départements)
+        """
+        cls.flush()
+        client = cls._redis_client()
+        if client is None:
+            return {}
+        stats = {}
+        for field, value in client.hgetall(cls.STATS_KEY).items():
+            field_dept, cache_name, counter = field.decode().split("|")
+            if dept is not None and field_dept != dept:
+                continue
+            value = float(value)
+            stats.setdefault(field_dept, {}).setdefault(cache_name, {})[counter] = (
+                int(value) if value.is_integer() else value
+            )
+        for caches in stats.values():
+            for counters in caches.values():
+                for counter in cls.COUNTERS:
+                    counters.setdefault(counter, 0)
+                nb_gets = counters["hits"] + counters["misses"]
+                counters["hit_rate"] = counters["hits"] / nb_gets if nb_gets else None
+        return stats
+
+
+class SemCacheGeneration:
+    """Jetons de génération des caches liés aux semestres.
+    Les clés de ces caches (voir ScoDocCache.generation_kind) incluent le jeton
+    du département et celui du semestre concerné: invalider un semestre, ou
+    tout un département, consiste à changer un seul jeton, sans rechercher
+    ni effacer les clés. Les anciennes valeurs ne sont plus lues et expirent
+    d'elles-mêmes (timeout).
+    Deux sortes de jetons (kind): "SEM" (notes, évaluations, inscriptions)
+    et "PDF" (bulletins pdf, qui peuvent être invalidés seuls).
+    Les jetons sont lus une fois par requête (g.cache_generations).
+    """
+
+    prefix = "GEN"
+
+    @classmethod
+    def _get_gen_key(cls, kind, formsemestre_id=None):
+        key = g.scodoc_dept + "_" + cls.prefix + kind
+        if formsemestre_id is None:
+            return key
+        return key + "_" + str(formsemestre_id)
+
+    @classmethod
+    def _memo(cls) -> dict:
+        if not hasattr(g, "cache_generations"):
+            g.cache_generations = {}
+        return g.cache_generations
+
+    @classmethod
+    def get_tokens(cls, kind, formsemestre_ids) -> dict:
+        """Jetons (département et semestre) des semestres indiqués:
+        { formsemestre_id : jeton }
+        """
+        memo = cls._memo()
+        dept_key = cls._get_gen_key(kind)
+        gen_keys = {
+            formsemestre_id: cls._get_gen_key(kind, formsemestre_id)
+            for formsemestre_id in set(formsemestre_ids)
+        }
+        missing = [
+            key for key in [dept_key] + list(gen_keys.values()) if key not in memo
+        ]
+        if missing:
+            for key, token in zip(missing, CACHE.get_many(*missing)):
+                if token is None:
+                    # nouveau jeton (sauf si un autre processus vient de le créer)
+                    CACHE.add(key, str(time.time()), timeout=0)
+                    token = CACHE.get(key)
+                memo[key] = token
+        return {
+            formsemestre_id: memo[dept_key] + "_" + memo[key]
+            for formsemestre_id, key in gen_keys.items()
+        }
+
+    @classmethod
+    def invalidate(cls, kinds, formsemestre_ids=None):
+        """Change les jetons de ces semestres, ou du département courant
+        si formsemestre_ids est None.
+        """
+        if formsemestre_ids is None:
+            keys = [cls._get_gen_key(kind) for kind in kinds]
+        else:
+            keys = [
+                cls._get_gen_key(kind, formsemestre_id)
+                for kind in kinds
+                for formsemestre_id in formsemestre_ids
+            ]
+        if not keys:
+            return
+        token = str(time.time())
+        CACHE.set_many({key: token for key in keys}, timeout=0)
+        cls._memo().update({key: token for key in keys})
+        CacheStats.record(cls, "invalidations", count=len(keys))
+
+
 class ScoDocCache:
     """Cache for ScoDoc objects.
     keys are prefixed by the current departement.
@@ -73,86 +325,256 @@ class ScoDocCache:
 
     timeout = None  # ttl, infinite by default
     prefix = ""
+    # caches liés aux semestres: sorte de jeton (voir SemCacheGeneration)
+    generation_kind = None
 
     @classmethod
     def _get_key(cls, oid):
         return g.scodoc_dept + "_" + cls.prefix + "_" + str(oid)
 
+    @classmethod
+    def _get_formsemestre_ids(cls, oids) -> dict:
+        """{ oid : formsemestre_id } (caches liés aux semestres)
+        Par défaut, les clés sont les formsemestre_id.
+        """
+        return {oid: oid for oid in oids}
+
+    @classmethod
+    def _get_keys(cls, oids) -> list:
+        """Clés de ces objets, incluant les jetons de génération
+        des semestres si le cache est lié aux semestres.
+        """
+        if cls.generation_kind is None:
+            return [cls._get_key(oid) for oid in oids]
+        sem_ids = cls._get_formsemestre_ids(oids)
+        tokens = SemCacheGeneration.get_tokens(cls.generation_kind, sem_ids.values())
+        prefix = g.scodoc_dept + "_" + cls.prefix + "_"
+        return [prefix + tokens[sem_ids[oid]] + "_" + str(oid) for oid in oids]
+
     @classmethod
     def get(cls, oid):
         """Returns cached object, or None"""
-        key = cls._get_key(oid)
+        key = None
         try:
-            return CACHE.get(key)
+            key = cls._get_keys([oid])[0]
+            t0 = CacheStats.start()
+            value = CACHE.get(key)
         except:
             log(f"XXX CACHE Warning: error in get(key={key})")
             log(traceback.format_exc())
             return None
+        CacheStats.record(cls, "misses" if value is None else "hits", t0)
+        return value
+
+    @classmethod
+    def get_many(cls, oids) -> dict:
+        """Returns dict { oid : cached object } for the oids found in cache"""
+        oids = list(oids)
+        if not oids:
+            return {}
+        try:
+            values = CACHE.get_many(*cls._get_keys(oids))
+        except:
+            log("XXX CACHE Warning: error in get_many")
+            log(traceback.format_exc())
+            return {}
+        res = {oid: value for oid, value in zip(oids, values) if value is not None}
+        CacheStats.record(cls, "hits", count=len(res))
+        CacheStats.record(cls, "misses", count=len(oids) - len(res))
+        return res
 
     @classmethod
     def set(cls, oid, value):
         """Store value"""
-        key = cls._get_key(oid)
-        # log(f"CACHE key={key}, type={type(value)}, timeout={cls.timeout}")
+        # log(f"CACHE oid={oid}, type={type(value)}, timeout={cls.timeout}")
+        t0 = None
         try:
+            key = cls._get_keys([oid])[0]
+            t0 = CacheStats.start()
             status = CACHE.set(key, value, timeout=cls.timeout)
             if not status:
                 log("Error: cache set failed !")
         except:
             log("XXX CACHE Warning: error in set !!!")
             status = None
+        CacheStats.record(cls, "sets", t0)
         return status
 
     @classmethod
     def delete(cls, oid):
         """Remove from cache"""
-        CACHE.delete(cls._get_key(oid))
+        cls.delete_many([oid])
 
     @classmethod
     def delete_many(cls, oids):
         """Remove multiple keys at once"""
-        # delete_many seems bugged:
-        # CACHE.delete_many([cls._get_key(oid) for oid in oids])
-        for oid in oids:
-            cls.delete(oid)
+        oids = list(oids)
+        if not oids:
+            return
+        # flask_caching attend les clés en arguments (et non une liste)
+        CACHE.delete_many(*cls._get_keys(oids))
+        CacheStats.record(cls, "invalidations", count=len(oids))
+
+
+# { (dept_id, evaluation_id) : formsemestre_id }, gardé par chaque processus
+# (le semestre d'une évaluation ne change jamais)
+_evaluations_formsemestre_ids = {}
+
+
+def _get_evaluations_formsemestre_ids(evaluation_ids) -> dict:
+    """{ evaluation_id : formsemestre_id }
+    Les semestres inconnus de ce processus sont lus en une seule requête.
+    """
+    dept_id = g.scodoc_dept_id
+    missing = {
+        int(evaluation_id): evaluation_id
+        for evaluation_id in evaluation_ids
+        if (dept_id, evaluation_id) not in _evaluations_formsemestre_ids
+    }
+    if missing:
+        for (evaluation_id, formsemestre_id) in ndb.SimpleQuery(
+            """SELECT e.id, mi.formsemestre_id
+            FROM notes_evaluation e, notes_moduleimpl mi
+            WHERE e.id = ANY(%(evaluation_ids)s)
+            AND mi.id = e.moduleimpl_id
+            """,
+            {"evaluation_ids": list(missing)},
+        ):
+            _evaluations_formsemestre_ids[
+                (dept_id, missing[evaluation_id])
+            ] = formsemestre_id
+    return {
+        evaluation_id: _evaluations_formsemestre_ids.get((dept_id, evaluation_id))
+        for evaluation_id in evaluation_ids
+    }
 
 
 class EvaluationCache(ScoDocCache):
     """Cache for evaluations.
     Clé: evaluation_id
     Valeur: { 'etudid' : note }
+    Invalidé avec le semestre de l'évaluation (jeton de génération).
     """
 
     prefix = "EVAL"
+    timeout = 24 * 60 * 60  # ttl 24h (anciennes générations)
+    generation_kind = "SEM"
+
+    @classmethod
+    def _get_formsemestre_ids(cls, oids) -> dict:
+        return _get_evaluations_formsemestre_ids(oids)
+
+    @classmethod
+    def delete_many(cls, oids):
+        """Remove from cache (with evaluation state, computed from the notes)"""
+        oids = list(oids)
+        super().delete_many(oids)
+        EvaluationEtatCache.delete_many(oids)
 
     @classmethod
     def invalidate_sem(cls, formsemestre_id):
-        "delete evaluations in this formsemestre from cache"
-        req = """SELECT e.id
-        FROM notes_formsemestre s, notes_evaluation e, notes_moduleimpl m 
-        WHERE s.id = %(formsemestre_id)s and s.id=m.formsemestre_id and e.moduleimpl_id=m.id;
+        """delete evaluations in this formsemestre from cache
+        (et tous les caches liés au semestre)
         """
-        evaluation_ids = [
-            x[0] for x in ndb.SimpleQuery(req, {"formsemestre_id": formsemestre_id})
-        ]
-        cls.delete_many(evaluation_ids)
+        SemCacheGeneration.invalidate(("SEM",), [formsemestre_id])
 
     @classmethod
     def invalidate_all_sems(cls):
-        "delete all evaluations in current dept from cache"
-        evaluation_ids = [
-            x[0]
-            for x in ndb.SimpleQuery(
-                """SELECT e.id
-                FROM notes_evaluation e, notes_moduleimpl mi, notes_formsemestre s
-                WHERE s.dept_id=%(dept_id)s
-                AND s.id = mi.formsemestre_id
-                AND mi.id = e.moduleimpl_id;
-                """,
-                {"dept_id": g.scodoc_dept_id},
-            )
-        ]
-        cls.delete_many(evaluation_ids)
+        """delete all evaluations in current dept from cache
+        (et tous les caches liés aux semestres du département)
+        """
+        SemCacheGeneration.invalidate(("SEM",))
+
+
+class EvaluationEtatCache(ScoDocCache):
+    """Cache pour l'état des évaluations (voir sco_evaluations.do_evaluation_etat)
+    Invalidé avec EvaluationCache (notes de l'évaluation).
+    Clé: evaluation_id
+    Valeur: { 'nb_inscrits', 'nb_notes', ..., 'evalcomplete', 'evalattente' }
+    """
+
+    prefix = "EVALETAT"
+    timeout = 24 * 60 * 60  # ttl 24h (anciennes générations)
+    generation_kind = "SEM"
+
+    @classmethod
+    def _get_formsemestre_ids(cls, oids) -> dict:
+        return _get_evaluations_formsemestre_ids(oids)
+
+
+class UserPermissionsCache(ScoDocCache):
+    """Cache pour les permissions des utilisateurs (voir User.has_permission)
+    Les utilisateurs ne dépendent pas du département courant: clés non préfixées.
+    Clé: user_id
+    Valeur: { dept : bitmask des permissions } (dept None pour les rôles globaux)
+    Toutes les entrées sont invalidées ensemble (modification d'un rôle, ou
+    des rôles d'un utilisateur) en changeant le jeton de génération inclus
+    dans les clés. Chaque processus garde en plus une copie locale.
+    """
+
+    prefix = "USERPERMS"
+    timeout = 24 * 60 * 60  # ttl 24h
+    generation_key = "USERPERMS_GENERATION"
+    _local = {}  # user_id : (generation, value)
+
+    @classmethod
+    def get_generation(cls):
+        """Jeton de génération courant (lu une fois par requête), ou None
+        si le cache est indisponible."""
+        generation = g.get("user_permissions_generation")
+        if generation is None:
+            try:
+                generation = CACHE.get(cls.generation_key)
+                if generation is None:
+                    CACHE.add(cls.generation_key, str(time.time()), timeout=0)
+                    generation = CACHE.get(cls.generation_key)
+            except:
+                log("XXX CACHE Warning: error in UserPermissionsCache.get_generation")
+                log(traceback.format_exc())
+                return None
+            g.user_permissions_generation = generation
+        return generation
+
+    @classmethod
+    def _get_key(cls, oid):
+        return cls.prefix + "_" + str(cls.get_generation()) + "_" + str(oid)
+
+    @classmethod
+    def get(cls, oid):
+        """Returns cached permissions, or None"""
+        generation = cls.get_generation()
+        if generation is None:
+            return None
+        local = cls._local.get(oid)
+        if local is not None and local[0] == generation:
+            return local[1]
+        value = super().get(oid)
+        if value is not None:
+            cls._local[oid] = (generation, value)
+        return value
+
+    @classmethod
+    def set(cls, oid, value):
+        """Store value"""
+        generation = cls.get_generation()
+        if generation is None:
+            return None
+        cls._local[oid] = (generation, value)
+        return super().set(oid, value)
+
+    @classmethod
+    def invalidate_all(cls):
+        "Invalidate cached permissions of all users (in all processes)"
+        cls._local.clear()
+        generation = str(time.time())
+        try:
+            CACHE.set(cls.generation_key, generation, timeout=0)
+        except:
+            log("XXX CACHE Warning: error in UserPermissionsCache.invalidate_all")
+            log(traceback.format_exc())
+            generation = None
+        if flask.has_app_context():
+            g.user_permissions_generation = generation
 
 
 class AbsSemEtudCache(ScoDocCache):
@@ -170,6 +592,54 @@ class AbsSemEtudCache(ScoDocCache):
     timeout = 60 * 60  # ttl 60 minutes
 
 
+class NewsSummaryCache(ScoDocCache):
+    """Cache pour le résumé des dernières nouvelles du département
+    (voir sco_news.scolar_news_summary), affiché sur sa page d'accueil.
+    Invalidé par sco_news.add. Les noms des auteurs et des semestres cités
+    peuvent changer sans nouvelle: le résumé expire après timeout secondes.
+    Clé: nombre de nouvelles (n)
+    Valeur: liste des nouvelles (dicts), avec leur texte complet
+    """
+
+    prefix = "NEWS"
+    timeout = 60 * 60  # ttl 1 heure
+    # valeurs de n mises en cache (l'accueil n'en utilise qu'une)
+    cached_sizes = (5,)
+
+    @classmethod
+    def invalidate(cls):
+        "Efface les résumés du département courant"
+        cls.delete_many(cls.cached_sizes)
+
+
+class ApoInscritsEtapeCache(ScoDocCache):
+    """Cache pour les listes d'inscrits aux étapes Apogée, telles que renvoyées
+    par le portail (voir sco_portal_apogee.get_inscrits_etapes).
+    Partagé par la synchronisation, le bilan des étapes et la vérification
+    des paiements. Expire après timeout secondes (pas d'invalidation explicite:
+    les données viennent d'Apogée).
+    Clé: code_etape + "_" + anneeapogee
+    Valeur: liste de dicts (étudiants)
+    """
+
+    prefix = "APOETAPE"
+    timeout = 10 * 60  # ttl 10 minutes
+
+
+class ICSCache(ScoDocCache):
+    """Cache pour les emplois du temps (voir sco_edt_cal.load_ics)
+    Les évènements sont gardés analysés et indexés par groupe, avec les entêtes
+    du serveur permettant de revalider le calendrier (requête conditionnelle).
+    Clé: URL du calendrier
+    Valeur: { "date", "etag", "last_modified", "events": { edt_group : [...] } }
+    """
+
+    prefix = "ICS"
+    # ttl 1 semaine: au delà de sco_edt_cal.ICS_MAX_AGE, les données sont
+    # revalidées, mais encore servies si le serveur ne répond pas
+    timeout = 7 * 24 * 60 * 60
+
+
 class SemBulletinsPDFCache(ScoDocCache):
     """Cache pour les classeurs de bulletins PDF d'un semestre.
     Document pdf assez volumineux. La clé inclut le type de bulletin (version).
@@ -179,16 +649,16 @@ class SemBulletinsPDFCache(ScoDocCache):
 
     prefix = "SBPDF"
     timeout = 12 * 60 * 60  # ttl 12h
+    generation_kind = "PDF"
+
+    @classmethod
+    def _get_formsemestre_ids(cls, oids) -> dict:
+        return {oid: str(oid).split("_")[0] for oid in oids}
 
     @classmethod
     def invalidate_sems(cls, formsemestre_ids):
         """Clear cached pdf for all given formsemestres"""
-        for version in scu.BULLETINS_VERSIONS:
-            oids = [
-                str(formsemestre_id) + "_" + version
-                for formsemestre_id in formsemestre_ids
-            ]
-            cls.delete_many(oids)
+        SemCacheGeneration.invalidate(("PDF",), formsemestre_ids)
 
 
 class SemInscriptionsCache(ScoDocCache):
@@ -199,21 +669,86 @@ class SemInscriptionsCache(ScoDocCache):
     """
 
     prefix = "SI"
-    duration = 12 * 60 * 60  # ttl 12h
+    timeout = 12 * 60 * 60  # ttl 12h
+    generation_kind = "SEM"
 
 
 class NotesTableCache(ScoDocCache):
     """Cache pour les NotesTable
     Clé: formsemestre_id
     Valeur: NotesTable instance
+    Les tables des semestres verrouillés sont aussi enregistrées sur disque
+    (voir sco_frozen_results) et n'ont pas à être recalculées.
+
+    Chaque processus garde en plus une copie locale (LRU, taille limitée à
+    Config.SCODOC_NT_LOCAL_CACHE_MB) des tables déjà désérialisées, ce qui
+    évite de relire et dé-pickler les grosses tables à chaque requête.
+    Un jeton de version (clé courte dans REDIS, changée à chaque set et
+    effacée par delete, et liée comme la table à la génération du semestre)
+    permet de vérifier que la copie locale est à jour: les invalidations
+    faites par un processus sont vues par tous les autres.
     """
 
     prefix = "NT"
+    timeout = 24 * 60 * 60  # ttl 24h (anciennes générations)
+    generation_kind = "SEM"
+    # { (dept, formsemestre_id) : (version, nt, size) }, du plus ancien au plus récent
+    _local = collections.OrderedDict()
+    _local_size = 0  # taille (sérialisée) totale des tables locales, en octets
+
+    @classmethod
+    def _get_version_key(cls, formsemestre_id):
+        return cls._get_keys([formsemestre_id])[0] + "_VERSION"
+
+    @classmethod
+    def _get_version(cls, formsemestre_id):
+        "Jeton de version de la table en cache, ou None"
+        try:
+            return CACHE.get(cls._get_version_key(formsemestre_id))
+        except:
+            log("XXX CACHE Warning: error in NotesTableCache._get_version")
+            log(traceback.format_exc())
+            return None
+
+    @classmethod
+    def _local_get(cls, formsemestre_id, version):
+        "Table locale si elle correspond à cette version, ou None"
+        if version is None:
+            return None
+        local_key = (g.scodoc_dept, formsemestre_id)
+        local = cls._local.get(local_key)
+        if local is None:
+            return None
+        if local[0] != version:
+            cls._local_delete(local_key)
+            return None
+        cls._local.move_to_end(local_key)
+        return local[1]
+
+    @classmethod
+    def _local_put(cls, formsemestre_id, version, nt, size):
+        "Ajoute la table au cache local, en éliminant les plus anciennes"
+        max_size = Config.SCODOC_NT_LOCAL_CACHE_MB * 1024 * 1024
+        if version is None or size is None or size > max_size:
+            return
+        local_key = (g.scodoc_dept, formsemestre_id)
+        cls._local_delete(local_key)
+        cls._local[local_key] = (version, nt, size)
+        cls._local_size += size
+        while cls._local_size > max_size:
+            cls._local_delete(next(iter(cls._local)))
+
+    @classmethod
+    def _local_delete(cls, local_key):
+        local = cls._local.pop(local_key, None)
+        if local is not None:
+            cls._local_size -= local[2]
 
     @classmethod
     def get(cls, formsemestre_id, compute=True):
         """Returns NotesTable for this formsemestre
-        Search in local cache (g.nt_cache) or global app cache (eg REDIS)
+        Search in local cache (g.nt_cache), process cache (cls._local)
+        or global app cache (eg REDIS)
         If not in cache and compute is True, build it and cache it.
         """
         # try local cache (same request)
@@ -222,14 +757,33 @@ class NotesTableCache(ScoDocCache):
         else:
             if formsemestre_id in g.nt_cache:
                 return g.nt_cache[formsemestre_id]
+        # try process cache, if up to date
+        version = cls._get_version(formsemestre_id)
+        nt = cls._local_get(formsemestre_id, version)
+        if nt:
+            CacheStats.record(cls, "hits")
+            CacheStats.record(cls, "local_hits")
+            g.nt_cache[formsemestre_id] = nt
+            return nt
         # try REDIS
-        key = cls._get_key(formsemestre_id)
+        key = cls._get_keys([formsemestre_id])[0]
+        t0 = CacheStats.start()
         nt = CACHE.get(key)
+        CacheStats.record(cls, "hits" if nt else "misses", t0)
         if nt:
+            cls._local_put(formsemestre_id, version, nt, CacheStats._last_size)
             g.nt_cache[formsemestre_id] = nt  # cache locally (same request)
             return nt
         if not compute:
             return None
+        from app.scodoc import sco_frozen_results
+
+        # try frozen results (locked semesters)
+        nt = sco_frozen_results.get(formsemestre_id)
+        if nt:
+            _ = cls.set(formsemestre_id, nt)  # cache in REDIS
+            g.nt_cache[formsemestre_id] = nt
+            return nt
         # Recompute requested table:
         from app.scodoc import notes_table
 
@@ -240,8 +794,41 @@ class NotesTableCache(ScoDocCache):
         t2 = time.time()
         log(f"cached formsemestre_id={formsemestre_id} ({(t1-t0):g}s +{(t2-t1):g}s)")
         g.nt_cache[formsemestre_id] = nt
+        if not nt.sem["etat"]:  # semestre verrouillé: fige les résultats
+            sco_frozen_results.store(nt)
         return nt
 
+    @classmethod
+    def set(cls, formsemestre_id, nt):
+        """Store NotesTable, with a new version"""
+        status = super().set(formsemestre_id, nt)
+        size = CacheStats._last_size
+        version = f"{time.time()}_{os.getpid()}"
+        try:
+            CACHE.set(
+                cls._get_version_key(formsemestre_id), version, timeout=cls.timeout
+            )
+        except:
+            log("XXX CACHE Warning: error in NotesTableCache.set (version)")
+            log(traceback.format_exc())
+            version = None
+        if status:
+            cls._local_put(formsemestre_id, version, nt, size)
+        return status
+
+    @classmethod
+    def delete_many(cls, formsemestre_ids):
+        """Remove from cache (all processes)"""
+        formsemestre_ids = list(formsemestre_ids)
+        if not formsemestre_ids:
+            return
+        CACHE.delete_many(
+            *[key + "_VERSION" for key in cls._get_keys(formsemestre_ids)]
+        )
+        for formsemestre_id in formsemestre_ids:
+            cls._local_delete((g.scodoc_dept, formsemestre_id))
+        super().delete_many(formsemestre_ids)
+
 
 def invalidate_formsemestre(  # was inval_cache(formsemestre_id=None, pdfonly=False)
     formsemestre_id=None, pdfonly=False
@@ -255,40 +842,34 @@ def invalidate_formsemestre(  # was inval_cache(formsemestre_id=None, pdfonly=Fa
         g.sem_to_invalidate.add(formsemestre_id)
         return
     log("inval_cache, formsemestre_id=%s pdfonly=%s" % (formsemestre_id, pdfonly))
+    # Notes, évaluations, inscriptions (SEM) et bulletins pdf (PDF):
+    # change les jetons de génération (voir SemCacheGeneration)
+    kinds = ("PDF",) if pdfonly else ("SEM", "PDF")
     if formsemestre_id is None:
         # clear all caches
         log("----- invalidate_formsemestre: clearing all caches -----")
-        formsemestre_ids = [
-            x[0]
-            for x in ndb.SimpleQuery(
-                """SELECT id FROM notes_formsemestre s
-                WHERE s.dept_id=%(dept_id)s
-            """,
-                {"dept_id": g.scodoc_dept_id},
-            )
-        ]
-    else:
-        formsemestre_ids = [
-            formsemestre_id
-        ] + sco_parcours_dut.list_formsemestre_utilisateurs_uecap(formsemestre_id)
-        log(f"----- invalidate_formsemestre: clearing {formsemestre_ids} -----")
+        SemCacheGeneration.invalidate(kinds)
+        if not pdfonly:
+            # préférences, identités...: les résultats figés sont aussi périmés
+            from app.scodoc import sco_frozen_results
 
-    if not pdfonly:
-        # Delete cached notes and evaluations
-        NotesTableCache.delete_many(formsemestre_ids)
-        if formsemestre_id:
-            for fid in formsemestre_ids:
-                EvaluationCache.invalidate_sem(fid)
-                if hasattr(g, "nt_cache") and fid in g.nt_cache:
-                    del g.nt_cache[fid]
-        else:
-            # optimization when we invalidate all evaluations:
-            EvaluationCache.invalidate_all_sems()
+            sco_frozen_results.delete_all()
             if hasattr(g, "nt_cache"):
                 del g.nt_cache
-        SemInscriptionsCache.delete_many(formsemestre_ids)
+        return
+    formsemestre_ids = [
+        formsemestre_id
+    ] + sco_parcours_dut.list_formsemestre_utilisateurs_uecap(formsemestre_id)
+    log(f"----- invalidate_formsemestre: clearing {formsemestre_ids} -----")
+    SemCacheGeneration.invalidate(kinds, formsemestre_ids)
+    if not pdfonly:
+        # résultats figés: effacés seulement si le semestre est désigné
+        from app.scodoc import sco_frozen_results
 
-    SemBulletinsPDFCache.invalidate_sems(formsemestre_ids)
+        sco_frozen_results.delete_many(formsemestre_ids)
+        for fid in formsemestre_ids:
+            if hasattr(g, "nt_cache") and fid in g.nt_cache:
+                del g.nt_cache[fid]
 
 
 class DefferedSemCacheManager:
@@ -300,7 +881,7 @@ class DefferedSemCacheManager:
     """
 
     def __enter__(self):
-        assert not hasattr(g, "defer_cache_invalidation")
+        assert not getattr(g, "defer_cache_invalidation", False)
         g.defer_cache_invalidation = True
         g.sem_to_invalidate = set()
         return True
@@ -311,3 +892,13 @@ class DefferedSemCacheManager:
         while g.sem_to_invalidate:
             formsemestre_id = g.sem_to_invalidate.pop()
             invalidate_formsemestre(formsemestre_id)
+
+
+def clear_local_caches():
+    """Vide les caches locaux de ce processus
+    (à appeler lorsque le cache partagé (REDIS) est vidé)
+    """
+    _evaluations_formsemestre_ids.clear()
+    NotesTableCache._local.clear()
+    NotesTableCache._local_size = 0
+    UserPermissionsCache._local.clear()
@@ -33,14 +33,25 @@ XXX incompatible avec les ics HyperPlanning Paris 13 (était pour GPU).
 
 """
 
-import icalendar
+import collections
+import http.client
+from operator import itemgetter
+import os
 import pprint
+import time
 import traceback
-import urllib
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import icalendar
+
+from config import Config
 
 import app.scodoc.sco_utils as scu
 from app import log
 from app.scodoc import html_sco_header
+from app.scodoc import sco_cache
 from app.scodoc import sco_formsemestre
 from app.scodoc import sco_groups
 from app.scodoc import sco_groups_view
@@ -72,28 +83,118 @@ def formsemestre_get_ics_url(sem):
     return ics_url
 
 
+# Durée pendant laquelle un emploi du temps en cache est utilisé sans
+# interroger le serveur (ensuite, il est revalidé)
+ICS_MAX_AGE = 5 * 60  # secondes
+
+
 def formsemestre_load_ics(sem):
-    """Load ics data, from our cache or, when necessary, from external provider"""
-    # TODO: cacher le résultat
+    """Evènements de l'emploi du temps du semestre, indexés par groupe EDT
+    (voir load_ics). {} si pas d'emploi du temps.
+    """
     ics_url = formsemestre_get_ics_url(sem)
     if not ics_url:
-        ics_data = ""
-    else:
-        log("Loading edt from %s" % ics_url)
-        f = urllib.request.urlopen(
-            ics_url, timeout=5
-        )  # 5s TODO: add config parameter, eg for slow networks
-        ics_data = f.read()
-        f.close()
+        return {}
+    return load_ics(ics_url)
+
+
+def load_ics(ics_url):
+    """Load ics data, from our cache or, when necessary, from external provider
+    -> { edt_group : [ {"title", "start", "end"}, ... ] }
+
+    Le calendrier analysé est gardé en cache (sco_cache.ICSCache). Au delà de
+    ICS_MAX_AGE secondes, il est revalidé par une requête conditionnelle
+    (ETag / Last-Modified) et n'est relu que s'il a changé.
+    Si le serveur ne répond pas (ou pas dans le délai Config.SCODOC_ICS_TIMEOUT),
+    les données en cache sont utilisées, même anciennes.
+    """
+    cached = sco_cache.ICSCache.get(ics_url)
+    if cached is not None and time.time() - cached["date"] < ICS_MAX_AGE:
+        return cached["events"]
+    try:
+        ics_data, etag, last_modified = _fetch_ics(ics_url, cached)
+        if ics_data is None:  # non modifié
+            events = cached["events"]
+        else:
+            events = _index_ics_events(ics_data)
+    except (OSError, ValueError, http.client.HTTPException) as exc:
+        if cached is None:
+            raise
+        log(f"load_ics: {ics_url} indisponible ({exc}), utilise le cache")
+        # ne réessaie qu'après ICS_MAX_AGE
+        cached["date"] = time.time()
+        sco_cache.ICSCache.set(ics_url, cached)
+        return cached["events"]
+    sco_cache.ICSCache.set(
+        ics_url,
+        {
+            "date": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "events": events,
+        },
+    )
+    return events
 
+
+def _fetch_ics(ics_url, cached=None):
+    """Lit le calendrier: (ics_data, etag, last_modified)
+    ics_data est None si le calendrier n'a pas changé depuis la version cached.
+    Les URL file:// (calendriers de test, hors ligne) sont lues directement:
+    la date de modification du fichier tient lieu de Last-Modified.
+    """
+    etag = cached["etag"] if cached else None
+    last_modified = cached["last_modified"] if cached else None
+    if ics_url.startswith("file://"):
+        filename = urllib.request.url2pathname(urllib.parse.urlparse(ics_url).path)
+        mtime = str(os.stat(filename).st_mtime_ns)
+        if cached and mtime == last_modified:
+            return None, etag, last_modified
+        with open(filename, "rb") as f:
+            return f.read(), None, mtime
+    req = urllib.request.Request(ics_url)
+    if etag:
+        req.add_header("If-None-Match", etag)
+    if last_modified:
+        req.add_header("If-Modified-Since", last_modified)
+    log("Loading edt from %s" % ics_url)
+    try:
+        with urllib.request.urlopen(req, timeout=Config.SCODOC_ICS_TIMEOUT) as f:
+            return f.read(), f.headers.get("ETag"), f.headers.get("Last-Modified")
+    except urllib.error.HTTPError as exc:
+        if exc.code == 304 and cached:
+            return None, etag, last_modified
+        raise
+
+
+def _index_ics_events(ics_data):
+    """Analyse le calendrier: { edt_group : [ évènements ] }
+    Le groupe est donné par X-GROUP-ID (None si absent).
+    Les évènements de chaque groupe sont triés par date de début.
+    """
     cal = icalendar.Calendar.from_ical(ics_data)
-    return cal
+    events = collections.defaultdict(list)
+    for e in cal.walk("VEVENT"):
+        if "DESCRIPTION" not in e:
+            continue
+        edt_group = e.get("X-GROUP-ID")
+        if edt_group is not None:
+            edt_group = str(edt_group).strip()
+        events[edt_group].append(
+            {
+                "title": str(e["DESCRIPTION"]),
+                "start": e.decoded("dtstart").isoformat(),
+                "end": e.decoded("dtend").isoformat(),
+            }
+        )
+    for group_events in events.values():
+        group_events.sort(key=itemgetter("start"))
+    return dict(events)
 
 
 # def formsemestre_edt_groups_used(sem):
 #    """L'ensemble des groupes EDT utilisés dans l'emploi du temps publié"""
-#    cal = formsemestre_load_ics(sem)
-#    return {e["X-GROUP-ID"].decode("utf8") for e in events}
+#    return set(formsemestre_load_ics(sem)) - {None}
 
 
 def get_edt_transcodage_groups(formsemestre_id):
@@ -124,10 +225,9 @@ def get_edt_transcodage_groups(formsemestre_id):
 
 
 def group_edt_json(group_id, start="", end=""):  # actuellement inutilisé
-    """EDT complet du semestre, au format JSON
-    TODO: indiquer un groupe
+    """EDT du groupe, au format JSON
+    (tout le semestre si le calendrier n'indique pas les groupes)
     TODO: utiliser start et end (2 dates au format ISO YYYY-MM-DD)
-    TODO: cacher
     """
     group = sco_groups.get_group(group_id)
     sem = sco_formsemestre.get_formsemestre(group["formsemestre_id"])
@@ -136,18 +236,16 @@ def group_edt_json(group_id, start="", end=""):  # actuellement inutilisé
     edt_group_name = sco2edt.get(group["group_name"], group["group_name"])
     log("group scodoc=%s : edt=%s" % (group["group_name"], edt_group_name))
 
-    cal = formsemestre_load_ics(sem)
-    events = [e for e in cal.walk() if e.name == "VEVENT"]
-    J = []
-    for e in events:
-        # if e['X-GROUP-ID'].strip() == edt_group_name:
-        if "DESCRIPTION" in e:
-            d = {
-                "title": e.decoded("DESCRIPTION"),  # + '/' + e['X-GROUP-ID'],
-                "start": e.decoded("dtstart").isoformat(),
-                "end": e.decoded("dtend").isoformat(),
-            }
-            J.append(d)
+    events = formsemestre_load_ics(sem)
+    if set(events) <= {None}:  # pas de groupes dans ce calendrier
+        J = events.get(None, [])
+    else:
+        # le groupe, le groupe EDT "tous" et les évènements sans groupe
+        edt_groups = {edt_group_name, sco2edt.get(None), None}
+        J = sorted(
+            (e for edt_group in edt_groups for e in events.get(edt_group, [])),
+            key=itemgetter("start"),
+        )
 
     return scu.sendJSON(J)
 
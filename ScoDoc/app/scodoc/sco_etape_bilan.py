@@ -94,7 +94,7 @@ import json
 
 from flask import url_for, g
 
-from app.scodoc.sco_portal_apogee import get_inscrits_etape
+from app.scodoc.sco_portal_apogee import get_inscrits_etapes
 from app import log
 from app.scodoc.sco_utils import annee_scolaire_debut
 from app.scodoc.gen_tables import GenTable
@@ -401,10 +401,14 @@ class EtapeBilan(object):
                 key_etu = self.register_etud_scodoc(etud, semestre)
                 self.etu_semestre[semestre].add(key_etu)
 
+        # inscrits de toutes les étapes (requêtes au portail en parallèle)
+        inscrits_etapes = get_inscrits_etapes(
+            [key_to_values(key_etape)[::-1] for key_etape in self.etapes]
+        )
         for key_etape in self.etapes:
             anneeapogee, etapestr = key_to_values(key_etape)
             self.etu_etapes[key_etape] = set()
-            for etud in get_inscrits_etape(etapestr, anneeapogee):
+            for etud in inscrits_etapes[(str(etapestr), str(anneeapogee))]:
                 key_etu = self.register_etud_apogee(etud, key_etape)
                 self.etu_etapes[key_etape].add(key_etu)
 
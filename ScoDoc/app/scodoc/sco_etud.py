@@ -29,6 +29,7 @@
 """
 
 # Ancien module "scolars"
+import collections
 import os
 import time
 from operator import itemgetter
@@ -276,14 +277,39 @@ def identite_list(cnx, *a, **kw):
     """List, adding on the fly 'annee_naissance' and 'civilite_str' (M., Mme, "")."""
     objs = _identiteEditor.list(cnx, *a, **kw)
     for o in objs:
-        if o["date_naissance"]:
-            o["annee_naissance"] = int(o["date_naissance"].split("/")[2])
-        else:
-            o["annee_naissance"] = o["date_naissance"]
-        o["civilite_str"] = format_civilite(o["civilite"])
+        _identite_add_fields(o)
     return objs
 
 
+def identite_list_many(cnx, etudids) -> dict:
+    """Identités de ces étudiants (comme identite_list), en une requête:
+    { etudid : etud } (seulement les étudiants du département courant)
+    """
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT * FROM identite
+        WHERE id = ANY(%(etudids)s)
+        AND dept_id = %(dept_id)s""",
+        {"etudids": list(etudids), "dept_id": g.scodoc_dept_id},
+    )
+    res = {}
+    for o in cursor.dictfetchall():
+        _identiteEditor.format_output(o)
+        o["etudid"] = o["id"]
+        _identite_add_fields(o)
+        res[o["etudid"]] = o
+    return res
+
+
+def _identite_add_fields(o):
+    "ajoute 'annee_naissance' et 'civilite_str'"
+    if o["date_naissance"]:
+        o["annee_naissance"] = int(o["date_naissance"].split("/")[2])
+    else:
+        o["annee_naissance"] = o["date_naissance"]
+    o["civilite_str"] = format_civilite(o["civilite"])
+
+
 def identite_edit_nocheck(cnx, args):
     """Modifie les champs mentionnes dans args, sans verification ni notification."""
     _identiteEditor.edit(cnx, args)
@@ -318,6 +344,64 @@ def check_nom_prenom(cnx, nom="", prenom="", etudid=None):
     return True, len(res)
 
 
+def check_nom_prenom_many(cnx, noms_prenoms) -> list:
+    """Version ensembliste de check_nom_prenom, pour une liste de couples
+    (nom, prenom): compte les homonymes de tous les étudiants en une requête.
+    Returns:
+    liste de couples (True | False, NbHomonyms), dans l'ordre de noms_prenoms
+    """
+    res = []
+    keys = {}  # (nom, prenom) en minuscules : indices dans res
+    for (nom, prenom) in noms_prenoms:
+        if not nom or (not prenom and not scu.CONFIG.ALLOW_NULL_PRENOM):
+            res.append((False, 0))
+            continue
+        nom = nom.lower().strip()
+        prenom = (prenom or "").lower().strip()
+        # Don't allow some special cars (eg used in sql regexps)
+        if scu.FORBIDDEN_CHARS_EXP.search(nom) or scu.FORBIDDEN_CHARS_EXP.search(
+            prenom
+        ):
+            res.append((False, 0))
+            continue
+        keys.setdefault((nom, prenom), []).append(len(res))
+        res.append((True, 0))
+    if not keys:
+        return res
+    # Now count homonyms (dans tous les départements):
+    noms, prenoms = zip(*keys.keys())
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT t.nom, t.prenom, count(i.id) AS nb
+        FROM unnest(%(noms)s, %(prenoms)s) AS t(nom, prenom), identite i
+        WHERE lower(i.nom) ~ t.nom
+        and lower(i.prenom) ~ t.prenom
+        GROUP BY t.nom, t.prenom
+        """,
+        {"noms": list(noms), "prenoms": list(prenoms)},
+    )
+    for r in cursor.dictfetchall():
+        for i in keys[(r["nom"], r["prenom"])]:
+            res[i] = (True, r["nb"])
+    return res
+
+
+def codes_in_use(cnx, code_name, codes) -> set:
+    """Parmi les codes (code_nip ou code_ine) indiqués, ceux déjà utilisés
+    dans le département courant"""
+    assert code_name in ("code_nip", "code_ine")
+    if not codes:
+        return set()
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        f"""SELECT DISTINCT {code_name} FROM identite
+        WHERE {code_name} = ANY(%(codes)s)
+        AND dept_id = %(dept_id)s""",
+        {"codes": [str(code) for code in codes], "dept_id": g.scodoc_dept_id},
+    )
+    return {r[0] for r in cursor.fetchall()}
+
+
 def _check_duplicate_code(cnx, args, code_name, disable_notify=False, edit=True):
     etudid = args.get("etudid", None)
     if args.get(code_name, None):
@@ -428,6 +512,25 @@ def identite_create(cnx, args):
     return _identiteEditor.create(cnx, args)
 
 
+def identite_create_many(cnx, args_list, commit=True) -> list:
+    """Création en masse (import): vérifie l'unicité des codes NIP et INE
+    (en une requête), puis crée les étudiants.
+    Return: liste des etudids créés, dans l'ordre de args_list.
+    """
+    for code_name in ("code_nip", "code_ine"):
+        codes = [str(args[code_name]) for args in args_list if args.get(code_name)]
+        dups = {code for code, n in collections.Counter(codes).items() if n > 1}
+        dups |= codes_in_use(cnx, code_name, codes)
+        if dups:
+            log("*** error: code %s duplique: %s" % (code_name, dups))
+            raise ScoValueError(
+                "Code étudiant (%s) dupliqué: %s" % (code_name, ", ".join(sorted(dups)))
+            )
+    for args in args_list:
+        _check_civilite(args)
+    return _identiteEditor.create_many(cnx, args_list, commit=commit)
+
+
 def notify_etud_change(email_addr, etud, before, after, subject):
     """Send email notifying changes to etud
     before and after are two dicts, with values before and after the change.
@@ -486,10 +589,31 @@ _adresseEditor = ndb.EditableTable(
 )
 
 adresse_create = _adresseEditor.create
+adresse_create_many = _adresseEditor.create_many
 adresse_delete = _adresseEditor.delete
 adresse_list = _adresseEditor.list
 
 
+def adresse_list_many(cnx, etudids) -> dict:
+    """Adresses de ces étudiants (comme adresse_list), en une requête:
+    { etudid : [ adresse, ... ] }
+    """
+    etudids = list(etudids)
+    res = {etudid: [] for etudid in etudids}
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT * FROM adresse
+        WHERE etudid = ANY(%(etudids)s)
+        ORDER BY id""",
+        {"etudids": etudids},
+    )
+    for r in cursor.dictfetchall():
+        _adresseEditor.format_output(r)
+        r["adresse_id"] = r["id"]
+        res[r["etudid"]].append(r)
+    return res
+
+
 def adresse_edit(cnx, args, disable_notify=False):
     """Modifie l'adresse d'un étudiant.
     Si pref notification et difference, envoie message notification, sauf si disable_notify
@@ -577,6 +701,7 @@ _admissionEditor = ndb.EditableTable(
 )
 
 admission_create = _admissionEditor.create
+admission_create_many = _admissionEditor.create_many
 admission_delete = _admissionEditor.delete
 admission_list = _admissionEditor.list
 admission_edit = _admissionEditor.edit
@@ -627,6 +752,30 @@ etudident_edit = _etudidentEditor.edit
 etudident_create = _etudidentEditor.create
 
 
+def etudident_list_many(cnx, etudids) -> dict:
+    """Identités et admissions de ces étudiants (comme etudident_list),
+    en deux requêtes: { etudid : etud }
+    """
+    etuds = identite_list_many(cnx, etudids)
+    void_adm = {
+        k: None for k in _admissionEditor.dbfields if k != "etudid" and k != "adm_id"
+    }
+    for etud in etuds.values():
+        etud.update(void_adm)
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT * FROM admissions
+        WHERE etudid = ANY(%(etudids)s)
+        ORDER BY id""",
+        {"etudids": list(etuds)},
+    )
+    for r in cursor.dictfetchall():
+        _admissionEditor.format_output(r)
+        r["adm_id"] = r["id"]
+        etuds[r["etudid"]].update(r)
+    return etuds
+
+
 def make_etud_args(etudid=None, code_nip=None, use_request=True, raise_exc=True):
     """forme args dict pour requete recherche etudiant
     On peut specifier etudid
@@ -774,6 +923,10 @@ def scolar_events_create(cnx, args):
     _scolar_eventsEditor.create(cnx, args)
 
 
+def scolar_events_create_many(cnx, args_list, commit=True):
+    _scolar_eventsEditor.create_many(cnx, args_list, commit=commit)
+
+
 # --------
 _etud_annotationsEditor = ndb.EditableTable(
     "etud_annotations",
@@ -797,6 +950,25 @@ etud_annotations_list = _etud_annotationsEditor.list
 etud_annotations_edit = _etud_annotationsEditor.edit
 
 
+def etud_annotations_list_many(cnx, etudids) -> dict:
+    """Annotations de ces étudiants (comme etud_annotations_list), en une requête:
+    { etudid : [ annotation, ... ] }, les plus récentes en premier.
+    """
+    etudids = list(etudids)
+    res = {etudid: [] for etudid in etudids}
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT * FROM etud_annotations
+        WHERE etudid = ANY(%(etudids)s)
+        ORDER BY date DESC""",
+        {"etudids": etudids},
+    )
+    for r in cursor.dictfetchall():
+        _etud_annotationsEditor.format_output(r)
+        res[r["etudid"]].append(r)
+    return res
+
+
 def add_annotations_to_etud_list(etuds):
     """Add key 'annotations' describing annotations of etuds
     (used to list all annotations of a group)
@@ -930,11 +1102,16 @@ def fill_etuds_info(etuds):
     from app.scodoc import sco_formsemestre_inscriptions
 
     cnx = ndb.GetDBConnexion()
-    # open('/tmp/t','w').write( str(etuds) )
+    # adresses et inscriptions de tous les étudiants, en deux requêtes:
+    etudids = [etud["etudid"] for etud in etuds]
+    adresses = adresse_list_many(cnx, etudids)
+    inscriptions = sco_formsemestre_inscriptions.do_formsemestre_inscription_list_many(
+        etudids
+    )
     for etud in etuds:
         etudid = etud["etudid"]
         etud["dept"] = g.scodoc_dept
-        adrs = adresse_list(cnx, {"etudid": etudid})
+        adrs = adresses[etudid]
         if not adrs:
             # certains "vieux" etudiants n'ont pas d'adresse
             adr = {}.fromkeys(_adresseEditor.dbfields, "")
@@ -947,9 +1124,7 @@ def fill_etuds_info(etuds):
         format_etud_ident(etud)
 
         # Semestres dans lesquel il est inscrit
-        ins = sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
-            {"etudid": etudid}
-        )
+        ins = inscriptions[etudid]
         etud["ins"] = ins
         sems = []
         cursem = None  # semestre "courant" ou il est inscrit
@@ -27,6 +27,7 @@
 
 """Evaluations
 """
+import collections
 import datetime
 import operator
 import pprint
@@ -58,43 +59,10 @@ from app.scodoc import sco_moduleimpl
 from app.scodoc import sco_news
 from app.scodoc import sco_permissions_check
 from app.scodoc import sco_preferences
+from app.scodoc import sco_stats
 from app.scodoc import sco_users
 
 
-# --------------------------------------------------------------------
-#
-#    MISC AUXILIARY FUNCTIONS
-#
-# --------------------------------------------------------------------
-def notes_moyenne_median_mini_maxi(notes):
-    "calcule moyenne et mediane d'une liste de valeurs (floats)"
-    notes = [
-        x
-        for x in notes
-        if (x != None) and (x != scu.NOTES_NEUTRALISE) and (x != scu.NOTES_ATTENTE)
-    ]
-    n = len(notes)
-    if not n:
-        return None, None, None, None
-    moy = sum(notes) / n
-    median = ListMedian(notes)
-    mini = min(notes)
-    maxi = max(notes)
-    return moy, median, mini, maxi
-
-
-def ListMedian(L):
-    """Median of a list L"""
-    n = len(L)
-    if not n:
-        raise ValueError("empty list")
-    L.sort()
-    if n % 2:
-        return L[n // 2]
-    else:
-        return (L[n // 2] + L[n // 2 - 1]) / 2
-
-
 # --------------------------------------------------------------------
 _evaluationEditor = ndb.EditableTable(
     "notes_evaluation",
@@ -382,31 +350,12 @@ def do_evaluation_etat(evaluation_id, partition_id=None, select_first_partition=
     à ce module ont des notes)
     evalattente est vrai s'il ne manque que des notes en attente
     """
-    nb_inscrits = len(
-        sco_groups.do_evaluation_listeetuds_groups(evaluation_id, getallstudents=True)
-    )
+    use_cache = partition_id is None and not select_first_partition
+    if use_cache:  # etat avec la partition par défaut
+        etat = sco_cache.EvaluationEtatCache.get(evaluation_id)
+        if etat is not None:
+            return etat
     NotesDB = do_evaluation_get_all_notes(evaluation_id)  # { etudid : value }
-    notes = [x["value"] for x in NotesDB.values()]
-    nb_abs = len([x for x in notes if x is None])
-    nb_neutre = len([x for x in notes if x == scu.NOTES_NEUTRALISE])
-    nb_att = len([x for x in notes if x == scu.NOTES_ATTENTE])
-    moy_num, median_num, mini_num, maxi_num = notes_moyenne_median_mini_maxi(notes)
-    if moy_num is None:
-        median, moy = "", ""
-        median_num, moy_num = None, None
-        mini, maxi = "", ""
-        mini_num, maxi_num = None, None
-    else:
-        median = scu.fmt_note(median_num)
-        moy = scu.fmt_note(moy_num)
-        mini = scu.fmt_note(mini_num)
-        maxi = scu.fmt_note(maxi_num)
-    # cherche date derniere modif note
-    if len(NotesDB):
-        t = [x["date"] for x in NotesDB.values()]
-        last_modif = max(t)
-    else:
-        last_modif = None
     # ---- Liste des groupes complets et incomplets
     E = do_evaluation_list(args={"evaluation_id": evaluation_id})[0]
     M = sco_moduleimpl.moduleimpl_list(moduleimpl_id=E["moduleimpl_id"])[0]
@@ -432,9 +381,102 @@ def do_evaluation_etat(evaluation_id, partition_id=None, select_first_partition=
         moduleimpl_id=E["moduleimpl_id"]
     )
     insmodset = set([x["etudid"] for x in insmod])
+    etud_groups = sco_groups.get_etud_groups_in_partition(partition_id)
+    etat = _comp_evaluation_etat(E, is_malus, NotesDB, insem, insmodset, etud_groups)
+    if use_cache:
+        sco_cache.EvaluationEtatCache.set(evaluation_id, etat)
+    return etat
+
+
+def do_evaluations_etats_in_sem(formsemestre_id) -> dict:
+    """Etat (voir do_evaluation_etat) de toutes les évaluations du semestre,
+    avec la partition par défaut.
+    Les inscriptions, groupes et notes sont chargés une seule fois pour
+    tout le semestre; les états sont cachés (EvaluationEtatCache).
+    Returns: { evaluation_id : etat }
+    """
+    evals = ndb.SimpleDictFetch(
+        """SELECT E.id AS evaluation_id, E.*, Mod.module_type
+        FROM notes_evaluation E, notes_moduleimpl MI, notes_modules Mod
+        WHERE MI.formsemestre_id = %(formsemestre_id)s
+        AND MI.id = E.moduleimpl_id
+        AND Mod.id = MI.module_id
+        """,
+        {"formsemestre_id": formsemestre_id},
+    )
+    etats = sco_cache.EvaluationEtatCache.get_many(
+        [e["evaluation_id"] for e in evals]
+    )
+    evals = [e for e in evals if e["evaluation_id"] not in etats]
+    if not evals:
+        return etats
+    # Inscriptions au semestre et aux modules, groupes:
+    insem = sco_formsemestre_inscriptions.do_formsemestre_inscription_listinscrits(
+        formsemestre_id
+    )
+    insmod = collections.defaultdict(set)  # { moduleimpl_id : set(etudids) }
+    for (moduleimpl_id, etudid) in ndb.SimpleQuery(
+        """SELECT Im.moduleimpl_id, Im.etudid
+        FROM notes_moduleimpl_inscription Im, notes_moduleimpl MI
+        WHERE MI.formsemestre_id = %(formsemestre_id)s
+        AND Im.moduleimpl_id = MI.id
+        """,
+        {"formsemestre_id": formsemestre_id},
+    ).fetchall():
+        insmod[moduleimpl_id].add(etudid)
+    partition = sco_groups.get_default_partition(formsemestre_id)
+    etud_groups = sco_groups.get_etud_groups_in_partition(partition["partition_id"])
+    # Notes:
+    all_notes = do_evaluations_get_all_notes([e["evaluation_id"] for e in evals])
+    for E in evals:
+        evaluation_id = E["evaluation_id"]
+        etat = _comp_evaluation_etat(
+            E,
+            E["module_type"] == scu.MODULE_MALUS,
+            all_notes[evaluation_id],
+            insem,
+            insmod[E["moduleimpl_id"]],
+            etud_groups,
+        )
+        sco_cache.EvaluationEtatCache.set(evaluation_id, etat)
+        etats[evaluation_id] = etat
+    return etats
+
+
+def _comp_evaluation_etat(E, is_malus, NotesDB, insem, insmodset, etud_groups):
+    """Calcule l'état de l'évaluation E (voir do_evaluation_etat)
+    is_malus: vrai si module de malus
+    NotesDB: notes de l'évaluation { etudid : { 'value' : value, 'date' : date ... }}
+    insem: inscriptions (état I) au semestre
+    insmodset: ensemble des etudids inscrits au module
+    etud_groups: groupes de la partition considérée { etudid : group }
+    """
+    evaluation_id = E["evaluation_id"]
     # retire de insem ceux qui ne sont pas inscrits au module
     ins = [i for i in insem if i["etudid"] in insmodset]
-
+    nb_inscrits = len(ins)
+    stats = sco_stats.NotesStats(x["value"] for x in NotesDB.values())
+    nb_abs = stats.nb_abs
+    nb_neutre = stats.nb_neutre
+    nb_att = stats.nb_att
+    moy_num, median_num = stats.mean, stats.median
+    mini_num, maxi_num = stats.min, stats.max
+    if moy_num is None:
+        median, moy = "", ""
+        median_num, moy_num = None, None
+        mini, maxi = "", ""
+        mini_num, maxi_num = None, None
+    else:
+        median = scu.fmt_note(median_num)
+        moy = scu.fmt_note(moy_num)
+        mini = scu.fmt_note(mini_num)
+        maxi = scu.fmt_note(maxi_num)
+    # cherche date derniere modif note
+    if len(NotesDB):
+        t = [x["date"] for x in NotesDB.values()]
+        last_modif = max(t)
+    else:
+        last_modif = None
     # Nombre de notes valides d'étudiants inscrits au module
     # (car il peut y avoir des notes d'étudiants désinscrits depuis l'évaluation)
     nb_notes = len(insmodset.intersection(NotesDB))
@@ -443,11 +485,10 @@ def do_evaluation_etat(evaluation_id, partition_id=None, select_first_partition=
     # On considere une note "manquante" lorsqu'elle n'existe pas
     # ou qu'elle est en attente (ATT)
     GrNbMissing = scu.DictDefault()  # group_id : nb notes manquantes
-    GrNotes = scu.DictDefault(defaultvalue=[])  # group_id: liste notes valides
+    gr_notes = []  # (group_id, note)
     TotalNbMissing = 0
     TotalNbAtt = 0
     groups = {}  # group_id : group
-    etud_groups = sco_groups.get_etud_groups_in_partition(partition_id)
 
     for i in ins:
         group = etud_groups.get(i["etudid"], None)
@@ -461,10 +502,8 @@ def do_evaluation_etat(evaluation_id, partition_id=None, select_first_partition=
                 isMissing = True
                 TotalNbAtt += 1
             if group:
-                GrNotes[group["group_id"]].append(val)
+                gr_notes.append((group["group_id"], val))
         else:
-            if group:
-                _ = GrNotes[group["group_id"]]  # create group
             isMissing = True
         if isMissing:
             TotalNbMissing += 1
@@ -496,9 +535,10 @@ def do_evaluation_etat(evaluation_id, partition_id=None, select_first_partition=
 
     # Calcul moyenne dans chaque groupe de TD
     gr_moyennes = []  # group : {moy,median, nb_notes}
-    for group_id in GrNotes.keys():
-        notes = GrNotes[group_id]
-        gr_moy, gr_median, gr_mini, gr_maxi = notes_moyenne_median_mini_maxi(notes)
+    gr_stats = sco_stats.notes_stats_groups(gr_notes, group_ids=groups.keys())
+    for group_id, gr_stat in gr_stats.items():
+        gr_moy, gr_median = gr_stat.mean, gr_stat.median
+        gr_mini, gr_maxi = gr_stat.min, gr_stat.max
         gr_moyennes.append(
             {
                 "group_id": group_id,
@@ -511,8 +551,8 @@ def do_evaluation_etat(evaluation_id, partition_id=None, select_first_partition=
                 "gr_maxi": scu.fmt_note(gr_maxi),
                 "gr_mini_num": gr_mini,
                 "gr_maxi_num": gr_maxi,
-                "gr_nb_notes": len(notes),
-                "gr_nb_att": len([x for x in notes if x == scu.NOTES_ATTENTE]),
+                "gr_nb_notes": gr_stat.nb_total,
+                "gr_nb_att": gr_stat.nb_att,
             }
         )
     gr_moyennes.sort(key=operator.itemgetter("group_name"))
@@ -603,10 +643,12 @@ def do_evaluation_list_in_sem(formsemestre_id, with_etat=True):
     cursor.execute(req, {"formsemestre_id": formsemestre_id})
     res = cursor.dictfetchall()
     # etat de chaque evaluation:
+    if with_etat:
+        etats = do_evaluations_etats_in_sem(formsemestre_id)
     for r in res:
         r["jour"] = r["jour"] or datetime.date(1900, 1, 1)  # pour les comparaisons
         if with_etat:
-            r["etat"] = do_evaluation_etat(r["evaluation_id"])
+            r["etat"] = etats[r["evaluation_id"]]
 
     return res
 
@@ -651,6 +693,30 @@ def do_evaluation_get_all_notes(
     return d
 
 
+def do_evaluations_get_all_notes(evaluation_ids) -> dict:
+    """Toutes les notes de ces évaluations (comme do_evaluation_get_all_notes):
+    { evaluation_id : { etudid : { 'value' : value, 'date' : date ... }}}
+    Les notes absentes du cache sont chargées en une seule requête.
+    """
+    r = sco_cache.EvaluationCache.get_many(evaluation_ids)
+    missing = [oid for oid in evaluation_ids if oid not in r]
+    if not missing:
+        return r
+    for evaluation_id in missing:
+        r[evaluation_id] = {}
+    for x in ndb.SimpleDictFetch(
+        "select * from notes_notes where evaluation_id = ANY(%(evaluation_ids)s)",
+        {"evaluation_ids": missing},
+    ):
+        if x["value"] != scu.NOTES_SUPPRESS:
+            r[x["evaluation_id"]][x["etudid"]] = x
+    for evaluation_id in missing:
+        status = sco_cache.EvaluationCache.set(evaluation_id, r[evaluation_id])
+        if not status:
+            log(f"Warning: EvaluationCache.set: {evaluation_id}\t{status}")
+    return r
+
+
 def _eval_etat(evals):
     """evals: list of mappings (etats)
     -> nb_eval_completes, nb_evals_en_cours,
@@ -612,6 +612,43 @@ def excel_file_to_list(filename):
         )
 
 
+def excel_bytes_iter_rows(bytes_content, diag: list):
+    """Itère sur les lignes de la première feuille, sans charger toute la
+    feuille en mémoire: couples (numéro de la ligne dans la feuille, à partir
+    de 1, liste de chaînes). Les lignes vides sont ignorées.
+    diag: liste de chaines (messages), complétée au fil de la lecture.
+    """
+    try:
+        wb = load_workbook(
+            filename=io.BytesIO(bytes_content), read_only=True, data_only=True
+        )
+    except:
+        log("excel_bytes_iter_rows: failure to import document")
+        raise ScoValueError(
+            """Le fichier xlsx attendu n'est pas lisible !
+            Peut-être avez-vous fourni un fichier au mauvais format (txt, xls, ..)
+            """
+        )
+    try:
+        if len(wb.sheetnames) < 1:
+            diag.append("Aucune feuille trouvée dans le classeur !")
+            return
+        if len(wb.sheetnames) > 1:
+            diag.append("Attention: n'utilise que la première feuille du classeur !")
+        sheet_name = wb.sheetnames[0]
+        nb_rows = 0
+        for rownum, row in enumerate(
+            wb[sheet_name].iter_rows(values_only=True), start=1
+        ):
+            line = ["" if v is None else str(v) for v in row]
+            if any(line):
+                nb_rows += 1
+                yield rownum, line
+        diag.append('Feuille "%s", %d lignes' % (sheet_name, nb_rows))
+    finally:
+        wb.close()
+
+
 def _excel_to_list(filelike):
     """returns list of list
     convert_to_string is a conversion function applied to all non-string values (ie numbers)
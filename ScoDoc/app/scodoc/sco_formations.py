@@ -197,7 +197,9 @@ def formation_import_xml(doc: str, import_tags=True):
     ues_old2new = {}  # xml ue_id : new ue_id
     modules_old2new = {}  # xml module_id : new module_id
     # (nb: mecanisme utilise pour cloner semestres seulement, pas pour I/O XML)
+    # Création en masse (requêtes multi-lignes): UEs, puis matières, puis modules
     # -- create UEs
+    ue_infos = []
     for ue_info in D[2]:
         assert ue_info[0] == "ue"
         ue_info[1]["formation_id"] = formation_id
@@ -206,32 +208,64 @@ def formation_import_xml(doc: str, import_tags=True):
             del ue_info[1]["ue_id"]
         else:
             xml_ue_id = None
-        ue_id = sco_edit_ue.do_ue_create(ue_info[1])
+        ue_infos.append((xml_ue_id, ue_info))
+    acronymes = [ue_info[1].get("acronyme") for (_, ue_info) in ue_infos]
+    for acronyme in acronymes:
+        if acronymes.count(acronyme) > 1:
+            raise ScoValueError('Acronyme d\'UE "%s" déjà utilisé !' % acronyme)
+    ue_ids = sco_edit_ue._ueEditor.create_many(
+        cnx, [ue_info[1] for (_, ue_info) in ue_infos], commit=False
+    )
+    # -- create matieres
+    mat_infos = []
+    for ((xml_ue_id, ue_info), ue_id) in zip(ue_infos, ue_ids):
         if xml_ue_id:
             ues_old2new[xml_ue_id] = ue_id
-        # -- create matieres
         for mat_info in ue_info[2]:
             assert mat_info[0] == "matiere"
             mat_info[1]["ue_id"] = ue_id
-            mat_id = sco_edit_matiere.do_matiere_create(mat_info[1])
-            # -- create modules
-            for mod_info in mat_info[2]:
-                assert mod_info[0] == "module"
-                if "module_id" in mod_info[1]:
-                    xml_module_id = int(mod_info[1]["module_id"])
-                    del mod_info[1]["module_id"]
-                else:
-                    xml_module_id = None
-                mod_info[1]["formation_id"] = formation_id
-                mod_info[1]["matiere_id"] = mat_id
-                mod_info[1]["ue_id"] = ue_id
-                mod_id = sco_edit_module.do_module_create(mod_info[1])
-                if xml_module_id:
-                    modules_old2new[int(xml_module_id)] = mod_id
-                if import_tags:
-                    if len(mod_info) > 2:
-                        tag_names = [t[1]["name"] for t in mod_info[2]]
-                        sco_tag_module.module_tag_set(mod_id, tag_names)
+            mat_infos.append(mat_info)
+    mat_ids = sco_edit_matiere._matiereEditor.create_many(
+        cnx, [mat_info[1] for mat_info in mat_infos], commit=False
+    )
+    # -- create modules
+    mod_infos = []
+    for (mat_info, mat_id) in zip(mat_infos, mat_ids):
+        for mod_info in mat_info[2]:
+            assert mod_info[0] == "module"
+            if "module_id" in mod_info[1]:
+                xml_module_id = int(mod_info[1]["module_id"])
+                del mod_info[1]["module_id"]
+            else:
+                xml_module_id = None
+            mod_info[1]["formation_id"] = formation_id
+            mod_info[1]["matiere_id"] = mat_id
+            mod_info[1]["ue_id"] = mat_info[1]["ue_id"]
+            mod_infos.append((xml_module_id, mod_info))
+    mod_ids = sco_edit_module._moduleEditor.create_many(
+        cnx, [mod_info[1] for (_, mod_info) in mod_infos], commit=False
+    )
+    cnx.commit()
+    for ((xml_module_id, mod_info), mod_id) in zip(mod_infos, mod_ids):
+        if xml_module_id:
+            modules_old2new[int(xml_module_id)] = mod_id
+        if import_tags:
+            if len(mod_info) > 2:
+                tag_names = [t[1]["name"] for t in mod_info[2]]
+                sco_tag_module.module_tag_set(mod_id, tag_names)
+    log(
+        "formation_import_xml: %d UEs, %d matières, %d modules"
+        % (len(ue_ids), len(mat_ids), len(mod_ids))
+    )
+    # news
+    if ue_ids:
+        F = formation_list(args={"formation_id": formation_id})[0]
+        sco_news.add(
+            typ=sco_news.NEWS_FORM,
+            object=formation_id,
+            text="Modification de la formation %(acronyme)s" % F,
+            max_frequency=3,
+        )
 
     return formation_id, modules_old2new, ues_old2new
 
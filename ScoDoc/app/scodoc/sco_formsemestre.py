@@ -269,6 +269,8 @@ def do_formsemestre_edit(sem, cnx=None, **kw):
         cnx = ndb.GetDBConnexion()
 
     _formsemestreEditor.edit(cnx, sem, **kw)
+    if hasattr(g, "stored_get_formsemestre"):
+        g.stored_get_formsemestre.pop(sem["formsemestre_id"], None)
     write_formsemestre_etapes(sem)
     write_formsemestre_responsables(sem)
 
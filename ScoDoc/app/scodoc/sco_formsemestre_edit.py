@@ -1425,6 +1425,9 @@ def formsemestre_change_lock(formsemestre_id) -> None:
 
     args = {"formsemestre_id": formsemestre_id, "etat": etat}
     sco_formsemestre.do_formsemestre_edit(args)
+    if not etat:
+        # verrouillage: calcule et fige les résultats du semestre
+        _ = sco_cache.NotesTableCache.get(formsemestre_id)
 
 
 def formsemestre_change_publication_bul(
@@ -34,7 +34,7 @@ from flask import url_for, g, request
 
 import app.scodoc.sco_utils as scu
 from app import log
-from app.scodoc.scolog import logdb
+from app.scodoc.scolog import logdb, logdb_many
 from app.scodoc.sco_exceptions import ScoException, ScoValueError
 from app.scodoc.sco_permissions import Permission
 from app.scodoc.sco_codes_parcours import UE_STANDARD, UE_SPORT, UE_TYPE_NAME
@@ -65,6 +65,27 @@ def do_formsemestre_inscription_list(*args, **kw):
     return _formsemestre_inscriptionEditor.list(cnx, *args, **kw)
 
 
+def do_formsemestre_inscription_list_many(etudids) -> dict:
+    """Inscriptions aux semestres de ces étudiants, en une requête:
+    { etudid : [ inscription, ... ] } (triées par formsemestre_id)
+    """
+    etudids = list(etudids)
+    res = {etudid: [] for etudid in etudids}
+    cnx = ndb.GetDBConnexion()
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT * FROM notes_formsemestre_inscription
+        WHERE etudid = ANY(%(etudids)s)
+        ORDER BY formsemestre_id""",
+        {"etudids": etudids},
+    )
+    for r in cursor.dictfetchall():
+        _formsemestre_inscriptionEditor.format_output(r)
+        r["formsemestre_inscription_id"] = r["id"]
+        res[r["etudid"]].append(r)
+    return res
+
+
 def do_formsemestre_inscription_listinscrits(formsemestre_id):
     """Liste les inscrits (état I) à ce semestre et cache le résultat"""
     r = sco_cache.SemInscriptionsCache.get(formsemestre_id)
@@ -251,37 +272,111 @@ def do_formsemestre_inscription_with_modules(
     """Inscrit cet etudiant à ce semestre et TOUS ses modules STANDARDS
     (donc sauf le sport)
     """
+    do_formsemestre_inscriptions_with_modules(
+        formsemestre_id,
+        [(etudid, group_ids)],
+        etat=etat,
+        method=method,
+        etapes={etudid: etape} if etape else None,
+    )
+
+
+def do_formsemestre_inscriptions_with_modules(
+    formsemestre_id,
+    etuds_group_ids,
+    etat="I",
+    method="inscription_with_modules",
+    etapes=None,
+    commit=True,
+):
+    """Inscrit ces étudiants à ce semestre et TOUS ses modules STANDARDS
+    (donc sauf le sport), avec des requêtes multi-lignes.
+    etuds_group_ids: liste de couples (etudid, [group_id, ...])
+    etapes: { etudid : étape Apogée d'inscription }, optionnel
+    Si commit est faux, c'est l'appelant qui doit commiter puis invalider
+    le cache du semestre (afin qu'aucun autre processus ne remette en cache
+    un état non commité).
+    """
+    if not etuds_group_ids:
+        return
+    cnx = ndb.GetDBConnexion()
+    sems = sco_formsemestre.do_formsemestre_list({"formsemestre_id": formsemestre_id})
+    if len(sems) != 1:
+        raise ScoValueError("code de semestre invalide: %s" % formsemestre_id)
+    # check lock
+    if not sems[0]["etat"]:
+        raise ScoValueError("inscription: semestre verrouille")
+    etudids = [etudid for (etudid, _) in etuds_group_ids]
+    log(
+        "do_formsemestre_inscriptions_with_modules: formsemestre_id=%s etudids=%s"
+        % (formsemestre_id, etudids)
+    )
     # inscription au semestre
-    args = {"formsemestre_id": formsemestre_id, "etudid": etudid}
+    args = {"formsemestre_id": formsemestre_id}
     if etat is not None:
         args["etat"] = etat
-    do_formsemestre_inscription_create(args, method=method)
-    log(
-        "do_formsemestre_inscription_with_modules: etudid=%s formsemestre_id=%s"
-        % (etudid, formsemestre_id)
+    args_list = []
+    for etudid in etudids:
+        args_etud = dict(args, etudid=etudid)
+        if etapes and etapes.get(etudid):
+            args_etud["etape"] = etapes[etudid]
+        args_list.append(args_etud)
+    _formsemestre_inscriptionEditor.create_many(
+        cnx, args_list, commit=False, return_id=False
+    )
+    # Evenements
+    event_date = time.strftime("%d/%m/%Y")
+    sco_etud.scolar_events_create_many(
+        cnx,
+        [
+            {
+                "etudid": etudid,
+                "event_date": event_date,
+                "formsemestre_id": formsemestre_id,
+                "event_type": "INSCRIPTION",
+            }
+            for etudid in etudids
+        ],
+        commit=False,
+    )
+    # Log etudiants
+    logdb_many(
+        cnx,
+        [
+            (method, etudid, "inscription en semestre %s" % formsemestre_id)
+            for etudid in etudids
+        ],
+        commit=False,
     )
     # inscriptions aux groupes
     # 1- inscrit au groupe 'tous'
-    group_id = sco_groups.get_default_group(formsemestre_id)
-    sco_groups.set_group(etudid, group_id)
-    gdone = {group_id: 1}  # empeche doublons
-
-    # 2- inscrit aux groupes
-    for group_id in group_ids:
-        if group_id and not group_id in gdone:
-            sco_groups.set_group(etudid, group_id)
-            gdone[group_id] = 1
+    default_group_id = sco_groups.get_default_group(formsemestre_id)
+    memberships = []
+    for (etudid, group_ids) in etuds_group_ids:
+        # 2- inscrit aux groupes (sans doublons)
+        for group_id in dict.fromkeys([default_group_id] + list(group_ids)):
+            if group_id:
+                memberships.append((etudid, group_id))
+    sco_groups.set_groups(memberships)
 
     # inscription a tous les modules de ce semestre
     modimpls = sco_moduleimpl.moduleimpl_withmodule_list(
         formsemestre_id=formsemestre_id
     )
-    for mod in modimpls:
-        if mod["ue"]["type"] != UE_SPORT:
-            sco_moduleimpl.do_moduleimpl_inscription_create(
-                {"moduleimpl_id": mod["moduleimpl_id"], "etudid": etudid},
-                formsemestre_id=formsemestre_id,
-            )
+    sco_moduleimpl.do_moduleimpl_inscription_create_many(
+        [
+            {"moduleimpl_id": mod["moduleimpl_id"], "etudid": etudid}
+            for mod in modimpls
+            if mod["ue"]["type"] != UE_SPORT
+            for etudid in etudids
+        ],
+        formsemestre_id=formsemestre_id,
+    )
+    if commit:
+        cnx.commit()
+        sco_cache.invalidate_formsemestre(
+            formsemestre_id=formsemestre_id
+        )  # > inscription au semestre
 
 
 def formsemestre_inscription_with_modules_etud(
@@ -27,6 +27,7 @@
 
 """Semestres: validation semestre et UE dans parcours
 """
+import collections
 import time
 
 import flask
@@ -863,75 +864,111 @@ def formsemestre_validation_auto(formsemestre_id):
     return "\n".join(H)
 
 
+def formsemestre_validation_auto_batch(formsemestre_id, nt):
+    """Décisions de jury automatiques (ADM, passage au semestre suivant)
+    pour tous les étudiants du semestre remplissant les conditions.
+    Le contexte (inscriptions, notes en attente, autorisations, codes des
+    formations des semestres antérieurs) et les infos (parcours) de tous les
+    étudiants sont chargés une seule fois. Les semestres antérieurs (et leurs
+    décisions) sont lus via les NotesTable, chargées une fois par requête.
+    Les décisions sont enregistrées dans une seule transaction,
+    et le cache n'est invalidé qu'à la fin.
+    Returns: nb de validations, liste des étudiants en conflit
+    (décisions différentes déjà saisies).
+    """
+    sem = nt.sem
+    next_semestre_id = sem["semestre_id"] + 1
+    cnx = ndb.GetDBConnexion()
+    # Contexte partagé par tous les étudiants:
+    etudids_attente = nt.get_etudids_with_notes_attente()
+    autorisations_by_etudid = collections.defaultdict(list)
+    for autorisation in sco_parcours_dut.scolar_autorisation_inscription_list(
+        cnx, {"origin_formsemestre_id": formsemestre_id}
+    ):
+        autorisations_by_etudid[autorisation["etudid"]].append(autorisation)
+    formation_codes = {}  # formation_id : formation_code, partagé par les parcours
+    # Infos (avec inscriptions aux semestres) des étudiants candidats:
+    etudids = [
+        etudid
+        for etudid in nt.get_etudids()
+        if nt.inscrdict[etudid]["etat"] == "I" and etudid not in etudids_attente
+    ]
+    etuds = sco_etud.etudident_list_many(cnx, etudids)
+    sco_etud.fill_etuds_info(list(etuds.values()))
+    decision_adm = sco_parcours_dut.DecisionSem(
+        code_etat=ADM,
+        new_code_prev="",
+        devenir="NEXT",
+        assiduite=True,
+    )
+    nb_valid = 0
+    conflicts = []  # liste des etudiants avec decision differente déjà saisie
+    with sco_cache.DefferedSemCacheManager():
+        try:
+            for etudid in etudids:
+                # Conditions pour validation automatique:
+                etud = etuds[etudid]
+                Se = sco_parcours_dut.SituationEtudParcours(
+                    etud, formsemestre_id, formation_codes=formation_codes
+                )
+                if not (
+                    (
+                        (not Se.prev)
+                        or (
+                            Se.prev_decision
+                            and Se.prev_decision["code"] in (ADM, ADC, ADJ)
+                        )
+                    )
+                    and Se.barre_moy_ok
+                    and Se.barres_ue_ok
+                ):
+                    continue
+                # check: s'il existe une decision ou autorisation et qu'elles sont differentes,
+                # warning (et ne fait rien)
+                decision_sem = nt.get_etud_decision_sem(etudid)
+                if decision_sem and decision_sem["code"] != ADM:
+                    conflicts.append(etud)
+                    continue
+                autorisations = autorisations_by_etudid[etudid]
+                if (
+                    len(autorisations) != 0
+                ):  # accepte le cas ou il n'y a pas d'autorisation : BUG 23/6/7, A RETIRER ENSUITE
+                    if (
+                        len(autorisations) != 1
+                        or autorisations[0]["semestre_id"] != next_semestre_id
+                    ):
+                        conflicts.append(etud)
+                        continue
+                # ok, valide !
+                Se.valide_decision(decision_adm, commit=False)
+                nb_valid += 1
+            cnx.commit()
+        except:
+            cnx.rollback()
+            raise
+    return nb_valid, conflicts
+
+
 def do_formsemestre_validation_auto(formsemestre_id):
     "Saisie automatisee des decisions d'un semestre"
     sem = sco_formsemestre.get_formsemestre(formsemestre_id)
-    next_semestre_id = sem["semestre_id"] + 1
     nt = sco_cache.NotesTableCache.get(
         formsemestre_id
     )  # > get_etudids, get_etud_decision_sem,
     etudids = nt.get_etudids()
-    nb_valid = 0
-    conflicts = []  # liste des etudiants avec decision differente déjà saisie
-    for etudid in etudids:
-        etud = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
-        Se = sco_parcours_dut.SituationEtudParcours(etud, formsemestre_id)
-        ins = sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
-            {"etudid": etudid, "formsemestre_id": formsemestre_id}
-        )[0]
-
-        # Conditions pour validation automatique:
-        if ins["etat"] == "I" and (
-            (
-                (not Se.prev)
-                or (Se.prev_decision and Se.prev_decision["code"] in (ADM, ADC, ADJ))
-            )
-            and Se.barre_moy_ok
-            and Se.barres_ue_ok
-            and not nt.etud_has_notes_attente(etudid)
-        ):
-            # check: s'il existe une decision ou autorisation et qu'elles sont differentes,
-            # warning (et ne fait rien)
-            decision_sem = nt.get_etud_decision_sem(etudid)
-            ok = True
-            if decision_sem and decision_sem["code"] != ADM:
-                ok = False
-                conflicts.append(etud)
-            autorisations = sco_parcours_dut.formsemestre_get_autorisation_inscription(
-                etudid, formsemestre_id
-            )
-            if (
-                len(autorisations) != 0
-            ):  # accepte le cas ou il n'y a pas d'autorisation : BUG 23/6/7, A RETIRER ENSUITE
-                if (
-                    len(autorisations) != 1
-                    or autorisations[0]["semestre_id"] != next_semestre_id
-                ):
-                    if ok:
-                        conflicts.append(etud)
-                        ok = False
-
-            # ok, valide !
-            if ok:
-                formsemestre_validation_etud_manu(
-                    formsemestre_id,
-                    etudid,
-                    code_etat=ADM,
-                    devenir="NEXT",
-                    assidu=True,
-                    redirect=False,
-                )
-                nb_valid += 1
+    t0 = time.time()
+    nb_valid, conflicts = formsemestre_validation_auto_batch(formsemestre_id, nt)
+    duration = time.time() - t0
     log(
-        "do_formsemestre_validation_auto: %d validations, %d conflicts"
-        % (nb_valid, len(conflicts))
+        "do_formsemestre_validation_auto: %d validations, %d conflicts (%.1f/s)"
+        % (nb_valid, len(conflicts), nb_valid / duration if duration else 0.0)
     )
     H = [html_sco_header.sco_header(page_title="Saisie automatique")]
     H.append(
         """<h2>Saisie automatique des décisions du semestre %s</h2>
     <p>Opération effectuée.</p>
-    <p>%d étudiants validés (sur %s)</p>"""
-        % (sem["titreannee"], nb_valid, len(etudids))
+    <p>%d étudiants validés (sur %s) en %.2gs</p>"""
+        % (sem["titreannee"], nb_valid, len(etudids), duration)
     )
     if conflicts:
         H.append(
@@ -0,0 +1,156 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+##############################################################################
+#
+# Gestion scolarite IUT
+#
+# Copyright (c) 1999 - 2021 Emmanuel Viennet.  All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#   Emmanuel Viennet      emmanuel.viennet@viennet.net
+#
+##############################################################################
+
+"""Résultats figés des semestres verrouillés
+
+Un semestre verrouillé (etat faux) ne change plus: ses résultats (moyennes
+générales et d'UE, rangs, décisions de jury, ECTS, c'est à dire sa NotesTable)
+sont enregistrés sur disque lors du verrouillage, dans
+.../var/scodoc/results/<dept_id>/<formsemestre_id>.pickle.gz
+
+NotesTableCache.get les relit lorsque la table n'est pas dans le cache
+(REDIS), au lieu de la recalculer: les consommateurs inter-semestres
+(parcours, jury, suivi de cohortes, poursuites d'études, export Apogée)
+ne recalculent plus les anciens semestres lorsque le cache a été vidé.
+
+Les résultats figés ne sont pas effacés par le vidage du cache, mais
+par le déverrouillage du semestre ou une invalidation explicite de
+ce semestre (sco_cache.invalidate_formsemestre(formsemestre_id)).
+Une invalidation globale (sco_cache.invalidate_formsemestre(), par exemple
+après modification des préférences) efface ceux de tout le département.
+Ils sont aussi ignorés après une mise à jour de ScoDoc (version différente).
+"""
+
+import glob
+import gzip
+import os
+import pickle
+import tempfile
+import traceback
+
+from flask import g
+
+from config import Config
+
+from app import log
+from app.scodoc import sco_formsemestre
+import app.scodoc.sco_utils as scu
+
+RESULTS_DIR = os.path.join(Config.SCODOC_VAR_DIR, "results")
+
+# attributs du semestre vérifiés à la relecture
+# (évite d'utiliser les résultats d'un autre semestre de même id, après ré-initialisation
+# de la base)
+_SEM_CHECKED_FIELDS = (
+    "formation_id",
+    "semestre_id",
+    "titre",
+    "date_debut",
+    "date_fin",
+)
+
+
+def _results_dir() -> str:
+    return os.path.join(RESULTS_DIR, str(g.scodoc_dept_id))
+
+
+def _results_filename(formsemestre_id) -> str:
+    return os.path.join(_results_dir(), str(formsemestre_id) + ".pickle.gz")
+
+
+def get(formsemestre_id):
+    """Résultats figés de ce semestre (NotesTable), ou None"""
+    filename = _results_filename(formsemestre_id)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with gzip.open(filename, "rb") as f:
+            version, nt = pickle.load(f)
+    except:
+        log(f"sco_frozen_results: can't read {filename}")
+        log(traceback.format_exc())
+        delete(formsemestre_id)
+        return None
+    if version != scu.get_scodoc_version():
+        log(f"sco_frozen_results: ignoring {filename} (version {version})")
+        delete(formsemestre_id)
+        return None
+    sem = sco_formsemestre.get_formsemestre(formsemestre_id)
+    if sem["etat"] or any(nt.sem[k] != sem[k] for k in _SEM_CHECKED_FIELDS):
+        log(f"sco_frozen_results: ignoring {filename} (semestre modifié)")
+        delete(formsemestre_id)
+        return None
+    return nt
+
+
+def store(nt):
+    """Enregistre les résultats de ce semestre, qui doit être verrouillé"""
+    if nt.sem["etat"]:
+        raise ValueError("sco_frozen_results: semestre non verrouillé")
+    filename = _results_filename(nt.formsemestre_id)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # fichier temporaire unique: plusieurs processus peuvent figer ce semestre
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            pickle.dump((scu.get_scodoc_version(), nt), f)
+        os.replace(tmp_filename, filename)
+    except:
+        try:
+            os.remove(tmp_filename)
+        except FileNotFoundError:
+            pass
+        raise
+    log(f"sco_frozen_results: stored {filename}")
+
+
+def delete(formsemestre_id):
+    """Efface les résultats figés de ce semestre (s'ils existent)"""
+    filename = _results_filename(formsemestre_id)
+    if os.path.exists(filename):
+        log(f"sco_frozen_results: removing {filename}")
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass  # removed by another process
+
+
+def delete_many(formsemestre_ids):
+    for formsemestre_id in formsemestre_ids:
+        delete(formsemestre_id)
+
+
+def delete_all():
+    """Efface tous les résultats figés du département courant"""
+    filenames = glob.glob(os.path.join(_results_dir(), "*.pickle.gz"))
+    if filenames:
+        log(f"sco_frozen_results: removing {len(filenames)} files")
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass  # removed by another process
@@ -48,7 +48,7 @@ from flask import url_for, make_response
 import app.scodoc.sco_utils as scu
 import app.scodoc.notesdb as ndb
 from app import log, cache
-from app.scodoc.scolog import logdb
+from app.scodoc.scolog import logdb, logdb_many
 from app.scodoc import html_sco_header
 from app.scodoc import sco_codes_parcours
 from app.scodoc import sco_cache
@@ -604,10 +604,38 @@ def set_group(etudid, group_id):
     return True
 
 
+def set_groups(memberships):
+    """Inscriptions en masse aux groupes:
+    memberships est une liste de couples (etudid, group_id).
+    Ignore les inscriptions déjà existantes.
+    Warning: don't check if group_id exists (the caller should check).
+    """
+    cnx = ndb.GetDBConnexion()
+    ndb.DBInsertDicts(
+        cnx,
+        "group_membership",
+        [
+            {"etudid": etudid, "group_id": group_id}
+            for (etudid, group_id) in memberships
+        ],
+        return_id=False,
+        ignore_conflicts=True,
+    )
+
+
 def change_etud_group_in_partition(etudid, group_id, partition=None):
     """Inscrit etud au groupe de cette partition, et le desinscrit d'autres groupes de cette partition."""
     log("change_etud_group_in_partition: etudid=%s group_id=%s" % (etudid, group_id))
+    change_etuds_group_in_partition([etudid], group_id, partition=partition)
+
 
+def change_etuds_group_in_partition(etudids, group_id, partition=None):
+    """Inscrit les étudiants au groupe de cette partition,
+    et les desinscrit des autres groupes de cette partition.
+    """
+    etudids = [int(etudid) for etudid in etudids]
+    if not etudids:
+        return
     # 0- La partition
     group = get_group(group_id)
     if partition:
@@ -624,25 +652,24 @@ def change_etud_group_in_partition(etudid, group_id, partition=None):
         """DELETE FROM group_membership gm
         WHERE EXISTS
         (SELECT 1 FROM  group_descr gd
-            WHERE gm.etudid = %(etudid)s
+            WHERE gm.etudid = ANY(%(etudids)s)
             AND gm.group_id = gd.id
             AND gd.partition_id = %(partition_id)s)
         """,
-        {"etudid": etudid, "partition_id": partition["partition_id"]},
+        {"etudids": etudids, "partition_id": partition["partition_id"]},
     )
     # 2- associe au nouveau groupe
-    set_group(etudid, group_id)
+    set_groups([(etudid, group_id) for etudid in etudids])
 
     # 3- log
     formsemestre_id = partition["formsemestre_id"]
     cnx = ndb.GetDBConnexion()
-    logdb(
-        cnx,
-        method="changeGroup",
-        etudid=etudid,
-        msg="formsemestre_id=%s,partition_name=%s, group_name=%s"
-        % (formsemestre_id, partition["partition_name"], group["group_name"]),
+    msg = "formsemestre_id=%s,partition_name=%s, group_name=%s" % (
+        formsemestre_id,
+        partition["partition_name"],
+        group["group_name"],
     )
+    logdb_many(cnx, [("changeGroup", etudid, msg) for etudid in etudids])
     cnx.commit()
     # 4- invalidate cache
     sco_cache.invalidate_formsemestre(
@@ -688,6 +715,7 @@ def setGroups(
         old_members = get_group_members(group_id)
         old_members_set = set([x["etudid"] for x in old_members])
         # Place dans ce groupe les etudiants indiqués:
+        moved_etudids = []
         for etudid_str in fs[1:-1]:
             etudid = int(etudid_str)
             if etudid in old_members_set:
@@ -697,23 +725,24 @@ def setGroups(
             if (etudid not in etud_groups) or (
                 group_id != etud_groups[etudid].get(partition_id, "")
             ):  # pas le meme groupe qu'actuel
-                change_etud_group_in_partition(etudid, group_id, partition)
+                moved_etudids.append(etudid)
+        change_etuds_group_in_partition(moved_etudids, group_id, partition)
         # Retire les anciens membres:
-        cnx = ndb.GetDBConnexion()
-        cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
-        for etudid in old_members_set:
-            log("removing %s from group %s" % (etudid, group_id))
+        if old_members_set:
+            cnx = ndb.GetDBConnexion()
+            log("removing %s from group %s" % (old_members_set, group_id))
             ndb.SimpleQuery(
-                "DELETE FROM group_membership WHERE etudid=%(etudid)s and group_id=%(group_id)s",
-                {"etudid": etudid, "group_id": group_id},
-                cursor=cursor,
+                """DELETE FROM group_membership
+                WHERE etudid = ANY(%(etudids)s) and group_id=%(group_id)s""",
+                {"etudids": list(old_members_set), "group_id": group_id},
             )
-            logdb(
-                cnx,
-                method="removeFromGroup",
-                etudid=etudid,
-                msg="formsemestre_id=%s,partition_name=%s, group_name=%s"
-                % (formsemestre_id, partition["partition_name"], group["group_name"]),
+            msg = "formsemestre_id=%s,partition_name=%s, group_name=%s" % (
+                formsemestre_id,
+                partition["partition_name"],
+                group["group_name"],
+            )
+            logdb_many(
+                cnx, [("removeFromGroup", etudid, msg) for etudid in old_members_set]
             )
 
     # Supprime les groupes indiqués comme supprimés:
@@ -728,8 +757,7 @@ def setGroups(
             continue
         group_id = create_group(partition_id, group_name)
         # Place dans ce groupe les etudiants indiqués:
-        for etudid in fs[1:-1]:
-            change_etud_group_in_partition(etudid, group_id, partition)
+        change_etuds_group_in_partition(fs[1:-1], group_id, partition)
 
     data = (
         '<?xml version="1.0" encoding="utf-8"?><response>Groupes enregistrés</response>'
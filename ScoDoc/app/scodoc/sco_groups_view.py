@@ -490,7 +490,14 @@ def groups_table(
     if with_paiement:
         columns_ids += ["datefinalisationinscription_str", "paiementinscription_str"]
     if with_paiement:  #  or with_codes:
-        sco_portal_apogee.check_paiement_etuds(groups_infos.members)
+        sem = groups_infos.formsemestre
+        anneeapogee = scu.annee_scolaire_debut(
+            sem["annee_debut"], sem["mois_debut_ord"]
+        )
+        sco_portal_apogee.check_paiement_etuds(
+            groups_infos.members,
+            etapes_annees=[(etape, anneeapogee) for etape in sem["etapes"] if etape],
+        )
     if with_archives:
         from app.scodoc import sco_archives_etud
 
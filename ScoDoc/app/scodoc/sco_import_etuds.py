@@ -42,7 +42,7 @@ import app.scodoc.notesdb as ndb
 from app import log
 from app.scodoc.sco_excel import COLORS
 from app.scodoc.sco_formsemestre_inscriptions import (
-    do_formsemestre_inscription_with_modules,
+    do_formsemestre_inscriptions_with_modules,
 )
 from app.scodoc.gen_tables import GenTable
 from app.scodoc.sco_exceptions import (
@@ -260,20 +260,25 @@ def scolars_import_excel_file(
 ):
     """Importe etudiants depuis fichier Excel
     et les inscrit dans le semestre indiqué (et à TOUS ses modules)
+
+    1- validation: lit la feuille ligne à ligne, puis vérifie les codes NIP et
+    INE, les homonymes, les semestres et groupes de tous les étudiants avec
+    quelques requêtes. Toutes les erreurs sont signalées ensemble.
+    2- écriture en masse, dans une seule transaction.
     """
     log("scolars_import_excel_file: formsemestre_id=%s" % formsemestre_id)
     cnx = ndb.GetDBConnexion(autocommit=False)
-    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
     annee_courante = time.localtime()[0]
     always_require_ine = sco_preferences.get_preference("always_require_ine")
     exceldata = datafile.read()
     if not exceldata:
         raise ScoValueError("Ficher excel vide ou invalide")
-    diag, data = sco_excel.excel_bytes_to_list(exceldata)
-    if not data:  # probably a bug
+    diag = []
+    rows = sco_excel.excel_bytes_iter_rows(exceldata, diag)
+    _, title_line = next(rows, (None, None))
+    if not title_line:  # probably a bug
         raise ScoException("scolars_import_excel_file: empty file !")
 
-    formsemestre_to_invalidate = set()
     # 1-  --- check title line
     titles = {}
     fmt = sco_import_format()
@@ -287,10 +292,9 @@ def scolars_import_excel_file(
     # log("titles=%s" % titles)
     # remove quotes, downcase and keep only 1st word
     try:
-        fs = [scu.stripquotes(s).lower().split()[0] for s in data[0]]
+        fs = [scu.stripquotes(s).lower().split()[0] for s in title_line]
     except:
         raise ScoValueError("Titres de colonnes invalides (ou vides ?)")
-    # log("excel: fs='%s'\ndata=%s" % (str(fs), str(data)))
 
     # check columns titles
     if len(fs) != len(titles):
@@ -311,126 +315,56 @@ def scolars_import_excel_file(
             raise ScoValueError('Colonne invalide: "%s"' % t)
         titleslist.append(t)  #
     # ok, same titles
-    # Start inserting data, abort whole transaction in case of error
+    # 2- --- Validation: lit et vérifie toutes les lignes, sans rien écrire
+    t0 = time.time()
+    errors = []  # liste des erreurs (toutes signalées à la fin de la validation)
+    students = []  # (linenum, values) des étudiants à importer
+    for rownum, line in rows:
+        # numérotation des lignes de données (comme avant: la ligne 2 de la
+        # feuille est la ligne 1), y compris les lignes vides ignorées
+        linenum = rownum - 1
+        values = _convert_line(
+            line, linenum, titles, titleslist, always_require_ine, errors
+        )
+        if values is not None:
+            students.append((linenum, values))
+    students, NbImportedHomonyms = _check_students(
+        cnx, students, require_ine, errors
+    )
+    sems_groups = _get_students_sems_groups(formsemestre_id, students, errors)
+    log(
+        "scolars_import_excel_file: %d lines checked in %.2fs, %d errors"
+        % (len(students), time.time() - t0, len(errors))
+    )
+    if errors:
+        raise ScoValueError(
+            "<p>Le fichier comporte %d erreur(s), aucun étudiant importé:</p><ul><li>%s</li></ul>"
+            % (len(errors), "</li><li>".join(errors))
+        )
+    # Verification proportion d'homonymes: si > 10%, abandonne
+    log("scolars_import_excel_file: detected %d homonyms" % NbImportedHomonyms)
+    if check_homonyms and NbImportedHomonyms > len(students) / 10:
+        log("scolars_import_excel_file: too many homonyms")
+        raise ScoValueError(
+            "Il y a trop d'homonymes (%d étudiants)" % NbImportedHomonyms
+        )
+
+    # 3- --- Ecriture, abort whole transaction in case of error
     created_etudids = []
-    NbImportedHomonyms = 0
-    GroupIdInferers = {}
     try:  # --- begin DB transaction
-        linenum = 0
-        for line in data[1:]:
-            linenum += 1
-            # Read fields, check and convert type
-            values = {}
-            fs = line
-            # remove quotes
-            for i in range(len(fs)):
-                if fs[i] and (
-                    (fs[i][0] == '"' and fs[i][-1] == '"')
-                    or (fs[i][0] == "'" and fs[i][-1] == "'")
-                ):
-                    fs[i] = fs[i][1:-1]
-            for i in range(len(fs)):
-                val = fs[i].strip()
-                typ, table, an, descr, aliases = tuple(titles[titleslist[i]])
-                # log('field %s: %s %s %s %s'%(titleslist[i], table, typ, an, descr))
-                if not val and not an:
-                    raise ScoValueError(
-                        "line %d: null value not allowed in column %s"
-                        % (linenum, titleslist[i])
-                    )
-                if val == "":
-                    val = None
-                else:
-                    if typ == "real":
-                        val = val.replace(",", ".")  # si virgule a la française
-                        try:
-                            val = float(val)
-                        except:
-                            raise ScoValueError(
-                                "valeur nombre reel invalide (%s) sur line %d, colonne %s"
-                                % (val, linenum, titleslist[i])
-                            )
-                    elif typ == "integer":
-                        try:
-                            # on doit accepter des valeurs comme "2006.0"
-                            val = val.replace(",", ".")  # si virgule a la française
-                            val = float(val)
-                            if val % 1.0 > 1e-4:
-                                raise ValueError()
-                            val = int(val)
-                        except:
-                            raise ScoValueError(
-                                "valeur nombre entier invalide (%s) sur ligne %d, colonne %s"
-                                % (val, linenum, titleslist[i])
-                            )
-                # xxx Ad-hoc checks (should be in format description)
-                if titleslist[i].lower() == "sexe":
-                    try:
-                        val = sco_etud.input_civilite(val)
-                    except:
-                        raise ScoValueError(
-                            "valeur invalide pour 'SEXE' (doit etre 'M', 'F', ou 'MME', 'H', 'X' ou vide, mais pas '%s') ligne %d, colonne %s"
-                            % (val, linenum, titleslist[i])
-                        )
-                # Excel date conversion:
-                if titleslist[i].lower() == "date_naissance":
-                    if val:
-                        try:
-                            val = sco_excel.xldate_as_datetime(val)
-                        except ValueError:
-                            raise ScoValueError(
-                                f"date invalide ({val}) sur ligne {linenum}, colonne {titleslist[i]}"
-                            )
-                # INE
-                if (
-                    titleslist[i].lower() == "code_ine"
-                    and always_require_ine
-                    and not val
-                ):
-                    raise ScoValueError(
-                        "Code INE manquant sur ligne %d, colonne %s"
-                        % (linenum, titleslist[i])
-                    )
-
-                # --
-                values[titleslist[i]] = val
-            skip = False
-            is_new_ine = values["code_ine"] and _is_new_ine(cnx, values["code_ine"])
-            if require_ine and not is_new_ine:
-                log("skipping %s (code_ine=%s)" % (values["nom"], values["code_ine"]))
-                skip = True
-
-            if not skip:
-                if values["code_ine"] and not is_new_ine:
-                    raise ScoValueError("Code INE dupliqué (%s)" % values["code_ine"])
-                # Check nom/prenom
-                ok, NbHomonyms = sco_etud.check_nom_prenom(
-                    cnx, nom=values["nom"], prenom=values["prenom"]
-                )
-                if not ok:
-                    raise ScoValueError(
-                        "nom ou prénom invalide sur la ligne %d" % (linenum)
-                    )
-                if NbHomonyms:
-                    NbImportedHomonyms += 1
-                # Insert in DB tables
-                formsemestre_id_etud = _import_one_student(
-                    cnx,
-                    formsemestre_id,
-                    values,
-                    GroupIdInferers,
-                    annee_courante,
-                    created_etudids,
-                    linenum,
-                )
-
-        # Verification proportion d'homonymes: si > 10%, abandonne
-        log("scolars_import_excel_file: detected %d homonyms" % NbImportedHomonyms)
-        if check_homonyms and NbImportedHomonyms > len(created_etudids) / 10:
-            log("scolars_import_excel_file: too many homonyms")
-            raise ScoValueError(
-                "Il y a trop d'homonymes (%d étudiants)" % NbImportedHomonyms
-            )
+        # Insert in DB tables
+        t0 = time.time()
+        formsemestre_to_invalidate = _import_students(
+            cnx,
+            students,
+            sems_groups,
+            annee_courante,
+            created_etudids,
+        )
+        log(
+            "scolars_import_excel_file: %d students imported in %.2fs"
+            % (len(created_etudids), time.time() - t0)
+        )
     except:
         cnx.rollback()
         log("scolars_import_excel_file: aborting transaction !")
@@ -512,77 +446,246 @@ def students_import_admission(
         return "\n".join(H) + html_sco_header.sco_footer()
 
 
-def _import_one_student(
+def _convert_line(line, linenum, titles, titleslist, always_require_ine, errors):
+    """Lit une ligne de la feuille: vérifie et convertit les valeurs.
+    Les erreurs sont ajoutées à la liste errors.
+    Return: dict { titre : valeur }, ou None si la ligne est invalide.
+    """
+    nb_errors = len(errors)
+    values = {}
+    fs = (line + [""] * len(titleslist))[: len(titleslist)]
+    # remove quotes
+    for i in range(len(fs)):
+        if fs[i] and (
+            (fs[i][0] == '"' and fs[i][-1] == '"')
+            or (fs[i][0] == "'" and fs[i][-1] == "'")
+        ):
+            fs[i] = fs[i][1:-1]
+    for i in range(len(fs)):
+        val = fs[i].strip()
+        typ, table, an, descr, aliases = tuple(titles[titleslist[i]])
+        # log('field %s: %s %s %s %s'%(titleslist[i], table, typ, an, descr))
+        if not val and not an:
+            errors.append(
+                "line %d: null value not allowed in column %s"
+                % (linenum, titleslist[i])
+            )
+            continue
+        if val == "":
+            val = None
+        else:
+            if typ == "real":
+                val = val.replace(",", ".")  # si virgule a la française
+                try:
+                    val = float(val)
+                except:
+                    errors.append(
+                        "valeur nombre reel invalide (%s) sur line %d, colonne %s"
+                        % (val, linenum, titleslist[i])
+                    )
+                    continue
+            elif typ == "integer":
+                try:
+                    # on doit accepter des valeurs comme "2006.0"
+                    val = val.replace(",", ".")  # si virgule a la française
+                    val = float(val)
+                    if val % 1.0 > 1e-4:
+                        raise ValueError()
+                    val = int(val)
+                except:
+                    errors.append(
+                        "valeur nombre entier invalide (%s) sur ligne %d, colonne %s"
+                        % (val, linenum, titleslist[i])
+                    )
+                    continue
+        # xxx Ad-hoc checks (should be in format description)
+        if titleslist[i].lower() == "sexe":
+            try:
+                val = sco_etud.input_civilite(val)
+            except:
+                errors.append(
+                    "valeur invalide pour 'SEXE' (doit etre 'M', 'F', ou 'MME', 'H', 'X' ou vide, mais pas '%s') ligne %d, colonne %s"
+                    % (val, linenum, titleslist[i])
+                )
+                continue
+        # Excel date conversion:
+        if titleslist[i].lower() == "date_naissance":
+            if val:
+                try:
+                    val = sco_excel.xldate_as_datetime(val)
+                except ValueError:
+                    errors.append(
+                        f"date invalide ({val}) sur ligne {linenum}, colonne {titleslist[i]}"
+                    )
+                    continue
+        # INE
+        if titleslist[i].lower() == "code_ine" and always_require_ine and not val:
+            errors.append(
+                "Code INE manquant sur ligne %d, colonne %s" % (linenum, titleslist[i])
+            )
+            continue
+        # --
+        values[titleslist[i]] = val
+    if len(errors) > nb_errors:
+        return None
+    return values
+
+
+def _check_students(cnx, students, require_ine, errors):
+    """Vérifications ensemblistes des étudiants à importer
+    (liste de couples (linenum, values)):
+    codes INE et NIP non dupliqués (dans le fichier et dans la base),
+    noms et prénoms valides, nombre d'homonymes.
+    Les erreurs sont ajoutées à la liste errors.
+    Return: étudiants à importer, nombre d'étudiants ayant des homonymes
+    """
+    # INE et NIP déjà utilisés dans ce département:
+    codes_in_use = {
+        code_name: sco_etud.codes_in_use(
+            cnx,
+            code_name,
+            [values[code_name] for (_, values) in students if values.get(code_name)],
+        )
+        for code_name in ("code_ine", "code_nip")
+    }
+    checked_students = []
+    for (linenum, values) in students:
+        code_ine = values.get("code_ine")
+        if require_ine and (not code_ine or str(code_ine) in codes_in_use["code_ine"]):
+            log("skipping %s (code_ine=%s)" % (values["nom"], code_ine))
+            continue
+        checked_students.append((linenum, values))
+    # Codes dupliqués:
+    for code_name, code_label in (("code_ine", "INE"), ("code_nip", "NIP")):
+        lines_by_code = collections.defaultdict(list)
+        for (linenum, values) in checked_students:
+            if values.get(code_name):
+                lines_by_code[str(values[code_name])].append(linenum)
+        for code, linenums in lines_by_code.items():
+            if code in codes_in_use[code_name]:
+                errors.append(
+                    "Code %s dupliqué (%s) sur ligne %s: déjà utilisé"
+                    % (code_label, code, ", ".join(str(l) for l in linenums))
+                )
+            elif len(linenums) > 1:
+                errors.append(
+                    "Code %s dupliqué (%s) sur les lignes %s"
+                    % (code_label, code, ", ".join(str(l) for l in linenums))
+                )
+    # Check nom/prenom
+    NbImportedHomonyms = 0
+    checks = sco_etud.check_nom_prenom_many(
+        cnx,
+        [(values["nom"], values["prenom"]) for (_, values) in checked_students],
+    )
+    for ((linenum, _), (ok, NbHomonyms)) in zip(checked_students, checks):
+        if not ok:
+            errors.append("nom ou prénom invalide sur la ligne %d" % (linenum))
+        if NbHomonyms:
+            NbImportedHomonyms += 1
+    return checked_students, NbImportedHomonyms
+
+
+def _get_students_sems_groups(formsemestre_id, students, errors) -> list:
+    """Semestre et groupes de chaque étudiant à importer.
+    Les erreurs sont ajoutées à la liste errors.
+    Return: liste de couples (formsemestre_id, [group_id, ...]),
+    dans l'ordre de students.
+    """
+    GroupIdInferers = {}  # formsemestre_id : GroupIdInferer (None si invalide)
+    sems_groups = []
+    for (linenum, values) in students:
+        if formsemestre_id:
+            formsemestre_id_etud = formsemestre_id
+        else:
+            formsemestre_id_etud = values["codesemestre"]
+        try:
+            formsemestre_id_etud = int(formsemestre_id_etud)
+        except (ValueError, TypeError):
+            errors.append(
+                f"valeur invalide dans la colonne codesemestre, ligne {linenum+1}"
+            )
+            sems_groups.append((None, []))
+            continue
+        # recupere liste des groupes:
+        if formsemestre_id_etud not in GroupIdInferers:
+            sems = sco_formsemestre.do_formsemestre_list(
+                {"formsemestre_id": formsemestre_id_etud}
+            )
+            if not sems:
+                GroupIdInferers[formsemestre_id_etud] = None
+                errors.append(f"code de semestre invalide: {formsemestre_id_etud}")
+            elif not sems[0]["etat"]:
+                GroupIdInferers[formsemestre_id_etud] = None
+                errors.append(
+                    f"inscription: semestre {formsemestre_id_etud} verrouillé"
+                )
+            else:
+                GroupIdInferers[formsemestre_id_etud] = sco_groups.GroupIdInferer(
+                    formsemestre_id_etud
+                )
+        gi = GroupIdInferers[formsemestre_id_etud]
+        if gi is None:
+            sems_groups.append((None, []))
+            continue
+        if values.get("groupes"):
+            groupes = values["groupes"].split(";")
+        else:
+            groupes = []
+        group_ids = [gi[group_name] for group_name in groupes]
+        group_ids = list({}.fromkeys(group_ids).keys())  # uniq
+        if None in group_ids:
+            errors.append(
+                "groupe invalide sur la ligne %d (groupe %s)" % (linenum, groupes)
+            )
+        sems_groups.append((formsemestre_id_etud, group_ids))
+    return sems_groups
+
+
+def _import_students(
     cnx,
-    formsemestre_id,
-    values,
-    GroupIdInferers,
+    students,
+    sems_groups,
     annee_courante,
     created_etudids,
-    linenum,
-) -> int:
+) -> set:
     """
-    Import d'un étudiant et inscription dans le semestre.
-    Return: id du semestre dans lequel il a été inscrit.
+    Import des étudiants (liste de couples (linenum, values)) et inscription
+    dans les semestres (sems_groups: liste de couples (formsemestre_id, group_ids)),
+    avec des requêtes multi-lignes. Ne commite pas.
+    Return: ensemble des ids des semestres dans lesquels on a inscrit.
     """
+    sem_etuds = collections.defaultdict(list)  # formsemestre_id : [ index ]
+    for i, (formsemestre_id_etud, _) in enumerate(sems_groups):
+        sem_etuds[formsemestre_id_etud].append(i)
     log(
-        "scolars_import_excel_file: formsemestre_id=%s values=%s"
-        % (formsemestre_id, str(values))
+        "scolars_import_excel_file: importing %d students in formsemestres %s"
+        % (len(students), list(sem_etuds.keys()))
     )
     # Identite
-    args = values.copy()
-    etudid = sco_etud.identite_create(cnx, args)
-    created_etudids.append(etudid)
+    args_list = [values.copy() for (_, values) in students]
+    etudids = sco_etud.identite_create_many(cnx, args_list, commit=False)
+    created_etudids.extend(etudids)
     # Admissions
-    args["etudid"] = etudid
-    args["annee"] = annee_courante
-    _ = sco_etud.admission_create(cnx, args)
+    for args, etudid in zip(args_list, etudids):
+        args["etudid"] = etudid
+        args["annee"] = annee_courante
+    sco_etud.admission_create_many(cnx, args_list, commit=False)
     # Adresse
-    args["typeadresse"] = "domicile"
-    args["description"] = "(infos admission)"
-    _ = sco_etud.adresse_create(cnx, args)
-    # Inscription au semestre
-    args["etat"] = "I"  # etat insc. semestre
-    if formsemestre_id:
-        args["formsemestre_id"] = formsemestre_id
-    else:
-        args["formsemestre_id"] = values["codesemestre"]
-        formsemestre_id = values["codesemestre"]
-    try:
-        formsemestre_id = int(formsemestre_id)
-    except ValueError as exc:
-        raise ScoValueError(
-            f"valeur invalide dans la colonne codesemestre, ligne {linenum+1}"
-        ) from exc
-    # recupere liste des groupes:
-    if formsemestre_id not in GroupIdInferers:
-        GroupIdInferers[formsemestre_id] = sco_groups.GroupIdInferer(formsemestre_id)
-    gi = GroupIdInferers[formsemestre_id]
-    if args["groupes"]:
-        groupes = args["groupes"].split(";")
-    else:
-        groupes = []
-    group_ids = [gi[group_name] for group_name in groupes]
-    group_ids = list({}.fromkeys(group_ids).keys())  # uniq
-    if None in group_ids:
-        raise ScoValueError(
-            "groupe invalide sur la ligne %d (groupe %s)" % (linenum, groupes)
+    for args in args_list:
+        args["typeadresse"] = "domicile"
+        args["description"] = "(infos admission)"
+    sco_etud.adresse_create_many(cnx, args_list, commit=False)
+    # Inscription aux semestres
+    for formsemestre_id_etud, indices in sem_etuds.items():
+        do_formsemestre_inscriptions_with_modules(
+            formsemestre_id_etud,
+            [(etudids[i], sems_groups[i][1]) for i in indices],
+            etat="I",
+            method="import_csv_file",
+            commit=False,
         )
-
-    do_formsemestre_inscription_with_modules(
-        int(args["formsemestre_id"]),
-        etudid,
-        group_ids,
-        etat="I",
-        method="import_csv_file",
-    )
-    return args["formsemestre_id"]
-
-
-def _is_new_ine(cnx, code_ine):
-    "True if this code is not in DB"
-    etuds = sco_etud.identite_list(cnx, {"code_ine": code_ine})
-    return not etuds
+    return set(sem_etuds.keys())
 
 
 # ------ Fonction ré-écrite en nov 2016 pour lire des fichiers sans etudid (fichiers APB)
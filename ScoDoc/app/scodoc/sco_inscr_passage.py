@@ -28,6 +28,7 @@
 """Form. pour inscription rapide des etudiants d'un semestre dans un autre
    Utilise les autorisations d'inscription délivrées en jury.
 """
+import collections
 import datetime
 from operator import itemgetter
 
@@ -118,10 +119,19 @@ def list_inscrits(formsemestre_id, with_dems=False):
     else:
         args = {"formsemestre_id": formsemestre_id}
         ins = sco_formsemestre_inscriptions.do_formsemestre_inscription_list(args=args)
+    # identités de tous les étudiants, en quelques requêtes:
+    cnx = ndb.GetDBConnexion()
+    etuds = sco_etud.etudident_list_many(cnx, [i["etudid"] for i in ins])
+    sco_etud.fill_etuds_info(list(etuds.values()))
     inscr = {}
     for i in ins:
         etudid = i["etudid"]
-        inscr[etudid] = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+        if etudid not in etuds:
+            raise ScoValueError(
+                f"étudiant inscrit introuvable (etudid {etudid}, "
+                f"semestre {formsemestre_id})"
+            )
+        inscr[etudid] = etuds[etudid]
     return inscr
 
 
@@ -169,51 +179,47 @@ def do_inscrit(sem, etudids, inscrit_groupes=False):
     En option: inscrit aux mêmes groupes que dans le semestre origine
     """
     log("do_inscrit (inscrit_groupes=%s): %s" % (inscrit_groupes, etudids))
+    sco_formsemestre_inscriptions.do_formsemestre_inscriptions_with_modules(
+        sem["formsemestre_id"],
+        [(etudid, []) for etudid in etudids],
+        etat="I",
+        method="formsemestre_inscr_passage",
+    )
+    if not inscrit_groupes:
+        return
+    # Inscription dans les mêmes groupes que ceux du semestre  d'origine,
+    # s'ils existent.
+    # (mise en correspondance à partir du nom du groupe, sans tenir compte
+    #  du nom de la partition: évidemment, cela ne marche pas si on a les
+    #   même noms de groupes dans des partitions différentes)
+    cursem_groups_by_name = dict(
+        [
+            (g["group_name"], g)
+            for g in sco_groups.get_sem_groups(sem["formsemestre_id"])
+            if g["group_name"]
+        ]
+    )
+    group_etudids = collections.defaultdict(list)  # group_id : [etudid]
     for etudid in etudids:
-        sco_formsemestre_inscriptions.do_formsemestre_inscription_with_modules(
-            sem["formsemestre_id"],
-            etudid,
-            etat="I",
-            method="formsemestre_inscr_passage",
-        )
-        if inscrit_groupes:
-            # Inscription dans les mêmes groupes que ceux du semestre  d'origine,
-            # s'ils existent.
-            # (mise en correspondance à partir du nom du groupe, sans tenir compte
-            #  du nom de la partition: évidemment, cela ne marche pas si on a les
-            #   même noms de groupes dans des partitions différentes)
-            etud = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
-            log("cherche groupes de %(nom)s" % etud)
-
-            # recherche le semestre origine (il serait plus propre de l'avoir conservé!)
-            if len(etud["sems"]) < 2:
-                continue
-            prev_formsemestre = etud["sems"][1]
-            sco_groups.etud_add_group_infos(etud, prev_formsemestre)
-
-            cursem_groups_by_name = dict(
-                [
-                    (g["group_name"], g)
-                    for g in sco_groups.get_sem_groups(sem["formsemestre_id"])
-                    if g["group_name"]
-                ]
-            )
+        etud = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+        log("cherche groupes de %(nom)s" % etud)
 
-            # forme la liste des groupes présents dans les deux semestres:
-            partition_groups = []  # [ partition+group ] (ds nouveau sem.)
-            for partition_id in etud["partitions"]:
-                prev_group_name = etud["partitions"][partition_id]["group_name"]
-                if prev_group_name in cursem_groups_by_name:
-                    new_group = cursem_groups_by_name[prev_group_name]
-                    partition_groups.append(new_group)
-
-            # inscrit aux groupes
-            for partition_group in partition_groups:
-                sco_groups.change_etud_group_in_partition(
-                    etudid,
-                    partition_group["group_id"],
-                    partition_group,
-                )
+        # recherche le semestre origine (il serait plus propre de l'avoir conservé!)
+        if len(etud["sems"]) < 2:
+            continue
+        prev_formsemestre = etud["sems"][1]
+        sco_groups.etud_add_group_infos(etud, prev_formsemestre)
+
+        # forme la liste des groupes présents dans les deux semestres:
+        for partition_id in etud["partitions"]:
+            prev_group_name = etud["partitions"][partition_id]["group_name"]
+            if prev_group_name in cursem_groups_by_name:
+                new_group = cursem_groups_by_name[prev_group_name]
+                group_etudids[new_group["group_id"]].append(etudid)
+
+    # inscrit aux groupes
+    for group_id, group_members in group_etudids.items():
+        sco_groups.change_etuds_group_in_partition(group_members, group_id)
 
 
 def do_desinscrit(sem, etudids):
@@ -49,6 +49,7 @@ from app.scodoc import sco_formsemestre_inscriptions
 from app.scodoc import sco_groups
 from app.scodoc import sco_moduleimpl
 from app.scodoc import sco_preferences
+from app.scodoc import sco_stats
 from app.scodoc import sco_etud
 from app.scodoc import sco_users
 import sco_version
@@ -539,10 +540,7 @@ def _add_eval_columns(
     e, rows, titles, coefs, note_max, moys, K, note_sur_20, keep_numeric
 ):
     """Add eval e"""
-    nb_notes = 0
-    nb_abs = 0
-    nb_att = 0
-    sum_notes = 0
+    vals = []  # notes affichées (et valeurs spéciales), pour les statistiques
     notes = []  # liste des notes numeriques, pour calcul histogramme uniquement
     evaluation_id = e["evaluation_id"]
     NotesDB = sco_evaluations.do_evaluation_get_all_notes(evaluation_id)
@@ -550,10 +548,6 @@ def _add_eval_columns(
         etudid = row["etudid"]
         if etudid in NotesDB:
             val = NotesDB[etudid]["value"]
-            if val is None:
-                nb_abs += 1
-            if val == scu.NOTES_ATTENTE:
-                nb_att += 1
             # calcul moyenne SANS LES ABSENTS
             if val != None and val != scu.NOTES_NEUTRALISE and val != scu.NOTES_ATTENTE:
                 if e["note_max"] > 0:
@@ -563,8 +557,7 @@ def _add_eval_columns(
                 notes.append(valsur20)  # toujours sur 20 pour l'histogramme
                 if note_sur_20:
                     val = valsur20  # affichage notes / 20 demandé
-                nb_notes = nb_notes + 1
-                sum_notes += val
+            vals.append(val)
             val_fmt = scu.fmt_note(val, keep_numeric=keep_numeric)
             comment = NotesDB[etudid]["comment"]
             if comment is None:
@@ -604,38 +597,39 @@ def _add_eval_columns(
             }
         )
 
-        coefs[evaluation_id] = "coef. %s" % e["coefficient"]
-        if note_sur_20:
-            nmax = 20.0
-        else:
-            nmax = e["note_max"]
-        if keep_numeric:
-            note_max[evaluation_id] = nmax
-        else:
-            note_max[evaluation_id] = "/ %s" % nmax
-
-        if nb_notes > 0:
-            moys[evaluation_id] = "%.3g" % (sum_notes / nb_notes)
-            moys[
-                "_" + str(evaluation_id) + "_help"
-            ] = "moyenne sur %d notes (%s le %s)" % (
-                nb_notes,
-                e["description"],
-                e["jour"],
-            )
-        else:
-            moys[evaluation_id] = ""
+    stats = sco_stats.NotesStats(vals)
+    coefs[evaluation_id] = "coef. %s" % e["coefficient"]
+    if note_sur_20:
+        nmax = 20.0
+    else:
+        nmax = e["note_max"]
+    if keep_numeric:
+        note_max[evaluation_id] = nmax
+    else:
+        note_max[evaluation_id] = "/ %s" % nmax
+
+    if stats.n > 0:
+        moys[evaluation_id] = "%.3g" % stats.mean
+        moys[
+            "_" + str(evaluation_id) + "_help"
+        ] = "moyenne sur %d notes (%s le %s)" % (
+            stats.n,
+            e["description"],
+            e["jour"],
+        )
+    else:
+        moys[evaluation_id] = ""
 
-        titles[evaluation_id] = "%(description)s (%(jour)s)" % e
+    titles[evaluation_id] = "%(description)s (%(jour)s)" % e
 
-        if e["eval_state"]["evalcomplete"]:
-            titles["_" + str(evaluation_id) + "_td_attrs"] = 'class="eval_complete"'
-        elif e["eval_state"]["evalattente"]:
-            titles["_" + str(evaluation_id) + "_td_attrs"] = 'class="eval_attente"'
-        else:
-            titles["_" + str(evaluation_id) + "_td_attrs"] = 'class="eval_incomplete"'
+    if e["eval_state"]["evalcomplete"]:
+        titles["_" + str(evaluation_id) + "_td_attrs"] = 'class="eval_complete"'
+    elif e["eval_state"]["evalattente"]:
+        titles["_" + str(evaluation_id) + "_td_attrs"] = 'class="eval_attente"'
+    else:
+        titles["_" + str(evaluation_id) + "_td_attrs"] = 'class="eval_incomplete"'
 
-    return notes, nb_abs, nb_att  # pour histogramme
+    return notes, stats.nb_abs, stats.nb_att  # pour histogramme
 
 
 def _add_moymod_column(
@@ -652,9 +646,7 @@ def _add_moymod_column(
     """Ajoute la colonne moymod à rows"""
     col_id = "moymod"
     nt = sco_cache.NotesTableCache.get(formsemestre_id)  # > get_etud_mod_moy
-    nb_notes = 0
-    sum_notes = 0
-    notes = []  # liste des notes numeriques, pour calcul histogramme uniquement
+    vals = []
     for row in rows:
         etudid = row["etudid"]
         val = nt.get_etud_mod_moy(
@@ -662,18 +654,16 @@ def _add_moymod_column(
         )  # note sur 20, ou 'NA','NI'
         row[col_id] = scu.fmt_note(val, keep_numeric=keep_numeric)
         row["_" + col_id + "_td_attrs"] = ' class="moyenne" '
-        if not isinstance(val, str):
-            notes.append(val)
-            nb_notes = nb_notes + 1
-            sum_notes += val
+        vals.append(val)
     coefs[col_id] = "(avec abs)"
     if keep_numeric:
         note_max[col_id] = 20.0
     else:
         note_max[col_id] = "/ 20"
     titles[col_id] = "Moyenne module"
-    if nb_notes > 0:
-        moys[col_id] = "%.3g" % (sum_notes / nb_notes)
+    stats = sco_stats.NotesStats(vals)
+    if stats.n > 0:
+        moys[col_id] = "%.3g" % stats.mean
         moys["_" + col_id + "_help"] = "moyenne des moyennes"
     else:
         moys[col_id] = ""
@@ -700,6 +690,120 @@ def _eval_demijournee(E):
     return am, pm, demijournee
 
 
+# Vérification des absences aux évaluations, pour toutes les évaluations
+# de plusieurs semestres en une seule requête.
+# Les demi-journées de l'évaluation sont déterminées comme dans _eval_demijournee:
+#  matin si début avant 13h, après-midi si fin à 13h ou après (ou si pas le matin).
+# Pour chaque étudiant noté et chaque évaluation, on agrège ses absences
+# (une ligne par demi-journée) sur les demi-journées de l'évaluation.
+_CHECK_ABSENCES_REQ = """
+WITH ev AS (
+    SELECT E.id AS evaluation_id, E.jour, E.moduleimpl_id, M.formsemestre_id,
+        COALESCE(E.heure_debut < '13:00', false) AS am,
+        COALESCE(EXTRACT(HOUR FROM E.heure_fin) >= 13, false)
+            OR NOT COALESCE(E.heure_debut < '13:00', false) AS pm
+    FROM notes_evaluation E, notes_moduleimpl M
+    WHERE E.moduleimpl_id = M.id
+    AND E.jour IS NOT NULL
+    AND %(cond)s
+), demijournees AS (
+    SELECT A.etudid, A.jour, A.matin,
+        bool_or(A.estabs) AS estabs, bool_or(A.estjust) AS estjust
+    FROM absences A
+    WHERE A.jour IN (SELECT jour FROM ev)
+    AND A.etudid IN (
+        SELECT Isem.etudid FROM notes_formsemestre_inscription Isem
+        WHERE Isem.formsemestre_id IN (SELECT formsemestre_id FROM ev)
+    )
+    GROUP BY A.etudid, A.jour, A.matin
+)
+SELECT ev.formsemestre_id, ev.evaluation_id, Im.etudid, N.value,
+    COALESCE(bool_or(D.estabs), false) AS absent,
+    COALESCE(bool_or(D.estabs AND NOT D.estjust), false) AS absent_non_just,
+    COALESCE(bool_or(D.estjust), false) AS justifie
+FROM ev
+JOIN notes_moduleimpl_inscription Im ON Im.moduleimpl_id = ev.moduleimpl_id
+JOIN notes_formsemestre_inscription Isem
+    ON Isem.etudid = Im.etudid
+    AND Isem.formsemestre_id = ev.formsemestre_id
+    AND Isem.etat = 'I'
+JOIN notes_notes N
+    ON N.evaluation_id = ev.evaluation_id AND N.etudid = Im.etudid
+LEFT JOIN demijournees D
+    ON D.etudid = Im.etudid
+    AND D.jour = ev.jour
+    AND ((D.matin AND ev.am) OR (NOT D.matin AND ev.pm))
+GROUP BY ev.formsemestre_id, ev.evaluation_id, Im.etudid, N.value
+ORDER BY ev.formsemestre_id, ev.evaluation_id, Im.etudid
+"""
+
+
+def _check_absences(cond: str, args: dict) -> dict:
+    """Vérifie les absences aux évaluations satisfaisant la condition SQL cond
+    (sur E et M), en une seule requête.
+    Résultat: { formsemestre_id : { evaluation_id : (ValButAbs, AbsNonSignalee,
+    ExcNonSignalee, ExcNonJust, AbsButExc) } }
+    N'y figurent que les évaluations datées ayant des notes.
+    """
+    cnx = ndb.GetDBConnexion()
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(_CHECK_ABSENCES_REQ % {"cond": cond}, args)
+    res = {}
+    for r in cursor.dictfetchall():
+        anomalies = res.setdefault(r["formsemestre_id"], {}).setdefault(
+            r["evaluation_id"], ([], [], [], [], [])
+        )
+        (
+            ValButAbs,  # une note mais noté absent
+            AbsNonSignalee,  # note ABS mais pas noté absent
+            ExcNonSignalee,  # note EXC mais pas noté absent
+            ExcNonJust,  #  note EXC mais absent non justifie
+            AbsButExc,  # note ABS mais justifié
+        ) = anomalies
+        etudid, val = r["etudid"], r["value"]
+        if (
+            val != None and val != scu.NOTES_NEUTRALISE and val != scu.NOTES_ATTENTE
+        ) and r["absent"]:
+            # note valide et absent
+            ValButAbs.append(etudid)
+        if val is None and not r["absent"]:
+            # absent mais pas signale comme tel
+            AbsNonSignalee.append(etudid)
+        if val == scu.NOTES_NEUTRALISE and not r["absent"]:
+            # Neutralisé mais pas signale absent
+            ExcNonSignalee.append(etudid)
+        if val == scu.NOTES_NEUTRALISE and r["absent_non_just"]:
+            # EXC mais pas justifié
+            ExcNonJust.append(etudid)
+        if val is None and r["justifie"]:
+            # ABS mais justificatif
+            AbsButExc.append(etudid)
+    return res
+
+
+def formsemestres_check_absences(formsemestre_ids) -> dict:
+    """Vérifie les absences aux évaluations de ces semestres (voir
+    evaluation_check_absences), en une seule requête.
+    Résultat: { formsemestre_id : { evaluation_id : (ValButAbs, AbsNonSignalee,
+    ExcNonSignalee, ExcNonJust, AbsButExc) } }
+    """
+    if not formsemestre_ids:
+        return {}
+    return _check_absences(
+        "M.formsemestre_id = ANY(%(formsemestre_ids)s)",
+        {"formsemestre_ids": list(formsemestre_ids)},
+    )
+
+
+def formsemestre_check_absences(formsemestre_id) -> dict:
+    """Vérifie les absences aux évaluations de ce semestre.
+    Résultat: { evaluation_id : (ValButAbs, AbsNonSignalee, ExcNonSignalee,
+    ExcNonJust, AbsButExc) }
+    Les évaluations sans anomalie possible (sans date ou sans notes) n'y figurent pas.
+    """
+    return formsemestres_check_absences([formsemestre_id]).get(formsemestre_id, {})
+
+
 def evaluation_check_absences(evaluation_id):
     """Vérifie les absences au moment de cette évaluation.
     Cas incohérents que l'on peut rencontrer pour chaque étudiant:
@@ -708,72 +812,35 @@ def evaluation_check_absences(evaluation_id):
       ABS et absent justifié
       EXC et pas noté absent
       EXC et pas justifie
-    Ramene 3 listes d'etudid
+    Ramene 5 listes d'etudid
     """
-    E = sco_evaluations.do_evaluation_list({"evaluation_id": evaluation_id})[0]
-    if not E["jour"]:
-        return [], [], [], [], []  # evaluation sans date
-
-    etudids = sco_groups.do_evaluation_listeetuds_groups(
-        evaluation_id, getallstudents=True
-    )
+    res = _check_absences("E.id = %(evaluation_id)s", {"evaluation_id": evaluation_id})
+    for evals in res.values():
+        if evaluation_id in evals:
+            return evals[evaluation_id]
+    return [], [], [], [], []  # evaluation sans date ou sans notes
 
-    am, pm, demijournee = _eval_demijournee(E)
 
-    # Liste les absences à ce moment:
-    A = sco_abs.list_abs_jour(ndb.DateDMYtoISO(E["jour"]), am=am, pm=pm)
-    As = set([x["etudid"] for x in A])  # ensemble des etudiants absents
-    NJ = sco_abs.list_abs_non_just_jour(ndb.DateDMYtoISO(E["jour"]), am=am, pm=pm)
-    NJs = set([x["etudid"] for x in NJ])  # ensemble des etudiants absents non justifies
-    Just = sco_abs.list_abs_jour(
-        ndb.DateDMYtoISO(E["jour"]), am=am, pm=pm, is_abs=None, is_just=True
-    )
-    Justs = set([x["etudid"] for x in Just])  # ensemble des etudiants avec justif
-
-    # Les notes:
-    NotesDB = sco_evaluations.do_evaluation_get_all_notes(evaluation_id)
-    ValButAbs = []  # une note mais noté absent
-    AbsNonSignalee = []  # note ABS mais pas noté absent
-    ExcNonSignalee = []  # note EXC mais pas noté absent
-    ExcNonJust = []  #  note EXC mais absent non justifie
-    AbsButExc = []  # note ABS mais justifié
-    for etudid in etudids:
-        if etudid in NotesDB:
-            val = NotesDB[etudid]["value"]
-            if (
-                val != None and val != scu.NOTES_NEUTRALISE and val != scu.NOTES_ATTENTE
-            ) and etudid in As:
-                # note valide et absent
-                ValButAbs.append(etudid)
-            if val is None and not etudid in As:
-                # absent mais pas signale comme tel
-                AbsNonSignalee.append(etudid)
-            if val == scu.NOTES_NEUTRALISE and not etudid in As:
-                # Neutralisé mais pas signale absent
-                ExcNonSignalee.append(etudid)
-            if val == scu.NOTES_NEUTRALISE and etudid in NJs:
-                # EXC mais pas justifié
-                ExcNonJust.append(etudid)
-            if val is None and etudid in Justs:
-                # ABS mais justificatif
-                AbsButExc.append(etudid)
-
-    return ValButAbs, AbsNonSignalee, ExcNonSignalee, ExcNonJust, AbsButExc
-
-
-def evaluation_check_absences_html(evaluation_id, with_header=True, show_ok=True):
-    """Affiche etat verification absences d'une evaluation"""
-
-    E = sco_evaluations.do_evaluation_list({"evaluation_id": evaluation_id})[0]
+def evaluation_check_absences_html(
+    evaluation_id, with_header=True, show_ok=True, E=None, anomalies=None
+):
+    """Affiche etat verification absences d'une evaluation.
+    E et anomalies (résultat de evaluation_check_absences) peuvent être
+    fournis par l'appelant s'il les a déjà.
+    """
+    if E is None:
+        E = sco_evaluations.do_evaluation_list({"evaluation_id": evaluation_id})[0]
     am, pm, demijournee = _eval_demijournee(E)
 
+    if anomalies is None:
+        anomalies = evaluation_check_absences(evaluation_id)
     (
         ValButAbs,
         AbsNonSignalee,
         ExcNonSignalee,
         ExcNonJust,
         AbsButExc,
-    ) = evaluation_check_absences(evaluation_id)
+    ) = anomalies
 
     if with_header:
         H = [
@@ -873,6 +940,8 @@ def formsemestre_check_absences_html(formsemestre_id):
           il vous appartient de corriger les erreurs détectées si vous le jugez nécessaire.
           </p>""",
     ]
+    # Toutes les anomalies du semestre, en une requête:
+    sem_anomalies = formsemestre_check_absences(formsemestre_id)
     # Modules, dans l'ordre
     Mlist = sco_moduleimpl.moduleimpl_withmodule_list(formsemestre_id=formsemestre_id)
     for M in Mlist:
@@ -890,6 +959,10 @@ def formsemestre_check_absences_html(formsemestre_id):
                     E["evaluation_id"],
                     with_header=False,
                     show_ok=False,
+                    E=E,
+                    anomalies=sem_anomalies.get(
+                        E["evaluation_id"], ([], [], [], [], [])
+                    ),
                 )
             )
         if evals:
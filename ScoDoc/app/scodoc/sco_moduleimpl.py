@@ -255,6 +255,30 @@ def do_moduleimpl_inscription_create(args, formsemestre_id=None):
     return r
 
 
+def do_moduleimpl_inscription_create_many(args_list, formsemestre_id=None):
+    "create moduleimpl_inscriptions (requêtes multi-lignes)"
+    if not args_list:
+        return []
+    cnx = ndb.GetDBConnexion()
+    r = _moduleimpl_inscriptionEditor.create_many(cnx, args_list, commit=False)
+    sco_cache.invalidate_formsemestre(
+        formsemestre_id=formsemestre_id
+    )  # > moduleimpl_inscription
+    scolog.logdb_many(
+        cnx,
+        [
+            (
+                "moduleimpl_inscription",
+                args["etudid"],
+                "inscription module %s" % args["moduleimpl_id"],
+            )
+            for args in args_list
+        ],
+        commit=False,
+    )
+    return r
+
+
 def do_moduleimpl_inscription_delete(oid, formsemestre_id=None):
     "delete moduleimpl_inscription"
     cnx = ndb.GetDBConnexion()
@@ -270,12 +294,16 @@ def do_moduleimpl_inscrit_etuds(moduleimpl_id, formsemestre_id, etudids, reset=F
     """
     from app.scodoc import sco_formsemestre_inscriptions
 
+    etudids = [int(etudid) for etudid in etudids]
     # Verifie qu'ils sont tous bien inscrits au semestre
-    for etudid in etudids:
-        insem = sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
-            args={"formsemestre_id": formsemestre_id, "etudid": etudid}
+    insem_set = {
+        x["etudid"]
+        for x in sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
+            args={"formsemestre_id": formsemestre_id}
         )
-        if not insem:
+    }
+    for etudid in etudids:
+        if not etudid in insem_set:
             raise ScoValueError("%s n'est pas inscrit au semestre !" % etudid)
 
     # Desinscriptions
@@ -294,13 +322,14 @@ def do_moduleimpl_inscrit_etuds(moduleimpl_id, formsemestre_id, etudids, reset=F
             for x in do_moduleimpl_inscription_list(moduleimpl_id=moduleimpl_id)
         ]
     )
-    for etudid in etudids:
-        # deja inscrit ?
-        if not etudid in inmod_set:
-            do_moduleimpl_inscription_create(
-                {"moduleimpl_id": moduleimpl_id, "etudid": etudid},
-                formsemestre_id=formsemestre_id,
-            )
+    do_moduleimpl_inscription_create_many(
+        [
+            {"moduleimpl_id": moduleimpl_id, "etudid": etudid}
+            for etudid in dict.fromkeys(etudids)  # uniq
+            if not etudid in inmod_set  # deja inscrit ?
+        ],
+        formsemestre_id=formsemestre_id,
+    )
 
     sco_cache.invalidate_formsemestre(
         formsemestre_id=formsemestre_id
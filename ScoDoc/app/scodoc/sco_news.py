@@ -39,6 +39,7 @@ from flask_login import current_user
 import app.scodoc.sco_utils as scu
 import app.scodoc.notesdb as ndb
 from app import log
+from app.scodoc import sco_cache
 from app.scodoc import sco_formsemestre
 from app.scodoc import sco_moduleimpl
 from app.scodoc import sco_preferences
@@ -104,12 +105,31 @@ def add(typ, object=None, text="", url=None, max_frequency=False):
     _LAST_NEWS[(authuser_name, typ, object)] = t
 
     _send_news_by_mail(args)
-    return scolar_news_create(cnx, args)
+    news_id = scolar_news_create(cnx, args)
+    sco_cache.NewsSummaryCache.invalidate()
+    return news_id
 
 
 def scolar_news_summary(n=5):
     """Return last n news.
     News are "compressed", ie redondant events are joined.
+    Le résumé est gardé en cache (par département) jusqu'à la prochaine
+    nouvelle (voir add).
+    """
+    cacheable = n in sco_cache.NewsSummaryCache.cached_sizes
+    if cacheable:
+        news = sco_cache.NewsSummaryCache.get(n)
+        if news is not None:
+            return news
+    news = _scolar_news_summary(n)
+    if cacheable:
+        sco_cache.NewsSummaryCache.set(n, news)
+    return news
+
+
+def _scolar_news_summary(n):
+    """Calcule le résumé des n dernières nouvelles.
+    Les auteurs et les semestres cités sont lus en une requête chacun.
     """
     from app.scodoc import sco_etud
 
@@ -137,6 +157,12 @@ def scolar_news_summary(n=5):
     # sort by date, descending
     news.sort(key=itemgetter("date"), reverse=True)
     news = news[:n]
+    users_info = sco_users.user_info_many(
+        [n["authenticated_user"] or "" for n in news]
+    )
+    sems_descr = _get_formsemestres_descr(
+        [n["object"] for n in news if n["type"] == NEWS_INSCR and n["object"]]
+    )
     # mimic EditableTable.list output formatting:
     for n in news:
         n["date822"] = n["date"].strftime("%a, %d %b %Y %H:%M:%S %z")
@@ -151,19 +177,51 @@ def scolar_news_summary(n=5):
         j, m = n["date"].split("/")[:2]
         mois = sco_etud.MONTH_NAMES_ABBREV[int(m) - 1]
         n["formatted_date"] = "%s %s %s" % (j, mois, n["hm"])
-        # indication semestre si ajout notes:
-        infos = _get_formsemestre_infos_from_news(n)
-        if infos:
+        # indication semestre si inscriptions
+        # (pas d'indication pour les notes, voir _get_formsemestre_infos_from_news)
+        if n["type"] == NEWS_INSCR and n["object"] in sems_descr:
+            infos = {
+                "formsemestre_id": n["object"],
+                "descr_sem": sems_descr[n["object"]],
+            }
             n["text"] += (
                 ' (<a href="Notes/formsemestre_status?formsemestre_id=%(formsemestre_id)s">%(descr_sem)s</a>)'
                 % infos
             )
-        n["text"] += (
-            " par " + sco_users.user_info(n["authenticated_user"])["nomcomplet"]
-        )
+        n["text"] += " par " + users_info[n["authenticated_user"]]["nomcomplet"]
     return news
 
 
+def _get_formsemestres_descr(formsemestre_ids) -> dict:
+    """Description courte (eg "S1 FAP") des semestres existants du département:
+    { formsemestre_id : descr_sem }
+    """
+    if not formsemestre_ids:
+        return {}
+    cnx = ndb.GetDBConnexion()
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """SELECT id, semestre_id, modalite
+    FROM notes_formsemestre
+    WHERE id = ANY(%(formsemestre_ids)s)
+    AND dept_id = %(dept_id)s
+    """,
+        {"formsemestre_ids": list(set(formsemestre_ids)), "dept_id": g.scodoc_dept_id},
+    )
+    return {r["id"]: _descr_sem(r) for r in cursor.dictfetchall()}
+
+
+def _descr_sem(sem) -> str:
+    "Description courte du semestre: numéro et modalité"
+    if sem["semestre_id"] > 0:
+        descr_sem = "S%d" % sem["semestre_id"]
+    else:
+        descr_sem = ""
+    if sem["modalite"]:
+        descr_sem += " " + sem["modalite"]
+    return descr_sem
+
+
 def _get_formsemestre_infos_from_news(n):
     """Informations sur le semestre concerné par la nouvelle n
     {} si inexistant
@@ -190,13 +248,11 @@ def _get_formsemestre_infos_from_news(n):
         # semestre n'existe plus
         return {}
 
-    if sem["semestre_id"] > 0:
-        descr_sem = "S%d" % sem["semestre_id"]
-    else:
-        descr_sem = ""
-    if sem["modalite"]:
-        descr_sem += " " + sem["modalite"]
-    return {"formsemestre_id": formsemestre_id, "sem": sem, "descr_sem": descr_sem}
+    return {
+        "formsemestre_id": formsemestre_id,
+        "sem": sem,
+        "descr_sem": _descr_sem(sem),
+    }
 
 
 def scolar_news_summary_html(n=5):
@@ -28,6 +28,8 @@
 """Semestres: gestion parcours DUT (Arreté du 13 août 2005)
 """
 
+import collections
+
 import app.scodoc.sco_utils as scu
 import app.scodoc.notesdb as ndb
 from app import log
@@ -105,26 +107,30 @@ class DecisionSem(object):
         # log('%s: %s %s %s %s %s' % (self.codechoice,code_etat,new_code_prev,formsemestre_id_utilise_pour_compenser,devenir,assiduite) )
 
 
-def SituationEtudParcours(etud, formsemestre_id):
-    """renvoie une instance de SituationEtudParcours (ou sous-classe spécialisée)"""
+def SituationEtudParcours(etud, formsemestre_id, formation_codes=None):
+    """renvoie une instance de SituationEtudParcours (ou sous-classe spécialisée)
+    formation_codes: dict { formation_id : formation_code } pouvant être partagé
+    entre plusieurs étudiants (traitements par lot).
+    """
     nt = sco_cache.NotesTableCache.get(
         formsemestre_id
     )  # > get_etud_decision_sem, get_etud_moy_gen, get_ues, get_etud_ue_status, etud_check_conditions_ues
     parcours = nt.parcours
     #
     if parcours.ECTS_ONLY:
-        return SituationEtudParcoursECTS(etud, formsemestre_id, nt)
+        return SituationEtudParcoursECTS(etud, formsemestre_id, nt, formation_codes)
     else:
-        return SituationEtudParcoursGeneric(etud, formsemestre_id, nt)
+        return SituationEtudParcoursGeneric(etud, formsemestre_id, nt, formation_codes)
 
 
 class SituationEtudParcoursGeneric(object):
     "Semestre dans un parcours"
 
-    def __init__(self, etud, formsemestre_id, nt):
+    def __init__(self, etud, formsemestre_id, nt, formation_codes=None):
         """
         etud: dict filled by fill_etuds_info()
         """
+        self.formation_codes = {} if formation_codes is None else formation_codes
         self.etud = etud
         self.etudid = etud["etudid"]
         self.formsemestre_id = formsemestre_id
@@ -338,9 +344,11 @@ class SituationEtudParcoursGeneric(object):
             if nb_ue > nb_max_ue:
                 nb_max_ue = nb_ue
             # add formation_code to each sem:
-            sem["formation_code"] = sco_formations.formation_list(
-                args={"formation_id": sem["formation_id"]}
-            )[0]["formation_code"]
+            if sem["formation_id"] not in self.formation_codes:
+                self.formation_codes[sem["formation_id"]] = sco_formations.formation_list(
+                    args={"formation_id": sem["formation_id"]}
+                )[0]["formation_code"]
+            sem["formation_code"] = self.formation_codes[sem["formation_id"]]
             # si sem peut servir à compenser le semestre courant, positionne
             #  can_compensate
             sem["can_compensate"] = check_compensation(
@@ -535,9 +543,10 @@ class SituationEtudParcoursGeneric(object):
                         validated = True
         return s
 
-    def valide_decision(self, decision):
+    def valide_decision(self, decision, commit=True):
         """Enregistre la decision (instance de DecisionSem)
         Enregistre codes semestre et UE, et autorisations inscription.
+        Si commit est faux, la transaction doit être validée par l'appelant.
         """
         cnx = ndb.GetDBConnexion(autocommit=False)
         # -- check
@@ -573,6 +582,7 @@ class SituationEtudParcoursGeneric(object):
                 decision.code_etat,
                 decision.assiduite,
                 decision.formsemestre_id_utilise_pour_compenser,
+                commit=commit,
             )
         logdb(
             cnx,
@@ -588,6 +598,7 @@ class SituationEtudParcoursGeneric(object):
             self.etudid,
             decision.code_etat,
             decision.assiduite,
+            commit=commit,
         )
         # -- modification du code du semestre precedent
         if self.prev and decision.new_code_prev:
@@ -618,6 +629,7 @@ class SituationEtudParcoursGeneric(object):
                 self.etudid,
                 decision.new_code_prev,
                 decision.assiduite,  # attention: en toute rigueur il faudrait utiliser une indication de l'assiduite au sem. precedent, que nous n'avons pas...
+                commit=commit,
             )
 
             sco_cache.invalidate_formsemestre(
@@ -645,8 +657,10 @@ class SituationEtudParcoursGeneric(object):
                         "semestre_id": next_semestre_id,
                         "origin_formsemestre_id": self.formsemestre_id,
                     },
+                    commit=commit,
                 )
-            cnx.commit()
+            if commit:
+                cnx.commit()
         except:
             cnx.rollback()
             raise
@@ -667,8 +681,10 @@ class SituationEtudParcoursGeneric(object):
 class SituationEtudParcoursECTS(SituationEtudParcoursGeneric):
     """Gestion parcours basés sur ECTS"""
 
-    def __init__(self, etud, formsemestre_id, nt):
-        SituationEtudParcoursGeneric.__init__(self, etud, formsemestre_id, nt)
+    def __init__(self, etud, formsemestre_id, nt, formation_codes=None):
+        SituationEtudParcoursGeneric.__init__(
+            self, etud, formsemestre_id, nt, formation_codes
+        )
 
     def could_be_compensated(self):
         return False  # jamais de compensations dans ce parcours
@@ -799,6 +815,7 @@ def formsemestre_validate_sem(
     code,
     assidu=True,
     formsemestre_id_utilise_pour_compenser=None,
+    commit=True,
 ):
     "Ajoute ou change validation semestre"
     args = {"formsemestre_id": formsemestre_id, "etudid": etudid}
@@ -814,7 +831,7 @@ def formsemestre_validate_sem(
         args["code"] = code
         args["assidu"] = assidu
         log("formsemestre_validate_sem: %s" % args)
-        scolar_formsemestre_validation_create(cnx, args)
+        scolar_formsemestre_validation_create(cnx, args, commit=commit)
         # marque sem. utilise pour compenser:
         if formsemestre_id_utilise_pour_compenser:
             assert code == ADC
@@ -895,7 +912,9 @@ def formsemestre_update_validation_sem(
     return to_invalidate
 
 
-def formsemestre_validate_ues(formsemestre_id, etudid, code_etat_sem, assiduite):
+def formsemestre_validate_ues(
+    formsemestre_id, etudid, code_etat_sem, assiduite, commit=True
+):
     """Enregistre codes UE, selon état semestre.
     Les codes UE sont toujours calculés ici, et non passés en paramètres
     car ils ne dépendent que de la note d'UE et de la validation ou non du semestre.
@@ -926,7 +945,7 @@ def formsemestre_validate_ues(formsemestre_id, etudid, code_etat_sem, assiduite)
         # log('code_ue=%s' % code_ue)
         if etud_est_inscrit_ue(cnx, etudid, formsemestre_id, ue_id) and code_ue:
             do_formsemestre_validate_ue(
-                cnx, nt, formsemestre_id, etudid, ue_id, code_ue
+                cnx, nt, formsemestre_id, etudid, ue_id, code_ue, commit=commit
             )
 
         logdb(
@@ -936,7 +955,8 @@ def formsemestre_validate_ues(formsemestre_id, etudid, code_etat_sem, assiduite)
             msg="ue_id=%s code=%s" % (ue_id, code_ue),
             commit=False,
         )
-    cnx.commit()
+    if commit:
+        cnx.commit()
 
 
 def do_formsemestre_validate_ue(
@@ -950,6 +970,7 @@ def do_formsemestre_validate_ue(
     date=None,
     semestre_id=None,
     is_external=False,
+    commit=True,
 ):
     """Ajoute ou change validation UE"""
     args = {
@@ -980,7 +1001,7 @@ def do_formsemestre_validate_ue(
             args["moy_ue"] = moy_ue
         log("formsemestre_validate_ue: %s" % args)
         if code != None:
-            scolar_formsemestre_validation_create(cnx, args)
+            scolar_formsemestre_validation_create(cnx, args, commit=commit)
         else:
             log("formsemestre_validate_ue: code is None, not recording validation")
     except:
@@ -1037,6 +1058,12 @@ def formsemestre_get_autorisation_inscription(etudid, origin_formsemestre_id):
     )
 
 
+# Formations de même code que la formation indiquée (%(formation_id)s),
+# utilisé pour rechercher les UE capitalisées et les semestres qui les utilisent:
+_SQL_MEME_CODE_FORMATION = """nf.formation_code = nf2.formation_code
+    and nf2.id = %(formation_id)s"""
+
+
 def formsemestre_get_etud_capitalisation(sem, etudid):
     """Liste des UE capitalisées (ADM) correspondant au semestre sem et à l'étudiant.
 
@@ -1050,21 +1077,46 @@ def formsemestre_get_etud_capitalisation(sem, etudid):
                   'moy_ue' :
                   'event_date' :
                   'is_external'
+                  'sum_coefs_ue' : somme des coefs des modules de l'UE suivis
+                                   dans le semestre origine (None si aucun)
                   } ]
     """
+    return formsemestre_get_capitalisations(sem, [etudid]).get(etudid, [])
+
+
+def formsemestre_get_capitalisations(sem, etudids) -> dict:
+    """UE capitalisées (ADM) et UE externes de tous les étudiants indiqués,
+    en une seule requête (voir formsemestre_get_etud_capitalisation).
+
+    Resultat: { etudid : [ ue_cap, ... ] } (étudiants sans UE capitalisée absents)
+    """
+    etudids = list(etudids)
+    if not etudids:
+        return {}
     cnx = ndb.GetDBConnexion()
     cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
     cursor.execute(
-        """select distinct SFV.*, ue.ue_code from notes_ue ue, notes_formations nf, 
+        """select distinct SFV.*, ue.ue_code,
+        (SELECT sum(mod.coefficient)
+         FROM notes_modules mod, notes_moduleimpl mi,
+         notes_moduleimpl_inscription ins
+         WHERE mod.id = mi.module_id
+         and ins.etudid = SFV.etudid
+         and ins.moduleimpl_id = mi.id
+         and mi.formsemestre_id = SFV.formsemestre_id
+         and mod.ue_id = SFV.ue_id
+        ) as sum_coefs_ue
+    from notes_ue ue, notes_formations nf,
         notes_formations nf2, scolar_formsemestre_validation SFV, notes_formsemestre sem
 
-    WHERE ue.formation_id = nf.id   
-    and nf.formation_code = nf2.formation_code
-    and nf2.id=%(formation_id)s
+    WHERE ue.formation_id = nf.id
+    and """
+        + _SQL_MEME_CODE_FORMATION
+        + """
 
     and SFV.ue_id = ue.id
     and SFV.code = 'ADM'
-    and SFV.etudid = %(etudid)s
+    and SFV.etudid = ANY(%(etudids)s)
     
     and (  (sem.id = SFV.formsemestre_id
            and sem.date_debut < %(date_debut)s
@@ -1075,14 +1127,16 @@ def formsemestre_get_etud_capitalisation(sem, etudid):
            ) )
     """,
         {
-            "etudid": etudid,
+            "etudids": etudids,
             "formation_id": sem["formation_id"],
             "semestre_id": sem["semestre_id"],
             "date_debut": ndb.DateDMYtoISO(sem["date_debut"]),
         },
     )
-
-    return cursor.dictfetchall()
+    capitalisations = collections.defaultdict(list)
+    for ue_cap in cursor.dictfetchall():
+        capitalisations[ue_cap["etudid"]].append(ue_cap)
+    return dict(capitalisations)
 
 
 def list_formsemestre_utilisateurs_uecap(formsemestre_id):
@@ -1091,19 +1145,20 @@ def list_formsemestre_utilisateurs_uecap(formsemestre_id):
     semestre): meme code formation, meme semestre_id, date posterieure"""
     cnx = ndb.GetDBConnexion()
     sem = sco_formsemestre.get_formsemestre(formsemestre_id)
-    F = sco_formations.formation_list(args={"formation_id": sem["formation_id"]})[0]
     cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
     cursor.execute(
         """SELECT sem.id
-    FROM notes_formsemestre sem, notes_formations F
-    WHERE sem.formation_id = F.id
-    and F.formation_code = %(formation_code)s
+    FROM notes_formsemestre sem, notes_formations nf, notes_formations nf2
+    WHERE sem.formation_id = nf.id
+    and """
+        + _SQL_MEME_CODE_FORMATION
+        + """
     and sem.semestre_id = %(semestre_id)s
     and sem.date_debut >= %(date_debut)s
     and sem.id != %(formsemestre_id)s;
     """,
         {
-            "formation_code": F["formation_code"],
+            "formation_id": sem["formation_id"],
             "semestre_id": sem["semestre_id"],
             "formsemestre_id": formsemestre_id,
             "date_debut": ndb.DateDMYtoISO(sem["date_debut"]),
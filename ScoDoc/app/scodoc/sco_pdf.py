@@ -33,6 +33,7 @@
 
     En ScoDoc 9, ce n'est pas nécessaire car on est multiptocessus / monothread.
 """
+import hashlib
 import html
 import io
 import os
@@ -56,6 +57,7 @@ from reportlab.lib.colors import Color
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER, TA_JUSTIFY
 from reportlab.lib import styles
 from reportlab.lib.pagesizes import letter, A4, landscape
+from reportlab.lib.utils import ImageReader
 
 from flask import g
 
@@ -179,6 +181,125 @@ def bold_paras(L, tag="b", close=None):
         return [b + (x or "") + close for x in L]
 
 
+# ---- Cache des images utilisées dans les documents PDF
+# Logos, fonds de page et signatures sont décodés une seule fois par processus
+# (objets ImageReader de ReportLab), et revalidés par la date de modification
+# des fichiers (et des répertoires de logos pour la recherche des fichiers).
+_IMAGE_FILENAMES = {}  # (dept, basenames) : (mtimes des répertoires, filename)
+_IMAGE_READERS = {}  # filename : ((mtime, size), ImageReader)
+_IMAGE_DATA_READERS = {}  # digest : ImageReader (signatures)
+_IMAGE_DATA_READERS_MAX = 64
+
+
+def _logos_dirs() -> tuple:
+    "répertoires des logos: celui du département, puis le global"
+    return (
+        os.path.join(SCODOC_LOGOS_DIR, "logos_" + g.scodoc_dept),
+        SCODOC_LOGOS_DIR,
+    )
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def find_image_filename(basenames) -> str:
+    """Cherche un fichier image (logo, fond de page), dans le répertoire des logos
+    du département puis dans le répertoire global.
+    basenames: noms sans extension, par ordre de préférence
+    (ex: ("bul_pdf_background", "letter_background")).
+    Le résultat est gardé en cache tant que les répertoires ne sont pas modifiés.
+    Returns: le chemin du fichier, ou "" si aucun.
+    """
+    image_dirs = _logos_dirs()
+    dirs_mtimes = tuple(_mtime(d) for d in image_dirs)
+    key = (g.scodoc_dept, tuple(basenames))
+    cached = _IMAGE_FILENAMES.get(key)
+    if cached and cached[0] == dirs_mtimes:
+        return cached[1]
+    filename = ""
+    for image_dir, mtime in zip(image_dirs, dirs_mtimes):
+        if mtime is None:
+            continue
+        for suffix in LOGOS_IMAGES_ALLOWED_TYPES:
+            for basename in basenames:
+                fn = os.path.join(image_dir, basename + "." + suffix)
+                if os.path.isfile(fn):
+                    filename = fn
+                    break
+            if filename:
+                break
+        if filename:
+            break
+    _IMAGE_FILENAMES[key] = (dirs_mtimes, filename)
+    return filename
+
+
+def get_image_reader(filename):
+    """ImageReader pour ce fichier image, ou None si le fichier n'existe pas.
+    Gardé en cache tant que le fichier n'est pas modifié.
+    """
+    if not filename:
+        return None
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        _IMAGE_READERS.pop(filename, None)
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _IMAGE_READERS.get(filename)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    reader = ImageReader(filename)
+    reader.getSize()  # lit l'entête maintenant
+    _IMAGE_READERS[filename] = (stamp, reader)
+    return reader
+
+
+def get_image_reader_from_data(data: bytes):
+    """ImageReader pour cette image (contenu du fichier, ex: signature),
+    gardé en cache (indexé par le contenu).
+    """
+    digest = hashlib.md5(data).digest()
+    reader = _IMAGE_DATA_READERS.get(digest)
+    if reader is None:
+        if len(_IMAGE_DATA_READERS) >= _IMAGE_DATA_READERS_MAX:
+            _IMAGE_DATA_READERS.clear()
+        reader = ImageReader(io.BytesIO(data))
+        reader.getSize()
+        _IMAGE_DATA_READERS[digest] = reader
+    return reader
+
+
+def find_image_reader(basenames):
+    "ImageReader pour l'image cherchée (voir find_image_filename), ou None"
+    return get_image_reader(find_image_filename(basenames))
+
+
+class CachedImage(Flowable):
+    """Image Platypus dessinée à partir d'un ImageReader (voir get_image_reader),
+    sans relire ni décoder le fichier.
+    """
+
+    def __init__(self, reader, width, height, hAlign="CENTER"):
+        Flowable.__init__(self)
+        self.reader = reader
+        self.drawWidth = width
+        self.drawHeight = height
+        self.hAlign = hAlign
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(
+            self.reader, 0, 0, self.drawWidth, self.drawHeight, mask="auto"
+        )
+
+
 class ScolarsPageTemplate(PageTemplate):
     """Our own page template."""
 
@@ -208,7 +329,6 @@ class ScolarsPageTemplate(PageTemplate):
             self.with_page_background = self.preferences["bul_pdf_with_background"]
         else:
             self.with_page_background = False
-        self.background_image_filename = None
         # Our doc is made of a single frame
         left, top, right, bottom = [float(x) for x in margins]
         content = Frame(
@@ -219,20 +339,13 @@ class ScolarsPageTemplate(PageTemplate):
         )
         PageTemplate.__init__(self, "ScolarsPageTemplate", [content])
         self.logo = None
-        # XXX COPIED from sco_pvpdf, to be refactored (no time now)
-        # Search background in dept specific dir, then in global config dir
-        for image_dir in (
-            SCODOC_LOGOS_DIR + "/logos_" + g.scodoc_dept + "/",
-            SCODOC_LOGOS_DIR + "/",  # global logos
-        ):
-            for suffix in LOGOS_IMAGES_ALLOWED_TYPES:
-                fn = image_dir + "/bul_pdf_background" + "." + suffix
-                if not self.background_image_filename and os.path.exists(fn):
-                    self.background_image_filename = fn
-                # Also try to use PV background
-                fn = image_dir + "/letter_background" + "." + suffix
-                if not self.background_image_filename and os.path.exists(fn):
-                    self.background_image_filename = fn
+        # Background (or PV background) in dept specific dir, then in global dir
+        if self.with_page_background:
+            self.background_image = find_image_reader(
+                ("bul_pdf_background", "letter_background")
+            )
+        else:
+            self.background_image = None
 
     def beforeDrawPage(self, canvas, doc):
         """Draws (optional) background, logo and contribution message on each page.
@@ -251,9 +364,9 @@ class ScolarsPageTemplate(PageTemplate):
             return
         canvas.saveState()
         # ---- Background image
-        if self.background_image_filename and self.with_page_background:
+        if self.background_image and self.with_page_background:
             canvas.drawImage(
-                self.background_image_filename, 0, 0, doc.pagesize[0], doc.pagesize[1]
+                self.background_image, 0, 0, doc.pagesize[0], doc.pagesize[1]
             )
 
         # ---- Logo: a small image, positionned at top left of the page
@@ -32,8 +32,14 @@ L'attribut "photo_filename" de la table identite donne le nom du fichier image,
 sans extension (e.g. "F44/RT_EID31545").
 Toutes les images sont converties en jpg, et stockées dans photo_filename.jpg en taille originale.
 Elles sont aussi réduites en 90 pixels de hauteur, et stockées dans photo_filename.h90.jpg
+(version "small", pour le web), et en 240 pixels de hauteur dans photo_filename.h240.jpg
+(version "pdf", pour les trombinoscopes et listes d'appel PDF).
+Ces versions réduites sont calculées lors du chargement (ou de la copie depuis le portail),
+et recalculées à la demande si elles manquent (photos anciennes).
 
-Les images sont servies par ScoDoc, via la méthode getphotofile?etudid=xxx
+Les images sont servies par ScoDoc, via la méthode get_photo_image?etudid=xxx
+Chaque processus garde un index etudid -> (chemin, mtime, etag) afin de servir
+les images sans requête SQL; les entrées sont revalidées par un simple stat().
 
 
 ## Historique:
@@ -45,12 +51,16 @@ Les images sont servies par ScoDoc, via la méthode getphotofile?etudid=xxx
 
 from flask.helpers import make_response
 from app.scodoc.sco_exceptions import ScoGenError
+import collections
+import concurrent.futures
 import datetime
 import glob
+import hashlib
 import io
 import os
 import random
 import requests
+import tempfile
 import time
 import traceback
 
@@ -79,6 +89,24 @@ JPG_QUALITY = 0.92
 REDUCED_HEIGHT = 90  # pixels
 MAX_FILE_SIZE = 1024 * 1024  # max allowed size for uploaded image, in bytes
 H90 = ".h90"  # suffix for reduced size images
+PDF_HEIGHT = 240  # pixels
+H240 = ".h240"  # suffix for images used in PDF documents
+# size name: (file suffix, height in pixels or None for original image)
+PHOTO_SIZES = {
+    "orig": ("", None),
+    "small": (H90, REDUCED_HEIGHT),
+    "pdf": (H240, PDF_HEIGHT),
+}
+PHOTO_LOAD_WORKERS = 8  # nb of threads used to load images (trombinoscopes)
+
+# Index en mémoire (par processus): (etudid, size) -> PhotoFileEntry
+PhotoFileEntry = collections.namedtuple(
+    "PhotoFileEntry", ["path", "mtime", "file_size", "etag"]
+)
+_PHOTO_INDEX = {}
+
+# Image chargée en mémoire (pour les documents PDF et zip)
+PhotoData = collections.namedtuple("PhotoData", ["path", "data", "width", "height"])
 
 
 def photo_portal_url(etud):
@@ -124,47 +152,92 @@ def etud_photo_url(etud, size="small", fast=False):
 def get_photo_image(etudid=None, size="small"):
     """Returns photo image (HTTP response)
     If not etudid, use "unknown" image
+    Les photos déjà servies par ce processus sont trouvées dans l'index,
+    sans accès à la base de données.
     """
     if not etudid:
-        filename = UNKNOWN_IMAGE_PATH
-    else:
+        return _http_jpeg_file(_photo_file_entry(UNKNOWN_IMAGE_PATH))
+    entry = _photo_index_get(etudid, size)
+    if entry is None:
         etud = sco_etud.get_etud_info(filled=True, etudid=etudid)[0]
         filename = photo_pathname(etud, size=size)
         if not filename:
-            filename = UNKNOWN_IMAGE_PATH
-    return _http_jpeg_file(filename)
+            # pas d'indexation: la photo peut apparaitre (copie depuis le portail)
+            return _http_jpeg_file(_photo_file_entry(UNKNOWN_IMAGE_PATH))
+        entry = _photo_file_entry(filename)
+        _PHOTO_INDEX[(str(etudid), size)] = entry
+    return _http_jpeg_file(entry)
+
+
+def _photo_index_get(etudid, size):
+    """L'entrée de l'index pour cette photo, ou None si absente ou périmée
+    (fichier supprimé ou modifié)."""
+    entry = _PHOTO_INDEX.get((str(etudid), size))
+    if entry is None:
+        return None
+    try:
+        st = os.stat(entry.path)
+    except FileNotFoundError:
+        st = None
+    if st is None or st.st_mtime != entry.mtime or st.st_size != entry.file_size:
+        _PHOTO_INDEX.pop((str(etudid), size), None)
+        return None
+    return entry
+
 
+def _photo_index_invalidate(etudid):
+    "Supprime de l'index les entrées de cet étudiant"
+    for size in PHOTO_SIZES:
+        _PHOTO_INDEX.pop((str(etudid), size), None)
 
-def _http_jpeg_file(filename):
-    """returns an image as a Flask response"""
+
+def _photo_file_entry(filename):
+    """PhotoFileEntry pour ce fichier.
+    L'etag (fort) est le hash du contenu."""
     st = os.stat(filename)
-    last_modified = st.st_mtime  # float timestamp
-    file_size = st.st_size
-    header = request.headers.get("If-Modified-Since")
-    if header is not None:
-        header = header.split(";")[0]
-        # Some proxies seem to send invalid date strings for this
-        # header. If the date string is not valid, we ignore it
-        # rather than raise an error to be generally consistent
-        # with common servers such as Apache (which can usually
-        # understand the screwy date string as a lucky side effect
-        # of the way they parse it).
-        try:
-            dt = datetime.datetime.strptime(header, "%a, %d %b %Y %H:%M:%S GMT")
-            mod_since = dt.timestamp()
-        except ValueError:
-            mod_since = None
-        if (mod_since is not None) and last_modified <= mod_since:
+    with open(filename, mode="rb") as f:
+        etag = hashlib.sha1(f.read()).hexdigest()
+    return PhotoFileEntry(
+        path=filename, mtime=st.st_mtime, file_size=st.st_size, etag=etag
+    )
+
+
+def _http_jpeg_file(entry):
+    """returns an image as a Flask response
+    entry is a PhotoFileEntry.
+    """
+    if request.if_none_match:
+        if request.if_none_match.contains(entry.etag):
             return "", 304  # not modified
+    else:
+        header = request.headers.get("If-Modified-Since")
+        if header is not None:
+            header = header.split(";")[0]
+            # Some proxies seem to send invalid date strings for this
+            # header. If the date string is not valid, we ignore it
+            # rather than raise an error to be generally consistent
+            # with common servers such as Apache (which can usually
+            # understand the screwy date string as a lucky side effect
+            # of the way they parse it).
+            try:
+                dt = datetime.datetime.strptime(header, "%a, %d %b %Y %H:%M:%S GMT")
+                mod_since = dt.timestamp()
+            except ValueError:
+                mod_since = None
+            if (mod_since is not None) and entry.mtime <= mod_since:
+                return "", 304  # not modified
     #
     last_modified_str = time.strftime(
-        "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(last_modified)
+        "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(entry.mtime)
     )
-    response = make_response(open(filename, mode="rb").read())
+    with open(entry.path, mode="rb") as f:
+        data = f.read()
+    response = make_response(data)
     response.headers["Content-Type"] = "image/jpeg"
     response.headers["Last-Modified"] = last_modified_str
     response.headers["Cache-Control"] = "max-age=3600"
-    response.headers["Content-Length"] = str(file_size)
+    response.headers["Content-Length"] = str(len(data))
+    response.set_etag(entry.etag)
     return response
 
 
@@ -215,20 +288,66 @@ def etud_photo_orig_html(etud=None, etudid=None, title=None):
 def photo_pathname(etud, size="orig"):
     """Returns full path of image file if etud has a photo (in the filesystem), or False.
     Do not distinguish the cases: no photo, or file missing.
+    Toutes les versions sont créées à l'enregistrement de la photo (store_photo).
+    Seules les photos enregistrées avant l'existence des versions réduites
+    peuvent en être dépourvues: elles sont alors créées ici (une seule fois).
     """
-    if size == "small":
-        version = H90
-    elif size == "orig":
-        version = ""
-    else:
+    if size not in PHOTO_SIZES:
         raise ValueError("invalid size parameter for photo")
+    version, height = PHOTO_SIZES[size]
     if not etud["photo_filename"]:
         return False
-    path = os.path.join(PHOTO_DIR, etud["photo_filename"]) + version + IMAGE_EXT
+    base_path = os.path.join(PHOTO_DIR, etud["photo_filename"])
+    path = base_path + version + IMAGE_EXT
     if os.path.exists(path):
         return path
-    else:
-        return False
+    if height is not None and os.path.exists(base_path + IMAGE_EXT):
+        # ancienne photo
+        try:
+            _save_missing_versions(base_path)
+        except (OSError, PIL.UnidentifiedImageError):
+            log("photo_pathname: can't create %s" % path)
+            return False
+        return path
+    return False
+
+
+def load_photos(etuds, size="pdf"):
+    """Charge les images des étudiants (en parallèle, ce qui est utile pour
+    les grands groupes, les fichiers étant lus et décodés hors du GIL).
+    Les étudiants sans photo, ou dont la photo est illisible, ont l'image
+    "inconnue".
+    Returns: list of PhotoData, in the same order as etuds.
+    """
+    # les chemins sont déterminés dans le thread principal
+    paths = [photo_pathname(etud, size=size) or UNKNOWN_IMAGE_PATH for etud in etuds]
+    if len(paths) < 2:
+        return [_load_photo_data(path) for path in paths]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=PHOTO_LOAD_WORKERS
+    ) as executor:
+        return list(executor.map(_load_photo_data, paths))
+
+
+def _load_photo_data(path):
+    """Lit l'image et ses dimensions: PhotoData
+    (image "inconnue" si le fichier est illisible)
+    """
+    try:
+        with open(path, mode="rb") as f:
+            data = f.read()
+        width, height = PILImage.open(io.BytesIO(data)).size
+    except (OSError, PIL.UnidentifiedImageError):
+        if path == UNKNOWN_IMAGE_PATH:
+            raise
+        log("_load_photo_data: can't read %s" % path)
+        return get_unknown_photo()
+    return PhotoData(path=path, data=data, width=width, height=height)
+
+
+def get_unknown_photo():
+    """L'image "inconnue" (PhotoData)"""
+    return _load_photo_data(UNKNOWN_IMAGE_PATH)
 
 
 def store_photo(etud, data):
@@ -248,6 +367,10 @@ def store_photo(etud, data):
         filename = save_image(etud["etudid"], data)
     except PIL.UnidentifiedImageError:
         raise ScoGenError(msg="Fichier d'image invalide ou non format non supporté")
+    old_filename = etud.get("photo_filename")
+    if old_filename and old_filename != filename:
+        _remove_image_files(old_filename)
+    _photo_index_invalidate(etud["etudid"])
     # update database:
     etud["photo_filename"] = filename
     etud["foto"] = None
@@ -278,6 +401,7 @@ def suppress_photo(etud):
         for filename in filenames:
             log("removing file %s" % filename)
             os.remove(filename)
+    _photo_index_invalidate(etud["etudid"])
     # 3- log
     logdb(cnx, method="changePhoto", msg="suppression", etudid=etud["etudid"])
 
@@ -288,7 +412,7 @@ def suppress_photo(etud):
 
 def save_image(etudid, data):
     """data is a bytes string.
-    Save image in JPEG in 2 sizes (original and h90).
+    Save image in JPEG in all sizes (original, h240 for pdf and h90 for web).
     Returns filename (relative to PHOTO_DIR), without extension
     """
     data_file = io.BytesIO()
@@ -299,14 +423,70 @@ def save_image(etudid, data):
     path = os.path.join(PHOTO_DIR, filename)
     log("saving %dx%d jpeg to %s" % (img.size[0], img.size[1], path))
     img = img.convert("RGB")
-    img.save(path + IMAGE_EXT, format="JPEG", quality=92)
-    # resize:
-    img = scale_height(img)
-    log("saving %dx%d jpeg to %s.h90" % (img.size[0], img.size[1], filename))
-    img.save(path + H90 + IMAGE_EXT, format="JPEG", quality=92)
+    _save_jpeg(img, path + IMAGE_EXT)
+    _save_reduced_images(img, path, [v for v in PHOTO_SIZES.values() if v[1]])
     return filename
 
 
+def _save_missing_versions(path):
+    """Crée les versions réduites manquantes de l'image path+IMAGE_EXT
+    (photos enregistrées avant l'existence de ces versions)
+    """
+    versions = [
+        (version, height)
+        for (version, height) in PHOTO_SIZES.values()
+        if height and not os.path.exists(path + version + IMAGE_EXT)
+    ]
+    log("creating missing versions of old photo %s" % path)
+    with PILImage.open(path + IMAGE_EXT) as img:
+        _save_reduced_images(img, path, versions)
+
+
+def _save_reduced_images(img, path, versions):
+    """Save reduced copies of img, versions is a list of (suffix, height).
+    Resize from the largest to the smallest version.
+    """
+    for version, height in sorted(versions, key=lambda v: -v[1]):
+        img = _save_reduced_image(img, path, version, height)
+
+
+def _save_reduced_image(img, path, version, height):
+    """Save a reduced copy of img in path+version+IMAGE_EXT.
+    Returns the reduced image.
+    """
+    img = scale_height(img.convert("RGB"), H=height)
+    log("saving %dx%d jpeg to %s%s" % (img.size[0], img.size[1], path, version))
+    _save_jpeg(img, path + version + IMAGE_EXT)
+    return img
+
+
+def _save_jpeg(img, filename):
+    """Save in JPEG (atomically, the file may be read by other processes).
+    Le fichier temporaire est propre à chaque appel: plusieurs processus
+    peuvent créer la même image simultanément.
+    """
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, format="JPEG", quality=92)
+        os.chmod(tmp_filename, 0o644)
+        os.replace(tmp_filename, filename)
+    except:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def _remove_image_files(filename):
+    "Remove all versions of image filename (relative to PHOTO_DIR, without extension)"
+    base_path = os.path.join(PHOTO_DIR, filename)
+    for version, _ in PHOTO_SIZES.values():
+        path = base_path + version + IMAGE_EXT
+        if os.path.exists(path):
+            log("removing file %s" % path)
+            os.remove(path)
+
+
 def scale_height(img, W=None, H=REDUCED_HEIGHT):
     if W is None:
         # keep aspect
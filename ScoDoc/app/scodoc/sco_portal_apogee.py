@@ -27,6 +27,7 @@
 
 """Liaison avec le portail ENT (qui donne accès aux infos Apogée)
 """
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import os
 import time
@@ -35,13 +36,19 @@ import xml
 import xml.sax.saxutils
 import xml.dom.minidom
 
+from flask import current_app
+
 import app.scodoc.sco_utils as scu
 from app import log
 from app.scodoc.sco_exceptions import ScoValueError
+from app.scodoc import sco_cache
 from app.scodoc import sco_preferences
 
 SCO_CACHE_ETAPE_FILENAME = os.path.join(scu.SCO_TMP_DIR, "last_etapes.xml")
 
+# nombre max. de requêtes simultanées au portail (listes d'inscrits des étapes)
+APO_MAX_CONCURRENT_REQUESTS = 4
+
 
 def has_portal():
     "True if we are connected to a portal"
@@ -143,16 +150,70 @@ def get_inscrits_etape(code_etape, anneeapogee=None, ntrials=2):
     """Liste des inscrits à une étape Apogée
     Result = list of dicts
     ntrials: try several time the same request, useful for some bad web services
+    (voir get_inscrits_etapes)
     """
-    log("get_inscrits_etape: code=%s anneeapogee=%s" % (code_etape, anneeapogee))
     if anneeapogee is None:
         anneeapogee = str(time.localtime()[0])
+    key = (str(code_etape), str(anneeapogee))
+    return get_inscrits_etapes([key], ntrials=ntrials)[key]
 
+
+def get_inscrits_etapes(etapes_annees, ntrials=2) -> dict:
+    """Listes des inscrits à plusieurs étapes Apogée
+    etapes_annees: liste de (code_etape, anneeapogee)
+    Result = { (str(code_etape), str(anneeapogee)) : list of dicts }
+
+    Les listes sont gardées en cache quelques minutes
+    (sco_cache.ApoInscritsEtapeCache): la synchronisation, le bilan des
+    étapes et la vérification des paiements ne ré-interrogent pas le portail.
+    Les étapes absentes du cache sont demandées au portail en parallèle.
+    """
+    keys = []
+    for code_etape, anneeapogee in etapes_annees:
+        if anneeapogee is None:
+            anneeapogee = time.localtime()[0]
+        key = (str(code_etape), str(anneeapogee))
+        if key not in keys:
+            keys.append(key)
     etud_url = get_etud_url()
+    if not etud_url or not keys:
+        return {key: [] for key in keys}
+    cache_keys = {key: "_".join(key) for key in keys}
+    cached = sco_cache.ApoInscritsEtapeCache.get_many(cache_keys.values())
+    res = {key: cached[cache_keys[key]] for key in keys if cache_keys[key] in cached}
+    missing = [key for key in keys if key not in res]
+    if not missing:
+        return res
     api_ver = get_portal_api_version()
-    if not etud_url:
-        return []
     portal_timeout = sco_preferences.get_preference("portal_timeout")
+    reqs = {key: _inscrits_etape_req(etud_url, api_ver, *key) for key in missing}
+    app = current_app._get_current_object()
+
+    def fetch(key):
+        with app.app_context():  # pour log
+            return _query_inscrits_etape(reqs[key], portal_timeout, ntrials)
+
+    with ThreadPoolExecutor(
+        max_workers=min(len(missing), APO_MAX_CONCURRENT_REQUESTS)
+    ) as executor:
+        docs = dict(zip(missing, executor.map(fetch, missing)))
+    failed = []  # étapes sans réponse (les autres sont mises en cache)
+    for key in missing:
+        if not docs[key]:
+            failed.append(key)
+            continue
+        res[key] = _parse_inscrits_etape(docs[key], reqs[key], *key)
+        sco_cache.ApoInscritsEtapeCache.set(cache_keys[key], res[key])
+    if failed:
+        raise ScoValueError(
+            "pas de réponse du portail ! (timeout=%s)" % portal_timeout
+        )
+    return res
+
+
+def _inscrits_etape_req(etud_url, api_ver, code_etape, anneeapogee):
+    "URL de la requête au portail donnant les inscrits à l'étape"
+    log("get_inscrits_etape: code=%s anneeapogee=%s" % (code_etape, anneeapogee))
     if api_ver > 1:
         req = (
             etud_url
@@ -161,6 +222,14 @@ def get_inscrits_etape(code_etape, anneeapogee=None, ntrials=2):
         )
     else:
         req = etud_url + "?" + urllib.parse.urlencode((("etape", code_etape),))
+    return req
+
+
+def _query_inscrits_etape(req, portal_timeout, ntrials):
+    """Interroge le portail (réponse XML), en plusieurs essais si nécessaire.
+    "" si pas de réponse.
+    """
+    doc = ""
     actual_timeout = float(portal_timeout) / ntrials
     if portal_timeout > 0:
         actual_timeout = max(1, actual_timeout)
@@ -168,8 +237,11 @@ def get_inscrits_etape(code_etape, anneeapogee=None, ntrials=2):
         doc = scu.query_portal(req, timeout=actual_timeout)
         if doc:
             break
-    if not doc:
-        raise ScoValueError("pas de réponse du portail ! (timeout=%s)" % portal_timeout)
+    return doc
+
+
+def _parse_inscrits_etape(doc, req, code_etape, anneeapogee):
+    "Liste des étudiants de la réponse du portail inscrits cette année"
     etuds = _normalize_apo_fields(xml_to_list_of_dicts(doc, req=req))
 
     # Filtre sur annee inscription Apogee:
@@ -505,11 +577,16 @@ def _normalize_apo_fields(infolist):
     return infolist
 
 
-def check_paiement_etuds(etuds):
+def check_paiement_etuds(etuds, etapes_annees=()):
     """Interroge le portail pour vérifier l'état de "paiement" et l'étape d'inscription.
 
     Seuls les etudiants avec code NIP sont renseignés.
 
+    etapes_annees: étapes (code_etape, anneeapogee) où chercher d'abord les
+    étudiants (listes des inscrits, en cache, voir get_inscrits_etapes).
+    Les autres, y compris ceux des étapes pour lesquelles le portail
+    n'a pas répondu, sont demandés un par un au portail.
+
     Renseigne l'attribut booleen 'paiementinscription' dans chaque etud.
 
     En sortie: modif les champs de chaque etud
@@ -517,7 +594,20 @@ def check_paiement_etuds(etuds):
     'paiementinscription_str' : 'ok', 'Non' ou '?' ou '(pas de code)'
     'etape' : etape Apogee ou None
     """
-    # interrogation séquentielle longue...
+    try:
+        inscrits_etapes = get_inscrits_etapes(etapes_annees)
+    except ScoValueError:
+        # au moins une étape sans réponse: garde les autres
+        inscrits_etapes = {}
+        for etape_annee in etapes_annees:
+            try:
+                inscrits_etapes.update(get_inscrits_etapes([etape_annee]))
+            except ScoValueError:
+                log("check_paiement_etuds: pas de liste pour %s" % (etape_annee,))
+    apo_etuds = {}  # nip : etud apo
+    for etudsapo in inscrits_etapes.values():
+        apo_etuds.update({e["nip"]: e for e in etudsapo if "nip" in e})
+    # interrogation séquentielle longue pour les autres...
     for etud in etuds:
         if "code_nip" not in etud:
             etud["paiementinscription"] = None
@@ -527,7 +617,9 @@ def check_paiement_etuds(etuds):
             etud["etape"] = None
         else:
             # Modifie certains champs de l'étudiant:
-            infos = get_etud_apogee(etud["code_nip"])
+            infos = apo_etuds.get(etud["code_nip"]) or get_etud_apogee(
+                etud["code_nip"]
+            )
             if infos:
                 for k in (
                     "paiementinscription",
@@ -1898,6 +1898,14 @@ class BasePreferences(object):
             return self.prefs[formsemestre_id].get(name, self.prefs[None][name])
         return self.prefs[None][name]
 
+    def snapshot(self, formsemestre_id=None) -> dict:
+        """Toutes les valeurs des préférences de ce semestre (ou globales),
+        dans un dict { name : value }
+        """
+        values = {name: self.prefs[None].get(name) for name in self.prefs_name}
+        values.update(self.prefs.get(formsemestre_id, {}))
+        return values
+
     def __contains__(self, item):
         return item in self.prefs[None]
 
@@ -76,12 +76,15 @@ def feuille_preparation_jury(formsemestre_id):
     groupestd = {}  # etudid : nom groupe principal
     nbabs = {}
     nbabsjust = {}
+    formation_codes = {}  # partagé par les parcours des étudiants
     for etudid in etudids:
         info = sco_etud.get_etud_info(etudid=etudid, filled=True)
         if not info:
             continue  # should not occur...
         etud = info[0]
-        Se = sco_parcours_dut.SituationEtudParcours(etud, formsemestre_id)
+        Se = sco_parcours_dut.SituationEtudParcours(
+            etud, formsemestre_id, formation_codes=formation_codes
+        )
         if Se.prev:
             ntp = sco_cache.NotesTableCache.get(
                 Se.prev["formsemestre_id"]
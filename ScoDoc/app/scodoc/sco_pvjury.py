@@ -185,6 +185,23 @@ def _sum_ects_dicts(s, t):
     return sum_ects
 
 
+def _max_decision_date(d, max_date="0000-01-01"):
+    """Date (ISO) de la décision (sem ou UE) la plus récente de d,
+    ou max_date si elle est plus récente.
+    """
+    if d["decision_sem"]:
+        date = ndb.DateDMYtoISO(d["decision_sem"]["event_date"])
+        if date and date > max_date:  # decision plus recente
+            max_date = date
+    if d["decisions_ue"]:
+        for dec_ue in d["decisions_ue"].values():
+            if dec_ue:
+                date = ndb.DateDMYtoISO(dec_ue["event_date"])
+                if date and date > max_date:  # decision plus recente
+                    max_date = date
+    return max_date
+
+
 def dict_pvjury(
     formsemestre_id,
     etudids=None,
@@ -232,12 +249,16 @@ def dict_pvjury(
 
     L = []
     D = {}  # même chose que L, mais { etudid : dec }
+    formation_codes = {}  # partagé par les parcours des étudiants
     for etudid in etudids:
         etud = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
-        Se = sco_parcours_dut.SituationEtudParcours(etud, formsemestre_id)
+        Se = sco_parcours_dut.SituationEtudParcours(
+            etud, formsemestre_id, formation_codes=formation_codes
+        )
         semestre_non_terminal = semestre_non_terminal or Se.semestre_non_terminal
         d = {}
-        d["identite"] = nt.identdict[etudid]
+        # copie: la NotesTable est partagée (cache local du processus)
+        d["identite"] = nt.identdict[etudid].copy()
         d["etat"] = nt.get_etud_etat(
             etudid
         )  # I|D|DEF  (inscription ou démission ou défaillant)
@@ -318,16 +339,7 @@ def dict_pvjury(
         d["observation"] = ", ".join(obs)
 
         # Cherche la date de decision (sem ou UE) la plus récente:
-        if d["decision_sem"]:
-            date = ndb.DateDMYtoISO(d["decision_sem"]["event_date"])
-            if date and date > max_date:  # decision plus recente
-                max_date = date
-        if d["decisions_ue"]:
-            for dec_ue in d["decisions_ue"].values():
-                if dec_ue:
-                    date = ndb.DateDMYtoISO(dec_ue["event_date"])
-                    if date and date > max_date:  # decision plus recente
-                        max_date = date
+        max_date = _max_decision_date(d, max_date)
         # Code semestre precedent
         if with_prev:  # optionnel car un peu long...
             info = sco_etud.get_etud_info(etudid=etudid, filled=True)
@@ -362,6 +374,34 @@ def dict_pvjury(
     }
 
 
+def restrict_dict_pvjury(dpv, etudids):
+    """Restreint un résultat de dict_pvjury aux étudiants indiqués,
+    sans refaire les calculs (évite de recalculer les situations de parcours).
+    dpv doit avoir été calculé avec with_prev=True.
+    Résultat identique à dict_pvjury(formsemestre_id, etudids=etudids, with_prev=True)
+    """
+    if not dpv:
+        return {}
+    etudids = [etudid for etudid in etudids if etudid in dpv["decisions_dict"]]
+    if not etudids:
+        return {}
+    L = [dpv["decisions_dict"][etudid] for etudid in etudids]
+    max_date = "0000-01-01"
+    for d in L:
+        max_date = _max_decision_date(d, max_date)
+    r = dpv.copy()
+    r.update(
+        {
+            "date": ndb.DateISOtoDMY(max_date),
+            "has_prev": any(d["prev_decision_sem"] is not None for d in L),
+            "semestre_non_terminal": any(d["Se"].semestre_non_terminal for d in L),
+            "decisions": L,
+            "decisions_dict": {d["identite"]["etudid"]: d for d in L},
+        }
+    )
+    return r
+
+
 def pvjury_table(
     dpv,
     only_diplome=False,
@@ -495,13 +535,14 @@ def pvjury_table(
     return lines, titles, columns_ids
 
 
-def formsemestre_pvjury(formsemestre_id, format="html", publish=True):
+def formsemestre_pvjury(formsemestre_id, format="html", publish=True, dpv=None):
     """Page récapitulant les décisions de jury
-    dpv: result of dict_pvjury
+    dpv: result of dict_pvjury (calculé si non fourni)
     """
     footer = html_sco_header.sco_footer()
 
-    dpv = dict_pvjury(formsemestre_id, with_prev=True)
+    if dpv is None:
+        dpv = dict_pvjury(formsemestre_id, with_prev=True)
     if not dpv:
         if format == "html":
             return (
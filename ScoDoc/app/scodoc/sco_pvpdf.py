@@ -30,6 +30,7 @@
 import io
 import os
 import re
+import time
 
 import reportlab
 from reportlab.lib.units import cm, mm
@@ -52,6 +53,7 @@ from app.scodoc import sco_pdf
 from app.scodoc import sco_preferences
 from app.scodoc import sco_etud
 import sco_version
+from app import log
 from app.scodoc.sco_pdf import PDFLOCK
 from app.scodoc.sco_pdf import SU
 
@@ -197,37 +199,25 @@ class CourrierIndividuelTemplate(PageTemplate):
 
         PageTemplate.__init__(self, template_name, [content])
 
-        self.background_image_filename = None
+        # Logos and background in dept specific dir, then in global scu.CONFIG dir
+        # (images cached by sco_pdf)
+        if template_name == "PVJuryTemplate":
+            background = "pvjury_background"
+        else:
+            background = "letter_background"
+        self.background_image = sco_pdf.find_image_reader((background,))
         self.logo_footer = None
+        reader = sco_pdf.find_image_reader(("logo_footer",))
+        if reader:
+            self.logo_footer = sco_pdf.CachedImage(
+                reader, height=LOGO_FOOTER_HEIGHT, width=LOGO_FOOTER_WIDTH
+            )
         self.logo_header = None
-        # Search logos in dept specific dir, then in global scu.CONFIG dir
-        for image_dir in (
-            scu.SCODOC_LOGOS_DIR + "/logos_" + g.scodoc_dept,
-            scu.SCODOC_LOGOS_DIR,  # global logos
-        ):
-            for suffix in scu.LOGOS_IMAGES_ALLOWED_TYPES:
-                if template_name == "PVJuryTemplate":
-                    fn = image_dir + "/pvjury_background" + "." + suffix
-                else:
-                    fn = image_dir + "/letter_background" + "." + suffix
-                if not self.background_image_filename and os.path.exists(fn):
-                    self.background_image_filename = fn
-
-                fn = image_dir + "/logo_footer" + "." + suffix
-                if not self.logo_footer and os.path.exists(fn):
-                    self.logo_footer = Image(
-                        fn,
-                        height=LOGO_FOOTER_HEIGHT,
-                        width=LOGO_FOOTER_WIDTH,
-                    )
-
-                fn = image_dir + "/logo_header" + "." + suffix
-                if not self.logo_header and os.path.exists(fn):
-                    self.logo_header = Image(
-                        fn,
-                        height=LOGO_HEADER_HEIGHT,
-                        width=LOGO_HEADER_WIDTH,
-                    )
+        reader = sco_pdf.find_image_reader(("logo_header",))
+        if reader:
+            self.logo_header = sco_pdf.CachedImage(
+                reader, height=LOGO_HEADER_HEIGHT, width=LOGO_HEADER_WIDTH
+            )
 
     def beforeDrawPage(self, canvas, doc):
         """Draws a logo and an contribution message on each page."""
@@ -246,9 +236,9 @@ class CourrierIndividuelTemplate(PageTemplate):
             canvas.addOutlineEntry(txt, bm)
 
         # ---- Background image
-        if self.background_image_filename and self.with_page_background:
+        if self.background_image and self.with_page_background:
             canvas.drawImage(
-                self.background_image_filename, 0, 0, doc.pagesize[0], doc.pagesize[1]
+                self.background_image, 0, 0, doc.pagesize[0], doc.pagesize[1]
             )
 
         # ---- Header/Footer
@@ -330,39 +320,44 @@ def pdf_lettres_individuelles(
     date_jury="",
     date_commission="",
     signature=None,
+    dpv=None,
 ):
     """Document PDF avec les lettres d'avis pour les etudiants mentionnés
     (tous ceux du semestre, ou la liste indiquée par etudids)
     Renvoie pdf data ou chaine vide si aucun etudiant avec décision de jury.
+    dpv: result of dict_pvjury (pour ces étudiants), calculé si non fourni.
     """
     from app.scodoc import sco_pvjury
 
-    dpv = sco_pvjury.dict_pvjury(formsemestre_id, etudids=etudids, with_prev=True)
+    t0 = time.time()
+    if dpv is None:
+        dpv = sco_pvjury.dict_pvjury(formsemestre_id, etudids=etudids, with_prev=True)
     if not dpv:
         return ""
-    # Ajoute infos sur etudiants
-    etuds = [x["identite"] for x in dpv["decisions"]]
+    # Ajoute infos sur etudiants (toutes en une fois)
+    etuds = [x["identite"] for x in dpv["decisions"] if x["decision_sem"]]
     sco_etud.fill_etuds_info(etuds)
     #
     sem = sco_formsemestre.get_formsemestre(formsemestre_id)
     prefs = sco_preferences.SemPreferences(formsemestre_id)
-    params = {
-        "date_jury": date_jury,
-        "date_commission": date_commission,
-        "titre_formation": dpv["formation"]["titre_officiel"],
-        "htab1": "8cm",  # lignes à droite (entete, signature)
-        "htab2": "1cm",
-    }
     # copie preferences
-    for name in sco_preferences.get_base_preferences().prefs_name:
-        params[name] = sco_preferences.get_preference(name, sem["formsemestre_id"])
+    params = prefs.base_prefs.snapshot(formsemestre_id)
+    params.update(
+        {
+            "date_jury": date_jury,
+            "date_commission": date_commission,
+            "titre_formation": dpv["formation"]["titre_officiel"],
+            "htab1": "8cm",  # lignes à droite (entete, signature)
+            "htab2": "1cm",
+        }
+    )
 
     bookmarks = {}
     objects = []  # list of PLATYPUS objects
     npages = 0
     for e in dpv["decisions"]:
         if e["decision_sem"]:  # decision prise
-            etud = sco_etud.get_etud_info(e["identite"]["etudid"], filled=True)[0]
+            etud = e["identite"]
             params["nomEtud"] = etud["nomprenom"]
             bookmarks[npages + 1] = scu.suppress_accents(etud["nomprenom"])
             objects += pdf_lettre_individuelle(
@@ -397,6 +392,11 @@ def pdf_lettres_individuelles(
 
     document.build(objects)
     data = report.getvalue()
+    duration = time.time() - t0
+    log(
+        f"pdf_lettres_individuelles: {npages} lettres en {duration:.1f}s"
+        f" ({npages / max(duration, 1e-3):.1f} lettres/s)"
+    )
     return data
 
 
@@ -425,7 +425,7 @@ def pdf_lettre_individuelle(sem, decision, etud, params, signature=None):
     objects = []
     style = reportlab.lib.styles.ParagraphStyle({})
     style.fontSize = 14
-    style.fontName = sco_preferences.get_preference("PV_FONTNAME", formsemestre_id)
+    style.fontName = params["PV_FONTNAME"]
     style.leading = 18
     style.alignment = TA_JUSTIFY
 
@@ -439,9 +439,6 @@ def pdf_lettre_individuelle(sem, decision, etud, params, signature=None):
     else:
         params["decisions_ue_descr_plural"] = ""
 
-    params["INSTITUTION_CITY"] = sco_preferences.get_preference(
-        "INSTITUTION_CITY", formsemestre_id
-    )
     if decision["prev_decision_sem"]:
         params["prev_semestre_id"] = decision["prev"]["semestre_id"]
         params["prev_code_descr"] = decision["prev_code_descr"]
@@ -507,7 +504,7 @@ def pdf_lettre_individuelle(sem, decision, etud, params, signature=None):
 
     # Corps de la lettre:
     objects += sco_bulletins_pdf.process_field(
-        sco_preferences.get_preference("PV_LETTER_TEMPLATE", sem["formsemestre_id"]),
+        params["PV_LETTER_TEMPLATE"],
         params,
         style,
         suppress_empty_pars=True,
@@ -517,12 +514,7 @@ def pdf_lettre_individuelle(sem, decision, etud, params, signature=None):
     # nota: si semestre terminal, signature par directeur IUT, sinon, signature par
     # chef de département.
     if Se.semestre_non_terminal:
-        sig = (
-            sco_preferences.get_preference(
-                "PV_LETTER_PASSAGE_SIGNATURE", formsemestre_id
-            )
-            % params
-        )
+        sig = params["PV_LETTER_PASSAGE_SIGNATURE"] % params
         sig = _simulate_br(sig, '<para leftindent="%(htab1)s">')
         objects += sco_pdf.makeParas(
             (
@@ -534,12 +526,7 @@ def pdf_lettre_individuelle(sem, decision, etud, params, signature=None):
             style,
         )
     else:
-        sig = (
-            sco_preferences.get_preference(
-                "PV_LETTER_DIPLOMA_SIGNATURE", formsemestre_id
-            )
-            % params
-        )
+        sig = params["PV_LETTER_DIPLOMA_SIGNATURE"] % params
         sig = _simulate_br(sig, '<para leftindent="%(htab1)s">')
         objects += sco_pdf.makeParas(
             (
@@ -570,18 +557,14 @@ def _simulate_br(p, para="<para>"):
 
 def _make_signature_image(signature, leftindent, formsemestre_id):
     "cree un paragraphe avec l'image signature"
-    # cree une image PIL pour avoir la taille (W,H)
-    from PIL import Image as PILImage
-
-    f = io.BytesIO(signature)
-    im = PILImage.open(f)
-    width, height = im.size
+    # image décodée une seule fois (cache sco_pdf)
+    reader = sco_pdf.get_image_reader_from_data(signature)
+    width, height = reader.getSize()
     pdfheight = (
         1.0
         * sco_preferences.get_preference("pv_sig_image_height", formsemestre_id)
         * mm
     )
-    f.seek(0, 0)
 
     style = styles.ParagraphStyle({})
     style.leading = 1.0 * sco_preferences.get_preference(
@@ -589,7 +572,14 @@ def _make_signature_image(signature, leftindent, formsemestre_id):
     )  # vertical space
     style.leftIndent = leftindent
     return Table(
-        [("", Image(f, width=width * pdfheight / float(height), height=pdfheight))],
+        [
+            (
+                "",
+                sco_pdf.CachedImage(
+                    reader, width=width * pdfheight / float(height), height=pdfheight
+                ),
+            )
+        ],
         colWidths=(9 * cm, 7 * cm),
     )
 
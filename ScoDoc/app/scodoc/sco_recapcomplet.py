@@ -30,9 +30,11 @@
 import datetime
 import json
 import time
+import traceback
 from xml.etree import ElementTree
 
-from flask import request
+import flask
+from flask import g, request
 from flask import make_response
 
 import app.scodoc.sco_utils as scu
@@ -56,6 +58,7 @@ from app.scodoc import sco_etud
 from app.scodoc import sco_users
 from app.scodoc import sco_xml
 from app.scodoc.sco_codes_parcours import DEF, UE_SPORT
+from app.scodoc.sco_exceptions import ScoValueError
 
 
 def formsemestre_recapcomplet(
@@ -410,7 +413,7 @@ def make_formsemestre_recapcomplet(
         else:
             rank = nt.get_etud_rang(etudid)
 
-        e = nt.identdict[etudid]
+        e = nt.identdict[etudid].copy()  # modifié par format_etud_ident
         if civ_nom_prenom:
             sco_etud.format_etud_ident(e)
             l = [rank, e["civilite_str"], e["nom_disp"], e["prenom"]]  # civ, nom prenom
@@ -845,7 +848,7 @@ def _list_notes_evals_titles(codemodule, evals):
 
 
 def _list_notes_evals_stats(evals, key):
-    """Liste des stats (moy, ou rien!) des evals completes"""
+    """Liste des stats (moy, min, max) des evals completes"""
     L = []
     for e in evals:
         if (
@@ -857,13 +860,15 @@ def _list_notes_evals_stats(evals, key):
                 val = e["etat"]["moy_num"]
                 L.append(scu.fmt_note(val, keep_numeric=True))
             elif key == "max":
-                L.append(e["note_max"])
+                val = e["etat"]["maxi_num"]
+                L.append(scu.fmt_note(val, keep_numeric=True))
             elif key == "min":
-                L.append(0.0)
+                val = e["etat"]["mini_num"]
+                L.append(scu.fmt_note(val, keep_numeric=True))
             elif key == "coef":
                 L.append(e["coefficient"])
             else:
-                L.append("")  # on n'a pas sous la main min/max
+                L.append("")
     return L
 
 
@@ -897,6 +902,8 @@ def _formsemestre_recapcomplet_xml(
             date_derniere_note=str(evals["last_modif"]),
         )
     )
+    # charge les données de tous les bulletins:
+    sco_bulletins.get_sem_bulletins_snapshot(formsemestre_id, prefetch=True)
     for t in T:
         etudid = t[-1]
         sco_bulletins_xml.make_xml_formsemestre_bulletinetud(
@@ -944,6 +951,8 @@ def _formsemestre_recapcomplet_json(
     bulletins = J["bulletins"]
     nt = sco_cache.NotesTableCache.get(formsemestre_id)  # > get_table_moyennes_triees
     T = nt.get_table_moyennes_triees()
+    # charge les données de tous les bulletins:
+    sco_bulletins.get_sem_bulletins_snapshot(formsemestre_id, prefetch=True)
     for t in T:
         etudid = t[-1]
         bulletins.append(
@@ -957,18 +966,81 @@ def _formsemestre_recapcomplet_json(
     return J, "", "json"
 
 
-def formsemestres_bulletins(annee_scolaire):
+def formsemestres_bulletins(annee_scolaire, after_formsemestre_id=None, limit=None):
     """Tous les bulletins des semestres publiés des semestres de l'année indiquée.
-    :param annee_scolaire(int): année de début de l'année scoalaire
-    :returns: JSON
+    La réponse est envoyée au fur et à mesure, semestre par semestre: la mémoire
+    utilisée reste celle du plus gros semestre.
+    Pour récupérer l'export par morceaux (reprise après une interruption, ou
+    plusieurs requêtes traitées en parallèle par les processus du serveur),
+    indiquer limit et/ou after_formsemestre_id: les semestres sont alors
+    triés par formsemestre_id.
+
+    La réponse ayant commencé avant la fin du calcul, une erreur sur un
+    semestre ne peut plus changer le code HTTP (200): elle est signalée par
+    un dernier élément {"error": message, "formsemestre_id": id} dans la
+    liste, qui reste un JSON valide. Le client doit alors reprendre l'export
+    après le dernier semestre reçu.
+
+    :param annee_scolaire(int): année de début de l'année scolaire
+    :param after_formsemestre_id(int): optionnel, dernier semestre déjà reçu
+    :param limit(int): optionnel, nombre max. de semestres dans la réponse
+    :returns: JSON (liste des bulletins de chaque semestre)
+    En-tête de la réponse X-ScoDoc-Next-After: présent seulement si limit
+    a tronqué la liste; valeur de after_formsemestre_id à passer pour obtenir
+    la suite (absent sur la dernière page).
     """
-    jslist = []
     sems = sco_formsemestre.list_formsemestre_by_etape(annee_scolaire=annee_scolaire)
+    next_after = None
+    if after_formsemestre_id is not None or limit is not None:
+        sems.sort(key=lambda s: s["formsemestre_id"])
+        if after_formsemestre_id is not None:
+            after_formsemestre_id = int(after_formsemestre_id)
+            sems = [s for s in sems if s["formsemestre_id"] > after_formsemestre_id]
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ScoValueError("formsemestres_bulletins: limit invalide")
+            if len(sems) > limit:
+                sems = sems[:limit]
+                next_after = sems[-1]["formsemestre_id"]
     log("formsemestres_bulletins(%s): %d sems" % (annee_scolaire, len(sems)))
-    for sem in sems:
-        J, _, _ = _formsemestre_recapcomplet_json(
-            sem["formsemestre_id"], force_publishing=False
-        )
-        jslist.append(J)
+    formsemestre_ids = [sem["formsemestre_id"] for sem in sems]
 
-    return scu.sendJSON(jslist)
+    def generate():
+        yield "["
+        for i, formsemestre_id in enumerate(formsemestre_ids):
+            sep = "\n" if i == 0 else ",\n"
+            try:
+                J, _, _ = _formsemestre_recapcomplet_json(
+                    formsemestre_id, force_publishing=False
+                )
+                data = json.dumps(J, indent=1, cls=scu.ScoDocJSONEncoder)
+            except Exception as exc:
+                # réponse déjà commencée: marqueur d'erreur en fin de liste
+                log("formsemestres_bulletins: error on %s" % formsemestre_id)
+                log(traceback.format_exc())
+                yield sep + json.dumps(
+                    {"error": str(exc), "formsemestre_id": formsemestre_id}
+                )
+                break
+            yield sep + data
+            del J, data
+            _release_sem_data(formsemestre_id)
+        yield "\n]\n"
+
+    response = flask.Response(
+        flask.stream_with_context(generate()), mimetype=scu.JSON_MIMETYPE
+    )
+    if next_after is not None:
+        response.headers["X-ScoDoc-Next-After"] = str(next_after)
+    return response
+
+
+def _release_sem_data(formsemestre_id):
+    """Oublie les données de ce semestre conservées pendant la requête
+    (elles restent dans les caches partagés et pourront être relues).
+    """
+    if hasattr(g, "nt_cache"):
+        g.nt_cache.pop(formsemestre_id, None)
+    if hasattr(g, "bulletins_snapshots"):
+        g.bulletins_snapshots.pop(formsemestre_id, None)
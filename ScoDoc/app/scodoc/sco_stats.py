@@ -0,0 +1,164 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+##############################################################################
+#
+# Gestion scolarite IUT
+#
+# Copyright (c) 1999 - 2021 Emmanuel Viennet.  All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#   Emmanuel Viennet      emmanuel.viennet@viennet.net
+#
+##############################################################################
+
+"""Statistiques sur des séries de notes
+
+Calcul commun (moyenne, médiane, quantiles, écart-type, min, max, histogramme)
+utilisé par l'état des évaluations, la NotesTable, les listes de notes
+et le tableau récapitulatif.
+
+Les notes valides sont rangées dans un tableau typé (array de doubles),
+trié une seule fois. Les valeurs spéciales ne sont pas prises en compte
+dans les statistiques, mais décomptées à part:
+    None (ABS), NOTES_NEUTRALISE (EXC), NOTES_ATTENTE (ATT),
+    et les valeurs non numériques ("NA", "NI", "-c-", ...)
+"""
+
+from array import array
+import math
+
+import app.scodoc.sco_utils as scu
+
+
+class NotesStats(object):
+    """Statistiques d'une série de notes.
+
+    Attributs:
+        n: nombre de notes valides
+        nb_total: nombre de valeurs (y compris spéciales)
+        nb_abs, nb_neutre, nb_att: nombre de ABS, EXC, ATT
+        nb_invalid: nombre de valeurs non numériques
+        values: notes valides triées (array)
+        mean, median, std, min, max: None si aucune note valide
+    """
+
+    def __init__(self, notes=()):
+        values = array("d")
+        nb_abs, nb_neutre, nb_att, nb_invalid = 0, 0, 0, 0
+        total = 0.0
+        mean, m2 = 0.0, 0.0  # pour l'écart-type en une passe (Welford)
+        n = 0
+        for x in notes:
+            if x is None:
+                nb_abs += 1
+                continue
+            if not isinstance(x, (float, int)):
+                try:
+                    x = float(x)
+                except (ValueError, TypeError):
+                    nb_invalid += 1
+                    continue
+            if x == scu.NOTES_NEUTRALISE:
+                nb_neutre += 1
+            elif x == scu.NOTES_ATTENTE:
+                nb_att += 1
+            else:
+                values.append(x)
+                n += 1
+                total += x
+                delta = x - mean
+                mean += delta / n
+                m2 += delta * (x - mean)
+        self.n = n
+        self.nb_abs = nb_abs
+        self.nb_neutre = nb_neutre
+        self.nb_att = nb_att
+        self.nb_invalid = nb_invalid
+        self.nb_total = n + nb_abs + nb_neutre + nb_att + nb_invalid
+        if n:
+            self.values = array("d", sorted(values))
+            self.mean = total / n
+            self.std = math.sqrt(m2 / n)
+            self.min = self.values[0]
+            self.max = self.values[-1]
+            if n % 2:
+                self.median = self.values[n // 2]
+            else:
+                self.median = (self.values[n // 2] + self.values[n // 2 - 1]) / 2
+        else:
+            self.values = values
+            self.mean = self.median = self.std = self.min = self.max = None
+
+    def __repr__(self):
+        return f"<NotesStats n={self.n} mean={self.mean} median={self.median}>"
+
+    def quantile(self, q: float):
+        """Quantile d'ordre q (0 <= q <= 1), par interpolation linéaire
+        entre les notes encadrantes. None si aucune note.
+        """
+        if not self.n:
+            return None
+        if not 0.0 <= q <= 1.0:
+            raise ValueError("quantile: q doit être entre 0 et 1")
+        pos = q * (self.n - 1)
+        i = int(pos)
+        if i >= self.n - 1:
+            return self.values[-1]
+        return self.values[i] + (self.values[i + 1] - self.values[i]) * (pos - i)
+
+    def quantiles(self, qs=(0.25, 0.5, 0.75)) -> list:
+        "Liste des quantiles demandés"
+        return [self.quantile(q) for q in qs]
+
+    def histogram(self, nbins: int, minmax=None):
+        """Histogramme des notes valides: (bins, H)
+        H[i] est le nombre de notes x telles que bins[i] <= x < bins[i+1]
+        Si minmax=(xmin, xmax) est donné, les notes hors de l'intervalle
+        sont ramenées à ses bornes.
+        """
+        H = [0] * nbins
+        if minmax is None:
+            if not self.n:
+                return [], H
+            xmin, xmax = self.min, self.max
+        else:
+            xmin, xmax = minmax
+        bin_width = (xmax - xmin) / float(nbins - 1) if nbins > 1 else 0.0
+        for x in self.values:
+            if x <= xmin or bin_width <= 0:
+                idx = 0
+            elif x >= xmax:
+                idx = nbins - 1
+            else:
+                idx = min(int(math.floor((x - xmin) / bin_width)), nbins - 1)
+            H[idx] += 1
+        bins = [xmin + bin_width * i for i in range(nbins)]
+        return bins, H
+
+
+def notes_stats_groups(group_notes, group_ids=()) -> dict:
+    """Statistiques de plusieurs groupes en une passe sur les notes.
+    group_notes: itérable de (group_id, note)
+    group_ids: groupes à inclure même s'ils n'ont aucune note
+    Résultat: { group_id : NotesStats }
+    """
+    notes_by_group = {group_id: [] for group_id in group_ids}
+    for group_id, note in group_notes:
+        notes_by_group.setdefault(group_id, []).append(note)
+    return {
+        group_id: NotesStats(notes) for group_id, notes in notes_by_group.items()
+    }
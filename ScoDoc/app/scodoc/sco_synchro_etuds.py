@@ -140,6 +140,7 @@ def formsemestre_synchro_etuds(
         inscrits_set,
         inscrits_without_key_all,
         etudsapo_ident,
+        key2etudid,
     ) = list_synch(sem, anneeapogee=anneeapogee)
     if export_cat_xls:
         filename = export_cat_xls
@@ -206,8 +207,12 @@ def formsemestre_synchro_etuds(
 
             if a_desinscrire:
                 H.append("<h3>Etudiants à désinscrire :</h3><ol>")
+                etuds_desinscrits = sco_etud.identite_list_many(
+                    ndb.GetDBConnexion(), [key2etudid[key] for key in a_desinscrire]
+                )
                 for key in a_desinscrire:
-                    etud = sco_etud.get_etud_info(filled=True, code_nip=key)[0]
+                    etud = etuds_desinscrits[key2etudid[key]]
+                    sco_etud.format_etud_ident(etud)
                     H.append('<li class="desinscription">%(nomprenom)s</li>' % etud)
                 H.append("</ol>")
             if a_desinscrire_without_key:
@@ -245,24 +250,39 @@ def formsemestre_synchro_etuds(
             # OK, do it
 
             # Conversions des listes de codes NIP en listes de codes etudid
-            def nip2etudid(code_nip):
-                etud = sco_etud.get_etud_info(code_nip=code_nip)[0]
-                return etud["etudid"]
-
-            etudids_a_inscrire = [nip2etudid(x) for x in a_inscrire]
-            etudids_a_desinscrire = [nip2etudid(x) for x in a_desinscrire]
+            etudids_a_inscrire = [key2etudid[x] for x in a_inscrire]
+            etudids_a_desinscrire = [key2etudid[x] for x in a_desinscrire]
             etudids_a_desinscrire += a_desinscrire_without_key
             #
+            t0 = time.time()
             with sco_cache.DefferedSemCacheManager():
                 do_import_etuds_from_portal(sem, a_importer, etudsapo_ident)
+                log(
+                    "formsemestre_synchro_etuds: inscription de %d etudiants"
+                    % len(etudids_a_inscrire)
+                )
                 sco_inscr_passage.do_inscrit(sem, etudids_a_inscrire)
+                log(
+                    "formsemestre_synchro_etuds: desinscription de %d etudiants"
+                    % len(etudids_a_desinscrire)
+                )
                 sco_inscr_passage.do_desinscrit(sem, etudids_a_desinscrire)
+            log(
+                "formsemestre_synchro_etuds: synchronisation effectuee en %.2fs"
+                % (time.time() - t0)
+            )
 
             H.append(
                 """<h3>Opération effectuée</h3>
+            <p>%d étudiants importés, %d inscrits, %d désinscrits.</p>
             <ul>
                 <li><a class="stdlink" href="formsemestre_synchro_etuds?formsemestre_id=%s">Continuer la synchronisation</a></li>"""
-                % formsemestre_id
+                % (
+                    len(a_importer),
+                    len(etudids_a_inscrire),
+                    len(etudids_a_desinscrire),
+                    formsemestre_id,
+                )
             )
             #
             partitions = sco_groups.get_partitions_list(
@@ -361,7 +381,10 @@ def build_page(
 
 
 def list_synch(sem, anneeapogee=None):
-    """"""
+    """Compare les inscrits du semestre et ceux des étapes Apogée
+    (ensembles de codes NIP). Les codes NIP et les identités sont lus
+    en quelques requêtes, pour tous les étudiants.
+    """
     inscrits = sco_inscr_passage.list_inscrits(sem["formsemestre_id"], with_dems=True)
     # Tous les ensembles d'etudiants sont ici des ensembles de codes NIP (voir EKEY_SCO)
     # (sauf inscrits_without_key)
@@ -380,25 +403,23 @@ def list_synch(sem, anneeapogee=None):
 
     datefinalisationinscription_by_NIP = {}  # nip : datefinalisationinscription_str
 
-    etapes = sem["etapes"]
-    etudsapo_set = set()
+    # inscrits de toutes les étapes (requêtes au portail en parallèle)
+    inscrits_etapes = sco_portal_apogee.get_inscrits_etapes(
+        [(etape, anneeapogee) for etape in sem["etapes"] if etape]
+    )
+    etudsapo = [e for etuds in inscrits_etapes.values() for e in etuds]
+    etudsapo_set = {e[EKEY_APO] for e in etudsapo}
     etudsapo_ident = {}
-    for etape in etapes:
-        if etape:
-            etudsapo = sco_portal_apogee.get_inscrits_etape(
-                etape, anneeapogee=anneeapogee
-            )
-            etudsapo_set = etudsapo_set.union(set([x[EKEY_APO] for x in etudsapo]))
-            for e in etudsapo:
-                if e[EKEY_APO] not in etudsapo_ident:
-                    etudsapo_ident[e[EKEY_APO]] = e
-                datefinalisationinscription_by_NIP[e[EKEY_APO]] = e[
-                    "datefinalisationinscription"
-                ]
+    for e in etudsapo:
+        if e[EKEY_APO] not in etudsapo_ident:
+            etudsapo_ident[e[EKEY_APO]] = e
+        datefinalisationinscription_by_NIP[e[EKEY_APO]] = e[
+            "datefinalisationinscription"
+        ]
 
     # categories:
     etuds_ok = etudsapo_set.intersection(inscrits_set)
-    etuds_aposco, a_importer, key2etudid = list_all(etudsapo_set)
+    etuds_aposco, a_importer, key2etudid = list_all(etudsapo_set, inscrits_set)
     etuds_noninscrits = etuds_aposco - inscrits_set
     etuds_nonapogee = inscrits_set - etudsapo_set
     # Etudiants ayant payé (avec balise <paiementinscription> true)
@@ -408,15 +429,21 @@ def list_synch(sem, anneeapogee=None):
     )
     #
     cnx = ndb.GetDBConnexion()
+    # identités des étudiants connus de ScoDoc, en une requête:
+    identites = sco_etud.identite_list_many(
+        cnx,
+        [key2etudid[key] for key in etuds_noninscrits | etuds_nonapogee | etuds_ok],
+    )
     # Tri listes
     def set_to_sorted_list(etudset, etud_apo=False, is_inscrit=False):
         def key2etud(key, etud_apo=False):
             if not etud_apo:
                 etudid = key2etudid[key]
-                etuds = sco_etud.identite_list(cnx, {"etudid": etudid})
-                if not etuds:  # ? cela ne devrait pas arriver XXX
-                    log(f"XXX key2etud etudid={{etudid}}, type {{type(etudid)}}")
-                etud = etuds[0]
+                etud = identites.get(etudid)
+                if etud is None:
+                    raise ScoValueError(
+                        f"étudiant {EKEY_NAME} {key} (etudid {etudid}) introuvable"
+                    )
                 etud["inscrit"] = is_inscrit  # checkbox state
                 etud[
                     "datefinalisationinscription"
@@ -519,16 +546,16 @@ def list_synch(sem, anneeapogee=None):
         inscrits_set,
         inscrits_without_key,
         etudsapo_ident,
+        key2etudid,
     )
 
 
-def list_all(etudsapo_set):
+def list_all(etudsapo_set, inscrits_set=frozenset()):
     """Cherche le sous-ensemble des etudiants Apogee de ce semestre
     qui existent dans ScoDoc.
+    Les codes (Apogée et inscrits) sont tous résolus en une seule requête.
+    Returns etuds_aposco, a_importer, key2etudid { code : etudid }
     """
-    # on charge TOUS les etudiants (au pire qq 100000 ?)
-    # si tres grosse base, il serait mieux de faire une requete
-    # d'interrogation par etudiant.
     cnx = ndb.GetDBConnexion()
     cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
     cursor.execute(
@@ -536,8 +563,13 @@ def list_all(etudsapo_set):
         + EKEY_SCO
         + """, id AS etudid
         FROM identite WHERE dept_id=%(dept_id)s
-        """,
-        {"dept_id": g.scodoc_dept_id},
+        AND """
+        + EKEY_SCO
+        + " = ANY(%(codes)s)",
+        {
+            "dept_id": g.scodoc_dept_id,
+            "codes": [str(code) for code in etudsapo_set | inscrits_set],
+        },
     )
     key2etudid = dict([(x[0], x[1]) for x in cursor.fetchall()])
     all_set = set(key2etudid.keys())
@@ -605,64 +637,47 @@ def get_annee_naissance(ddmmyyyyy: str) -> int:
 
 
 def do_import_etuds_from_portal(sem, a_importer, etudsapo_ident):
-    """Inscrit les etudiants Apogee dans ce semestre."""
+    """Importe les etudiants Apogee et les inscrit dans ce semestre,
+    avec des requêtes multi-lignes, dans une seule transaction.
+    """
     log("do_import_etuds_from_portal: a_importer=%s" % a_importer)
     if not a_importer:
         return
     cnx = ndb.GetDBConnexion()
     created_etudids = []
-
+    t0 = time.time()
     try:  # --- begin DB transaction
-        for key in a_importer:
-            etud = etudsapo_ident[
-                key
-            ]  # on a ici toutes les infos renvoyées par le portail
-
-            # Traduit les infos portail en infos pour ScoDoc:
-            address = etud.get("address", "").strip()
-            if address[-2:] == "\\n":  # certains champs se terminent par \n
-                address = address[:-2]
-
-            args = {
-                "code_nip": etud["nip"],
-                "nom": etud["nom"].strip(),
-                "prenom": etud["prenom"].strip(),
-                # Les champs suivants sont facultatifs (pas toujours renvoyés par le portail)
-                "code_ine": etud.get("ine", "").strip(),
-                "civilite": gender2civilite(etud["gender"].strip()),
-                "etape": etud.get("etape", None),
-                "email": etud.get("mail", "").strip(),
-                "emailperso": etud.get("mailperso", "").strip(),
-                "date_naissance": etud.get("naissance", "").strip(),
-                "lieu_naissance": etud.get("ville_naissance", "").strip(),
-                "dept_naissance": etud.get("code_dep_naissance", "").strip(),
-                "domicile": address,
-                "codepostaldomicile": etud.get("postalcode", "").strip(),
-                "villedomicile": etud.get("city", "").strip(),
-                "paysdomicile": etud.get("country", "").strip(),
-                "telephone": etud.get("phone", "").strip(),
-                "typeadresse": "domicile",
-                "boursier": etud.get("bourse", None),
-                "description": "infos portail",
-            }
-
-            # Identite
-            args["etudid"] = sco_etud.identite_create(cnx, args)
-            created_etudids.append(args["etudid"])
-            # Admissions
-            do_import_etud_admission(cnx, args["etudid"], etud)
-
-            # Adresse
-            sco_etud.adresse_create(cnx, args)
-
-            # Inscription au semestre
-            sco_formsemestre_inscriptions.do_formsemestre_inscription_with_modules(
-                sem["formsemestre_id"],
-                args["etudid"],
-                etat="I",
-                etape=args["etape"],
-                method="synchro_apogee",
-            )
+        # on a ici toutes les infos renvoyées par le portail
+        etuds = [etudsapo_ident[key] for key in a_importer]
+        args_list = [_portal_etud_args(etud) for etud in etuds]
+        # Identite
+        log("do_import_etuds_from_portal: creation de %d etudiants" % len(etuds))
+        etudids = sco_etud.identite_create_many(cnx, args_list, commit=False)
+        created_etudids.extend(etudids)
+        for args, etudid in zip(args_list, etudids):
+            args["etudid"] = etudid
+        # Admissions
+        log("do_import_etuds_from_portal: admissions et adresses")
+        sco_etud.admission_create_many(
+            cnx,
+            [
+                _etud_admission_args(etudid, etud)
+                for (etudid, etud) in zip(etudids, etuds)
+            ],
+            commit=False,
+        )
+        # Adresse
+        sco_etud.adresse_create_many(cnx, args_list, commit=False)
+        # Inscription au semestre
+        log("do_import_etuds_from_portal: inscription au semestre")
+        sco_formsemestre_inscriptions.do_formsemestre_inscriptions_with_modules(
+            sem["formsemestre_id"],
+            [(etudid, []) for etudid in etudids],
+            etat="I",
+            method="synchro_apogee",
+            etapes={args["etudid"]: args["etape"] for args in args_list},
+            commit=False,
+        )
     except:
         cnx.rollback()
         log("do_import_etuds_from_portal: aborting transaction !")
@@ -701,6 +716,14 @@ def do_import_etuds_from_portal(sem, a_importer, etudsapo_ident):
         sco_cache.invalidate_formsemestre()
         raise
 
+    cnx.commit()
+    sco_cache.invalidate_formsemestre(
+        formsemestre_id=sem["formsemestre_id"]
+    )  # > inscription au semestre
+    log(
+        "do_import_etuds_from_portal: %d etudiants importes en %.2fs"
+        % (len(created_etudids), time.time() - t0)
+    )
     sco_news.add(
         typ=sco_news.NEWS_INSCR,
         text="Import Apogée de %d étudiants en " % len(created_etudids),
@@ -708,23 +731,43 @@ def do_import_etuds_from_portal(sem, a_importer, etudsapo_ident):
     )
 
 
+def _portal_etud_args(etud):
+    """Traduit les infos portail en infos pour ScoDoc (identité et adresse)"""
+    address = etud.get("address", "").strip()
+    if address[-2:] == "\\n":  # certains champs se terminent par \n
+        address = address[:-2]
+
+    return {
+        "code_nip": etud["nip"],
+        "nom": etud["nom"].strip(),
+        "prenom": etud["prenom"].strip(),
+        # Les champs suivants sont facultatifs (pas toujours renvoyés par le portail)
+        "code_ine": etud.get("ine", "").strip(),
+        "civilite": gender2civilite(etud["gender"].strip()),
+        "etape": etud.get("etape", None),
+        "email": etud.get("mail", "").strip(),
+        "emailperso": etud.get("mailperso", "").strip(),
+        "date_naissance": etud.get("naissance", "").strip(),
+        "lieu_naissance": etud.get("ville_naissance", "").strip(),
+        "dept_naissance": etud.get("code_dep_naissance", "").strip(),
+        "domicile": address,
+        "codepostaldomicile": etud.get("postalcode", "").strip(),
+        "villedomicile": etud.get("city", "").strip(),
+        "paysdomicile": etud.get("country", "").strip(),
+        "telephone": etud.get("phone", "").strip(),
+        "typeadresse": "domicile",
+        "boursier": etud.get("bourse", None),
+        "description": "infos portail",
+    }
+
+
 def do_import_etud_admission(
     cnx, etudid, etud, import_naissance=False, import_identite=False
 ):
     """Importe les donnees admission pour cet etud.
     etud est un dictionnaire traduit du XML portail
     """
-    annee_courante = time.localtime()[0]
-    serie_bac, spe_bac = get_bac(etud)
-    args = {
-        "etudid": etudid,
-        "annee": get_opt_str(etud, "inscription") or annee_courante,
-        "bac": serie_bac,
-        "specialite": spe_bac,
-        "annee_bac": get_opt_str(etud, "anneebac"),
-        "codelycee": get_opt_str(etud, "lycee"),
-        "boursier": get_opt_str(etud, "bourse"),
-    }
+    args = _etud_admission_args(etudid, etud)
     # log("do_import_etud_admission: etud=%s" % pprint.pformat(etud))
     al = sco_etud.admission_list(cnx, args={"etudid": etudid})
     if not al:
@@ -773,6 +816,21 @@ def do_import_etud_admission(
         sco_etud.identite_edit_nocheck(cnx, args)
 
 
+def _etud_admission_args(etudid, etud):
+    "données admission de l'étudiant, etud est un dict traduit du XML portail"
+    annee_courante = time.localtime()[0]
+    serie_bac, spe_bac = get_bac(etud)
+    return {
+        "etudid": etudid,
+        "annee": get_opt_str(etud, "inscription") or annee_courante,
+        "bac": serie_bac,
+        "specialite": spe_bac,
+        "annee_bac": get_opt_str(etud, "anneebac"),
+        "codelycee": get_opt_str(etud, "lycee"),
+        "boursier": get_opt_str(etud, "bourse"),
+    }
+
+
 def get_bac(etud):
     bac = get_opt_str(etud, "bac")
     if not bac:
@@ -827,8 +885,10 @@ def formsemestre_import_etud_admission(
         scu.annee_scolaire_debut(sem["annee_debut"], sem["mois_debut_ord"])
     )
     apo_etuds = {}  # nip : etud apo
-    for etape in sem["etapes"]:
-        etudsapo = sco_portal_apogee.get_inscrits_etape(etape, anneeapogee=anneeapogee)
+    inscrits_etapes = sco_portal_apogee.get_inscrits_etapes(
+        [(etape, anneeapogee) for etape in sem["etapes"]]
+    )
+    for etudsapo in inscrits_etapes.values():
         apo_etuds.update({e["nip"]: e for e in etudsapo})
 
     for i in ins:
@@ -42,7 +42,6 @@ from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib import styles
 from reportlab.lib.colors import Color
 from reportlab.lib import colors
-from PIL import Image as PILImage
 
 import flask
 from flask import url_for, g, send_file, request
@@ -220,11 +219,12 @@ def _trombino_zip(groups_infos):
     Z = ZipFile(data, "w")
     # assume we have the photos (or the user acknowledged the fact)
     # Archive originals (not reduced) images, in JPEG
-    for t in groups_infos.members:
-        im_path = sco_photos.photo_pathname(t, size="orig")
-        if not im_path:
-            continue
-        img = open(im_path, "rb").read()
+    etuds = [
+        t for t in groups_infos.members if sco_photos.photo_pathname(t, size="orig")
+    ]
+    photos = sco_photos.load_photos(etuds, size="orig")
+    for t, photo in zip(etuds, photos):
+        img = photo.data
         code_nip = t["code_nip"]
         if code_nip:
             filename = code_nip + ".jpg"
@@ -291,28 +291,34 @@ def trombino_copy_photos(group_ids=[], dialog_confirmed=False):
     )
 
 
-def _get_etud_platypus_image(t, image_width=2 * cm):
-    """Returns aplatypus object for the photo of student t"""
+def _get_etud_platypus_image(t, image_width=2 * cm, photo=None):
+    """Returns aplatypus object for the photo of student t
+    photo: image déjà chargée (sco_photos.PhotoData), sinon la lit.
+    """
+    path = None
     try:
-        path = sco_photos.photo_pathname(t, size="small")
-        if not path:
-            # log('> unknown')
-            path = sco_photos.UNKNOWN_IMAGE_PATH
-        im = PILImage.open(path)
-        w0, h0 = im.size[0], im.size[1]
+        if photo is None:
+            photo = sco_photos.load_photos([t], size="pdf")[0]
+        path = photo.path
+        w0, h0 = photo.width, photo.height
         if w0 > h0:
             W = image_width
             H = h0 * W / w0
         else:
             H = image_width
             W = w0 * H / h0
-        return reportlab.platypus.Image(path, width=W, height=H)
+        return reportlab.platypus.Image(io.BytesIO(photo.data), width=W, height=H)
     except:
         log(
             "*** exception while processing photo of %s (%s) (path=%s)"
             % (t["nom"], t["etudid"], path)
         )
-        raise
+        if path == sco_photos.UNKNOWN_IMAGE_PATH:
+            raise
+    # photo inutilisable: image "inconnue"
+    return _get_etud_platypus_image(
+        t, image_width=image_width, photo=sco_photos.get_unknown_photo()
+    )
 
 
 def _trombino_pdf(groups_infos):
@@ -337,8 +343,9 @@ def _trombino_pdf(groups_infos):
     n = 0
     currow = []
     log("_trombino_pdf %d elements" % len(groups_infos.members))
-    for t in groups_infos.members:
-        img = _get_etud_platypus_image(t, image_width=PHOTOWIDTH)
+    photos = sco_photos.load_photos(groups_infos.members, size="pdf")
+    for t, photo in zip(groups_infos.members, photos):
+        img = _get_etud_platypus_image(t, image_width=PHOTOWIDTH, photo=photo)
         elem = Table(
             [
                 [img],
@@ -420,11 +427,12 @@ def _listeappel_photos_pdf(groups_infos):
     currow = []
     log("_listeappel_photos_pdf %d elements" % len(groups_infos.members))
     n = len(groups_infos.members)
+    photos = sco_photos.load_photos(groups_infos.members, size="pdf")
     # npages = n / 2*ROWS_PER_PAGE + 1 # nb de pages papier
     # for page in range(npages):
     for i in range(n):  # page*2*ROWS_PER_PAGE, (page+1)*2*ROWS_PER_PAGE):
         t = groups_infos.members[i]
-        img = _get_etud_platypus_image(t, image_width=PHOTOWIDTH)
+        img = _get_etud_platypus_image(t, image_width=PHOTOWIDTH, photo=photos[i])
         txt = Paragraph(
             SU(sco_etud.format_nomprenom(t)),
             StyleSheet["Normal"],
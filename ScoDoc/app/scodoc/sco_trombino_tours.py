@@ -41,6 +41,7 @@ from app import log
 from app.scodoc import sco_abs
 from app.scodoc import sco_groups
 from app.scodoc import sco_groups_view
+from app.scodoc import sco_photos
 from app.scodoc import sco_preferences
 from app.scodoc import sco_trombino
 from app.scodoc import sco_etud
@@ -173,8 +174,11 @@ def pdf_trombino_tours(
                 )
             )
             n = 1
-            for m in members:
-                img = sco_trombino._get_etud_platypus_image(m, image_width=PHOTOWIDTH)
+            photos = sco_photos.load_photos(members, size="pdf")
+            for m, photo in zip(members, photos):
+                img = sco_trombino._get_etud_platypus_image(
+                    m, image_width=PHOTOWIDTH, photo=photo
+                )
                 etud_main_group = sco_groups.get_etud_main_group(m["etudid"], sem)
                 if group_id != etud_main_group["group_id"]:
                     text_group = " (" + etud_main_group["group_name"] + ")"
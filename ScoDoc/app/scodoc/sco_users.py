@@ -249,23 +249,7 @@ def user_info(user_name_or_id=None, user=None):
 
     if not info:
         # special case: user is not in our database
-        return {
-            "user_name": user_name,
-            "nom": user_name,
-            "prenom": "",
-            "email": "",
-            "dept": "",
-            "nomprenom": user_name,
-            "prenomnom": user_name,
-            "prenom_fmt": "",
-            "nom_fmt": user_name,
-            "nomcomplet": user_name,
-            "nomplogin": user_name,
-            # "nomnoacc": scu.suppress_accents(user_name),
-            "passwd_temp": 0,
-            "status": "",
-            "date_expiration": None,
-        }
+        return _unknown_user_info(user_name)
     else:
         # Ensure we never publish password hash
         if "password_hash" in info:
@@ -273,6 +257,45 @@ def user_info(user_name_or_id=None, user=None):
         return info
 
 
+def user_info_many(user_names) -> dict:
+    """Infos sur plusieurs utilisateurs, lus en une seule requête:
+    { user_name : dict comme user_info }
+    (les utilisateurs absents de notre base sont "inconnu", comme dans user_info)
+    """
+    user_names = set(user_names)
+    if not user_names:
+        return {}
+    infos = {
+        u.user_name: u.to_dict()
+        for u in User.query.filter(User.user_name.in_(user_names))
+    }
+    for user_name in user_names:
+        if user_name not in infos:
+            infos[user_name] = _unknown_user_info("inconnu")
+    return infos
+
+
+def _unknown_user_info(user_name) -> dict:
+    "infos pour un utilisateur absent de notre base"
+    return {
+        "user_name": user_name,
+        "nom": user_name,
+        "prenom": "",
+        "email": "",
+        "dept": "",
+        "nomprenom": user_name,
+        "prenomnom": user_name,
+        "prenom_fmt": "",
+        "nom_fmt": user_name,
+        "nomcomplet": user_name,
+        "nomplogin": user_name,
+        # "nomnoacc": scu.suppress_accents(user_name),
+        "passwd_temp": 0,
+        "status": "",
+        "date_expiration": None,
+    }
+
+
 def check_modif_user(
     edit,
     enforce_optionals=False,
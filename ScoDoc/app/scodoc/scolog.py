@@ -56,6 +56,30 @@ def logdb(cnx=None, method=None, etudid=None, msg=None, commit=True):
         cnx.commit()
 
 
+def logdb_many(cnx=None, entries=(), commit=True):
+    """Add entries: liste de tuples (method, etudid, msg)"""
+    if not cnx:
+        raise ValueError("logdb_many: cnx is None")
+    args_list = []
+    for (method, etudid, msg) in entries:
+        args = {
+            "authenticated_user": current_user.user_name,
+            "method": method,
+            "etudid": etudid,
+            "msg": msg,
+        }
+        ndb.quote_dict(args)
+        args_list.append(args)
+    ndb.DBInsertDicts(
+        cnx,
+        "scolog",
+        args_list,
+        commit=commit,
+        convert_empty_to_nulls=0,
+        return_id=False,
+    )
+
+
 def loglist(cnx, method=None, authenticated_user=None):
     """List of events logged for these method and user"""
     cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
@@ -1889,6 +1889,7 @@ def formsemestre_bulletins_mailetuds(
         )
 
     # Make each bulletin
+    sco_bulletins.get_sem_bulletins_snapshot(formsemestre_id, prefetch=True)
     nb_send = 0
     for etudid in etudids:
         h, _ = sco_bulletins.do_formsemestre_bulletinetud(
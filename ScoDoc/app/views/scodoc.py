@@ -52,6 +52,7 @@ from app.models import Departement, Identite
 from app.models import FormSemestre, NotesFormsemestreInscription
 from app.models import ScoDocSiteConfig
 import sco_version
+from app.scodoc import sco_cache
 from app.scodoc import sco_logos
 from app.scodoc import sco_find_etud
 from app.scodoc import sco_utils as scu
@@ -259,6 +260,17 @@ def configuration():
     )
 
 
+@bp.route("/ScoDoc/cache_stats")
+@admin_required
+def cache_stats():
+    """Statistiques d'utilisation des caches (JSON), par département et
+    classe de cache: hits, misses, sets, invalidations, tailles, latences.
+    """
+    return scu.sendJSON(
+        sco_cache.CacheStats.get_stats(dept=request.args.get("dept", None))
+    )
+
+
 def _return_logo(logo_type="header", scodoc_dept=""):
     # stockée dans /opt/scodoc-data/config/logos donc servie manuellement ici
     filename = sco_logos.get_logo_filename(logo_type, scodoc_dept)
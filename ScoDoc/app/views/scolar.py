@@ -1709,6 +1709,7 @@ def check_group_apogee(group_id, etat=None, fix=False, fixmail=False):
     ]
     nerrs = 0  # nombre d'anomalies détectées
     nfix = 0  # nb codes changes
+    fixed_etudids = []
     nmailmissing = 0  # nb etuds sans mail
     for t in members:
         nom, nom_usuel, prenom, etudid, email, code_nip = (
@@ -1740,6 +1741,7 @@ def check_group_apogee(group_id, etat=None, fix=False, fixmail=False):
                             '<span style="color:green">copié %s</span>' % nip_apogee
                         )
                         nfix += 1
+                        fixed_etudids.append(etudid)
                     else:
                         info_apogee = '<span style="color:red">%s</span>' % nip_apogee
                         nerrs += 1
@@ -1783,6 +1785,14 @@ def check_group_apogee(group_id, etat=None, fix=False, fixmail=False):
             )
         )
     H.append("</table>")
+    # Inval semestres des étudiants modifiés (y compris résultats figés):
+    with sco_cache.DefferedSemCacheManager():
+        for etudid in fixed_etudids:
+            etud = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+            for s in etud["sems"]:
+                sco_cache.invalidate_formsemestre(
+                    formsemestre_id=s["formsemestre_id"]
+                )  # > check_group_apogee (fix)
     H.append("<ul>")
     if nfix:
         H.append("<li><b>%d</b> codes modifiés</li>" % nfix)
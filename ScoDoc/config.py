@@ -32,6 +32,14 @@ class Config:
     SCODOC_LOG_FILE = os.path.join(SCODOC_VAR_DIR, "log", "scodoc.log")
     # evite confusion avec le log nginx scodoc_error.log:
     SCODOC_ERR_FILE = os.path.join(SCODOC_VAR_DIR, "log", "scodoc_exc.log")
+    # archives: stockage dédupliqué et compressé (voir sco_archives)
+    SCODOC_ARCHIVES_CONTENT_STORE = (
+        os.environ.get("SCODOC_ARCHIVES_CONTENT_STORE") is not None
+    )
+    # taille max. du cache local (par processus) des NotesTable, en Mo
+    SCODOC_NT_LOCAL_CACHE_MB = int(os.environ.get("SCODOC_NT_LOCAL_CACHE_MB", 64))
+    # délai max. de réponse des serveurs d'emplois du temps (ics), en secondes
+    SCODOC_ICS_TIMEOUT = int(os.environ.get("SCODOC_ICS_TIMEOUT", 5))
     #
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Flask uploads (16Mo, en ligne avec nginx)
 
@@ -325,6 +325,15 @@ def migrate_scodoc7_dept_archives(dept: str):  # migrate-scodoc7-dept-archives
     tools.migrate_scodoc7_dept_archives(dept)
 
 
+@app.cli.command()
+@click.argument("dept", default="")
+@click.option("--gc/--no-gc", default=False, help="Supprime les blobs non référencés")
+@with_appcontext
+def migrate_archives_content_store(dept: str, gc=False):  # migrate-archives-content-store
+    """Déplace les fichiers archivés vers le magasin de contenus (compressé)"""
+    tools.migrate_archives_content_store(dept, gc=gc)
+
+
 @app.cli.command()
 @click.argument("formsemestre_id", type=click.INT)
 @click.argument("xlsfile", type=click.File("rb"))
@@ -380,6 +389,86 @@ def clear_cache():  # clear-cache
     click.echo("Redis caches flushed.")
 
 
+@app.cli.command()
+@click.option("--dept", default=None, help="Limite au département indiqué")
+@click.option("--json", "as_json", is_flag=True, help="Sortie au format JSON")
+@click.option("--reset", is_flag=True, help="Remet les compteurs à zéro")
+@with_appcontext
+def cache_stats(dept=None, as_json=False, reset=False):  # cache-stats
+    """Statistiques d'utilisation des caches (hits, misses, tailles, latences),
+    par département et classe de cache.
+    """
+    import json
+    from app.scodoc import sco_cache
+
+    stats = sco_cache.CacheStats.get_stats(dept=dept)
+    if as_json:
+        click.echo(json.dumps(stats, indent=1, sort_keys=True))
+    else:
+        click.echo(
+            f"{'dept':12} {'cache':10} {'hits':>9} {'misses':>9} {'rate':>6}"
+            f" {'sets':>8} {'inval.':>8} {'get ms':>7} {'set ms':>7} {'KB/set':>8}"
+        )
+        for dept_name, caches in sorted(stats.items()):
+            for cache_name, c in sorted(caches.items()):
+                nb_gets = c["hits"] + c["misses"]
+                rate = f"{c['hit_rate']:.0%}" if c["hit_rate"] is not None else "-"
+                get_ms = c.get("get_time_ms", 0) / nb_gets if nb_gets else 0
+                set_ms = c.get("set_time_ms", 0) / c["sets"] if c["sets"] else 0
+                set_kb = c.get("set_bytes", 0) / 1024 / c["sets"] if c["sets"] else 0
+                click.echo(
+                    f"{dept_name or '-':12} {cache_name:10}"
+                    f" {c['hits']:9} {c['misses']:9} {rate:>6} {c['sets']:8} {c['invalidations']:8}"
+                    f" {get_ms:7.1f} {set_ms:7.1f} {set_kb:8.1f}"
+                )
+    if reset:
+        sco_cache.CacheStats.reset()
+        click.echo("Compteurs remis à zéro.")
+
+
+@app.cli.command()
+@click.argument("dept")
+@click.option(
+    "-s", "--formsemestre-id", "formsemestre_ids", type=click.INT, multiple=True
+)
+@with_appcontext
+def check_absences(dept, formsemestre_ids=()):  # check-absences
+    """Vérifie la cohérence notes/absences aux évaluations de tous les semestres
+    du département (ou seulement des semestres indiqués).
+    """
+    import app as mapp
+    from app.scodoc import sco_formsemestre, sco_liste_notes
+
+    labels = (
+        "note mais absent",
+        "ABS mais pas absent",
+        "EXC mais pas absent",
+        "EXC mais absent non justifié",
+        "ABS mais justifié",
+    )
+    with app.test_request_context():
+        mapp.set_sco_dept(dept)
+        sems = sco_formsemestre.do_formsemestre_list()
+        if formsemestre_ids:
+            sems = [s for s in sems if s["formsemestre_id"] in formsemestre_ids]
+        res = sco_liste_notes.formsemestres_check_absences(
+            [s["formsemestre_id"] for s in sems]
+        )
+        nb_anomalies = 0
+        for sem in sems:
+            evals = res.get(sem["formsemestre_id"], {})
+            for evaluation_id, anomalies in sorted(evals.items()):
+                for label, etudids in zip(labels, anomalies):
+                    if etudids:
+                        nb_anomalies += len(etudids)
+                        click.echo(
+                            f"{sem['formsemestre_id']} {sem['titreannee']}"
+                            f" evaluation {evaluation_id}: {label}:"
+                            f" {', '.join(str(etudid) for etudid in etudids)}"
+                        )
+        click.echo(f"{len(sems)} semestres vérifiés, {nb_anomalies} anomalies.")
+
+
 def recursive_help(cmd, parent=None):
     ctx = click.core.Context(cmd, info_name=cmd.name, parent=parent)
     print(cmd.get_help(ctx))
@@ -13,6 +13,8 @@ from tests.unit import sco_fake_gen
 from app.scodoc import sco_abs
 from app.scodoc import sco_abs_views
 from app.scodoc import sco_groups
+from app.scodoc import sco_liste_notes
+import app.scodoc.sco_utils as scu
 from app.views import absences
 
 
@@ -337,3 +339,80 @@ def test_abs_basic(test_client):
 
     assert len(load_li_bi) == 2
     assert load_li_bi[1]["description"] == "abs du 22"
+
+
+def test_check_absences_evaluations(test_client):
+    """Vérification cohérence notes/absences aux évaluations d'un semestre"""
+    G = sco_fake_gen.ScoFake(verbose=False)
+    etuds = [G.create_etud(code_nip=None) for _ in range(5)]
+    f = G.create_formation(acronyme="")
+    ue = G.create_ue(formation_id=f["formation_id"], acronyme="TST1", titre="ue test")
+    mat = G.create_matiere(ue_id=ue["ue_id"], titre="matière test")
+    mod = G.create_module(
+        matiere_id=mat["matiere_id"],
+        code="TSM1",
+        coefficient=1.0,
+        titre="module test",
+        ue_id=ue["ue_id"],
+        formation_id=f["formation_id"],
+    )
+    sem = G.create_formsemestre(
+        formation_id=f["formation_id"],
+        semestre_id=1,
+        date_debut="01/01/2021",
+        date_fin="30/06/2021",
+    )
+    mi = G.create_moduleimpl(
+        module_id=mod["module_id"],
+        formsemestre_id=sem["formsemestre_id"],
+    )
+    for etud in etuds:
+        G.inscrit_etudiant(sem, etud)
+    # évaluation le matin:
+    e = G.create_evaluation(
+        moduleimpl_id=mi["moduleimpl_id"],
+        jour="15/01/2021",
+        heure_debut="8h00",
+        heure_fin="10h00",
+        description="evaluation test",
+        coefficient=1.0,
+    )
+    notes = (12.0, None, scu.NOTES_NEUTRALISE, None, None)
+    for etud, note in zip(etuds, notes):
+        G.create_note(evaluation=e, etud=etud, note=note)
+    # absent le matin, avec une note:
+    sco_abs_views.doSignaleAbsence(
+        "15/01/2021", "15/01/2021", demijournee=1, etudid=etuds[0]["etudid"]
+    )
+    # EXC, absent non justifié:
+    sco_abs_views.doSignaleAbsence(
+        "15/01/2021", "15/01/2021", demijournee=1, etudid=etuds[2]["etudid"]
+    )
+    # ABS, absent justifié:
+    sco_abs_views.doSignaleAbsence(
+        "15/01/2021", "15/01/2021", demijournee=1, etudid=etuds[3]["etudid"]
+    )
+    sco_abs_views.doJustifAbsence(
+        "15/01/2021", "15/01/2021", demijournee=1, etudid=etuds[3]["etudid"]
+    )
+    # ABS, mais absent seulement l'après-midi:
+    sco_abs_views.doSignaleAbsence(
+        "15/01/2021", "15/01/2021", demijournee=0, etudid=etuds[4]["etudid"]
+    )
+    res = sco_liste_notes.formsemestre_check_absences(sem["formsemestre_id"])
+    (
+        ValButAbs,
+        AbsNonSignalee,
+        ExcNonSignalee,
+        ExcNonJust,
+        AbsButExc,
+    ) = res[e["evaluation_id"]]
+    assert ValButAbs == [etuds[0]["etudid"]]
+    assert AbsNonSignalee == sorted([etuds[1]["etudid"], etuds[4]["etudid"]])
+    assert ExcNonSignalee == []
+    assert ExcNonJust == [etuds[2]["etudid"]]
+    assert AbsButExc == [etuds[3]["etudid"]]
+    # même résultat évaluation par évaluation:
+    assert sco_liste_notes.evaluation_check_absences(e["evaluation_id"]) == tuple(
+        res[e["evaluation_id"]]
+    )
@@ -0,0 +1,102 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test des archives: magasin de contenus (blobs dédupliqués et compressés),
+migration des archives au format historique, ramasse-miettes.
+
+Les archives sont créées dans un répertoire temporaire.
+
+Utiliser comme:
+    pytest tests/unit/test_archives.py
+
+"""
+import glob
+import os
+
+import pytest
+
+from config import Config
+from app.scodoc import sco_archives
+
+TEXT = "".join("Procès-verbal de jury, ligne %d\n" % i for i in range(500)).encode()
+IMAGE = os.urandom(4096)  # incompressible
+
+
+@pytest.fixture()
+def archiver(tmp_path, monkeypatch):
+    "archiveur utilisant le magasin de contenus, dans un répertoire temporaire"
+    monkeypatch.setattr(Config, "SCODOC_VAR_DIR", str(tmp_path))
+    archiver = sco_archives.BaseArchiver(archive_type="test")
+    archiver.use_content_store = True
+    return archiver
+
+
+def _blobs(archiver):
+    return glob.glob(os.path.join(archiver.blobs_dir, "*", "*"))
+
+
+def test_content_store(test_client, archiver):
+    """Stockage dédupliqué et compressé, lecture en flux, ramasse-miettes"""
+    a1 = archiver.create_obj_archive(1, "archive 1")
+    a2 = archiver.create_obj_archive(2, "archive 2")
+    for archive_id in (a1, a2):
+        archiver.store(archive_id, "pv.txt", TEXT)
+        archiver.store(archive_id, "logo.png", IMAGE)
+    assert len(_blobs(archiver)) == 2  # un seul exemplaire de chaque contenu
+    manifest = archiver._read_manifest(a1)
+    assert manifest == archiver._read_manifest(a2)
+    assert manifest["pv.txt"]["encoding"] == "gzip"
+    assert manifest["pv.txt"]["size"] == len(TEXT)
+    blob_path = archiver._blob_path(manifest["pv.txt"]["sha256"], "gzip")
+    assert os.path.getsize(blob_path) < len(TEXT)
+    assert manifest["logo.png"]["encoding"] == "identity"
+    assert archiver.list_archive(a2) == ["logo.png", "pv.txt"]
+    assert archiver.get(a2, "pv.txt") == TEXT
+    assert archiver.get(a2, "logo.png") == IMAGE
+    assert archiver.get_archive_description(a1) == "archive 1"
+    with pytest.raises(ValueError):
+        archiver.open_file(a1, "../pv.txt")
+    # envoi au client, en flux
+    response = archiver.get_archived_file(1, archiver.get_archive_name(a1), "pv.txt")
+    assert response.is_streamed
+    assert response.get_data() == TEXT
+    assert "pv.txt" in response.headers["Content-Disposition"]
+
+    # ramasse-miettes
+    archiver.delete_archive(a1)
+    assert archiver.gc_blobs(grace_period=0) == 0  # encore référencés par a2
+    archiver.store(a2, "pv.txt", b"PV corrige")  # remplace: l'ancien blob est libre
+    assert len(_blobs(archiver)) == 3
+    assert archiver.gc_blobs() == 0  # blob récent: conservé
+    assert archiver.gc_blobs(grace_period=0) == 1
+    assert archiver.get(a2, "pv.txt") == b"PV corrige"
+    assert archiver.get(a2, "logo.png") == IMAGE
+
+
+def test_migrate_archive(test_client, archiver):
+    """Migration transparente des archives au format historique"""
+    archiver.use_content_store = False
+    a1 = archiver.create_obj_archive(1, "ancienne archive 1")
+    a2 = archiver.create_obj_archive(2, "ancienne archive 2")
+    for archive_id in (a1, a2):
+        archiver.store(archive_id, "pv.txt", TEXT)
+        archiver.store(archive_id, "notes.csv", archive_id.encode("utf-8"))
+    assert os.path.exists(os.path.join(a1, "pv.txt"))
+    assert not _blobs(archiver)
+
+    archiver.use_content_store = True
+    # avant migration, les fichiers ordinaires sont lus
+    assert archiver.get(a1, "pv.txt") == TEXT
+    assert archiver.migrate_archive(a1) == 2
+    # les deux formats coexistent
+    assert archiver.list_archive(a1) == archiver.list_archive(a2)
+    assert archiver.get(a1, "pv.txt") == archiver.get(a2, "pv.txt") == TEXT
+    assert archiver.migrate_archive(a2) == 2
+    assert archiver.migrate_archive(a2) == 0  # déjà migrée
+    for archive_id in (a1, a2):
+        assert not os.path.exists(os.path.join(archive_id, "pv.txt"))
+        assert archiver.list_archive(archive_id) == ["notes.csv", "pv.txt"]
+        assert archiver.get(archive_id, "notes.csv") == archive_id.encode("utf-8")
+        assert archiver.get(archive_id, "pv.txt") == TEXT
+    assert archiver.get_archive_description(a1) == "ancienne archive 1"
+    assert len(_blobs(archiver)) == 3  # pv.txt dédupliqué
@@ -14,8 +14,12 @@ from flask import current_app, g
 import app
 from app import db
 from app.scodoc import sco_cache
+from app.scodoc import sco_etud
 from app.scodoc import sco_evaluations
 from app.scodoc import sco_formsemestre
+from app.scodoc import sco_news
+from app.scodoc import sco_pdf
+from app.scodoc import sco_pvjury
 from app.scodoc import notesdb as ndb
 from config import TestConfig
 from tests.unit.test_sco_basic import run_sco_basic
@@ -73,3 +77,177 @@ def test_cache_evaluations(test_client):
     sco_cache.invalidate_formsemestre(sem["formsemestre_id"])
     # should have been erased from cache:
     assert not sco_cache.EvaluationCache.get(evaluation_id)
+
+
+def test_evaluations_etats(test_client):
+    """Etat des évaluations calculé pour tout le semestre
+    identique au calcul évaluation par évaluation"""
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    for sem in sco_formsemestre.do_formsemestre_list():
+        formsemestre_id = sem["formsemestre_id"]
+        sco_cache.invalidate_formsemestre(formsemestre_id)
+        etats = sco_evaluations.do_evaluations_etats_in_sem(formsemestre_id)
+        for evaluation_id, etat in etats.items():
+            assert sco_cache.EvaluationEtatCache.get(evaluation_id)
+            sco_cache.EvaluationEtatCache.delete(evaluation_id)
+            assert sco_evaluations.do_evaluation_etat(evaluation_id) == etat
+
+
+def test_frozen_results(test_client):
+    """Résultats figés des semestres verrouillés"""
+    from app.scodoc import sco_frozen_results
+
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    sem = sco_formsemestre.do_formsemestre_list()[0]
+    formsemestre_id = sem["formsemestre_id"]
+    # verrouille le semestre
+    sco_formsemestre.do_formsemestre_edit(
+        {"formsemestre_id": formsemestre_id, "etat": False}
+    )
+    nt = sco_cache.NotesTableCache.get(formsemestre_id)
+    assert sco_frozen_results.get(formsemestre_id)
+    # vide le cache: la table est relue et non recalculée
+    sco_cache.NotesTableCache.delete(formsemestre_id)
+    del g.nt_cache[formsemestre_id]
+    nt2 = sco_cache.NotesTableCache.get(formsemestre_id)
+    assert nt2.get_etudids() == nt.get_etudids()
+    # invalidation globale (préférences...): résultats figés effacés
+    sco_cache.invalidate_formsemestre()
+    assert sco_frozen_results.get(formsemestre_id) is None
+    sco_cache.NotesTableCache.get(formsemestre_id)
+    assert sco_frozen_results.get(formsemestre_id)
+    # déverrouille: résultats figés effacés
+    sco_formsemestre.do_formsemestre_edit(
+        {"formsemestre_id": formsemestre_id, "etat": True}
+    )
+    assert sco_frozen_results.get(formsemestre_id) is None
+
+
+def test_cache_stats(test_client):
+    """Compteurs d'utilisation des caches"""
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    formsemestre_id = sco_formsemestre.do_formsemestre_list()[0]["formsemestre_id"]
+    sco_cache.CacheStats.reset()
+    sco_cache.invalidate_formsemestre(formsemestre_id)
+    sco_cache.NotesTableCache.get(formsemestre_id)  # miss, set
+    del g.nt_cache[formsemestre_id]
+    sco_cache.NotesTableCache.get(formsemestre_id)  # hit
+    stats = sco_cache.CacheStats.get_stats(dept=DEPT)
+    nt_stats = stats[DEPT][sco_cache.NotesTableCache.prefix]
+    assert nt_stats["hits"] == 1
+    assert nt_stats["misses"] == 1
+    assert nt_stats["sets"] == 1
+    assert nt_stats["hit_rate"] == 0.5
+    assert nt_stats["set_bytes"] > 0
+
+
+def test_notes_table_local_cache(test_client):
+    """Copie locale (processus) des NotesTable, vérifiée par le jeton de version"""
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    formsemestre_id = sco_formsemestre.do_formsemestre_list()[0]["formsemestre_id"]
+    sco_cache.invalidate_formsemestre(formsemestre_id)
+    nt = sco_cache.NotesTableCache.get(formsemestre_id)
+    del g.nt_cache[formsemestre_id]
+    # même objet, non relu depuis REDIS:
+    assert sco_cache.NotesTableCache.get(formsemestre_id) is nt
+    # un autre processus change la version: la copie locale est ignorée
+    sco_cache.CACHE.set(
+        sco_cache.NotesTableCache._get_version_key(formsemestre_id), "other"
+    )
+    del g.nt_cache[formsemestre_id]
+    nt2 = sco_cache.NotesTableCache.get(formsemestre_id)
+    assert nt2 is not nt
+    assert nt2.get_etudids() == nt.get_etudids()
+    # invalidation: plus de copie locale
+    sco_cache.invalidate_formsemestre(formsemestre_id)
+    assert not sco_cache.NotesTableCache.get(formsemestre_id, compute=False)
+
+
+def test_notes_table_local_cache_not_mutated(test_client):
+    """Les modifications des données extraites de la NotesTable (décisions
+    de jury, identités formatées) ne sont pas vues par les requêtes suivantes
+    qui partagent la copie locale"""
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    formsemestre_id = sco_formsemestre.do_formsemestre_list()[0]["formsemestre_id"]
+    sco_cache.invalidate_formsemestre(formsemestre_id)
+    nt = sco_cache.NotesTableCache.get(formsemestre_id)
+    identdict = {etudid: ident.copy() for (etudid, ident) in nt.identdict.items()}
+    dpv = sco_pvjury.dict_pvjury(formsemestre_id, with_prev=True)
+    for d in dpv["decisions"]:
+        sco_etud.format_etud_ident(d["identite"])
+        d["identite"]["nom"] = "MODIFIE"
+    sco_etud.fill_etuds_info([d["identite"] for d in dpv["decisions"]])
+    # requête suivante: même objet (copie locale), non modifié
+    del g.nt_cache[formsemestre_id]
+    nt2 = sco_cache.NotesTableCache.get(formsemestre_id)
+    assert nt2 is nt
+    assert nt2.identdict == identdict
+
+
+def test_cache_generations(test_client):
+    """Invalidation des semestres et du département par jetons de génération"""
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    sems = sco_formsemestre.do_formsemestre_list()
+    formsemestre_ids = [sem["formsemestre_id"] for sem in sems[:2]]
+    for formsemestre_id in formsemestre_ids:
+        sco_cache.NotesTableCache.get(formsemestre_id)
+        sco_cache.SemInscriptionsCache.set(formsemestre_id, [])
+    # invalide un semestre: les autres restent en cache
+    sco_cache.invalidate_formsemestre(formsemestre_ids[0])
+    assert not sco_cache.NotesTableCache.get(formsemestre_ids[0], compute=False)
+    assert sco_cache.SemInscriptionsCache.get(formsemestre_ids[0]) is None
+    if len(formsemestre_ids) > 1:
+        assert sco_cache.NotesTableCache.get(formsemestre_ids[1], compute=False)
+        assert sco_cache.SemInscriptionsCache.get(formsemestre_ids[1]) == []
+    # invalide tout le département
+    sco_cache.invalidate_formsemestre()
+    for formsemestre_id in formsemestre_ids:
+        assert not sco_cache.NotesTableCache.get(formsemestre_id, compute=False)
+        assert sco_cache.SemInscriptionsCache.get(formsemestre_id) is None
+
+
+def test_pdf_images_cache(test_client, tmp_path, monkeypatch):
+    """Cache des images (logos, fonds) des documents PDF"""
+    from PIL import Image as PILImage
+
+    app.set_sco_dept(DEPT)
+    monkeypatch.setattr(sco_pdf, "SCODOC_LOGOS_DIR", str(tmp_path))
+    assert sco_pdf.find_image_filename(("logo_header",)) == ""
+    global_logo = tmp_path / "logo_header.png"
+    PILImage.new("RGB", (20, 10)).save(global_logo)
+    assert sco_pdf.find_image_filename(("logo_header",)) == str(global_logo)
+    # logo du département prioritaire
+    (tmp_path / ("logos_" + DEPT)).mkdir()
+    dept_logo = tmp_path / ("logos_" + DEPT) / "logo_header.jpg"
+    PILImage.new("RGB", (30, 10)).save(dept_logo)
+    assert sco_pdf.find_image_filename(("logo_header",)) == str(dept_logo)
+    # image décodée une seule fois, tant que le fichier n'est pas modifié
+    reader = sco_pdf.find_image_reader(("logo_header",))
+    assert reader.getSize() == (30, 10)
+    assert sco_pdf.find_image_reader(("logo_header",)) is reader
+    PILImage.new("RGB", (40, 10)).save(dept_logo)
+    assert sco_pdf.find_image_reader(("logo_header",)).getSize() == (40, 10)
+    # images données par leur contenu (signatures)
+    data = global_logo.read_bytes()
+    reader = sco_pdf.get_image_reader_from_data(data)
+    assert reader.getSize() == (20, 10)
+    assert sco_pdf.get_image_reader_from_data(data) is reader
+
+
+def test_news_summary_cache(test_client):
+    """Résumé des nouvelles en cache, invalidé par chaque nouvelle"""
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    news = sco_news.scolar_news_summary(n=5)
+    assert news
+    assert sco_cache.NewsSummaryCache.get(5) == news
+    sco_news.add(typ=sco_news.NEWS_MISC, text="test cache nouvelles")
+    assert sco_cache.NewsSummaryCache.get(5) is None
+    news = sco_news.scolar_news_summary(n=5)
+    assert news[0]["text"].startswith("test cache nouvelles par ")
@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*
+
+"""Unit tests for sco_edt_cal (emplois du temps ics et leur cache)
+
+Les calendriers sont lus depuis des fichiers (URL file://), sans réseau.
+
+Usage: pytest tests/unit/test_edt_cal.py
+"""
+
+import os
+
+from app.scodoc import sco_edt_cal
+
+ICS_TEMPLATE = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//ScoDoc//test//FR
+BEGIN:VEVENT
+UID:1
+DTSTART:20210913T100000Z
+DTEND:20210913T120000Z
+DESCRIPTION:{title} TD A
+X-GROUP-ID:TDA
+END:VEVENT
+BEGIN:VEVENT
+UID:2
+DTSTART:20210913T080000Z
+DTEND:20210913T100000Z
+DESCRIPTION:{title} CM
+END:VEVENT
+BEGIN:VEVENT
+UID:3
+DTSTART:20210914T080000Z
+DTEND:20210914T100000Z
+DESCRIPTION:{title} TD B
+X-GROUP-ID:TDB
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def _write_ics(filename, title):
+    with open(filename, "w", newline="\r\n") as f:
+        f.write(ICS_TEMPLATE.format(title=title))
+
+
+def test_load_ics(test_client, tmp_path, monkeypatch):
+    """Calendrier indexé par groupe, revalidé et servi depuis le cache"""
+    filename = tmp_path / "edt.ics"
+    _write_ics(filename, "Maths")
+    ics_url = filename.as_uri()
+    events = sco_edt_cal.load_ics(ics_url)
+    assert set(events) == {None, "TDA", "TDB"}
+    assert [e["title"] for e in events["TDA"]] == ["Maths TD A"]
+    assert events[None][0]["start"] == "2021-09-13T08:00:00+00:00"
+    # calendrier modifié: pas relu tant que le cache est frais
+    _write_ics(filename, "Info")
+    os.utime(filename, ns=(0, 0))
+    assert sco_edt_cal.load_ics(ics_url) == events
+    # puis revalidé
+    monkeypatch.setattr(sco_edt_cal, "ICS_MAX_AGE", 0)
+    events = sco_edt_cal.load_ics(ics_url)
+    assert [e["title"] for e in events["TDB"]] == ["Info TD B"]
+    # calendrier indisponible: données en cache
+    filename.unlink()
+    assert sco_edt_cal.load_ics(ics_url) == events
@@ -0,0 +1,157 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test de la saisie automatique des décisions de jury
+
+Le traitement par lot (formsemestre_validation_auto_batch) doit donner les mêmes
+décisions que la validation étudiant par étudiant.
+
+Utiliser comme:
+    pytest tests/unit/test_jury_auto.py
+
+"""
+
+from config import TestConfig
+from tests.unit import sco_fake_gen
+
+import app
+from app.scodoc import sco_cache
+from app.scodoc import sco_codes_parcours
+from app.scodoc import sco_etud
+from app.scodoc import sco_formsemestre_validation
+from app.scodoc import sco_parcours_dut
+from app.scodoc import sco_utils as scu
+from app.scodoc.sco_codes_parcours import ADM, ADC, ADJ
+
+DEPT = TestConfig.DEPT_TEST
+
+# notes (UE1, UE2) et décision déjà saisie de chaque étudiant
+ETUDS_NOTES = [
+    ((14.0, 12.0), None),  # validé
+    ((6.0, 7.0), None),  # non validé (moyenne)
+    ((15.0, 7.0), None),  # non validé (barre d'UE)
+    ((15.0, scu.NOTES_ATTENTE), None),  # notes en attente: ignoré
+    ((13.0, 11.0), sco_codes_parcours.AJ),  # décision différente: conflit
+    ((12.0, 12.0), ADM),  # déjà validé
+]
+
+
+def _setup_semestre(G, f, mod_list):
+    "semestre avec ses étudiants notés et les décisions déjà saisies"
+    sem, evals = G.setup_formsemestre(f, mod_list)
+    formsemestre_id = sem["formsemestre_id"]
+    etudids = []
+    for notes, code in ETUDS_NOTES:
+        etud = G.create_etud(code_nip=None)
+        G.inscrit_etudiant(sem, etud)
+        for e, note in zip(evals, notes):
+            G.create_note(evaluation=e, etud=etud, note=note)
+        if code:
+            sco_formsemestre_validation.formsemestre_validation_etud_manu(
+                formsemestre_id,
+                etud["etudid"],
+                code_etat=code,
+                devenir="NEXT" if code == ADM else "",
+                assidu=True,
+                redirect=False,
+            )
+        etudids.append(etud["etudid"])
+    return formsemestre_id, etudids
+
+
+def _validation_auto_par_etudiant(formsemestre_id):
+    "Validation automatique étudiant par étudiant (traitement de référence)"
+    nt = sco_cache.NotesTableCache.get(formsemestre_id)
+    nb_valid = 0
+    conflicts = []
+    for etudid in nt.get_etudids():
+        etud = sco_etud.get_etud_info(etudid=etudid, filled=True)[0]
+        Se = sco_parcours_dut.SituationEtudParcours(etud, formsemestre_id)
+        if not (
+            nt.inscrdict[etudid]["etat"] == "I"
+            and (
+                (not Se.prev)
+                or (Se.prev_decision and Se.prev_decision["code"] in (ADM, ADC, ADJ))
+            )
+            and Se.barre_moy_ok
+            and Se.barres_ue_ok
+            and not nt.etud_has_notes_attente(etudid)
+        ):
+            continue
+        decision_sem = nt.get_etud_decision_sem(etudid)
+        autorisations = sco_parcours_dut.formsemestre_get_autorisation_inscription(
+            etudid, formsemestre_id
+        )
+        if (decision_sem and decision_sem["code"] != ADM) or (
+            autorisations
+            and (
+                len(autorisations) != 1
+                or autorisations[0]["semestre_id"] != nt.sem["semestre_id"] + 1
+            )
+        ):
+            conflicts.append(etud)
+            continue
+        sco_formsemestre_validation.formsemestre_validation_etud_manu(
+            formsemestre_id,
+            etudid,
+            code_etat=ADM,
+            devenir="NEXT",
+            assidu=True,
+            redirect=False,
+        )
+        nb_valid += 1
+    return nb_valid, conflicts
+
+
+def _decisions(formsemestre_id, etudids):
+    "décisions (semestre, UEs, autorisations) de chaque étudiant"
+    sco_cache.invalidate_formsemestre(formsemestre_id)
+    nt = sco_cache.NotesTableCache.get(formsemestre_id)
+    ue_acronymes = {ue["ue_id"]: ue["acronyme"] for ue in nt.get_ues()}
+    decisions = []
+    for etudid in etudids:
+        decision_sem = nt.get_etud_decision_sem(etudid)
+        decisions_ues = nt.get_etud_decision_ues(etudid) or {}
+        decisions.append(
+            (
+                decision_sem["code"] if decision_sem else None,
+                sorted(
+                    (ue_acronymes[ue_id], d["code"])
+                    for ue_id, d in decisions_ues.items()
+                ),
+                [
+                    a["semestre_id"]
+                    for a in sco_parcours_dut.formsemestre_get_autorisation_inscription(
+                        etudid, formsemestre_id
+                    )
+                ],
+            )
+        )
+    return decisions
+
+
+def test_validation_auto_batch(test_client):
+    """Mêmes décisions par lot qu'étudiant par étudiant"""
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(
+        nb_semestre=1, nb_ue_per_semestre=2, nb_module_per_ue=1, acronyme="JURY"
+    )
+    # deux semestres identiques
+    fid_batch, etudids_batch = _setup_semestre(G, f, mod_list)
+    fid_ref, etudids_ref = _setup_semestre(G, f, mod_list)
+
+    nt = sco_cache.NotesTableCache.get(fid_batch)
+    nb_valid, conflicts = (
+        sco_formsemestre_validation.formsemestre_validation_auto_batch(fid_batch, nt)
+    )
+    nb_valid_ref, conflicts_ref = _validation_auto_par_etudiant(fid_ref)
+    assert nb_valid == nb_valid_ref == 2
+    assert [etudids_batch.index(e["etudid"]) for e in conflicts] == [
+        etudids_ref.index(e["etudid"]) for e in conflicts_ref
+    ]
+    assert [etudids_batch.index(e["etudid"]) for e in conflicts] == [4]
+    decisions = _decisions(fid_batch, etudids_batch)
+    assert decisions == _decisions(fid_ref, etudids_ref)
+    assert decisions[0] == (ADM, [("TSU11", ADM), ("TSU12", ADM)], [2])
+    assert decisions[1][0] is None and decisions[3][0] is None
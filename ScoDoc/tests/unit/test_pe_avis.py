@@ -0,0 +1,111 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test du zip des avis de poursuites d'études (jury PE)
+
+Petite promotion de S4: le zip contient un avis LaTeX par étudiant,
+avec son annotation PE, le fichier appelant et les fichiers auxiliaires.
+
+Utiliser comme:
+    pytest tests/unit/test_pe_avis.py
+
+"""
+import io
+import zipfile
+
+from flask import current_app
+
+from config import TestConfig
+from tests.unit import sco_fake_gen
+
+import app
+from app.pe import pe_tools
+from app.pe import pe_view
+from app.scodoc import notesdb as ndb
+from app.scodoc import sco_etud
+
+DEPT = TestConfig.DEPT_TEST
+
+
+def _setup_promo():
+    "semestre S4 (diplôme en 2021) avec trois étudiants notés, dont un annoté"
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(
+        nb_semestre=4, nb_ue_per_semestre=1, nb_module_per_ue=1, acronyme="PEZ"
+    )
+    sem, evals = G.setup_formsemestre(
+        f, mod_list, semestre_id=4, date_debut="01/01/2021", date_fin="30/06/2021"
+    )
+    etuds = [G.create_etud(code_nip=None) for _ in range(3)]
+    for etud, note in zip(etuds, (14.0, 11.0, 8.0)):
+        G.inscrit_etudiant(sem, etud)
+        for e in evals:
+            G.create_note(evaluation=e, etud=etud, note=note)
+    cnx = ndb.GetDBConnexion()
+    sco_etud.etud_annotations_create(
+        cnx,
+        args={
+            "etudid": etuds[0]["etudid"],
+            "author": "test",
+            "comment": "PE> Excellent dossier",
+        },
+    )
+    return sem, etuds
+
+
+def _get_zip(formsemestre_id):
+    "zip renvoyé par la vue (lu jusqu'au bout)"
+    with current_app.test_request_context(method="POST"):
+        response = pe_view.pe_view_sem_recap(formsemestre_id)
+        assert response.mimetype == "application/zip"
+        data = b"".join(response.response)
+    return zipfile.ZipFile(io.BytesIO(data))
+
+
+def test_pe_avis_zip(test_client):
+    """Membres du zip et annotations dans les avis"""
+    app.set_sco_dept(DEPT)
+    sem, etuds = _setup_promo()
+    z = _get_zip(sem["formsemestre_id"])
+    assert z.testzip() is None
+    names = z.namelist()
+    root = "Jury_PE_2021/"
+    assert root + "Jury_PE_2021_annotationsPE.xlsx" in names
+    assert root + "avis/avis_poursuite.tex" in names
+    assert root + "avis/avisPE.cls" in names  # fichiers auxiliaires
+    assert not [name for name in names if name.endswith("ERREUR.txt")]
+    avis = {
+        etud["etudid"]: [
+            name
+            for name in names
+            if name.startswith(root + "avis/avis_poursuite_")
+            and name.endswith("_%s.tex" % etud["etudid"])
+        ]
+        for etud in etuds
+    }
+    assert all(len(files) == 1 for files in avis.values())
+    appelant = z.read(root + "avis/avis_poursuite.tex").decode("utf-8")
+    for files in avis.values():
+        assert "\\include{%s}" % files[0][len(root + "avis/") : -4] in appelant
+    contenus = {
+        etudid: z.read(files[0]).decode("utf-8")
+        for (etudid, files) in avis.items()
+    }
+    assert "Excellent dossier" in contenus[etuds[0]["etudid"]]
+    assert "Excellent dossier" not in contenus[etuds[1]["etudid"]]
+
+
+def test_pe_avis_zip_error(test_client, monkeypatch):
+    """Erreur pendant l'envoi: zip lisible, avec un fichier d'erreur"""
+    app.set_sco_dept(DEPT)
+    sem, _ = _setup_promo()
+
+    def fail(zip_file, ziproot):
+        raise OSError("fichier auxiliaire illisible")
+
+    monkeypatch.setattr(pe_tools, "add_pe_stuff_to_zip", fail)
+    z = _get_zip(sem["formsemestre_id"])
+    assert z.testzip() is None
+    erreur = z.read("Jury_PE_2021/ERREUR.txt").decode("utf-8")
+    assert "fichier auxiliaire illisible" in erreur
+    assert "Jury_PE_2021/avis/avis_poursuite.tex" in z.namelist()
@@ -0,0 +1,99 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test des semestres taggués (poursuites d'études)
+
+Vérifie que les notes mémorisées et le registre des SemestreTag
+(partagé par le jury) donnent les mêmes résultats qu'un SemestreTag
+construit indépendamment, y compris avec des UE capitalisées.
+
+Utiliser comme:
+    pytest tests/unit/test_pe_semestretag.py
+
+"""
+
+from config import TestConfig
+from tests.unit import sco_fake_gen
+
+import app
+from app.pe import pe_semestretag
+from app.scodoc import sco_cache
+from app.scodoc import sco_codes_parcours
+from app.scodoc import sco_parcours_dut
+from app.scodoc import sco_tag_module
+
+DEPT = TestConfig.DEPT_TEST
+
+
+def test_semtag_ue_capitalisee(test_client):
+    """Notes et moyennes par tag avec UE capitalisées"""
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(
+        nb_semestre=1, nb_ue_per_semestre=2, nb_module_per_ue=1, acronyme="PE"
+    )
+    sco_tag_module.module_tag_set(mod_list[0]["module_id"], ["maths"])
+    sco_tag_module.module_tag_set(mod_list[1]["module_id"], ["maths:2", "info"])
+    # deux semestres S1 successifs (redoublement)
+    sem1, evals1 = G.setup_formsemestre(
+        f, mod_list, date_debut="01/09/2019", date_fin="31/01/2020"
+    )
+    sem2, evals2 = G.setup_formsemestre(
+        f, mod_list, date_debut="01/09/2020", date_fin="31/01/2021"
+    )
+    etuds = [G.create_etud(code_nip=None) for _ in range(3)]
+    # notes (UE1, UE2) dans chaque semestre
+    notes1 = [(15.0, 5.0), (12.0, 11.0), (6.0, 7.0)]
+    notes2 = [(8.0, 12.0), (14.0, 9.0), (10.0, 10.0)]
+    for sem, evals, notes in ((sem1, evals1, notes1), (sem2, evals2, notes2)):
+        for etud, notes_etud in zip(etuds, notes):
+            G.inscrit_etudiant(sem, etud)
+            for e, note in zip(evals, notes_etud):
+                G.create_note(evaluation=e, etud=etud, note=note)
+    # S1 non validé: capitalise les UE de moyenne >= 10
+    for etud in etuds:
+        sco_parcours_dut.formsemestre_validate_ues(
+            sem1["formsemestre_id"], etud["etudid"], sco_codes_parcours.AJ, True
+        )
+    sco_cache.invalidate_formsemestre()
+
+    # comme dans le jury: S1 puis S2 créés dans le même registre
+    registry = {}
+    semtag1 = pe_semestretag.get_semtag(sem1["formsemestre_id"], registry)
+    semtag1.comp_data_semtag()
+    semtag2 = pe_semestretag.get_semtag(sem2["formsemestre_id"], registry)
+    semtag2.comp_data_semtag()
+    assert semtag2.get_semtag(sem1["formsemestre_id"]) is semtag1
+    # référence: semestre taggué construit indépendamment, sans registre partagé
+    nt2 = sco_cache.NotesTableCache.get(sem2["formsemestre_id"])
+    semtag_ref = pe_semestretag.SemestreTag(nt2, nt2.sem)
+    semtag_ref.comp_data_semtag()
+    assert semtag_ref.get_semtag(sem1["formsemestre_id"]) is not semtag1
+
+    modimpl_ids = [modimpl["moduleimpl_id"] for modimpl in semtag2.modimpls]
+    for etud in etuds:
+        etudid = etud["etudid"]
+        for modimpl_id in modimpl_ids:
+            # deux fois, pour lire la valeur mémorisée
+            for _ in range(2):
+                assert semtag2.get_noteEtCoeff_modimpl(
+                    modimpl_id, etudid
+                ) == semtag_ref.get_noteEtCoeff_modimpl(modimpl_id, etudid)
+    # UE1 capitalisée avec 15 en S1 (8 en S2): note lue dans S1
+    assert semtag2.get_noteEtCoeff_modimpl(modimpl_ids[0], etuds[0]["etudid"]) == (
+        15.0,
+        0.5,
+    )
+    # UE1 meilleure en S2 (14 contre 12)
+    assert semtag2.get_noteEtCoeff_modimpl(modimpl_ids[0], etuds[1]["etudid"]) == (
+        14.0,
+        0.5,
+    )
+    assert semtag2.taglist == semtag_ref.taglist == ["dut", "info", "maths"]
+    for tag in semtag2.taglist:
+        assert semtag2.resultats[tag] == semtag_ref.resultats[tag]
+        assert semtag2.comp_MoyennesTag(tag, force=True) == semtag_ref.comp_MoyennesTag(
+            tag, force=True
+        )
+        assert semtag2.rangs[tag] == semtag_ref.rangs[tag]
+        assert semtag2.comp_stats_d_un_tag(tag) == semtag_ref.comp_stats_d_un_tag(tag)
@@ -0,0 +1,134 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test des photos des étudiants: versions réduites, index en mémoire, ETag
+
+Les photos sont stockées dans un répertoire temporaire.
+
+Utiliser comme:
+    pytest tests/unit/test_photos.py
+
+"""
+import concurrent.futures
+import glob
+import io
+import os
+
+from flask import current_app
+import pytest
+from PIL import Image as PILImage
+
+from config import TestConfig
+from tests.unit import sco_fake_gen
+
+import app
+from app.scodoc import sco_etud
+from app.scodoc import sco_photos
+
+DEPT = TestConfig.DEPT_TEST
+
+
+def _jpeg_data(width, height, color="red"):
+    "image jpeg de la taille indiquée"
+    f = io.BytesIO()
+    PILImage.new("RGB", (width, height), color=color).save(f, format="JPEG")
+    return f.getvalue()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _image_height(path):
+    with PILImage.open(path) as img:
+        return img.size[1]
+
+
+@pytest.fixture()
+def etud(test_client, tmp_path, monkeypatch):
+    "un étudiant, avec les photos dans un répertoire temporaire"
+    monkeypatch.setattr(sco_photos, "PHOTO_DIR", str(tmp_path))
+    monkeypatch.setattr(sco_photos, "_PHOTO_INDEX", {})
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    etudid = G.create_etud(code_nip="")["etudid"]
+    return sco_etud.get_etud_info(filled=True, etudid=etudid)[0]
+
+
+def test_store_photo(etud, monkeypatch):
+    """Versions réduites créées à l'enregistrement, index et ETag"""
+    etudid = etud["etudid"]
+    assert sco_photos.store_photo(etud, _jpeg_data(300, 400)) == (1, "ok")
+    heights = {"orig": 400, "small": sco_photos.REDUCED_HEIGHT, "pdf": 240}
+    for size, height in heights.items():
+        path = sco_photos.photo_pathname(etud, size=size)
+        assert path and _image_height(path) == height
+    assert not glob.glob(os.path.join(sco_photos.PHOTO_DIR, "*", "*.tmp"))
+
+    # la lecture ne crée aucun fichier
+    def no_write(img, filename):
+        raise AssertionError("écriture d'image lors d'une lecture")
+
+    with monkeypatch.context() as m:
+        m.setattr(sco_photos, "_save_jpeg", no_write)
+        response = sco_photos.get_photo_image(etudid, size="small")
+        assert response.status_code == 200
+        etag = response.get_etag()[0]
+        assert response.get_data() == _read(sco_photos.photo_pathname(etud, "small"))
+        # servie depuis l'index, sans accès à la base
+        m.setattr(sco_etud, "get_etud_info", None)
+        headers = {"If-None-Match": '"%s"' % etag}
+        with current_app.test_request_context(headers=headers):
+            assert sco_photos.get_photo_image(etudid, size="small") == ("", 304)
+        with current_app.test_request_context(headers={"If-None-Match": '"autre"'}):
+            response = sco_photos.get_photo_image(etudid, size="small")
+            assert response.status_code == 200 and response.get_etag()[0] == etag
+
+    # remplacement: anciens fichiers supprimés, index invalidé
+    old_paths = [sco_photos.photo_pathname(etud, size=size) for size in heights]
+    assert sco_photos.store_photo(etud, _jpeg_data(600, 800, "blue")) == (1, "ok")
+    assert (str(etudid), "small") not in sco_photos._PHOTO_INDEX
+    etud = sco_etud.get_etud_info(filled=True, etudid=etudid)[0]
+    new_paths = [sco_photos.photo_pathname(etud, size=size) for size in heights]
+    for path in set(old_paths) - set(new_paths):
+        assert not os.path.exists(path)
+    assert _image_height(new_paths[0]) == 800
+    response = sco_photos.get_photo_image(etudid, size="small")
+    assert response.get_etag()[0] != etag
+
+
+def test_old_photo(etud):
+    """Photo enregistrée sans versions réduites: créées une fois, au besoin"""
+    sco_photos.store_photo(etud, _jpeg_data(300, 400))
+    path_pdf = sco_photos.photo_pathname(etud, size="pdf")
+    path_small = sco_photos.photo_pathname(etud, size="small")
+    os.remove(path_pdf)
+    os.remove(path_small)
+    assert sco_photos.photo_pathname(etud, size="pdf") == path_pdf
+    assert _image_height(path_pdf) == 240
+    assert _image_height(path_small) == sco_photos.REDUCED_HEIGHT
+
+
+def test_load_photos_unreadable(etud):
+    """Une photo illisible est remplacée par l'image inconnue"""
+    sco_photos.store_photo(etud, _jpeg_data(300, 400))
+    path_pdf = sco_photos.photo_pathname(etud, size="pdf")
+    with open(path_pdf, "wb") as f:
+        f.write(b"not an image")
+    photos = sco_photos.load_photos([etud, etud], size="pdf")
+    assert [p.path for p in photos] == [sco_photos.UNKNOWN_IMAGE_PATH] * 2
+    assert photos[0].data == _read(sco_photos.UNKNOWN_IMAGE_PATH)
+
+
+def test_save_jpeg_concurrent(etud):
+    """Même image créée simultanément: fichier complet, pas de fichier temporaire"""
+    filename = os.path.join(sco_photos.PHOTO_DIR, "concurrent.jpg")
+    img = PILImage.new("RGB", (200, 300), color="green")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in executor.map(
+            lambda _: sco_photos._save_jpeg(img.copy(), filename), range(16)
+        ):
+            pass
+    assert _image_height(filename) == 300
+    assert os.listdir(sco_photos.PHOTO_DIR) == ["concurrent.jpg"]
@@ -0,0 +1,109 @@
+# -*- coding: UTF-8 -*
+
+"""Unit tests for sco_portal_apogee (listes d'inscrits aux étapes et leur cache)
+
+Le portail est simulé: les réponses XML sont construites avec les modèles
+du faux portail (tools/fakeportal).
+
+Usage: pytest tests/unit/test_portal_apogee.py
+"""
+
+import os
+from urllib.parse import parse_qs, urlparse
+
+from app.scodoc import sco_portal_apogee
+from app.scodoc import sco_utils as scu
+
+FAKEPORTAL_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "..", "tools", "fakeportal"
+)
+with open(os.path.join(FAKEPORTAL_DIR, "etud_minimal_template.xml")) as f:
+    ETUD_TEMPLATE = f.read()
+
+
+def test_inscrits_etapes(test_client, monkeypatch):
+    """Etapes demandées au portail une seule fois"""
+    requests = []
+
+    def fake_query_portal(req, msg="Portail Apogee", timeout=3):
+        requests.append(req)
+        query = parse_qs(urlparse(req).query)
+        etape, annee = query["etape"][0], query["annee"][0]
+        etuds = [
+            ETUD_TEMPLATE.format(
+                nip=f"{etape}{i}",
+                etape=etape,
+                gender="F",
+                nom="Dupont",
+                prenom="Alice",
+                annee=annee,
+            )
+            for i in range(3)
+        ]
+        return "<etudiants>" + "\n".join(etuds) + "</etudiants>"
+
+    monkeypatch.setattr(scu, "query_portal", fake_query_portal)
+    monkeypatch.setattr(
+        sco_portal_apogee,
+        "get_etud_url",
+        lambda: "http://localhost:8678/scodocEtudiant.php",
+    )
+    monkeypatch.setattr(sco_portal_apogee, "get_portal_api_version", lambda: 2)
+    inscrits = sco_portal_apogee.get_inscrits_etapes(
+        [("V1RT", "2021"), ("V2RT", 2021), ("V1RT", "2021")]
+    )
+    assert set(inscrits) == {("V1RT", "2021"), ("V2RT", "2021")}
+    assert [e["nip"] for e in inscrits[("V2RT", "2021")]] == ["V2RT0", "V2RT1", "V2RT2"]
+    assert len(requests) == 2
+    # réponses partagées (cache)
+    etuds = sco_portal_apogee.get_inscrits_etape("V1RT", anneeapogee="2021")
+    assert etuds == inscrits[("V1RT", "2021")]
+    etuds = [{"code_nip": "V2RT1"}]
+    sco_portal_apogee.check_paiement_etuds(etuds, etapes_annees=[("V2RT", "2021")])
+    assert etuds[0]["etape"] == "V2RT"
+    assert len(requests) == 2
+
+
+def test_check_paiement_etape_sans_reponse(test_client, monkeypatch):
+    """Une étape sans réponse: ses étudiants sont demandés un par un"""
+    requests = []
+
+    def fake_query_portal(req, msg="Portail Apogee", timeout=3):
+        requests.append(req)
+        query = parse_qs(urlparse(req).query)
+        if "nip" in query:
+            nip = query["nip"][0]
+            etapes = [nip[:4]]
+        elif query["etape"][0] == "V4RT":
+            return ""  # pas de réponse
+        else:
+            nip, etapes = None, [query["etape"][0]]
+        annee = "2022"
+        etuds = [
+            ETUD_TEMPLATE.format(
+                nip=nip or f"{etape}{i}",
+                etape=etape,
+                gender="F",
+                nom="Dupont",
+                prenom="Alice",
+                annee=annee,
+            )
+            for etape in etapes
+            for i in range(1 if nip else 3)
+        ]
+        return "<etudiants>" + "\n".join(etuds) + "</etudiants>"
+
+    monkeypatch.setattr(scu, "query_portal", fake_query_portal)
+    monkeypatch.setattr(
+        sco_portal_apogee,
+        "get_etud_url",
+        lambda: "http://localhost:8678/scodocEtudiant.php",
+    )
+    monkeypatch.setattr(sco_portal_apogee, "get_portal_api_version", lambda: 2)
+    etuds = [{"code_nip": "V3RT1"}, {"code_nip": "V4RT1"}]
+    sco_portal_apogee.check_paiement_etuds(
+        etuds, etapes_annees=[("V3RT", "2022"), ("V4RT", "2022")]
+    )
+    assert [etud["etape"] for etud in etuds] == ["V3RT", "V4RT"]
+    nip_requests = [req for req in requests if "nip=" in req]
+    assert len(nip_requests) == 1 and "V4RT1" in nip_requests[0]
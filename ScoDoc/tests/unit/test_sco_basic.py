@@ -11,9 +11,11 @@ Au besoin, créer un base de test neuve:
     ./tools/create_database.sh SCODOC_TEST
 
 """
+import io
 import random
 
 from flask import g
+import openpyxl
 
 from config import TestConfig
 from tests.unit import sco_fake_gen
@@ -25,9 +27,15 @@ from app.scodoc import sco_abs_views
 from app.scodoc import sco_bulletins
 from app.scodoc import sco_codes_parcours
 from app.scodoc import sco_evaluations
+from app.scodoc import sco_formsemestre_inscriptions
 from app.scodoc import sco_formsemestre_validation
+from app.scodoc import sco_groups
+from app.scodoc import sco_moduleimpl
 from app.scodoc import sco_parcours_dut
+from app.scodoc import sco_preferences
 from app.scodoc import sco_cache
+from app.scodoc import sco_etud
+from app.scodoc import sco_excel
 from app.scodoc import sco_saisie_notes
 from app.scodoc import sco_utils as scu
 
@@ -214,3 +222,196 @@ def run_sco_basic(verbose=False):
         dec_ues = nt.get_etud_decision_ues(etud["etudid"])
         for ue_id in dec_ues:
             assert dec_ues[ue_id]["code"] in {"ADM", "CMP"}
+
+
+def test_inscriptions_bulk(test_client):
+    """Création et inscription en masse (requêtes multi-lignes)"""
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(nb_semestre=1, acronyme="BULK")
+    sem, _ = G.setup_formsemestre(f, mod_list, nb_evaluations_per_module=0)
+    formsemestre_id = sem["formsemestre_id"]
+    cnx = ndb.GetDBConnexion()
+    args_list = [
+        {"nom": "BULK%d" % i, "prenom": "Etud", "code_nip": "NIPBULK%d" % i}
+        for i in range(20)
+    ]
+    etudids = sco_etud.identite_create_many(cnx, args_list)
+    assert len(set(etudids)) == len(args_list)
+    # vérifications ensemblistes (import excel):
+    codes = ["NIPBULK1", "NIPBULK2", "NIPBULKX"]
+    assert sco_etud.codes_in_use(cnx, "code_nip", codes) == set(codes[:2])
+    checks = sco_etud.check_nom_prenom_many(cnx, [("bulk1", "etud"), ("", "etud")])
+    assert checks[0][0] and checks[0][1] >= 1
+    assert checks[1] == (False, 0)
+    # ids renvoyés dans l'ordre des données:
+    for args, etudid in zip(args_list, etudids):
+        etud = sco_etud.identite_list(cnx, {"etudid": etudid})[0]
+        assert etud["nom"] == args["nom"]
+    sco_formsemestre_inscriptions.do_formsemestre_inscriptions_with_modules(
+        formsemestre_id, [(etudid, []) for etudid in etudids]
+    )
+    inscrits = sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
+        args={"formsemestre_id": formsemestre_id}
+    )
+    assert {i["etudid"] for i in inscrits} == set(etudids)
+    group_id = sco_groups.get_default_group(formsemestre_id)
+    assert {m["etudid"] for m in sco_groups.get_group_members(group_id)} == set(
+        etudids
+    )
+    for modimpl in sco_moduleimpl.moduleimpl_list(formsemestre_id=formsemestre_id):
+        inscr = sco_moduleimpl.do_moduleimpl_inscription_list(
+            moduleimpl_id=modimpl["moduleimpl_id"]
+        )
+        assert len(inscr) == len(etudids)
+    # ré-inscription (conflits ignorés), sans demander les ids:
+    r = sco_formsemestre_inscriptions._formsemestre_inscriptionEditor.create_many(
+        cnx,
+        [{"formsemestre_id": formsemestre_id, "etudid": etudid} for etudid in etudids],
+        return_id=False,
+    )
+    assert r == [None] * len(etudids)
+    assert len(
+        sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
+            args={"formsemestre_id": formsemestre_id}
+        )
+    ) == len(etudids)
+
+
+def test_formsemestres_bulletins_stream(test_client):
+    """Export JSON des bulletins de l'année, en flux et par morceaux"""
+    import json
+    from app.scodoc import sco_formsemestre
+    from app.scodoc import sco_recapcomplet
+
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    annee_scolaire = 2019  # semestre de janvier 2020
+    sems = sco_formsemestre.list_formsemestre_by_etape(annee_scolaire=annee_scolaire)
+    assert sems
+    response = sco_recapcomplet.formsemestres_bulletins(annee_scolaire)
+    data = json.loads(response.get_data())
+    assert [J["formsemestre_id"] for J in data] == [
+        sem["formsemestre_id"] for sem in sems
+    ]
+    # par morceaux d'un semestre:
+    formsemestre_ids = []
+    after = None
+    while True:
+        response = sco_recapcomplet.formsemestres_bulletins(
+            annee_scolaire, after_formsemestre_id=after, limit=1
+        )
+        data = json.loads(response.get_data())
+        formsemestre_ids += [J["formsemestre_id"] for J in data]
+        after = response.headers.get("X-ScoDoc-Next-After")
+        if after is None:
+            break
+    assert formsemestre_ids == sorted(sem["formsemestre_id"] for sem in sems)
+
+
+def test_formsemestres_bulletins_stream_error(test_client, monkeypatch):
+    """Export JSON des bulletins: erreur signalée en fin de liste"""
+    import json
+    from app.scodoc import sco_formsemestre
+    from app.scodoc import sco_recapcomplet
+
+    app.set_sco_dept(DEPT)
+    run_sco_basic()
+    annee_scolaire = 2019
+    sems = sco_formsemestre.list_formsemestre_by_etape(annee_scolaire=annee_scolaire)
+
+    def fail(formsemestre_id, force_publishing=False):
+        raise ValueError("calcul impossible")
+
+    monkeypatch.setattr(sco_recapcomplet, "_formsemestre_recapcomplet_json", fail)
+    response = sco_recapcomplet.formsemestres_bulletins(annee_scolaire)
+    data = json.loads(response.get_data())  # JSON valide
+    assert data == [
+        {"error": "calcul impossible", "formsemestre_id": sems[0]["formsemestre_id"]}
+    ]
+
+
+def test_excel_iter_rows():
+    """Lecture ligne à ligne d'un classeur: les lignes vides sont ignorées,
+    les numéros de lignes de la feuille sont conservés (messages d'erreur)"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["nom", "prenom"])
+    ws.append([None, None])
+    ws.append(["DUPONT", 12])
+    ws.append([None, None])
+    ws.append(["", "Alice"])
+    data = io.BytesIO()
+    wb.save(data)
+    diag = []
+    rows = list(sco_excel.excel_bytes_iter_rows(data.getvalue(), diag))
+    assert rows == [
+        (1, ["nom", "prenom"]),
+        (3, ["DUPONT", "12"]),
+        (5, ["", "Alice"]),
+    ]
+    assert diag[-1].endswith(", 3 lignes")
+
+
+def test_etuds_info_bulk(test_client):
+    """Adresses et inscriptions de plusieurs étudiants en une requête:
+    mêmes résultats qu'étudiant par étudiant"""
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(nb_semestre=1, acronyme="INFOS")
+    sems = [
+        G.setup_formsemestre(f, mod_list, nb_evaluations_per_module=0)[0]
+        for _ in range(2)
+    ]
+    etuds = [G.create_etud(code_nip=None) for _ in range(3)]
+    cnx = ndb.GetDBConnexion()
+    sco_etud.adresse_create(
+        cnx, {"etudid": etuds[0]["etudid"], "description": "seconde adresse"}
+    )
+    for sem in sems:
+        G.inscrit_etudiant(sem, etuds[0])
+    G.inscrit_etudiant(sems[1], etuds[1])
+    etudids = [etud["etudid"] for etud in etuds]
+
+    adresses = sco_etud.adresse_list_many(cnx, etudids)
+    inscriptions = sco_formsemestre_inscriptions.do_formsemestre_inscription_list_many(
+        etudids
+    )
+    assert set(adresses) == set(inscriptions) == set(etudids)
+    for etudid in etudids:
+        assert sorted(adresses[etudid], key=lambda a: a["id"]) == sorted(
+            sco_etud.adresse_list(cnx, {"etudid": etudid}), key=lambda a: a["id"]
+        )
+        assert inscriptions[etudid] == (
+            sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
+                {"etudid": etudid}
+            )
+        )
+    assert [len(adresses[etudid]) for etudid in etudids] == [2, 1, 1]
+    assert [len(inscriptions[etudid]) for etudid in etudids] == [2, 1, 0]
+    # aucun étudiant
+    assert sco_etud.adresse_list_many(cnx, []) == {}
+    assert sco_formsemestre_inscriptions.do_formsemestre_inscription_list_many([]) == {}
+
+
+def test_preferences_snapshot(test_client):
+    """Toutes les préférences d'un semestre en une fois"""
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(nb_semestre=1, acronyme="PREFS")
+    sem, _ = G.setup_formsemestre(f, mod_list, nb_evaluations_per_module=0)
+    formsemestre_id = sem["formsemestre_id"]
+    prefs = sco_preferences.get_base_preferences()
+    # valeurs propres au semestre
+    prefs.set(formsemestre_id, "INSTITUTION_CITY", "Saint-Denis")
+    prefs.set(formsemestre_id, "PV_FONTNAME", "Helvetica")
+    names = [name for name in prefs.prefs_name if name and name[0] != "_"]
+    for fid in (None, formsemestre_id):
+        snapshot = prefs.snapshot(fid)
+        for name in names:
+            assert snapshot[name] == prefs.get(fid, name), name
+            assert snapshot[name] == sco_preferences.get_preference(name, fid), name
+    snapshot = prefs.snapshot(formsemestre_id)
+    assert snapshot["INSTITUTION_CITY"] == "Saint-Denis"
+    assert snapshot["PV_FONTNAME"] == "Helvetica"
+    assert prefs.snapshot()["PV_FONTNAME"] != "Helvetica"
@@ -0,0 +1,39 @@
+# -*- coding: UTF-8 -*
+
+"""Unit tests for sco_stats (statistiques sur les notes)
+
+Usage: pytest tests/unit/test_stats.py
+"""
+
+from app.scodoc import sco_stats
+from app.scodoc import sco_utils as scu
+
+
+def test_notes_stats():
+    notes = [12.0, None, 8.0, scu.NOTES_NEUTRALISE, 15.0, "NA", scu.NOTES_ATTENTE, 9]
+    stats = sco_stats.NotesStats(notes)
+    assert stats.n == 4
+    assert stats.nb_total == len(notes)
+    assert stats.nb_abs == stats.nb_neutre == stats.nb_att == stats.nb_invalid == 1
+    assert stats.mean == 11.0
+    assert stats.median == 10.5
+    assert (stats.min, stats.max) == (8.0, 15.0)
+    assert abs(stats.std - 2.7386127875258306) < 1e-9
+    assert stats.quantiles((0.0, 0.5, 1.0)) == [8.0, 10.5, 15.0]
+    bins, H = stats.histogram(21, minmax=(0, 20))
+    assert len(bins) == 21 and sum(H) == 4
+    assert H[8] == H[9] == H[12] == H[15] == 1
+    # série vide
+    stats = sco_stats.NotesStats([None, "NI"])
+    assert stats.n == 0
+    assert stats.mean is None and stats.median is None and stats.quantile(0.5) is None
+
+
+def test_notes_stats_groups():
+    gr_stats = sco_stats.notes_stats_groups(
+        [("A", 10.0), ("B", None), ("A", 14.0), ("B", 6.0)], group_ids=["A", "B", "C"]
+    )
+    assert set(gr_stats) == {"A", "B", "C"}
+    assert gr_stats["A"].mean == 12.0
+    assert (gr_stats["B"].n, gr_stats["B"].nb_abs) == (1, 1)
+    assert gr_stats["C"].n == 0
@@ -0,0 +1,158 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test synchronisation des inscrits avec Apogée
+
+Le portail est simulé (liste d'étudiants renvoyée pour l'étape du semestre).
+
+Utiliser comme:
+    pytest tests/unit/test_synchro_etuds.py
+
+"""
+import pytest
+
+from config import TestConfig
+from tests.unit import sco_fake_gen
+
+import app
+from app.scodoc import notesdb as ndb
+from app.scodoc import sco_etud
+from app.scodoc import sco_formsemestre
+from app.scodoc import sco_formsemestre_inscriptions
+from app.scodoc import sco_portal_apogee
+from app.scodoc import sco_synchro_etuds
+
+DEPT = TestConfig.DEPT_TEST
+ETAPE = "V1TST"
+
+
+def _etud_apo(nip, nom):
+    "étudiant tel que renvoyé par le portail"
+    return {
+        "nip": nip,
+        "nom": nom,
+        "prenom": "Alice",
+        "gender": "F",
+        "etape": ETAPE,
+        "ine": "INE" + nip,
+        "mail": nip + "@localhost",
+        "address": "1, rue du portail\\n",
+        "postalcode": "75001",
+        "city": "Paris",
+        "bac": "S",
+        "anneebac": "2019",
+        "datefinalisationinscription": "01/09/2020",
+    }
+
+
+def _setup_synchro(monkeypatch, etuds_apo):
+    "semestre avec une étape, portail simulé renvoyant etuds_apo"
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, _, mod_list = G.setup_formation(nb_semestre=1, acronyme="SYNC")
+    sem = G.create_formsemestre(
+        formation_id=f["formation_id"],
+        semestre_id=1,
+        date_debut="01/09/2020",
+        date_fin="31/01/2021",
+        etapes=[ETAPE],
+    )
+    for mod in mod_list:
+        G.create_moduleimpl(
+            module_id=mod["module_id"], formsemestre_id=sem["formsemestre_id"]
+        )
+    sem = sco_formsemestre.get_formsemestre(sem["formsemestre_id"])
+    sem["etape_apo_str"] = sco_formsemestre.formsemestre_etape_apo_str(sem)
+    monkeypatch.setattr(
+        sco_portal_apogee,
+        "get_inscrits_etapes",
+        lambda etapes_annees, ntrials=2: {(ETAPE, "2020"): etuds_apo},
+    )
+    return G, sem
+
+
+def test_list_synch(test_client, monkeypatch):
+    """Catégories de la synchro, avec des NIP connus et inconnus"""
+    app.set_sco_dept(DEPT)
+    etuds_apo = [_etud_apo(nip, "APO" + nip) for nip in ("N1", "N3", "N5", "N6")]
+    G, sem = _setup_synchro(monkeypatch, etuds_apo)
+    # N1: inscrit et dans Apogée, N2: inscrit mais pas dans Apogée,
+    # N3: connu mais non inscrit, N4: connu, sans rapport avec le semestre,
+    # sans NIP: inscrit, N5 et N6: à importer
+    etuds = {nip: G.create_etud(code_nip=nip) for nip in ("N1", "N2", "N3", "N4")}
+    etud_sans_nip = G.create_etud(code_nip=None)
+    for etud in (etuds["N1"], etuds["N2"], etud_sans_nip):
+        G.inscrit_etudiant(sem, etud)
+
+    (
+        boites,
+        a_importer,
+        etuds_noninscrits,
+        inscrits_set,
+        inscrits_without_key,
+        etudsapo_ident,
+        key2etudid,
+    ) = sco_synchro_etuds.list_synch(sem)
+    assert a_importer == {"N5", "N6"}
+    assert etuds_noninscrits == {"N3"}
+    assert inscrits_set == {"N1", "N2"}
+    assert set(inscrits_without_key) == {etud_sans_nip["etudid"]}
+    assert set(etudsapo_ident) == {"N1", "N3", "N5", "N6"}
+    assert key2etudid == {nip: etuds[nip]["etudid"] for nip in ("N1", "N2", "N3")}
+    boites_nips = {
+        "etuds_a_importer": {"N5", "N6"},
+        "etuds_noninscrits": {"N3"},
+        "etuds_nonapogee": {"N2"},
+        "etuds_ok": {"N1"},
+    }
+    for boite, nips in boites_nips.items():
+        etud_key = boites[boite]["infos"]["etud_key"]
+        assert {e[etud_key] for e in boites[boite]["etuds"]} == nips
+    assert boites["etuds_ok"]["etuds"][0]["etape"] == ETAPE
+    assert boites["etuds_noninscrits"]["etuds"][0]["nom"] == etuds["N3"]["nom"]
+
+
+def test_import_etuds_from_portal(test_client, monkeypatch):
+    """Import des étudiants Apogée, en une transaction"""
+    app.set_sco_dept(DEPT)
+    etuds_apo = [_etud_apo(nip, "APO" + nip) for nip in ("N7", "N8", "N9")]
+    _, sem = _setup_synchro(monkeypatch, etuds_apo)
+    formsemestre_id = sem["formsemestre_id"]
+    etudsapo_ident = {e["nip"]: e for e in etuds_apo}
+    cnx = ndb.GetDBConnexion()
+
+    sco_synchro_etuds.do_import_etuds_from_portal(sem, ["N7", "N8"], etudsapo_ident)
+    inscrits = {
+        i["etudid"]: i
+        for i in sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
+            args={"formsemestre_id": formsemestre_id}
+        )
+    }
+    assert len(inscrits) == 2
+    for nip in ("N7", "N8"):
+        etud = sco_etud.identite_list(cnx, {"code_nip": nip})[0]
+        etudid = etud["etudid"]
+        assert (etud["nom"], etud["code_ine"]) == ("APO" + nip, "INE" + nip)
+        adm = sco_etud.admission_list(cnx, args={"etudid": etudid})
+        assert len(adm) == 1 and adm[0]["bac"] == "S"
+        adr = sco_etud.adresse_list(cnx, {"etudid": etudid})
+        assert len(adr) == 1 and adr[0]["domicile"] == "1, rue du portail"
+        assert inscrits[etudid]["etape"] == ETAPE
+        assert inscrits[etudid]["etat"] == "I"
+    # les importés sont maintenant inscrits:
+    _, a_importer, _, inscrits_set, _, _, _ = sco_synchro_etuds.list_synch(sem)
+    assert a_importer == {"N9"}
+    assert inscrits_set == {"N7", "N8"}
+
+    # échec au milieu de l'import: aucun étudiant créé
+    def fail(*args, **kw):
+        raise ValueError("adresse")
+
+    monkeypatch.setattr(sco_etud, "adresse_create_many", fail)
+    with pytest.raises(ValueError):
+        sco_synchro_etuds.do_import_etuds_from_portal(sem, ["N9"], etudsapo_ident)
+    assert not sco_etud.identite_list(cnx, {"code_nip": "N9"})
+    assert len(
+        sco_formsemestre_inscriptions.do_formsemestre_inscription_list(
+            args={"formsemestre_id": formsemestre_id}
+        )
+    ) == len(inscrits)
@@ -0,0 +1,138 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Test du chargement en une requête des UE capitalisées d'un semestre
+
+Compare formsemestre_get_capitalisations (tous les étudiants)
+à la requête étudiant par étudiant qu'elle remplace.
+
+Utiliser comme:
+    pytest tests/unit/test_ue_capitalisations.py
+
+"""
+
+from config import TestConfig
+from tests.unit import sco_fake_gen
+
+import app
+from app.scodoc import notes_table
+from app.scodoc import notesdb as ndb
+from app.scodoc import sco_cache
+from app.scodoc import sco_codes_parcours
+from app.scodoc import sco_parcours_dut
+
+DEPT = TestConfig.DEPT_TEST
+
+
+def _etud_capitalisation(sem, etudid):
+    "référence: une requête par étudiant (ancienne version)"
+    cnx = ndb.GetDBConnexion()
+    cursor = cnx.cursor(cursor_factory=ndb.ScoDocCursor)
+    cursor.execute(
+        """select distinct SFV.*, ue.ue_code from notes_ue ue, notes_formations nf,
+        notes_formations nf2, scolar_formsemestre_validation SFV, notes_formsemestre sem
+
+    WHERE ue.formation_id = nf.id
+    and nf.formation_code = nf2.formation_code
+    and nf2.id=%(formation_id)s
+
+    and SFV.ue_id = ue.id
+    and SFV.code = 'ADM'
+    and SFV.etudid = %(etudid)s
+
+    and (  (sem.id = SFV.formsemestre_id
+           and sem.date_debut < %(date_debut)s
+           and sem.semestre_id = %(semestre_id)s )
+         or (
+             ((SFV.formsemestre_id is NULL) OR (SFV.is_external))
+             AND (SFV.semestre_id is NULL OR SFV.semestre_id=%(semestre_id)s)
+           ) )
+    """,
+        {
+            "etudid": etudid,
+            "formation_id": sem["formation_id"],
+            "semestre_id": sem["semestre_id"],
+            "date_debut": ndb.DateDMYtoISO(sem["date_debut"]),
+        },
+    )
+    return cursor.dictfetchall()
+
+
+def _key(ue_cap):
+    return (ue_cap["ue_id"], ue_cap["formsemestre_id"] or 0, ue_cap["code"])
+
+
+def test_capitalisations(test_client):
+    """UE capitalisées de tous les étudiants: même résultat qu'étudiant
+    par étudiant, y compris pour une UE de coefficient nul"""
+    app.set_sco_dept(DEPT)
+    G = sco_fake_gen.ScoFake(verbose=False)
+    f, ues, mod_list = G.setup_formation(
+        nb_semestre=1, nb_ue_per_semestre=2, nb_module_per_ue=1, acronyme="CAP"
+    )
+    # UE3: un seul module, de coefficient nul
+    ue3 = G.create_ue(formation_id=f["formation_id"], acronyme="TSU13", titre="ue3")
+    mat3 = G.create_matiere(ue_id=ue3["ue_id"], titre="matière coef nul")
+    mod_list.append(
+        G.create_module(
+            matiere_id=mat3["matiere_id"],
+            code="TSMCOEF0",
+            coefficient=0.0,
+            titre="module coef nul",
+            ue_id=ue3["ue_id"],
+            formation_id=f["formation_id"],
+        )
+    )
+    sem1, evals1 = G.setup_formsemestre(
+        f, mod_list, date_debut="01/09/2019", date_fin="31/01/2020"
+    )
+    sem2, _ = G.setup_formsemestre(
+        f, mod_list, date_debut="01/09/2020", date_fin="31/01/2021"
+    )
+    # notes de S1 (UE1, UE2, UE3): A capitalise UE1, B rien, C capitalise UE2
+    notes = [(15.0, 5.0, 12.0), (6.0, 7.0, 8.0), (4.0, 13.0, 9.0)]
+    etuds = [G.create_etud(code_nip=None) for _ in notes]
+    for etud, notes_etud in zip(etuds, notes):
+        G.inscrit_etudiant(sem1, etud)
+        G.inscrit_etudiant(sem2, etud)
+        for e, note in zip(evals1, notes_etud):
+            G.create_note(evaluation=e, etud=etud, note=note)
+    for etud in etuds:
+        sco_parcours_dut.formsemestre_validate_ues(
+            sem1["formsemestre_id"], etud["etudid"], sco_codes_parcours.AJ, True
+        )
+    # A: UE3 (coefficient nul) validée par le jury
+    cnx = ndb.GetDBConnexion()
+    nt1 = sco_cache.NotesTableCache.get(sem1["formsemestre_id"])
+    sco_parcours_dut.do_formsemestre_validate_ue(
+        cnx,
+        nt1,
+        sem1["formsemestre_id"],
+        etuds[0]["etudid"],
+        ue3["ue_id"],
+        sco_codes_parcours.ADM,
+        moy_ue=12.0,
+    )
+    sco_cache.invalidate_formsemestre()
+
+    etudids = [etud["etudid"] for etud in etuds]
+    caps = sco_parcours_dut.formsemestre_get_capitalisations(sem2, etudids)
+    assert set(caps) == {etudids[0], etudids[2]}  # B sans UE capitalisée: absent
+    assert sco_parcours_dut.formsemestre_get_etud_capitalisation(sem2, etudids[1]) == []
+    for etudid in etudids:
+        ref = sorted(_etud_capitalisation(sem2, etudid), key=_key)
+        res = sorted(caps.get(etudid, []), key=_key)
+        assert [
+            {k: v for (k, v) in ue_cap.items() if k != "sum_coefs_ue"} for ue_cap in res
+        ] == ref
+        for ue_cap in res:
+            assert ue_cap["sum_coefs_ue"] == notes_table.comp_etud_sum_coef_modules_ue(
+                ue_cap["formsemestre_id"], etudid, ue_cap["ue_id"]
+            )
+    assert {ue_cap["ue_id"] for ue_cap in caps[etudids[0]]} == {
+        ues[0]["ue_id"],
+        ue3["ue_id"],
+    }
+    assert {ue_cap["ue_id"] for ue_cap in caps[etudids[2]]} == {ues[1]["ue_id"]}
+    ue3_cap = [ue_cap for ue_cap in caps[etudids[0]] if ue_cap["ue_id"] == ue3["ue_id"]]
+    assert ue3_cap[0]["sum_coefs_ue"] == 0.0  # nul, et non None
@@ -123,3 +123,26 @@ def test_create_delete(test_client):
     db.session.commit()
     ul = User.query.filter_by(prenom="Pierre").all()
     assert len(ul) == 1
+
+
+def test_permissions_cache(test_client):
+    "les permissions mises en cache suivent les modifications des rôles"
+    dept = "XX"
+    perm = Permission.ScoEditApo
+    role = Role(name="TestCache")
+    db.session.add(role)
+    u = User(user_name="un_cache")
+    u.add_role(role, dept)
+    db.session.add(u)
+    db.session.commit()
+    assert not u.has_permission(perm, dept)
+    # modification du rôle
+    role.add_permission(perm)
+    db.session.commit()
+    u = User.query.filter_by(user_name="un_cache").first()
+    assert u.has_permission(perm, dept)
+    assert not u.has_permission(perm, dept + "X")
+    # modification des rôles de l'utilisateur
+    u.set_roles([], dept)
+    db.session.commit()
+    assert not u.has_permission(perm, dept)
@@ -7,3 +7,4 @@
 from tools.import_scodoc7_user_db import import_scodoc7_user_db
 from tools.import_scodoc7_dept import import_scodoc7_dept
 from tools.migrate_scodoc7_archives import migrate_scodoc7_dept_archives
+from tools.migrate_archives_content_store import migrate_archives_content_store
@@ -0,0 +1,38 @@
+# -*- mode: python -*-
+# -*- coding: utf-8 -*-
+
+"""Migration des archives existantes vers le magasin de contenus
+(stockage compressé et dédupliqué, voir sco_archives)
+"""
+import glob
+import os
+
+from app.models import Departement
+from app.scodoc import sco_archives
+from app.scodoc import sco_archives_etud
+from app.scodoc import sco_etape_apogee
+
+
+def migrate_archives_content_store(dept_name="", gc=False):
+    if dept_name:
+        depts = Departement.query.filter_by(acronym=dept_name)
+    else:
+        depts = Departement.query
+    archivers = (
+        sco_archives.PVArchive,
+        sco_archives_etud.EtudsArchive,
+        sco_etape_apogee.ApoCSVArchive,
+    )
+    for dept in depts:
+        print(f"Migrating {dept.acronym} archives...")
+        for archiver in archivers:
+            archiver.initialize()
+            n = 0
+            for archive_id in glob.glob(
+                os.path.join(archiver.root, str(dept.id), "*", "????-??-??-??-??-??")
+            ):
+                n += archiver.migrate_archive(archive_id)
+            print(f"  {archiver.root}: {n} files migrated")
+    if gc:
+        n = sco_archives.PVArchive.gc_blobs()
+        print(f"{n} unreferenced blobs deleted")